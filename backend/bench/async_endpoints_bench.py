@@ -0,0 +1,86 @@
+"""
+Throughput of the hot endpoints (/checkins/daily, /users/{id}/metrics and
+daily-mode /predict) at 100, 500 and 1000 concurrent keep-alive clients.
+
+Runs the current tree and, with --baseline-ref, the same backend/ from a
+git revision (e.g. the last commit with sync handlers) side by side, each
+as a single uvicorn worker.
+
+Usage (from backend/):
+    python -m bench.async_endpoints_bench --baseline-ref HEAD~1 --clients 100,500,1000 --duration 10
+"""
+import argparse
+import io
+import json
+import os
+import subprocess
+import tarfile
+import tempfile
+from datetime import date, timedelta
+
+from bench.load import BACKEND_DIR, Server, request, run_async_load
+
+
+def _export_backend(ref: str) -> str:
+    """backend/ as of `ref`, unpacked into a scratch directory."""
+    archive = subprocess.check_output(["git", "archive", ref, "."], cwd=BACKEND_DIR)
+    target = tempfile.mkdtemp(prefix="finpilot-baseline-")
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(target, filter="data")
+    return target
+
+
+def _bench(backend_dir: str, levels, duration: float, users: int) -> dict:
+    results = {}
+    for clients in levels:
+        with Server(backend_dir=backend_dir) as server:
+            base = server.base_url
+            user_ids = [
+                request("POST", f"{base}/users/register", {"name": f"u{i}", "email": f"u{i}@bench.local"})[1]["user_id"]
+                for i in range(users)
+            ]
+            today = date.today()
+
+            def _next(idx: int, iteration: int) -> tuple:
+                user_id = user_ids[idx % users]
+                step = iteration % 3
+                if step == 0:
+                    body = {
+                        "user_id": user_id,
+                        "checkin_date": (today - timedelta(days=(iteration // 3) % 90)).isoformat(),
+                        "daily_sales": 1000 + iteration % 50,
+                        "daily_expenses": 900,
+                        "receivables": 100,
+                        "loan_emi": 50,
+                        "cash_balance": 5000,
+                    }
+                    return "POST", "/checkins/daily", body
+                if step == 1:
+                    return "GET", f"/users/{user_id}/metrics", None
+                body = {"user_id": user_id, "use_daily_mode": True, "receivables": 100, "loan_emi": 50, "cash_balance": 5000}
+                return "POST", "/predict", body
+
+            results[str(clients)] = run_async_load(base, _next, clients, duration)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--clients", default="100,500,1000", help="Comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--baseline-ref", default=None, help="git revision of backend/ to compare with")
+    args = parser.parse_args()
+
+    levels = [int(part) for part in args.clients.split(",") if part.strip()]
+    targets = {"current": BACKEND_DIR}
+    if args.baseline_ref:
+        targets = {"baseline": _export_backend(args.baseline_ref), **targets}
+    report = {"cpus": os.cpu_count(), "duration_s": args.duration, "users": args.users}
+    for name, backend_dir in targets.items():
+        report[name] = _bench(backend_dir, levels, args.duration, args.users)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+End-of-day check-in burst against SQLite: synchronous upserts versus the
+write-behind log (utils/checkin_buffer.py). Reports acknowledgement latency
+percentiles, throughput including the final flush, and checks that both
+modes leave the same check-ins and user_metrics behind.
+
+Usage (from backend/):
+    python -m bench.checkin_write_behind_bench --users 200 --checkins 5000 --threads 16
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+# Point the storage layer and the log at scratch files before importing them.
+_SCRATCH = tempfile.mkdtemp()
+os.environ["APP_DB_PATH"] = os.path.join(_SCRATCH, "sync.db")
+os.environ["CHECKIN_LOG_PATH"] = os.path.join(_SCRATCH, "checkin_log.jsonl")
+os.environ["CHECKIN_WRITE_BEHIND"] = "1"
+
+from db import storage_sqlite as storage  # noqa: E402
+from utils import checkin_buffer  # noqa: E402
+
+
+def _percentiles(samples) -> dict:
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+    return {"p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+
+def _workload(args) -> list:
+    rng = random.Random(args.seed)
+    today = date(2024, 6, 30)
+    rows = []
+    for _ in range(args.checkins):
+        rows.append(
+            {
+                "user_id": rng.randint(1, args.users),
+                "checkin_date": (today - timedelta(days=rng.randrange(3))).isoformat(),
+                "daily_sales": round(rng.uniform(0, 5000), 2),
+                "daily_expenses": round(rng.uniform(0, 4000), 2),
+                "receivables": 250.0,
+                "loan_emi": 40.0,
+                "cash_balance": round(rng.uniform(0, 20000), 2),
+            }
+        )
+    return rows
+
+
+def _prepare(path: str, args) -> None:
+    storage.close_db()
+    storage.DB_PATH = path
+    storage.init_db()
+    for i in range(args.users):
+        storage.create_user(f"user {i}", f"user{i}@bench.local")
+    # Some history so each metrics recompute has a real window to read.
+    start = date(2024, 6, 30) - timedelta(days=60)
+    for user_id in range(1, args.users + 1):
+        storage.bulk_upsert_daily_checkins(
+            user_id,
+            [
+                {"checkin_date": (start + timedelta(days=d)).isoformat(), "daily_sales": 1000.0, "daily_expenses": 800.0,
+                 "receivables": 250.0, "loan_emi": 40.0, "cash_balance": 9000.0}
+                for d in range(57)
+            ],
+        )
+
+
+def _snapshot(args) -> list:
+    conn = storage._connect()
+    try:
+        checkins = conn.execute(
+            "SELECT user_id, checkin_date, daily_sales, cash_balance FROM daily_checkins ORDER BY user_id, checkin_date"
+        ).fetchall()
+    finally:
+        conn.close()
+    return [tuple(r) for r in checkins] + [storage.get_user_metrics(u) for u in range(1, args.users + 1)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--checkins", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+    # Requests from one user arrive in order, as they would from one device.
+    rows = sorted(_workload(args), key=lambda r: r["user_id"])
+    by_user = {}
+    for row in rows:
+        by_user.setdefault(row["user_id"], []).append(row)
+
+    def per_user(submit):
+        def run(user_rows):
+            for row in user_rows:
+                submit(row)
+        return run
+
+    report = {}
+
+    _prepare(os.path.join(_SCRATCH, "sync.db"), args)
+    latencies = []
+
+    def timed(fn):
+        def wrapper(row):
+            began = time.perf_counter()
+            fn(row)
+            latencies.append(time.perf_counter() - began)
+        return wrapper
+
+    began = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        list(pool.map(per_user(timed(storage.upsert_daily_checkin)), by_user.values()))
+    elapsed = time.perf_counter() - began
+    report["synchronous"] = {"checkins_per_sec": round(len(rows) / elapsed, 1), "ack": _percentiles(latencies)}
+    expected = _snapshot(args)
+
+    _prepare(os.path.join(_SCRATCH, "write_behind.db"), args)
+    checkin_buffer.start_checkin_flusher()
+    latencies = []
+    began = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        list(pool.map(per_user(timed(checkin_buffer.enqueue_checkin)), by_user.values()))
+    acked = time.perf_counter() - began
+    checkin_buffer.stop_checkin_flusher()
+    elapsed = time.perf_counter() - began
+    report["write_behind"] = {
+        "checkins_per_sec": round(len(rows) / elapsed, 1),
+        "ack_phase_seconds": round(acked, 3),
+        "ack": _percentiles(latencies),
+        "same_result": _snapshot(args) == expected,
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
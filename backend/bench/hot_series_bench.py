@@ -0,0 +1,95 @@
+"""
+Daily-mode scoring traffic against SQLite: compute_rolling_metrics served
+from the hot-user ring buffers (db/hot_series.py, through db/storage.py)
+versus straight from the running totals. Active users check in for today
+and score a few times a day; every answer is compared with storage.
+
+Usage (from backend/):
+    python -m bench.hot_series_bench --users 200 --active 50 --operations 20000
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+# Point the storage layer at a scratch database before importing it.
+os.environ["APP_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "hot_series.db")
+os.environ["STORAGE_BACKEND"] = "sqlite"
+
+from db import storage  # noqa: E402
+from db import storage_sqlite  # noqa: E402
+
+
+def _percentiles(samples) -> dict:
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1e6, 2)
+
+    return {"p50_us": pick(0.50), "p95_us": pick(0.95), "p99_us": pick(0.99)}
+
+
+def _checkin(rng: random.Random, user_id: int, day: date) -> dict:
+    return {
+        "user_id": user_id,
+        "checkin_date": day.isoformat(),
+        "daily_sales": round(rng.uniform(0, 5000), 2),
+        "daily_expenses": round(rng.uniform(0, 4000), 2),
+        "receivables": 250.0,
+        "loan_emi": 40.0,
+        "cash_balance": round(rng.uniform(0, 20000), 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--active", type=int, default=50)
+    parser.add_argument("--history-days", type=int, default=180)
+    parser.add_argument("--operations", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    today = date.today()
+    storage.init_db()
+    users = [storage.create_user(f"user {n}", f"user{n}@example.com")["user_id"] for n in range(args.users)]
+    for user_id in users:
+        days = [today - timedelta(days=d) for d in range(args.history_days, 0, -1)]
+        storage.bulk_upsert_daily_checkins(user_id, [_checkin(rng, user_id, day) for day in days])
+
+    ring, direct = [], []
+    mismatches = 0
+    for _ in range(args.operations):
+        user_id = rng.choice(users[: args.active]) if rng.random() < 0.9 else rng.choice(users)
+        if rng.random() < 0.2:
+            storage.upsert_daily_checkin(_checkin(rng, user_id, today))
+            continue
+        began = time.perf_counter()
+        got = storage.compute_rolling_metrics(user_id=user_id)
+        ring.append(time.perf_counter() - began)
+        began = time.perf_counter()
+        want = storage_sqlite.compute_rolling_metrics(user_id=user_id)
+        direct.append(time.perf_counter() - began)
+        mismatches += got != want
+
+    print(
+        json.dumps(
+            {
+                "users": args.users,
+                "active": args.active,
+                "operations": args.operations,
+                "rolling_metrics": {"ring_buffers": _percentiles(ring), "running_totals": _percentiles(direct)},
+                "mismatches": mismatches,
+                "hot_series": storage.get_hot_series_stats(),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
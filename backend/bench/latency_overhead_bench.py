@@ -0,0 +1,65 @@
+"""
+Cost of the latency spans (utils/latency.py): one span and one timed()
+call with recording on and off, inside and outside a request, plus a
+storage read (get_user_metrics, served from the read cache) with and
+without its "storage.get_user_metrics" span.
+
+Usage (from backend/):
+    python -m bench.latency_overhead_bench --iterations 200000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+os.environ["APP_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "latency.db")
+os.environ["STORAGE_BACKEND"] = "sqlite"
+
+from db import storage  # noqa: E402
+from utils import latency  # noqa: E402
+
+
+def _per_call_us(fn, iterations: int) -> float:
+    began = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - began) / iterations * 1e6
+
+
+def _empty_span() -> None:
+    with latency.span("bench.span"):
+        pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--iterations", type=int, default=200000)
+    args = parser.parse_args()
+
+    storage.init_db()
+    user_id = storage.create_user("bench", "bench@example.com")["user_id"]
+    timed_noop = latency.timed("bench.timed")(lambda: None)
+    metrics_read = lambda: storage.get_user_metrics(user_id)  # noqa: E731
+
+    baseline = _per_call_us(lambda: None, args.iterations)
+    report = {"iterations": args.iterations, "baseline_call_us": round(baseline, 3)}
+    for label, flag in (("enabled", True), ("disabled", False)):
+        latency.set_enabled(flag)
+        report[label] = {
+            "span_us": round(_per_call_us(_empty_span, args.iterations) - baseline, 3),
+            "timed_us": round(_per_call_us(timed_noop, args.iterations) - baseline, 3),
+            "get_user_metrics_us": round(_per_call_us(metrics_read, args.iterations), 3),
+        }
+    latency.set_enabled(True)
+    token = latency._request_spans.set([])
+    try:
+        report["enabled"]["span_in_request_us"] = round(_per_call_us(_empty_span, args.iterations) - baseline, 3)
+    finally:
+        latency._request_spans.reset(token)
+    storage.close_db()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
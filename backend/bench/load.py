@@ -0,0 +1,216 @@
+"""
+Small load-generation helpers shared by the benchmark scripts.
+
+Servers are started as uvicorn subprocesses so each run gets a fresh
+process, database file and environment. run_load drives a server from
+client threads; run_async_load from coroutines on keep-alive connections,
+for client counts too high for one thread each.
+"""
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def request(method: str, url: str, body: Optional[Dict] = None, timeout: float = 30.0):
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    req = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, json.loads(resp.read().decode("utf-8") or "null")
+    except urllib.error.HTTPError as exc:
+        return exc.code, None
+
+
+class Server:
+    """uvicorn main:app in a subprocess with a throwaway APP_DB_PATH."""
+
+    def __init__(
+        self,
+        env: Optional[Dict[str, str]] = None,
+        workers: int = 1,
+        extra_args: Optional[List[str]] = None,
+        backend_dir: str = BACKEND_DIR,
+    ):
+        self.backend_dir = backend_dir
+        self.port = free_port()
+        self.tmpdir = tempfile.mkdtemp(prefix="finpilot-bench-")
+        self.env = {
+            **os.environ,
+            "APP_DB_PATH": os.path.join(self.tmpdir, "app.db"),
+            "LLM_USE_OLLAMA": "0",
+            "LLM_API_KEY": "",
+            **(env or {}),
+        }
+        self.args = [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--host", "127.0.0.1", "--port", str(self.port),
+            "--workers", str(workers), "--log-level", "warning",
+            *(extra_args or []),
+        ]
+        self.proc = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self):
+        self.proc = subprocess.Popen(self.args, cwd=self.backend_dir, env=self.env)
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            try:
+                urllib.request.urlopen(f"{self.base_url}/docs", timeout=1).read()
+                return self
+            except Exception:
+                time.sleep(0.2)
+        self.proc.kill()
+        raise RuntimeError("Server did not start")
+
+    def __exit__(self, *exc):
+        self.proc.terminate()
+        try:
+            self.proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+
+
+def run_load(worker: Callable[[int, int], bool], clients: int, duration_seconds: float) -> Dict:
+    """Run worker(client_idx, iteration) from `clients` threads; report req/s and latency."""
+    stop_at = time.monotonic() + duration_seconds
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def _client(idx: int) -> None:
+        local: List[float] = []
+        local_errors = 0
+        iteration = 0
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            ok = worker(idx, iteration)
+            local.append(time.perf_counter() - started)
+            local_errors += 0 if ok else 1
+            iteration += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(_client, range(clients)))
+    elapsed = time.monotonic() - started
+    return summarize(latencies, elapsed, errors[0])
+
+
+async def _http_call(reader, writer, method: str, path: str, body: Optional[Dict]) -> int:
+    """One HTTP/1.1 request on an open keep-alive connection; returns the status."""
+    data = json.dumps(body).encode("utf-8") if body is not None else b""
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: bench\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(data)}\r\n\r\n".encode("ascii")
+        + data
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length, chunked = 0, False
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        name = name.strip().lower()
+        if name == "content-length":
+            length = int(value)
+        elif name == "transfer-encoding":
+            chunked = "chunked" in value.lower()
+    if not chunked:
+        await reader.readexactly(length)
+        return status
+    while True:
+        size = int((await reader.readline()).split(b";")[0], 16)
+        await reader.readexactly(size + 2)
+        if size == 0:
+            return status
+
+
+def run_async_load(
+    base_url: str,
+    make_request: Callable[[int, int], tuple],
+    clients: int,
+    duration_seconds: float,
+) -> Dict:
+    """
+    `clients` coroutines, each on its own keep-alive connection, sending
+    make_request(client_idx, iteration) -> (method, path, body) until the
+    time is up. Anything but a 2xx counts as an error.
+    """
+    host, port = base_url.rsplit("//", 1)[1].split(":")
+    latencies: List[float] = []
+    errors = [0]
+
+    async def _client(idx: int, stop_at: float) -> None:
+        reader = writer = None
+        iteration = 0
+        while time.monotonic() < stop_at:
+            method, path, body = make_request(idx, iteration)
+            iteration += 1
+            started = time.perf_counter()
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection(host, int(port))
+                status = await _http_call(reader, writer, method, path, body)
+            except (OSError, ValueError, IndexError, asyncio.IncompleteReadError):
+                errors[0] += 1
+                if writer is not None:
+                    writer.close()
+                reader = writer = None
+                continue
+            latencies.append(time.perf_counter() - started)
+            errors[0] += 0 if 200 <= status < 300 else 1
+        if writer is not None:
+            writer.close()
+
+    async def _main() -> float:
+        started = time.monotonic()
+        await asyncio.gather(*(_client(idx, started + duration_seconds) for idx in range(clients)))
+        return time.monotonic() - started
+
+    elapsed = asyncio.run(_main())
+    return summarize(latencies, elapsed, errors[0])
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def summarize(latencies: List[float], elapsed: float, errors: int = 0) -> Dict:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "req_per_s": round(len(ordered) / elapsed, 1) if elapsed > 0 else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+    }
@@ -0,0 +1,143 @@
+"""
+Round trips and throughput of the Mongo storage backend: single check-ins,
+bulk check-in batches and concurrent registrations.
+
+Runs against MONGODB_URI when it is set (use a throwaway database name via
+MONGODB_DB_NAME), otherwise against an in-process mongomock stand-in, where
+timings only reflect client-side work and the round-trip counts are the
+interesting number. --baseline-ref also runs the storage_mongo.py from an
+earlier git revision for comparison.
+
+Usage (from backend/):
+    python -m bench.mongo_storage_bench --checkins 500 --bulk-rows 2000
+    python -m bench.mongo_storage_bench --baseline-ref HEAD~1
+"""
+import argparse
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from tests.storage_helpers import RoundTrips, mongomock_client
+
+
+DB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "db")
+
+
+def _real_client(counter: RoundTrips):
+    from pymongo import MongoClient, monitoring
+
+    class _Listener(monitoring.CommandListener):
+        def started(self, event):
+            if event.command_name not in {"hello", "isMaster", "ismaster", "endSessions", "ping"}:
+                counter.add()
+
+        def succeeded(self, event):
+            pass
+
+        def failed(self, event):
+            pass
+
+    return MongoClient(os.environ["MONGODB_URI"], event_listeners=[_Listener()])
+
+
+def _load_storage(name: str, source: str):
+    spec = importlib.util.spec_from_loader(f"db.{name}", loader=None)
+    module = importlib.util.module_from_spec(spec)
+    module.__package__ = "db"
+    sys.modules[spec.name] = module
+    exec(compile(source, f"<{name}>", "exec"), module.__dict__)
+    return module
+
+
+def _payload(user_id: int, day: date, i: int) -> dict:
+    return {
+        "user_id": user_id,
+        "checkin_date": day.isoformat(),
+        "daily_sales": 1000.0 + i % 97,
+        "daily_expenses": 800.0 + i % 13,
+        "receivables": 250.0,
+        "loan_emi": 40.0,
+        "cash_balance": 9000.0,
+    }
+
+
+def _run(storage, client, counter: RoundTrips, args) -> dict:
+    storage._client = client
+    database = client[storage.MONGODB_DB_NAME]
+    for name in ("users", "daily_checkins", "user_metrics", "counters"):
+        database[name].delete_many({})
+    storage.init_db()
+    results = {}
+
+    start = date(2022, 1, 1)
+    user_id = storage.create_user("bench", "bench@bench.local")["user_id"]
+    counter.count = 0
+    began = time.perf_counter()
+    for i in range(args.checkins):
+        storage.upsert_daily_checkin(_payload(user_id, start + timedelta(days=i), i))
+    elapsed = time.perf_counter() - began
+    results["single_checkin"] = {
+        "ops_per_sec": round(args.checkins / elapsed, 1),
+        "round_trips_per_op": round(counter.count / args.checkins, 2),
+    }
+
+    bulk_user = storage.create_user("bulk", "bulk@bench.local")["user_id"]
+    rows = [_payload(bulk_user, start + timedelta(days=i), i) for i in range(args.bulk_rows)]
+    counter.count = 0
+    began = time.perf_counter()
+    for offset in range(0, len(rows), args.batch_rows):
+        storage.bulk_upsert_daily_checkins(bulk_user, rows[offset : offset + args.batch_rows])
+    elapsed = time.perf_counter() - began
+    results["bulk_checkins"] = {
+        "rows_per_sec": round(args.bulk_rows / elapsed, 1),
+        "round_trips": counter.count,
+    }
+
+    counter.count = 0
+    began = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        ids = list(pool.map(lambda i: storage.create_user(f"r{i}", f"r{i}@bench.local")["user_id"], range(args.registrations)))
+    elapsed = time.perf_counter() - began
+    results["registrations"] = {
+        "users_per_sec": round(args.registrations / elapsed, 1),
+        "round_trips_per_user": round(counter.count / args.registrations, 2),
+        "unique_ids": len(set(ids)) == len(ids),
+    }
+    storage.close_db()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--checkins", type=int, default=500)
+    parser.add_argument("--bulk-rows", type=int, default=2000)
+    parser.add_argument("--batch-rows", type=int, default=500)
+    parser.add_argument("--registrations", type=int, default=400)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--baseline-ref", default=None, help="git revision of db/storage_mongo.py to compare with")
+    args = parser.parse_args()
+
+    os.environ.setdefault("MONGODB_URI", "")
+    counter = RoundTrips()
+    client = _real_client(counter) if os.environ["MONGODB_URI"] else mongomock_client(counter)
+
+    with open(os.path.join(DB_DIR, "storage_mongo.py"), "r", encoding="utf-8") as f:
+        targets = {"current": f.read()}
+    if args.baseline_ref:
+        targets["baseline"] = subprocess.check_output(
+            ["git", "show", f"{args.baseline_ref}:./storage_mongo.py"], cwd=DB_DIR, text=True
+        )
+
+    report = {"backend": "mongod" if os.environ["MONGODB_URI"] else "mongomock"}
+    for name, source in targets.items():
+        report[name] = _run(_load_storage(f"_bench_storage_{name}", source), client, counter, args)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Dashboard loads (GET /users/{id}/metrics plus the last year of
+/users/{id}/checkins) against SQLite through the API: with the read cache
+off, with it warm, and as conditional requests that come back 304. Between
+rounds every user checks in once, and the cached responses are compared
+with uncached ones to confirm the writes invalidated them.
+
+Usage (from backend/):
+    python -m bench.read_cache_bench --users 50 --days 365 --rounds 20
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+
+_SCRATCH = tempfile.mkdtemp()
+os.environ["APP_DB_PATH"] = os.path.join(_SCRATCH, "app.db")
+os.environ.pop("CHECKIN_WRITE_BEHIND", None)
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from db import storage  # noqa: E402
+from main import app  # noqa: E402
+
+
+def _percentiles(samples) -> dict:
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+    return {"p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+
+def _checkin(user_id: int, day: date, amount: float) -> dict:
+    return {
+        "user_id": user_id,
+        "checkin_date": day.isoformat(),
+        "daily_sales": amount,
+        "daily_expenses": amount * 0.7,
+        "receivables": 250.0,
+        "loan_emi": 40.0,
+        "cash_balance": 9000.0,
+    }
+
+
+def _load(client: TestClient, user_id: int, etags: dict, conditional: bool):
+    bodies = []
+    for path in (f"/users/{user_id}/metrics", f"/users/{user_id}/checkins?order=desc&limit=365"):
+        headers = {"If-None-Match": etags[path]} if conditional and path in etags else {}
+        response = client.get(path, headers=headers)
+        etags[path] = response.headers["etag"]
+        bodies.append((response.status_code, response.content))
+    return bodies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    start = date(2024, 1, 1)
+    with TestClient(app) as client:
+        user_ids = [storage.create_user(f"user {n}", f"user{n}@example.com")["user_id"] for n in range(args.users)]
+        for user_id in user_ids:
+            storage.bulk_upsert_daily_checkins(
+                user_id, [_checkin(user_id, start + timedelta(days=d), 1000.0 + d) for d in range(args.days)]
+            )
+
+        modes = {"uncached": ("0", False), "cached": ("2048", False), "conditional": ("2048", True)}
+        samples = {mode: [] for mode in modes}
+        statuses = {mode: {} for mode in modes}
+        etags = {mode: {} for mode in modes}
+        mismatches = 0
+        for round_no in range(args.rounds):
+            if round_no % 5 == 4:
+                day = start + timedelta(days=args.days + round_no)
+                for user_id in user_ids:
+                    storage.upsert_daily_checkin(_checkin(user_id, day, 5000.0 + round_no))
+            for mode, (size, conditional) in modes.items():
+                os.environ["READ_CACHE_SIZE"] = size
+                for user_id in user_ids:
+                    began = time.perf_counter()
+                    bodies = _load(client, user_id, etags[mode], conditional)
+                    samples[mode].append(time.perf_counter() - began)
+                    for status, _ in bodies:
+                        statuses[mode][status] = statuses[mode].get(status, 0) + 1
+                    if mode == "cached":
+                        os.environ["READ_CACHE_SIZE"] = "0"
+                        if _load(client, user_id, {}, False) != bodies:
+                            mismatches += 1
+                        os.environ["READ_CACHE_SIZE"] = size
+
+    print(
+        json.dumps(
+            {
+                "users": args.users,
+                "days": args.days,
+                "rounds": args.rounds,
+                "dashboard_load": {mode: {**_percentiles(samples[mode]), "statuses": statuses[mode]} for mode in modes},
+                "cached_vs_uncached_mismatches": mismatches,
+                "read_cache": storage.get_read_cache_stats(),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
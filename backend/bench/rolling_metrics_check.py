@@ -0,0 +1,165 @@
+"""
+Checks that the rolling metrics match the original window scans (SUM/AVG
+over daily_checkins) after random appends, backdated days, overwrites and
+bulk imports. Times the original SQL against compute_rolling_metrics
+(running-total lookups), and both approaches on a long window.
+
+Usage (from backend/):
+    python -m bench.rolling_metrics_check --users 20 --operations 400
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+# Point the storage layer at a scratch database before importing it.
+os.environ["APP_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "rolling_check.db")
+
+from db import storage_sqlite as storage  # noqa: E402
+
+
+_LEGACY_ROLLING_SQL = """
+    SELECT SUM(daily_sales) AS sales, SUM(daily_expenses) AS expenses
+    FROM daily_checkins
+    WHERE user_id = ? AND checkin_date BETWEEN date(?, ?) AND date(?, ?)
+"""
+
+_LEGACY_METRICS_SQL = """
+    SELECT
+        AVG(daily_sales) AS sales, AVG(daily_expenses) AS expenses,
+        AVG(receivables) AS receivables, AVG(loan_emi) AS loan_emi,
+        AVG(cash_balance) AS cash, COUNT(*) AS cnt
+    FROM daily_checkins
+    WHERE user_id = ? AND checkin_date BETWEEN date(?, '-29 day') AND date(?)
+"""
+
+
+def _legacy_rolling(conn, user_id: int, anchor: str) -> dict:
+    storage._validate_user_exists(conn, user_id)
+    cur = conn.execute(_LEGACY_ROLLING_SQL, (user_id, anchor, "-29 day", anchor, "+0 day")).fetchone()
+    prev = conn.execute(_LEGACY_ROLLING_SQL, (user_id, anchor, "-59 day", anchor, "-30 day")).fetchone()
+    return {
+        "monthly_sales": round(float(cur["sales"] or 0.0), 2),
+        "monthly_expenses": round(float(cur["expenses"] or 0.0), 2),
+        "sales_3_months_ago": round(float(prev["sales"] or 0.0), 2),
+        "expenses_3_months_ago": round(float(prev["expenses"] or 0.0), 2),
+    }
+
+
+def _legacy_metrics(conn, user_id: int, anchor: str) -> dict:
+    agg = conn.execute(_LEGACY_METRICS_SQL, (user_id, anchor, anchor)).fetchone()
+    return {
+        "monthly_sales": round(float(agg["sales"] or 0.0) * 30.0, 2),
+        "monthly_expenses": round(float(agg["expenses"] or 0.0) * 30.0, 2),
+        "monthly_receivables": round(float(agg["receivables"] or 0.0) * 30.0, 2),
+        "monthly_loan_emi": round(float(agg["loan_emi"] or 0.0) * 30.0, 2),
+        "monthly_cash_balance": round(float(agg["cash"] or 0.0) * 30.0, 2),
+        "window_days": int(agg["cnt"] or 0),
+    }
+
+
+def _payload(rng: random.Random, user_id: int, day: date) -> dict:
+    return {
+        "user_id": user_id,
+        "checkin_date": day.isoformat(),
+        "daily_sales": round(rng.uniform(0, 50000), 2),
+        "daily_expenses": round(rng.uniform(0, 40000), 2),
+        "receivables": round(rng.uniform(0, 20000), 2),
+        "loan_emi": round(rng.uniform(0, 3000), 2),
+        "cash_balance": round(rng.uniform(-5000, 90000), 2),
+    }
+
+
+def _close(a: dict, b: dict) -> bool:
+    # Prefix differences can differ from a direct SUM in the last bits.
+    return all(abs(float(a[k]) - float(b[k])) <= 0.011 for k in b)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--history-days", type=int, default=365)
+    parser.add_argument("--operations", type=int, default=400)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--long-window", type=int, default=365)
+    parser.add_argument("--timing-calls", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    storage.init_db()
+    # History ends today, as in production, so windows sit inside the retention horizon.
+    start = date.today() - timedelta(days=args.history_days)
+    users = [storage.create_user(f"u{i}", f"u{i}@check.local")["user_id"] for i in range(args.users)]
+    for user_id in users:
+        days = [start + timedelta(days=i) for i in range(args.history_days) if rng.random() < 0.85]
+        storage.bulk_upsert_daily_checkins(user_id, [_payload(rng, user_id, d) for d in days])
+
+    mismatches = 0
+    checks = 0
+    conn = storage._connect()
+    for _ in range(args.operations):
+        user_id = rng.choice(users)
+        kind = rng.random()
+        if kind < 0.4:
+            day = start + timedelta(days=args.history_days + rng.randint(0, 30))  # append
+        else:
+            day = start + timedelta(days=rng.randint(0, args.history_days))  # backdated / overwrite
+        if kind < 0.9:
+            metrics = storage.upsert_daily_checkin(_payload(rng, user_id, day))
+        else:
+            batch = [_payload(rng, user_id, day + timedelta(days=rng.randint(-40, 40))) for _ in range(25)]
+            metrics = storage.bulk_upsert_daily_checkins(user_id, batch)["metrics"]
+        checks += 2
+        if not _close(metrics, _legacy_metrics(conn, user_id, metrics["checkin_date"])):
+            mismatches += 1
+        anchor = (start + timedelta(days=rng.randint(0, args.history_days + 60))).isoformat()
+        if not _close(storage.compute_rolling_metrics(user_id, anchor), _legacy_rolling(conn, user_id, anchor)):
+            mismatches += 1
+
+    anchors = [(start + timedelta(days=rng.randint(0, args.history_days))).isoformat() for _ in range(args.timing_calls)]
+    # Every variant takes a pooled connection per call, as compute_rolling_metrics does.
+    began = time.perf_counter()
+    for i, anchor in enumerate(anchors):
+        call_conn = storage._connect()
+        try:
+            _legacy_rolling(call_conn, users[i % len(users)], anchor)
+        finally:
+            call_conn.close()
+    legacy_us = (time.perf_counter() - began) / len(anchors) * 1e6
+    began = time.perf_counter()
+    for i, anchor in enumerate(anchors):
+        storage.compute_rolling_metrics(users[i % len(users)], anchor)
+    running_us = (time.perf_counter() - began) / len(anchors) * 1e6
+
+    # Cost of a window scan grows with the window; two prefix lookups do not.
+    long_window = f"-{args.long_window - 1} day"
+    began = time.perf_counter()
+    for i, anchor in enumerate(anchors):
+        conn.execute(_LEGACY_ROLLING_SQL, (users[i % len(users)], anchor, long_window, anchor, "+0 day")).fetchone()
+    long_scan_us = (time.perf_counter() - began) / len(anchors) * 1e6
+    began = time.perf_counter()
+    for i, anchor in enumerate(anchors):
+        storage._prefix_points(conn, users[i % len(users)], anchor, (0, args.long_window), ("cum_sales", "cum_expenses"))
+    long_prefix_us = (time.perf_counter() - began) / len(anchors) * 1e6
+    conn.close()
+
+    print(
+        json.dumps(
+            {
+                "checks": checks,
+                "mismatches": mismatches,
+                "window_scan_us_per_call": round(legacy_us, 1),
+                "running_totals_us_per_call": round(running_us, 1),
+                f"{args.long_window}d_window_scan_us": round(long_scan_us, 1),
+                f"{args.long_window}d_running_totals_us": round(long_prefix_us, 1),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
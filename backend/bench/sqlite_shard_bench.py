@@ -0,0 +1,108 @@
+"""
+Check-in write throughput of the SQLite backend as SQLITE_SHARDS grows.
+
+Several writer processes (like several uvicorn workers) each upsert daily
+check-ins for their own users. With one file every commit takes the same
+database lock; with N shards writers for different users mostly don't.
+Also times a portfolio read (get_portfolio_metrics) over all users.
+
+Usage (from backend/):
+    python -m bench.sqlite_shard_bench --shards 1,2,4,8 --procs 8 --checkins 400
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+
+from db import storage_sqlite as storage
+
+
+def _configure(path: str, shards: int) -> None:
+    storage.close_db()
+    storage.DB_PATH = path
+    storage.SQLITE_SHARDS = shards
+
+
+def _writer(path: str, shards: int, user_ids, checkins: int, start_barrier, latencies) -> None:
+    _configure(path, shards)
+    start = date(2024, 1, 1)
+    timings = []
+    start_barrier.wait()
+    for i in range(checkins):
+        began = time.perf_counter()
+        storage.upsert_daily_checkin(
+            {
+                "user_id": user_ids[i % len(user_ids)],
+                "checkin_date": (start + timedelta(days=i // len(user_ids))).isoformat(),
+                "daily_sales": 1000.0 + i % 97,
+                "daily_expenses": 800.0 + i % 13,
+                "receivables": 250.0,
+                "loan_emi": 40.0,
+                "cash_balance": 9000.0,
+            }
+        )
+        timings.append(time.perf_counter() - began)
+    latencies.put(timings)
+    storage.close_db()
+
+
+def _run(shards: int, args) -> dict:
+    path = os.path.join(tempfile.mkdtemp(prefix=f"shards{shards}-"), "app.db")
+    _configure(path, shards)
+    storage.init_db()
+    user_ids = [storage.create_user(f"u{i}", f"u{i}@bench.local")["user_id"] for i in range(args.users)]
+    storage.close_db()
+
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(args.procs + 1)
+    latencies = ctx.Queue()
+    procs = [
+        ctx.Process(target=_writer, args=(path, shards, user_ids[p :: args.procs], args.checkins, barrier, latencies))
+        for p in range(args.procs)
+    ]
+    for proc in procs:
+        proc.start()
+    barrier.wait()
+    began = time.perf_counter()
+    timings = []
+    for _ in procs:
+        timings.extend(latencies.get())
+    elapsed = time.perf_counter() - began
+    for proc in procs:
+        proc.join()
+    failed = sum(1 for proc in procs if proc.exitcode != 0)
+    timings.sort()
+
+    _configure(path, shards)
+    began = time.perf_counter()
+    portfolio = storage.get_portfolio_metrics(user_ids)
+    read_ms = (time.perf_counter() - began) * 1000
+    storage.close_db()
+    return {
+        "checkins_per_sec": round(args.procs * args.checkins / elapsed, 1),
+        "write_p50_ms": round(timings[len(timings) // 2] * 1000, 3),
+        "write_p99_ms": round(timings[int(len(timings) * 0.99)] * 1000, 3),
+        "failed_writers": failed,
+        "portfolio_read_ms": round(read_ms, 2),
+        "portfolio_users": len(portfolio),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--shards", default="1,2,4,8")
+    parser.add_argument("--procs", type=int, default=8, help="writer processes")
+    parser.add_argument("--checkins", type=int, default=400, help="check-ins per writer")
+    parser.add_argument("--users", type=int, default=400)
+    args = parser.parse_args()
+    report = {}
+    for shards in [int(s) for s in args.shards.split(",") if s.strip()]:
+        report[f"shards={shards}"] = _run(shards, args)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Throughput of /checkins/daily and /users/{id}/metrics under concurrent load,
+with connect-per-call SQLite (SQLITE_POOL=0, the old behaviour) versus the
+pooled WAL connection manager.
+
+Usage (from backend/):
+    python -m bench.sqlite_storage_bench --clients 16 --duration 10
+"""
+import argparse
+import json
+from datetime import date, timedelta
+
+from bench.load import Server, request, run_load
+
+
+def _bench(mode_env, clients: int, duration: float, users: int) -> dict:
+    with Server(env=mode_env) as server:
+        base = server.base_url
+        user_ids = [
+            request("POST", f"{base}/users/register", {"name": f"u{i}", "email": f"u{i}@bench.local"})[1]["user_id"]
+            for i in range(users)
+        ]
+        start = date(2023, 1, 1)
+
+        def _checkin(idx: int, iteration: int) -> bool:
+            status, _ = request(
+                "POST",
+                f"{base}/checkins/daily",
+                {
+                    "user_id": user_ids[idx % users],
+                    "checkin_date": (start + timedelta(days=iteration % 720)).isoformat(),
+                    "daily_sales": 1000 + iteration % 50,
+                    "daily_expenses": 900,
+                    "receivables": 100,
+                    "loan_emi": 50,
+                    "cash_balance": 5000,
+                },
+            )
+            return status == 200
+
+        def _metrics(idx: int, iteration: int) -> bool:
+            status, _ = request("GET", f"{base}/users/{user_ids[(idx + iteration) % users]}/metrics")
+            return status == 200
+
+        def _mixed(idx: int, iteration: int) -> bool:
+            return _checkin(idx, iteration) if idx % 2 == 0 else _metrics(idx, iteration)
+
+        return {
+            "checkins_daily": run_load(_checkin, clients, duration),
+            "user_metrics": run_load(_metrics, clients, duration),
+            "mixed_50_50": run_load(_mixed, clients, duration),
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per scenario")
+    parser.add_argument("--users", type=int, default=32)
+    args = parser.parse_args()
+
+    results = {
+        "before (SQLITE_POOL=0)": _bench({"SQLITE_POOL": "0"}, args.clients, args.duration, args.users),
+        "after (pooled WAL)": _bench({"SQLITE_POOL": "1"}, args.clients, args.duration, args.users),
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Runs one seeded workload against every storage backend, checks that they
+return the same results, and reports per-operation latency percentiles.
+
+Backends: memory, SQLite (temporary file) and Mongo. Mongo uses MONGODB_URI
+when it is set (point MONGODB_DB_NAME at a throwaway database; it is
+cleared), otherwise mongomock if it is installed, otherwise it is skipped.
+Exits non-zero when any backend disagrees with the memory backend.
+
+Usage (from backend/):
+    python -m bench.storage_conformance --users 20 --ops 1000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+from typing import Dict, List
+
+from tests.storage_helpers import RoundTrips, conformance_workload, diff_results, mongomock_client, run_workload
+
+
+def _backends() -> Dict[str, object]:
+    from db import storage_memory, storage_sqlite
+
+    backends = {"memory": storage_memory}
+    storage_sqlite.DB_PATH = os.path.join(tempfile.mkdtemp(prefix="conformance-"), "app.db")
+    backends["sqlite"] = storage_sqlite
+
+    try:
+        from db import storage_mongo
+    except ImportError:
+        return backends
+    if os.getenv("MONGODB_URI", "").strip():
+        backends["mongo"] = storage_mongo
+    else:
+        try:
+            storage_mongo._client = mongomock_client(RoundTrips())
+        except ImportError:
+            return backends
+        backends["mongo"] = storage_mongo
+    return backends
+
+
+def _reset(name: str, storage) -> None:
+    if name == "memory":
+        storage.reset_db()
+    elif name == "mongo":
+        database = storage._get_db()
+        for collection in database.list_collection_names():
+            database[collection].delete_many({})
+        # close_db also drops the id block and user cache; keep the client.
+        client = storage._client
+        storage._client = None
+        storage.close_db()
+        storage._client = client
+    storage.init_db()
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1e6, 1)
+
+    return {"count": len(ordered), "p50_us": pick(0.50), "p95_us": pick(0.95), "p99_us": pick(0.99)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--ops", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=400, help="spread of check-in dates")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--max-diffs", type=int, default=10, help="mismatches printed per backend")
+    args = parser.parse_args()
+
+    ops = conformance_workload(args)
+    report = {"operations": len(ops), "backends": {}}
+    reference = None
+    failed = False
+    for name, storage in _backends().items():
+        _reset(name, storage)
+        results, timings = run_workload(storage, ops)
+        storage.close_db()
+        entry = {"latency": {op: _percentiles(samples) for op, samples in sorted(timings.items())}}
+        if reference is None:
+            reference = results
+        else:
+            mismatches = []
+            for idx, (expected, actual) in enumerate(zip(reference, results)):
+                mismatches.extend(f"#{idx} {ops[idx][0]}{p}" for p in diff_results(expected, actual))
+            entry["mismatches"] = len(mismatches)
+            entry["first_mismatches"] = mismatches[: args.max_diffs]
+            failed = failed or bool(mismatches)
+        report["backends"][name] = entry
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
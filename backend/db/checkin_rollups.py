@@ -0,0 +1,134 @@
+"""
+Shared pieces of check-in compaction (compact_checkins in the storage
+backends): check-ins in whole months older than the retention horizon are
+folded into one monthly_checkin_rollups row per user and month, and the raw
+rows are deleted.
+
+A rollup keeps count, sum, min, max and last value of every metric, plus the
+running totals as of its last check-in, so rolling windows keep working. A
+compacted month falls inside a window when its last check-in does; windows
+are exact for dates inside the horizon and month-granular beyond it.
+Check-ins can no longer be written into a compacted month.
+"""
+import os
+import re
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from .rolling_windows import ROLLING_WINDOW_METRICS
+
+
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+def retention_days() -> int:
+    try:
+        return max(1, int(os.getenv("CHECKIN_RETENTION_DAYS", "400").strip()))
+    except ValueError:
+        return 400
+
+
+def retention_cutoff() -> str:
+    """Check-ins on or after this date are never compacted."""
+    return (date.today() - timedelta(days=retention_days())).isoformat()
+
+
+def compaction_boundary(before_date: Optional[str] = None) -> str:
+    """
+    First day of the month holding `before_date` (default and upper limit:
+    the retention cutoff); months before it are compacted.
+    """
+    cutoff = retention_cutoff()
+    day = min((before_date or cutoff).strip(), cutoff)
+    return day[:8] + "01"
+
+
+def compacted_error(month: str) -> ValueError:
+    return ValueError(f"Check-ins up to {month} have been compacted into monthly rollups and can no longer be changed")
+
+
+def is_compactable(checkin_date: str) -> bool:
+    return bool(_DATE_RE.match(checkin_date or ""))
+
+
+def build_rollups(rows: Iterable[Dict], created_at: str) -> List[Dict]:
+    """
+    One rollup per month from a user's raw rows, oldest first. Each row needs
+    checkin_date, the metric columns and cum_days / cum_* running totals.
+    """
+    rollups: Dict[str, Dict] = {}
+    for row in sorted(rows, key=lambda r: r["checkin_date"]):
+        month = row["checkin_date"][:7]
+        rollup = rollups.get(month)
+        if rollup is None:
+            rollup = rollups[month] = {"month": month, "first_checkin_date": row["checkin_date"], "checkin_days": 0}
+            for metric in ROLLING_WINDOW_METRICS:
+                rollup[f"{metric}_sum"] = 0.0
+                rollup[f"{metric}_min"] = float(row[metric])
+                rollup[f"{metric}_max"] = float(row[metric])
+        rollup["last_checkin_date"] = row["checkin_date"]
+        rollup["checkin_days"] += 1
+        for metric in ROLLING_WINDOW_METRICS:
+            value = float(row[metric])
+            rollup[f"{metric}_sum"] += value
+            rollup[f"{metric}_min"] = min(rollup[f"{metric}_min"], value)
+            rollup[f"{metric}_max"] = max(rollup[f"{metric}_max"], value)
+            rollup[f"{metric}_last"] = value
+        for key in ("cum_days", "cum_sales", "cum_expenses", "cum_receivables", "cum_loan_emi", "cum_cash_balance"):
+            rollup[key] = row[key]
+        rollup["created_at"] = created_at
+    return list(rollups.values())
+
+
+def month_record(rollup: Dict) -> Dict:
+    """get_user_checkins entry for a compacted month: per-check-in averages."""
+    days = int(rollup["checkin_days"])
+    return {
+        "checkin_date": f"{rollup['month']}-01",
+        "daily_sales": round(float(rollup["daily_sales_sum"]) / days, 2),
+        "daily_expenses": round(float(rollup["daily_expenses_sum"]) / days, 2),
+        "period": "month",
+        "checkin_days": days,
+    }
+
+
+def page_row(rollup: Dict) -> Dict:
+    """get_checkin_page entry for a compacted month: per-check-in averages of every metric."""
+    days = int(rollup["checkin_days"])
+    return {
+        "checkin_date": f"{rollup['month']}-01",
+        **{metric: round(float(rollup[f"{metric}_sum"]) / days, 2) for metric in ROLLING_WINDOW_METRICS},
+        "period": "month",
+        "checkin_days": days,
+    }
+
+
+def history_row(rollup: Dict) -> Dict:
+    """
+    get_checkin_history row for a compacted month: dated at its last check-in,
+    with the month's sales/expense totals and its closing balances.
+    """
+    return {
+        "checkin_date": str(rollup["last_checkin_date"]),
+        "daily_sales": float(rollup["daily_sales_sum"]),
+        "daily_expenses": float(rollup["daily_expenses_sum"]),
+        "receivables": float(rollup["receivables_last"]),
+        "loan_emi": float(rollup["loan_emi_last"]),
+        "cash_balance": float(rollup["cash_balance_last"]),
+    }
+
+
+def latest_row(user_id: int, rollup: Dict) -> Dict:
+    """get_latest_checkin result from a compacted month's last check-in."""
+    return {
+        "user_id": int(user_id),
+        "checkin_date": str(rollup["last_checkin_date"]),
+        **{metric: float(rollup[f"{metric}_last"]) for metric in ROLLING_WINDOW_METRICS},
+    }
+
+
+def merge_history(raw_rows: List[Dict], rollup_rows: List[Dict], start_date: str) -> List[Dict]:
+    """Raw and compacted history rows, oldest first, keeping only the latest row before start_date."""
+    rows = sorted(rollup_rows + raw_rows, key=lambda r: r["checkin_date"])
+    earlier = [i for i, row in enumerate(rows) if row["checkin_date"] < start_date]
+    return rows[earlier[-1]:] if earlier else rows
@@ -0,0 +1,39 @@
+"""
+Compact cold check-ins into monthly rollups (see db/checkin_rollups.py).
+
+Whole months older than CHECKIN_RETENTION_DAYS (default 400) are folded into
+one monthly_checkin_rollups row per user and month and their daily rows are
+deleted. Run it from cron during a quiet hour; it is safe to re-run.
+
+Usage (from backend/):
+    python -m db.compact_checkins
+    python -m db.compact_checkins --before 2024-01-01 --archive data/checkins-2023.jsonl.gz
+"""
+import argparse
+import gzip
+import json
+
+from db.storage import close_db, compact_checkins, init_db
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compact cold check-ins into monthly rollups.")
+    parser.add_argument("--before", default=None, help="Compact months before this date (YYYY-MM-DD); capped at the retention horizon")
+    parser.add_argument("--archive", default="", help="Append the deleted rows here as JSON lines (.gz to compress)")
+    args = parser.parse_args()
+
+    init_db()
+    archive = None
+    if args.archive:
+        archive = gzip.open(args.archive, "at", encoding="utf-8") if args.archive.endswith(".gz") else open(args.archive, "a", encoding="utf-8")
+    try:
+        stats = compact_checkins(before_date=args.before, archive=archive)
+    finally:
+        if archive is not None:
+            archive.close()
+        close_db()
+    print(json.dumps(stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Tables that iter_table_rows (in every storage backend) can export: their
+columns in export order, the key identifying a row, the timestamp column
+that drives incremental exports and the date column exports are
+partitioned by month on.
+"""
+from typing import Dict, List
+
+from .rolling_windows import ROLLING_WINDOW_METRICS
+
+
+EXPORT_TABLES: Dict[str, Dict] = {
+    "daily_checkins": {
+        "columns": ["user_id", "checkin_date", *ROLLING_WINDOW_METRICS, "updated_at"],
+        "key": ["user_id", "checkin_date"],
+        "timestamp": "updated_at",
+        "partition": "checkin_date",
+    },
+    "user_metrics": {
+        "columns": [
+            "user_id",
+            "last_checkin_date",
+            "monthly_sales",
+            "monthly_expenses",
+            "monthly_receivables",
+            "monthly_loan_emi",
+            "monthly_cash_balance",
+            "window_days",
+            "updated_at",
+        ],
+        "key": ["user_id"],
+        "timestamp": "updated_at",
+        "partition": "last_checkin_date",
+    },
+    "risk_reports": {
+        "columns": ["run_id", "user_id", "as_of_date", "risk_score", "risk_level", "created_at"],
+        "key": ["run_id", "user_id"],
+        "timestamp": "created_at",
+        "partition": "as_of_date",
+    },
+}
+
+
+def export_spec(table: str) -> Dict:
+    spec = EXPORT_TABLES.get(table)
+    if spec is None:
+        raise ValueError(f"Unknown export table '{table}' (choose from {', '.join(EXPORT_TABLES)})")
+    return spec
+
+
+def export_columns(table: str) -> List[str]:
+    return export_spec(table)["columns"]
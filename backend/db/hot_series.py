@@ -0,0 +1,316 @@
+"""
+In-process ring buffers of recent check-ins for users who score often.
+
+Daily-mode /predict calls compute_rolling_metrics, which sums the 60 days
+before the scoring date. For an active user db/storage.py serves it from
+a NumPy ring of the last HOT_SERIES_DAYS (default 120) days of sales and
+expenses: one slot per calendar day, zero when there was no check-in.
+The ring is loaded from get_checkin_history on first use and written
+through by every upsert and bulk upsert in this process, so it never
+needs reloading while the user stays active. Days after the newest slot
+are known to be empty, so a new day only clears the slots it rolls over.
+
+Other worker processes write to the same database, so every answer from a
+ring is checked against the user's check-in version (get_checkin_version,
+one primary-key read bumped by each committed write). The ring remembers
+the version it was loaded at plus its own write-throughs; any other value
+means someone else wrote, and the ring is reloaded.
+
+Both 30-day windows are one vectorised sum over the ring. A compacted
+month counts on its last check-in date, as in the running totals, and
+windows reaching before the retention cutoff (where a compaction run in
+another process could have changed that) go to storage instead.
+
+Rings are evicted least recently used once they take more than
+HOT_SERIES_MAX_BYTES (default 32 MiB; 0 turns them off) and reloaded
+after HOT_SERIES_TTL_SECONDS (default 300) regardless.
+"""
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from functools import wraps
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .checkin_rollups import is_compactable, retention_cutoff
+
+
+_WINDOW_DAYS = 30
+_FAR_FUTURE = "9999-12-31"
+
+_lock = threading.Lock()
+_series: "OrderedDict[int, Dict]" = OrderedDict()
+# Bumped by every write (_epoch by clear()) so a load that raced one is not kept.
+_write_generations: Dict[int, int] = {}
+_epoch = 0
+_bytes = 0
+_counters = {"hits": 0, "loads": 0, "fallbacks": 0, "evictions": 0, "writes": 0, "stale": 0}
+
+
+def _env_int(name: str, default: int, minimum: int = 0) -> int:
+    try:
+        return max(minimum, int(os.getenv(name, str(default)).strip()))
+    except ValueError:
+        return default
+
+
+def series_days() -> int:
+    return _env_int("HOT_SERIES_DAYS", 120, minimum=2 * _WINDOW_DAYS)
+
+
+def _max_bytes() -> int:
+    return _env_int("HOT_SERIES_MAX_BYTES", 32 * 1024 * 1024)
+
+
+def _ordinal(value: str) -> Optional[int]:
+    if not is_compactable(value):
+        return None
+    try:
+        return date.fromisoformat(value).toordinal()
+    except ValueError:
+        return None
+
+
+def _advance(entry: Dict, ordinal: int) -> None:
+    """Move the newest slot forward to `ordinal`, clearing the days rolled over."""
+    values = entry["values"]
+    days = len(values)
+    if ordinal - entry["end"] >= days:
+        values[:] = 0.0
+    else:
+        for day in range(entry["end"] + 1, ordinal + 1):
+            values[day % days] = 0.0
+    entry["end"] = ordinal
+
+
+def _drop(user_id: int) -> None:
+    global _bytes
+    entry = _series.pop(user_id, None)
+    if entry is not None:
+        _bytes -= entry["bytes"]
+
+
+def _record(user_id: int, rows: Iterable[Tuple[str, float, float]]) -> None:
+    with _lock:
+        _write_generations[user_id] = _write_generations.get(user_id, 0) + 1
+        entry = _series.get(user_id)
+        if entry is None:
+            return
+        rows = list(rows)
+        if rows:
+            entry["version"] += 1  # one committed write, one version
+        for checkin_date, sales, expenses in rows:
+            ordinal = _ordinal(checkin_date)
+            if ordinal is None:
+                # Storage orders such dates as strings; leave this user to it.
+                _drop(user_id)
+                return
+            if ordinal > entry["end"]:
+                _advance(entry, ordinal)
+            if ordinal > entry["end"] - len(entry["values"]) and ordinal >= entry["start"]:
+                entry["values"][ordinal % len(entry["values"])] = (sales, expenses)
+            _counters["writes"] += 1
+
+
+def _load(user_id: int, anchor: int, load_history: Callable, version: int) -> Optional[Dict]:
+    """A fresh ring covering `anchor`, or None when the history has dates it cannot place."""
+    days = series_days()
+    end = max(anchor, date.today().toordinal())
+    start = end - days + 1
+    rows = load_history(user_id, date.fromordinal(start).isoformat(), _FAR_FUTURE)
+    placed = []
+    for row in rows:
+        if row["checkin_date"] < date.fromordinal(start).isoformat():
+            continue  # the carried-forward balance row
+        ordinal = _ordinal(row["checkin_date"])
+        if ordinal is None:
+            return None
+        placed.append((ordinal, row["daily_sales"], row["daily_expenses"]))
+        end = max(end, ordinal)
+    values = np.zeros((days, 2), dtype=np.float64)
+    for ordinal, sales, expenses in placed:
+        if ordinal > end - days:
+            values[ordinal % days] = (sales, expenses)
+    return {
+        "values": values,
+        "start": start,
+        "end": end,
+        "loaded_at": time.monotonic(),
+        "version": version,
+        "bytes": sys.getsizeof(values),
+    }
+
+
+def _generation(user_id: int) -> Tuple[int, int]:
+    return _epoch, _write_generations.get(user_id, 0)
+
+
+def _install(user_id: int, entry: Dict, generation: Tuple[int, int]) -> None:
+    global _bytes
+    max_bytes = _max_bytes()
+    with _lock:
+        if _generation(user_id) != generation:
+            return
+        _drop(user_id)
+        _series[user_id] = entry
+        _bytes += entry["bytes"]
+        while _bytes > max_bytes and _series:
+            _drop(next(iter(_series)))
+            _counters["evictions"] += 1
+
+
+def _window_sums(entry: Dict, anchor: int) -> Optional[List[List[float]]]:
+    """[[previous sales, expenses], [current sales, expenses]], or None if the ring does not cover them."""
+    values = entry["values"]
+    days = len(values)
+    first = anchor - 2 * _WINDOW_DAYS + 1
+    if anchor > entry["end"]:
+        _advance(entry, anchor)
+    if first <= entry["end"] - days or first < entry["start"]:
+        return None
+    slots = np.arange(first, anchor + 1) % days
+    return values[slots].reshape(2, _WINDOW_DAYS, 2).sum(axis=1).tolist()
+
+
+def _rolling(sums: List[List[float]]) -> Dict:
+    (previous_sales, previous_expenses), (sales, expenses) = sums
+    return {
+        "monthly_sales": round(sales, 2),
+        "monthly_expenses": round(expenses, 2),
+        "sales_3_months_ago": round(previous_sales, 2),
+        "expenses_3_months_ago": round(previous_expenses, 2),
+    }
+
+
+def _cached_sums(user_id: int, anchor: int, version: int) -> Tuple[bool, Optional[List[List[float]]]]:
+    """(resident, window sums): sums is None for a resident ring that does not cover the window."""
+    ttl = _env_int("HOT_SERIES_TTL_SECONDS", 300)
+    with _lock:
+        entry = _series.get(user_id)
+        if entry is not None and entry["version"] != version:
+            # Written by another process (or by this one since the version was read).
+            _drop(user_id)
+            _counters["stale"] += 1
+            entry = None
+        if entry is not None and time.monotonic() - entry["loaded_at"] > ttl:
+            _drop(user_id)
+            entry = None
+        if entry is None:
+            return False, None
+        sums = _window_sums(entry, anchor)
+        if sums is not None:
+            _series.move_to_end(user_id)
+            _counters["hits"] += 1
+        return True, sums
+
+
+def serving(compute_rolling_metrics: Callable, load_history: Callable, load_version: Callable) -> Callable:
+    """compute_rolling_metrics answered from the user's ring when it covers the window and is current."""
+
+    @wraps(compute_rolling_metrics)
+    def wrapper(user_id: int, as_of_date: Optional[str] = None) -> Dict:
+        user_id = int(user_id)
+        anchor_date = (as_of_date or date.today().isoformat()).strip()
+        anchor = _ordinal(anchor_date)
+        first = anchor - 2 * _WINDOW_DAYS + 1 if anchor is not None else None
+        sums = None
+        if _max_bytes() > 0 and anchor is not None and date.fromordinal(first).isoformat() >= retention_cutoff():
+            # Read before the history, so a write landing in between shows up as a newer version.
+            version = load_version(user_id)
+            resident, sums = _cached_sums(user_id, anchor, version)
+            if not resident:
+                with _lock:
+                    generation = _generation(user_id)
+                    _counters["loads"] += 1
+                entry = _load(user_id, anchor, load_history, version)
+                sums = _window_sums(entry, anchor) if entry is not None else None
+                if sums is not None:
+                    _install(user_id, entry, generation)
+        if sums is None:
+            with _lock:
+                _counters["fallbacks"] += 1
+            return compute_rolling_metrics(user_id=user_id, as_of_date=as_of_date)
+        return _rolling(sums)
+
+    return wrapper
+
+
+def _payload_row(payload: Dict) -> Tuple[str, float, float]:
+    checkin_date = (payload.get("checkin_date") or date.today().isoformat()).strip()
+    return checkin_date, float(payload["daily_sales"]), float(payload["daily_expenses"])
+
+
+def recording_upsert(upsert_daily_checkin: Callable) -> Callable:
+    """upsert_daily_checkin, written through to the user's ring."""
+
+    @wraps(upsert_daily_checkin)
+    def wrapper(payload: Dict, **kwargs) -> Dict:
+        user_id = int(payload["user_id"])
+        try:
+            result = upsert_daily_checkin(payload, **kwargs)
+        except Exception:
+            with _lock:
+                _drop(user_id)
+                _write_generations[user_id] = _write_generations.get(user_id, 0) + 1
+            raise
+        _record(user_id, [_payload_row(payload)])
+        return result
+
+    return wrapper
+
+
+def recording_bulk_upsert(bulk_upsert_daily_checkins: Callable) -> Callable:
+    """bulk_upsert_daily_checkins, with the rows it wrote written through to the user's ring."""
+
+    @wraps(bulk_upsert_daily_checkins)
+    def wrapper(user_id: int, payloads: List[Dict]) -> Dict:
+        user_id = int(user_id)
+        try:
+            result = bulk_upsert_daily_checkins(user_id, payloads)
+        except Exception:
+            with _lock:
+                _drop(user_id)
+                _write_generations[user_id] = _write_generations.get(user_id, 0) + 1
+            raise
+        failed = {error["index"] for error in result["errors"]}
+        _record(user_id, [_payload_row(payload) for idx, payload in enumerate(payloads) if idx not in failed])
+        return result
+
+    return wrapper
+
+
+def clear() -> None:
+    global _bytes, _epoch
+    with _lock:
+        _epoch += 1
+        _series.clear()
+        _bytes = 0
+
+
+def clearing(fn: Callable) -> Callable:
+    """fn, followed by dropping every ring (writes that touch many users)."""
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            clear()
+
+    return wrapper
+
+
+def get_hot_series_stats() -> Dict:
+    with _lock:
+        stats = dict(_counters)
+        stats["users"] = len(_series)
+        stats["bytes"] = _bytes
+    lookups = stats["hits"] + stats["loads"] + stats["fallbacks"]
+    stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+    stats["max_bytes"] = _max_bytes()
+    stats["days"] = series_days()
+    return stats
@@ -0,0 +1,182 @@
+"""
+Per-process read-through cache in front of the storage backend.
+
+db/storage.py wraps the hot per-user reads (get_user_metrics,
+get_user_checkins, get_checkin_page, get_user_by_email) with cached() and
+every write that can change them with invalidating(), so a dashboard
+reload is served from memory until that user writes again.
+
+Invalidation is by generation: each user (and each email) has a counter
+that writes bump, and an entry is only valid for the generation it was
+loaded at. A read that raced a write is never stored, so a cached value is
+never older than the last write this process made. Other worker processes
+write to the same database, so per-user entries are also stamped with the
+user's check-in version (get_checkin_version, one primary-key read, as in
+db/hot_series.py) and only served while it is unchanged. Anything else
+another process writes is seen once the entry expires
+(READ_CACHE_TTL_SECONDS, default 30). READ_CACHE_SIZE (default 2048
+entries) bounds memory; 0 turns the cache off.
+
+Every entry carries a content hash the API sends as its ETag. Cached
+values are shared between callers and must not be mutated.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+_lock = threading.Lock()
+_entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+_generations: Dict[Hashable, int] = {}
+_epoch = 0
+_counters = {"hits": 0, "misses": 0, "stores": 0, "invalidations": 0}
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(0, int(os.getenv(name, str(default)).strip()))
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return max(0.0, float(os.getenv(name, str(default)).strip()))
+    except ValueError:
+        return default
+
+
+def content_etag(value: Any) -> str:
+    payload = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return '"' + hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest() + '"'
+
+
+def _stamp(owner: Hashable) -> Tuple[int, int]:
+    return _epoch, _generations.get(owner, 0)
+
+
+def cached_call(
+    kind: str,
+    owner: Hashable,
+    loader: Callable[[], Any],
+    key: tuple,
+    cache_none: bool = True,
+    load_version: Optional[Callable[[], Any]] = None,
+) -> Tuple[Any, str]:
+    """
+    (value, etag) for `key`, from the cache when `owner` has not written since
+    it was loaded and, with load_version, the stored version still matches.
+    """
+    max_entries = _env_int("READ_CACHE_SIZE", 2048)
+    if max_entries == 0:
+        value = loader()
+        return value, content_etag(value)
+    full_key = (kind, owner) + key
+    now = time.monotonic()
+    # Read before the value, so a write landing in between shows up as a newer version.
+    version = load_version() if load_version is not None else None
+    with _lock:
+        entry = _entries.get(full_key)
+        if entry is not None and entry[2] == _stamp(owner) and entry[3] > now and entry[4] == version:
+            _entries.move_to_end(full_key)
+            _counters["hits"] += 1
+            return entry[0], entry[1]
+        _counters["misses"] += 1
+        stamp = _stamp(owner)
+    value = loader()
+    etag = content_etag(value)
+    if value is None and not cache_none:
+        return value, etag
+    with _lock:
+        # A write landed while loading: the value may predate it, so don't keep it.
+        if _stamp(owner) == stamp:
+            _entries[full_key] = (value, etag, stamp, now + _env_float("READ_CACHE_TTL_SECONDS", 30.0), version)
+            _entries.move_to_end(full_key)
+            _counters["stores"] += 1
+            while len(_entries) > max_entries:
+                _entries.popitem(last=False)
+    return value, etag
+
+
+def invalidate(owner: Hashable) -> None:
+    with _lock:
+        _generations[owner] = _generations.get(owner, 0) + 1
+        _counters["invalidations"] += 1
+
+
+def invalidate_all() -> None:
+    global _epoch
+    with _lock:
+        _epoch += 1
+        _entries.clear()
+        _counters["invalidations"] += 1
+
+
+def cached(
+    kind: str,
+    fn: Callable,
+    owner_of: Callable[..., Hashable],
+    cache_none: bool = True,
+    version_of: Optional[Callable[[Hashable], Any]] = None,
+) -> Callable:
+    """
+    fn behind the cache. The wrapper's with_etag(*args, **kwargs) returns
+    (value, etag) for endpoints that answer conditional requests.
+    version_of(owner), when given, is checked on every call (see above).
+    """
+
+    def with_etag(*args, **kwargs) -> Tuple[Any, str]:
+        key = (args, tuple(sorted(kwargs.items())))
+        owner = owner_of(*args, **kwargs)
+        load_version = (lambda: version_of(owner)) if version_of is not None else None
+        return cached_call(kind, owner, lambda: fn(*args, **kwargs), key, cache_none, load_version)
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        return with_etag(*args, **kwargs)[0]
+
+    wrapper.with_etag = with_etag
+    return wrapper
+
+
+def invalidating(fn: Callable, owners_of: Callable[..., list]) -> Callable:
+    """fn, followed by invalidating every owner it wrote for (also when it fails part-way)."""
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            for owner in owners_of(*args, **kwargs):
+                invalidate(owner)
+
+    return wrapper
+
+
+def clearing(fn: Callable) -> Callable:
+    """fn, followed by dropping the whole cache (writes that touch many users)."""
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            invalidate_all()
+
+    return wrapper
+
+
+def get_read_cache_stats() -> Dict:
+    with _lock:
+        stats = dict(_counters)
+        stats["entries"] = len(_entries)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+    stats["max_entries"] = _env_int("READ_CACHE_SIZE", 2048)
+    stats["ttl_seconds"] = _env_float("READ_CACHE_TTL_SECONDS", 30.0)
+    return stats
@@ -0,0 +1,63 @@
+"""
+Shared request validation and result shape for multi-window aggregates
+(compute_window_aggregates in both storage backends).
+"""
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+ROLLING_WINDOW_METRICS = ["daily_sales", "daily_expenses", "receivables", "loan_emi", "cash_balance"]
+DEFAULT_WINDOWS = [7, 30, 90, 365]
+MAX_WINDOW_DAYS = 3660
+
+
+def normalize_window_request(
+    windows: Optional[Iterable[int]],
+    metrics: Optional[Iterable[str]],
+    as_of_date: Optional[str],
+) -> Tuple[date, List[int], List[str]]:
+    anchor = datetime.strptime((as_of_date or date.today().isoformat()).strip(), "%Y-%m-%d").date()
+    days = sorted({int(w) for w in (windows or DEFAULT_WINDOWS)})
+    if days[0] < 1 or days[-1] > MAX_WINDOW_DAYS:
+        raise ValueError(f"Window lengths must be between 1 and {MAX_WINDOW_DAYS} days")
+    names = list(dict.fromkeys(metrics or ROLLING_WINDOW_METRICS))
+    unknown = [m for m in names if m not in ROLLING_WINDOW_METRICS]
+    if unknown:
+        raise ValueError(f"Unknown metrics: {', '.join(unknown)}")
+    return anchor, days, names
+
+
+def window_periods(windows: List[int], include_previous: bool) -> List[Tuple[int, int]]:
+    """(days, offset) for each trailing window and, optionally, the period before it."""
+    periods = []
+    for days in windows:
+        periods.append((days, 0))
+        if include_previous:
+            periods.append((days, days))
+    return periods
+
+
+def period_summary(anchor: date, days: int, offset: int, checkin_days: int, totals: Dict[str, float]) -> Dict:
+    return {
+        "start_date": (anchor - timedelta(days=offset + days - 1)).isoformat(),
+        "end_date": (anchor - timedelta(days=offset)).isoformat(),
+        "checkin_days": int(checkin_days),
+        "totals": {m: round(float(v), 2) for m, v in totals.items()},
+        # Per day with a check-in, like user_metrics.
+        "averages": {m: round(float(v) / checkin_days, 2) if checkin_days else 0.0 for m, v in totals.items()},
+    }
+
+
+def window_result(user_id: int, anchor: date, windows: List[int], summaries: Dict[Tuple[int, int], Dict]) -> Dict:
+    return {
+        "user_id": int(user_id),
+        "as_of_date": anchor.isoformat(),
+        "windows": [
+            {
+                "window_days": days,
+                "current": summaries[(days, 0)],
+                "previous": summaries.get((days, days)),
+            }
+            for days in windows
+        ],
+    }
@@ -1,25 +1,161 @@
 import os
 
+from . import hot_series as _hot_series
+from . import read_cache as _read_cache
+from utils import latency as _latency
 
-USE_MONGODB = bool(os.getenv("MONGODB_URI", "").strip())
 
-if USE_MONGODB:
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "").strip().lower()
+USE_MONGODB = STORAGE_BACKEND == "mongo" or (not STORAGE_BACKEND and bool(os.getenv("MONGODB_URI", "").strip()))
+
+if STORAGE_BACKEND == "memory":
+    from .storage_memory import (  # noqa: F401
+        init_db,
+        close_db,
+        create_user,
+        get_user_by_email,
+        user_exists,
+        check_checkin,
+        upsert_daily_checkin,
+        bulk_upsert_daily_checkins,
+        get_user_metrics,
+        get_portfolio_metrics,
+        get_checkin_version,
+        get_user_checkins,
+        get_checkin_page,
+        compute_rolling_metrics,
+        compute_window_aggregates,
+        get_latest_checkin,
+        get_checkin_history,
+        save_risk_report,
+        save_import_job,
+        get_import_job,
+        list_import_jobs,
+        claim_import_job,
+        compact_checkins,
+        iter_table_rows,
+    )
+elif USE_MONGODB:
     from .storage_mongo import (  # noqa: F401
         init_db,
+        close_db,
         create_user,
         get_user_by_email,
+        user_exists,
+        check_checkin,
         upsert_daily_checkin,
+        bulk_upsert_daily_checkins,
         get_user_metrics,
+        get_portfolio_metrics,
+        get_checkin_version,
         get_user_checkins,
+        get_checkin_page,
         compute_rolling_metrics,
+        compute_window_aggregates,
+        get_latest_checkin,
+        get_checkin_history,
+        save_risk_report,
+        save_import_job,
+        get_import_job,
+        list_import_jobs,
+        claim_import_job,
+        compact_checkins,
+        iter_table_rows,
     )
 else:
     from .storage_sqlite import (  # noqa: F401
         init_db,
+        close_db,
         create_user,
         get_user_by_email,
+        user_exists,
+        check_checkin,
         upsert_daily_checkin,
+        bulk_upsert_daily_checkins,
         get_user_metrics,
+        get_portfolio_metrics,
+        get_checkin_version,
         get_user_checkins,
+        get_checkin_page,
         compute_rolling_metrics,
+        compute_window_aggregates,
+        get_latest_checkin,
+        get_checkin_history,
+        save_risk_report,
+        save_import_job,
+        get_import_job,
+        list_import_jobs,
+        claim_import_job,
+        compact_checkins,
+        iter_table_rows,
     )
+
+
+def _user_owner(user_id, *args, **kwargs) -> int:
+    return int(user_id)
+
+
+def _email_owner(email, *args, **kwargs) -> tuple:
+    return ("email", email.strip())
+
+
+# Daily-mode rolling metrics for active users come from in-process ring
+# buffers that check-in writes keep current (see db/hot_series.py).
+compute_rolling_metrics = _hot_series.serving(compute_rolling_metrics, get_checkin_history, get_checkin_version)
+upsert_daily_checkin = _hot_series.recording_upsert(upsert_daily_checkin)
+bulk_upsert_daily_checkins = _hot_series.recording_bulk_upsert(bulk_upsert_daily_checkins)
+compact_checkins = _hot_series.clearing(compact_checkins)
+init_db = _hot_series.clearing(init_db)
+get_hot_series_stats = _hot_series.get_hot_series_stats
+
+# Hot per-user reads go through the per-process read cache; the writes that
+# can change them invalidate it, and other workers' check-ins change the
+# version it is checked against (see db/read_cache.py).
+get_user_metrics = _read_cache.cached("metrics", get_user_metrics, _user_owner, version_of=get_checkin_version)
+get_user_checkins = _read_cache.cached("checkins", get_user_checkins, _user_owner, version_of=get_checkin_version)
+get_checkin_page = _read_cache.cached("checkin_page", get_checkin_page, _user_owner, version_of=get_checkin_version)
+# A miss is not kept: a user registered through another worker must be able to log in at once.
+get_user_by_email = _read_cache.cached("user_by_email", get_user_by_email, _email_owner, cache_none=False)
+create_user = _read_cache.invalidating(create_user, lambda name, email: [_email_owner(email)])
+upsert_daily_checkin = _read_cache.invalidating(upsert_daily_checkin, lambda payload, **kwargs: [int(payload["user_id"])])
+bulk_upsert_daily_checkins = _read_cache.invalidating(
+    bulk_upsert_daily_checkins, lambda user_id, payloads: [int(user_id)]
+)
+compact_checkins = _read_cache.clearing(compact_checkins)
+init_db = _read_cache.clearing(init_db)
+get_read_cache_stats = _read_cache.get_read_cache_stats
+
+
+def _timed(fn):
+    name = "storage." + fn.__name__
+    wrapper = _latency.timed(name)(fn)
+    if hasattr(fn, "with_etag"):
+        wrapper.with_etag = _latency.timed(name)(fn.with_etag)
+    return wrapper
+
+
+# Outermost: every call is a "storage.<name>" latency span (see utils/latency.py),
+# cache hits included. iter_table_rows is a generator and is left untimed.
+init_db = _timed(init_db)
+close_db = _timed(close_db)
+create_user = _timed(create_user)
+get_user_by_email = _timed(get_user_by_email)
+user_exists = _timed(user_exists)
+check_checkin = _timed(check_checkin)
+upsert_daily_checkin = _timed(upsert_daily_checkin)
+bulk_upsert_daily_checkins = _timed(bulk_upsert_daily_checkins)
+get_user_metrics = _timed(get_user_metrics)
+get_portfolio_metrics = _timed(get_portfolio_metrics)
+get_checkin_version = _timed(get_checkin_version)
+get_user_checkins = _timed(get_user_checkins)
+get_checkin_page = _timed(get_checkin_page)
+compute_rolling_metrics = _timed(compute_rolling_metrics)
+compute_window_aggregates = _timed(compute_window_aggregates)
+get_latest_checkin = _timed(get_latest_checkin)
+get_checkin_history = _timed(get_checkin_history)
+save_risk_report = _timed(save_risk_report)
+save_import_job = _timed(save_import_job)
+get_import_job = _timed(get_import_job)
+list_import_jobs = _timed(list_import_jobs)
+claim_import_job = _timed(claim_import_job)
+compact_checkins = _timed(compact_checkins)
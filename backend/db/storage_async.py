@@ -0,0 +1,157 @@
+"""
+Async facade over db/storage.py for handlers that run on the event loop.
+
+Every call runs the synchronous storage function (caches and ring buffers
+included) on a storage executor and awaits it, so a request waiting on the
+database holds neither the event loop nor one of the framework's
+threadpool slots; thousands of requests can be waiting at once.
+
+SQLite: each database file gets one dedicated writer thread: the main
+file (users, import jobs) and, with SQLITE_SHARDS > 1, every shard. SQLite
+takes one writer per file at a time anyway, and queueing writes here rather
+than on the file lock avoids busy-timeout spinning. Writes for a user run on
+their shard's writer, so they stay in order and different shards commit in
+parallel. Reads go to STORAGE_READ_THREADS (default 4) threads, each with
+its own pooled connection, and run alongside writes under WAL.
+
+Mongo: reads and writes share STORAGE_MONGO_THREADS (default 32) threads;
+pymongo's connection pool lets them all have a request in flight.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from . import storage
+
+
+_executors_lock = threading.Lock()
+_readers: Optional[ThreadPoolExecutor] = None
+# The main file's writer first, then one per shard (just the first when unsharded).
+_writers: List[ThreadPoolExecutor] = []
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(1, int(os.getenv(name, str(default)).strip()))
+    except ValueError:
+        return default
+
+
+def _sqlite_shards() -> int:
+    if storage.STORAGE_BACKEND == "memory":
+        return 1
+    from . import storage_sqlite
+
+    return storage_sqlite.SQLITE_SHARDS
+
+
+def _executors():
+    global _readers, _writers
+    with _executors_lock:
+        if _readers is None:
+            if storage.USE_MONGODB:
+                _readers = ThreadPoolExecutor(_env_int("STORAGE_MONGO_THREADS", 32), thread_name_prefix="mongo-storage")
+                _writers = [_readers]
+            else:
+                _readers = ThreadPoolExecutor(_env_int("STORAGE_READ_THREADS", 4), thread_name_prefix="storage-read")
+                shards = _sqlite_shards()
+                _writers = [
+                    ThreadPoolExecutor(1, thread_name_prefix=f"storage-write-{index}")
+                    for index in range(1 + shards if shards > 1 else 1)
+                ]
+        return _readers, _writers
+
+
+def _writer(user_id: Optional[int] = None) -> ThreadPoolExecutor:
+    writers = _executors()[1]
+    if user_id is None or len(writers) == 1:
+        return writers[0]
+    from .storage_sqlite import _shard_index
+
+    return writers[1 + _shard_index(user_id) % (len(writers) - 1)]
+
+
+async def _submit(executor: ThreadPoolExecutor, fn: Callable, args, kwargs):
+    # Context variables (request-scoped state) follow the call into the thread.
+    call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(executor, call)
+
+
+async def run(fn: Callable, *args, **kwargs):
+    """fn(*args, **kwargs) on a storage reader thread."""
+    return await _submit(_executors()[0], fn, args, kwargs)
+
+
+async def run_write(fn: Callable, *args, **kwargs):
+    """fn(*args, **kwargs) on the main database file's writer thread."""
+    return await _submit(_writer(), fn, args, kwargs)
+
+
+async def run_user_write(user_id: int, fn: Callable, *args, **kwargs):
+    """fn(*args, **kwargs) on the writer thread for user_id's shard."""
+    return await _submit(_writer(int(user_id)), fn, args, kwargs)
+
+
+def _reading(fn: Callable) -> Callable:
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await run(fn, *args, **kwargs)
+
+    if hasattr(fn, "with_etag"):
+        wrapper.with_etag = _reading(fn.with_etag)
+    return wrapper
+
+
+def _writing(fn: Callable, user_of: Optional[Callable] = None) -> Callable:
+    """`user_of(*args, **kwargs)` names the user whose shard fn writes to."""
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        if user_of is None:
+            return await run_write(fn, *args, **kwargs)
+        return await run_user_write(user_of(*args, **kwargs), fn, *args, **kwargs)
+
+    return wrapper
+
+
+def _payload_user(payload, *args, **kwargs) -> int:
+    return payload["user_id"]
+
+
+def _first_arg_user(user_id, *args, **kwargs) -> int:
+    return user_id
+
+
+create_user = _writing(storage.create_user)
+get_user_by_email = _reading(storage.get_user_by_email)
+user_exists = _reading(storage.user_exists)
+upsert_daily_checkin = _writing(storage.upsert_daily_checkin, _payload_user)
+bulk_upsert_daily_checkins = _writing(storage.bulk_upsert_daily_checkins, _first_arg_user)
+get_user_metrics = _reading(storage.get_user_metrics)
+get_portfolio_metrics = _reading(storage.get_portfolio_metrics)
+get_user_checkins = _reading(storage.get_user_checkins)
+get_checkin_page = _reading(storage.get_checkin_page)
+compute_rolling_metrics = _reading(storage.compute_rolling_metrics)
+compute_window_aggregates = _reading(storage.compute_window_aggregates)
+get_latest_checkin = _reading(storage.get_latest_checkin)
+get_checkin_history = _reading(storage.get_checkin_history)
+save_risk_report = _writing(storage.save_risk_report, _payload_user)
+save_import_job = _writing(storage.save_import_job)
+get_import_job = _reading(storage.get_import_job)
+list_import_jobs = _reading(storage.list_import_jobs)
+claim_import_job = _writing(storage.claim_import_job)
+compact_checkins = _writing(storage.compact_checkins)
+
+
+def shutdown() -> None:
+    """Stop the storage threads (before close_db, which closes the connections they hold)."""
+    global _readers, _writers
+    with _executors_lock:
+        executors = {id(executor): executor for executor in [_readers, *_writers] if executor is not None}
+        _readers, _writers = None, []
+    for executor in executors.values():
+        executor.shutdown(wait=True)
@@ -0,0 +1,444 @@
+"""
+In-process storage backend (STORAGE_BACKEND=memory) for tests and
+ephemeral deployments. Nothing is persisted.
+
+Each user's check-ins are kept as a sorted list of dates with parallel
+float arrays per metric, so window sums are two bisects and a slice sum.
+Results follow the SQLite backend, including its error messages.
+"""
+import copy
+import json
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .checkin_rollups import compaction_boundary
+from .export_tables import export_spec
+from .rolling_windows import normalize_window_request, period_summary, window_periods, window_result
+
+
+_METRICS = ["daily_sales", "daily_expenses", "receivables", "loan_emi", "cash_balance"]
+
+_lock = threading.RLock()
+_users: Dict[int, Dict] = {}
+_user_ids_by_email: Dict[str, int] = {}
+_checkins: Dict[int, "_UserCheckins"] = {}
+_metrics: Dict[int, Dict] = {}
+_risk_reports: Dict[Tuple[str, int], Dict] = {}
+_import_jobs: Dict[str, Dict] = {}
+_last_user_id = 0
+
+
+class _UserCheckins:
+    __slots__ = ("dates", "columns", "timestamps")
+
+    def __init__(self):
+        self.dates: List[str] = []
+        self.columns = {name: array("d") for name in _METRICS}
+        self.timestamps: List[Tuple[str, str]] = []
+
+    def upsert(self, checkin_date: str, values: Dict[str, float], now: str) -> bool:
+        idx = bisect_left(self.dates, checkin_date)
+        if idx < len(self.dates) and self.dates[idx] == checkin_date:
+            for name in _METRICS:
+                self.columns[name][idx] = values[name]
+            self.timestamps[idx] = (self.timestamps[idx][0], now)
+            return True
+        self.dates.insert(idx, checkin_date)
+        for name in _METRICS:
+            self.columns[name].insert(idx, values[name])
+        self.timestamps.insert(idx, (now, now))
+        return False
+
+    def totals(self, after: str, until: str) -> Dict:
+        """Count and sums over check-ins with after < checkin_date <= until."""
+        lo, hi = bisect_right(self.dates, after), bisect_right(self.dates, until)
+        totals = {"days": max(0, hi - lo)}
+        for name in _METRICS:
+            totals[name] = float(sum(self.columns[name][lo:hi])) if hi > lo else 0.0
+        return totals
+
+    def row(self, idx: int) -> Dict:
+        return {"checkin_date": self.dates[idx], **{name: float(self.columns[name][idx]) for name in _METRICS}}
+
+
+def _money(value: float) -> float:
+    return round(float(value), 2)
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat(timespec="seconds")
+
+
+def _shift(day: str, days_back: int) -> Optional[str]:
+    try:
+        return (datetime.strptime(day, "%Y-%m-%d").date() - timedelta(days=days_back)).isoformat()
+    except ValueError:
+        return None
+
+
+def _window(user_id: int, anchor_date: str, days: int, offset: int = 0) -> Dict:
+    until, after = _shift(anchor_date, offset), _shift(anchor_date, offset + days)
+    checkins = _checkins.get(user_id)
+    if checkins is None or until is None:
+        return {"days": 0, **{name: 0.0 for name in _METRICS}}
+    return checkins.totals(after, until)
+
+
+def init_db() -> None:
+    pass
+
+
+def close_db() -> None:
+    pass
+
+
+def reset_db() -> None:
+    """Drop all data (tests)."""
+    global _last_user_id
+    with _lock:
+        for store in (_users, _user_ids_by_email, _checkins, _metrics, _risk_reports, _import_jobs):
+            store.clear()
+        _last_user_id = 0
+
+
+def create_user(name: str, email: str) -> Dict:
+    global _last_user_id
+    email_value = email.strip()
+    with _lock:
+        if email_value in _user_ids_by_email:
+            raise ValueError("Email already exists. Please use Existing User login.")
+        _last_user_id += 1
+        user = {"user_id": _last_user_id, "name": name.strip(), "email": email_value, "created_at": _now()}
+        _users[_last_user_id] = user
+        _user_ids_by_email[email_value] = _last_user_id
+        return {"user_id": user["user_id"], "name": user["name"], "email": user["email"]}
+
+
+def get_user_by_email(email: str) -> Optional[Dict]:
+    with _lock:
+        user_id = _user_ids_by_email.get(email.strip())
+        if user_id is None:
+            return None
+        user = _users[user_id]
+        return {"user_id": user_id, "name": user["name"], "email": user["email"]}
+
+
+def user_exists(user_id: int) -> bool:
+    with _lock:
+        return int(user_id) in _users
+
+
+def _validate_user_exists(user_id: int) -> None:
+    if user_id not in _users:
+        raise ValueError(f"User {user_id} not found")
+
+
+def _checkin_values(payload: Dict) -> Dict[str, float]:
+    values = {name: float(payload[name]) for name in _METRICS}
+    for name, value in values.items():
+        if value != value:
+            # SQLite stores NaN as NULL and rejects it.
+            raise ValueError(f"NOT NULL constraint failed: daily_checkins.{name}")
+    return values
+
+
+def _recompute_metrics(user_id: int, as_of_date: str) -> Dict:
+    window = _window(user_id, as_of_date, 30)
+    count = window["days"]
+    monthly = {name: (window[name] / count if count else 0.0) * 30.0 for name in _METRICS}
+    _metrics[user_id] = {
+        "user_id": user_id,
+        "last_checkin_date": as_of_date,
+        "monthly_sales": monthly["daily_sales"],
+        "monthly_expenses": monthly["daily_expenses"],
+        "monthly_receivables": monthly["receivables"],
+        "monthly_loan_emi": monthly["loan_emi"],
+        "monthly_cash_balance": monthly["cash_balance"],
+        "window_days": count,
+        "updated_at": _now(),
+        "version": _metrics.get(user_id, {}).get("version", 0) + 1,
+    }
+    return {
+        "user_id": user_id,
+        "checkin_date": as_of_date,
+        "monthly_sales": _money(monthly["daily_sales"]),
+        "monthly_expenses": _money(monthly["daily_expenses"]),
+        "monthly_receivables": _money(monthly["receivables"]),
+        "monthly_loan_emi": _money(monthly["loan_emi"]),
+        "monthly_cash_balance": _money(monthly["cash_balance"]),
+        "window_days": count,
+    }
+
+
+def check_checkin(payload: Dict) -> None:
+    """Raise the ValueError upsert_daily_checkin would raise for `payload`, without writing it."""
+    with _lock:
+        _validate_user_exists(int(payload["user_id"]))
+        _checkin_values(payload)
+
+
+def upsert_daily_checkin(payload: Dict, with_rolling: bool = False) -> Dict:
+    user_id = int(payload["user_id"])
+    checkin_date = (payload.get("checkin_date") or date.today().isoformat()).strip()
+    with _lock:
+        _validate_user_exists(user_id)
+        values = _checkin_values(payload)
+        existed = _checkins.setdefault(user_id, _UserCheckins()).upsert(checkin_date, values, _now())
+        metrics = _recompute_metrics(user_id, checkin_date)
+        if with_rolling:
+            metrics["rolling"] = _rolling_metrics(user_id, checkin_date)
+        metrics["updated"] = existed
+        return metrics
+
+
+def bulk_upsert_daily_checkins(user_id: int, payloads: List[Dict]) -> Dict:
+    """Same contract as the SQLite backend: per-row errors by index, one metrics recompute."""
+    user_id = int(user_id)
+    with _lock:
+        if user_id not in _users:
+            return {
+                "processed": 0,
+                "errors": [{"index": idx, "error": f"User {user_id} not found"} for idx in range(len(payloads))],
+                "metrics": None,
+            }
+        checkins = _checkins.setdefault(user_id, _UserCheckins())
+        now = _now()
+        errors: List[Dict] = []
+        processed = 0
+        last_date = None
+        for idx, payload in enumerate(payloads):
+            try:
+                checkin_date = (payload.get("checkin_date") or date.today().isoformat()).strip()
+                checkins.upsert(checkin_date, _checkin_values(payload), now)
+            except (KeyError, TypeError, ValueError) as exc:
+                errors.append({"index": idx, "error": str(exc)})
+                continue
+            processed += 1
+            last_date = checkin_date
+        metrics = _recompute_metrics(user_id, last_date) if processed else None
+        return {"processed": processed, "errors": errors, "metrics": metrics}
+
+
+def _metrics_from_row(row: Dict) -> Dict:
+    return {
+        "user_id": int(row["user_id"]),
+        "last_checkin_date": row["last_checkin_date"],
+        "monthly_sales": _money(row["monthly_sales"]),
+        "monthly_expenses": _money(row["monthly_expenses"]),
+        "monthly_receivables": _money(row["monthly_receivables"]),
+        "monthly_loan_emi": _money(row["monthly_loan_emi"]),
+        "monthly_cash_balance": _money(row["monthly_cash_balance"]),
+    }
+
+
+def get_user_metrics(user_id: int) -> Optional[Dict]:
+    with _lock:
+        row = _metrics.get(int(user_id))
+        return _metrics_from_row(row) if row else None
+
+
+def get_checkin_version(user_id: int) -> int:
+    with _lock:
+        return int(_metrics.get(int(user_id), {}).get("version", 0))
+
+
+def get_portfolio_metrics(user_ids: List[int]) -> List[Dict]:
+    with _lock:
+        return [_metrics_from_row(_metrics[u]) for u in sorted({int(u) for u in user_ids}) if u in _metrics]
+
+
+def get_user_checkins(user_id: int, limit: int = 120) -> List[Dict]:
+    with _lock:
+        checkins = _checkins.get(int(user_id))
+        if checkins is None:
+            return []
+        count = min(len(checkins.dates), max(0, int(limit)))
+        return [
+            {
+                "checkin_date": checkins.dates[idx],
+                "daily_sales": _money(checkins.columns["daily_sales"][idx]),
+                "daily_expenses": _money(checkins.columns["daily_expenses"][idx]),
+            }
+            for idx in range(count)
+        ]
+
+
+def get_checkin_page(
+    user_id: int,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = 500,
+    descending: bool = False,
+) -> List[Dict]:
+    """Keyset page of check-ins; same contract as the SQLite backend."""
+    with _lock:
+        checkins = _checkins.get(int(user_id))
+        if checkins is None:
+            return []
+        lo = bisect_left(checkins.dates, start_date) if start_date else 0
+        hi = bisect_right(checkins.dates, end_date) if end_date else len(checkins.dates)
+        if after and descending:
+            hi = min(hi, bisect_left(checkins.dates, after))
+        elif after:
+            lo = max(lo, bisect_right(checkins.dates, after))
+        indexes = range(hi - 1, lo - 1, -1) if descending else range(lo, hi)
+        return [
+            {
+                "checkin_date": checkins.dates[idx],
+                **{name: _money(checkins.columns[name][idx]) for name in _METRICS},
+                "period": "day",
+                "checkin_days": 1,
+            }
+            for idx in indexes[: max(0, int(limit))]
+        ]
+
+
+def get_latest_checkin(user_id: int, as_of_date: Optional[str] = None) -> Optional[Dict]:
+    anchor_date = (as_of_date or date.today().isoformat()).strip()
+    with _lock:
+        checkins = _checkins.get(int(user_id))
+        idx = bisect_right(checkins.dates, anchor_date) - 1 if checkins else -1
+        if idx < 0:
+            return None
+        return {"user_id": int(user_id), **checkins.row(idx)}
+
+
+def get_checkin_history(user_id: int, start_date: str, end_date: str) -> List[Dict]:
+    with _lock:
+        _validate_user_exists(int(user_id))
+        checkins = _checkins.get(int(user_id))
+        if checkins is None:
+            return []
+        lo = max(0, bisect_left(checkins.dates, start_date) - 1)
+        hi = bisect_right(checkins.dates, end_date)
+        return [checkins.row(idx) for idx in range(lo, hi)]
+
+
+def compute_rolling_metrics(user_id: int, as_of_date: Optional[str] = None) -> Dict:
+    anchor_date = (as_of_date or date.today().isoformat()).strip()
+    with _lock:
+        _validate_user_exists(int(user_id))
+        return _rolling_metrics(int(user_id), anchor_date)
+
+
+def _rolling_metrics(user_id: int, anchor_date: str) -> Dict:
+    current = _window(user_id, anchor_date, 30)
+    previous = _window(user_id, anchor_date, 30, offset=30)
+    return {
+        "monthly_sales": _money(current["daily_sales"]),
+        "monthly_expenses": _money(current["daily_expenses"]),
+        "sales_3_months_ago": _money(previous["daily_sales"]),
+        "expenses_3_months_ago": _money(previous["daily_expenses"]),
+    }
+
+
+def compute_window_aggregates(
+    user_id: int,
+    windows: Optional[List[int]] = None,
+    metrics: Optional[List[str]] = None,
+    as_of_date: Optional[str] = None,
+    include_previous: bool = True,
+) -> Dict:
+    anchor, windows, metrics = normalize_window_request(windows, metrics, as_of_date)
+    summaries = {}
+    with _lock:
+        _validate_user_exists(int(user_id))
+        for days, offset in window_periods(windows, include_previous):
+            totals = _window(int(user_id), anchor.isoformat(), days, offset)
+            summaries[(days, offset)] = period_summary(
+                anchor, days, offset, totals["days"], {m: totals[m] for m in metrics}
+            )
+    return window_result(user_id, anchor, windows, summaries)
+
+
+def save_risk_report(report: Dict) -> None:
+    stored = {
+        "as_of_date": str(report["as_of_date"]),
+        "risk_score": int(report["risk_score"]),
+        "risk_level": str(report["risk_level"]),
+        # Same JSON round trip as the other backends, so later edits to
+        # `report` do not leak in.
+        "report": json.loads(json.dumps(report)),
+        "created_at": _now(),
+    }
+    with _lock:
+        _risk_reports[(str(report["run_id"]), int(report["user_id"]))] = stored
+
+
+def save_import_job(job: Dict, owner: Optional[str] = None) -> bool:
+    stored = copy.deepcopy(job)
+    stored["updated_at"] = _now()
+    with _lock:
+        current = _import_jobs.get(str(job["job_id"]))
+        if owner is not None and (current is None or current.get("owner") != owner):
+            return False
+        _import_jobs[str(job["job_id"])] = stored
+    return True
+
+
+def claim_import_job(job_id: str, owner: str, lease_seconds: float, statuses: List[str]) -> Optional[Dict]:
+    now = time.time()
+    with _lock:
+        job = _import_jobs.get(str(job_id))
+        if job is None or job["status"] not in statuses:
+            return None
+        held_by = job.get("owner")
+        if held_by not in (None, owner) and (job.get("lease_expires_at") or 0) >= now:
+            return None
+        job.update(status="running", owner=owner, lease_expires_at=now + lease_seconds, updated_at=_now())
+        return copy.deepcopy(job)
+
+
+def get_import_job(job_id: str) -> Optional[Dict]:
+    with _lock:
+        job = _import_jobs.get(str(job_id))
+        return copy.deepcopy(job) if job else None
+
+
+def list_import_jobs(statuses: List[str]) -> List[Dict]:
+    with _lock:
+        jobs = [copy.deepcopy(job) for job in _import_jobs.values() if job["status"] in statuses]
+    return sorted(jobs, key=lambda job: job["created_at"])
+
+
+def compact_checkins(before_date: Optional[str] = None, archive=None) -> Dict:
+    """Nothing is kept past the process, so there is no cold data to compact."""
+    return {"before": compaction_boundary(before_date), "users": 0, "months": 0, "rows": 0}
+
+
+def _table_snapshot(table: str) -> List[Dict]:
+    if table == "daily_checkins":
+        return [
+            {"user_id": user_id, **checkins.row(idx), "updated_at": checkins.timestamps[idx][1]}
+            for user_id, checkins in _checkins.items()
+            for idx in range(len(checkins.dates))
+        ]
+    if table == "user_metrics":
+        return [dict(row) for row in _metrics.values()]
+    return [
+        {"run_id": run_id, "user_id": user_id, **{k: v for k, v in stored.items() if k != "report"}}
+        for (run_id, user_id), stored in _risk_reports.items()
+    ]
+
+
+def iter_table_rows(
+    table: str, since: Optional[str] = None, until: Optional[str] = None, batch_rows: int = 5000
+) -> Iterator[List[Dict]]:
+    """Export table rows in batches; same contract as the SQLite backend (the data is in memory anyway)."""
+    spec = export_spec(table)
+    columns, stamp = spec["columns"], spec["timestamp"]
+    with _lock:
+        rows = [
+            {column: row.get(column) for column in columns}
+            for row in _table_snapshot(table)
+            if row[stamp] >= (since or "") and (until is None or row[stamp] < until)
+        ]
+    rows.sort(key=lambda row: row[stamp])
+    for offset in range(0, len(rows), int(batch_rows)):
+        yield rows[offset : offset + int(batch_rows)]
+
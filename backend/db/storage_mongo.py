@@ -1,8 +1,28 @@
+import json
+import operator
 import os
+import threading
+import time
 from datetime import date, datetime, timedelta
-from typing import Dict, List, Optional
-
-from pymongo import ASCENDING, MongoClient, ReturnDocument
+from typing import Dict, Iterator, List, Optional
+
+from pymongo import ASCENDING, DESCENDING, MongoClient, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from .checkin_rollups import (
+    build_rollups,
+    compacted_error,
+    compaction_boundary,
+    history_row,
+    is_compactable,
+    latest_row,
+    merge_history,
+    month_record,
+    page_row,
+    retention_cutoff,
+)
+from .export_tables import EXPORT_TABLES, export_spec
+from .rolling_windows import ROLLING_WINDOW_METRICS, normalize_window_request, period_summary, window_periods, window_result
 
 
 MONGODB_URI = os.getenv("MONGODB_URI", "").strip()
@@ -10,6 +30,21 @@ MONGODB_DB_NAME = os.getenv("MONGODB_DB_NAME", "finpilot").strip()
 
 _client: Optional[MongoClient] = None
 
+# hi/lo user ids: each process reserves a block of ids with one counter
+# update and hands them out locally, so registration bursts do not all
+# serialize on the counters document. Ids stay unique but may skip values
+# when a process exits with part of a block unused.
+try:
+    USER_ID_BLOCK_SIZE = max(1, int(os.getenv("MONGODB_USER_ID_BLOCK", "50").strip()))
+except ValueError:
+    USER_ID_BLOCK_SIZE = 50
+
+_id_lock = threading.Lock()
+_id_block = {"next": 0, "last": -1}
+
+# Users are never deleted, so one successful lookup per user is enough.
+_known_users = set()
+
 
 def _money(value: float) -> float:
     return round(float(value), 2)
@@ -28,6 +63,16 @@ def _get_db():
     return _client[MONGODB_DB_NAME]
 
 
+def close_db() -> None:
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+    with _id_lock:
+        _id_block.update({"next": 0, "last": -1})
+    _known_users.clear()
+
+
 def init_db() -> None:
     db = _get_db()
     db.users.create_index([("email", ASCENDING)], unique=True)
@@ -36,30 +81,51 @@ def init_db() -> None:
         [("user_id", ASCENDING), ("checkin_date", ASCENDING)],
         unique=True,
     )
+    db.monthly_checkin_rollups.create_index([("user_id", ASCENDING), ("month", ASCENDING)], unique=True)
     db.user_metrics.create_index([("user_id", ASCENDING)], unique=True)
+    db.risk_reports.create_index([("run_id", ASCENDING), ("user_id", ASCENDING)], unique=True)
+    db.import_jobs.create_index([("job_id", ASCENDING)], unique=True)
+    db.import_jobs.create_index([("status", ASCENDING), ("created_at", ASCENDING)])
+    # Incremental exports (iter_table_rows) walk these in order.
+    for table, spec in EXPORT_TABLES.items():
+        db[table].create_index([(spec["timestamp"], ASCENDING), ("_id", ASCENDING)])
     db.counters.update_one(
         {"_id": "user_id"},
         {"$setOnInsert": {"seq": 0}},
         upsert=True,
     )
+    # Check-ins written before running totals existed.
+    for user_id in db.daily_checkins.distinct("user_id", {"cum_days": {"$exists": False}}):
+        _refresh_prefix_sums(db, int(user_id), "")
 
 
 def _next_user_id(db) -> int:
-    doc = db.counters.find_one_and_update(
-        {"_id": "user_id"},
-        {"$inc": {"seq": 1}},
-        upsert=True,
-        return_document=ReturnDocument.AFTER,
-    )
-    return int(doc["seq"])
+    with _id_lock:
+        if _id_block["next"] > _id_block["last"]:
+            doc = db.counters.find_one_and_update(
+                {"_id": "user_id"},
+                {"$inc": {"seq": USER_ID_BLOCK_SIZE}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            _id_block["last"] = int(doc["seq"])
+            _id_block["next"] = _id_block["last"] - USER_ID_BLOCK_SIZE + 1
+        user_id = _id_block["next"]
+        _id_block["next"] += 1
+        return user_id
+
+
+def _release_user_id(user_id: int) -> None:
+    # Hand an unused id back unless a later one was already given out, so a
+    # rejected registration does not leave a gap in the sequence.
+    with _id_lock:
+        if _id_block["next"] == user_id + 1:
+            _id_block["next"] = user_id
 
 
 def create_user(name: str, email: str) -> Dict:
     db = _get_db()
     email_value = email.strip()
-    if db.users.find_one({"email": email_value}, {"_id": 1}):
-        raise ValueError("Email already exists. Please use Existing User login.")
-
     user_id = _next_user_id(db)
     now = datetime.utcnow().isoformat(timespec="seconds")
     doc = {
@@ -68,7 +134,15 @@ def create_user(name: str, email: str) -> Dict:
         "email": email_value,
         "created_at": now,
     }
-    db.users.insert_one(doc)
+    # The unique email index doubles as the duplicate check.
+    try:
+        db.users.insert_one(doc)
+    except DuplicateKeyError as exc:
+        if "email" not in ((exc.details or {}).get("keyPattern") or {"email": 1}):
+            raise
+        _release_user_id(user_id)
+        raise ValueError("Email already exists. Please use Existing User login.")
+    _known_users.add(user_id)
     return {"user_id": user_id, "name": doc["name"], "email": doc["email"]}
 
 
@@ -84,47 +158,100 @@ def get_user_by_email(email: str) -> Optional[Dict]:
 
 
 def _validate_user_exists(db, user_id: int) -> None:
+    if int(user_id) in _known_users:
+        return
     if not db.users.find_one({"user_id": int(user_id)}, {"_id": 1}):
         raise ValueError(f"User {user_id} not found")
-
-
-def _sum_and_avg(db, user_id: int, start_date: str, end_date: str) -> Dict:
-    pipeline = [
-        {
-            "$match": {
-                "user_id": int(user_id),
-                "checkin_date": {"$gte": start_date, "$lte": end_date},
-            }
-        },
-        {
-            "$group": {
-                "_id": None,
-                "avg_daily_sales": {"$avg": "$daily_sales"},
-                "avg_daily_expenses": {"$avg": "$daily_expenses"},
-                "avg_receivables": {"$avg": "$receivables"},
-                "avg_loan_emi": {"$avg": "$loan_emi"},
-                "avg_cash_balance": {"$avg": "$cash_balance"},
-                "sum_sales": {"$sum": "$daily_sales"},
-                "sum_expenses": {"$sum": "$daily_expenses"},
-                "count": {"$sum": 1},
-            }
-        },
-    ]
-    rows = list(db.daily_checkins.aggregate(pipeline))
-    return rows[0] if rows else {}
-
-
-def _recompute_metrics(db, user_id: int, as_of_date: str) -> Dict:
-    anchor = datetime.strptime(as_of_date, "%Y-%m-%d").date()
-    start = (anchor - timedelta(days=29)).isoformat()
-    agg = _sum_and_avg(db, user_id=int(user_id), start_date=start, end_date=as_of_date)
-
-    avg_daily_sales = float(agg.get("avg_daily_sales") or 0.0)
-    avg_daily_expenses = float(agg.get("avg_daily_expenses") or 0.0)
-    avg_receivables = float(agg.get("avg_receivables") or 0.0)
-    avg_loan_emi = float(agg.get("avg_loan_emi") or 0.0)
-    avg_cash_balance = float(agg.get("avg_cash_balance") or 0.0)
-    window_days = int(agg.get("count") or 0)
+    _known_users.add(int(user_id))
+
+
+def user_exists(user_id: int) -> bool:
+    try:
+        _validate_user_exists(_get_db(), int(user_id))
+    except ValueError:
+        return False
+    return True
+
+
+# Running totals per user, ordered by checkin_date, stored on each check-in
+# document (inclusive of that day), so window sums are two indexed lookups.
+_PREFIX_FIELDS = [
+    ("cum_sales", "daily_sales"),
+    ("cum_expenses", "daily_expenses"),
+    ("cum_receivables", "receivables"),
+    ("cum_loan_emi", "loan_emi"),
+    ("cum_cash_balance", "cash_balance"),
+]
+_PREFIX_PROJECTION = {"_id": 0, "cum_days": 1, **{cum: 1 for cum, _ in _PREFIX_FIELDS}}
+
+
+def _prefix_doc(db, user_id: int, date_filter: Dict) -> Dict:
+    row = db.daily_checkins.find_one(
+        {"user_id": int(user_id), "checkin_date": date_filter},
+        _PREFIX_PROJECTION,
+        sort=[("checkin_date", DESCENDING)],
+    )
+    if not row:
+        # Compacted months are older than every check-in document and carry
+        # the running totals as of their last check-in.
+        row = db.monthly_checkin_rollups.find_one(
+            {"user_id": int(user_id), "last_checkin_date": date_filter},
+            _PREFIX_PROJECTION,
+            sort=[("month", DESCENDING)],
+        )
+    totals = {"days": int(row.get("cum_days") or 0) if row else 0}
+    for cum, field in _PREFIX_FIELDS:
+        totals[field] = float(row.get(cum) or 0.0) if row else 0.0
+    return totals
+
+
+def _window_totals(db, user_id: int, anchor, days: int) -> Dict:
+    """Totals over the `days` days ending on anchor (a date)."""
+    end = _prefix_doc(db, user_id, {"$lte": anchor.isoformat()})
+    before = _prefix_doc(db, user_id, {"$lte": (anchor - timedelta(days=days)).isoformat()})
+    return {key: end[key] - before[key] for key in end}
+
+
+def _refresh_prefix_sums(db, user_id: int, from_date: str, report_date: Optional[str] = None) -> Optional[Dict]:
+    """
+    Rewrite running totals for the user's check-ins on or after from_date.
+
+    Appending today's check-in touches one document; a backdated or
+    overwritten day rewrites the documents after it. Returns the totals as
+    of report_date (on or after from_date) when one is given.
+    """
+    running = _prefix_doc(db, user_id, {"$lt": from_date})
+    reported = None
+    projection = {"_id": 1, "checkin_date": 1, **{field: 1 for _, field in _PREFIX_FIELDS}}
+    operations = []
+    for row in db.daily_checkins.find(
+        {"user_id": int(user_id), "checkin_date": {"$gte": from_date}}, projection
+    ).sort("checkin_date", ASCENDING):
+        running["days"] += 1
+        values = {"cum_days": running["days"]}
+        for cum, field in _PREFIX_FIELDS:
+            running[field] += float(row[field])
+            values[cum] = running[field]
+        operations.append(UpdateOne({"_id": row["_id"]}, {"$set": values}))
+        if report_date is not None and row["checkin_date"] <= report_date:
+            reported = dict(running)
+    if operations:
+        db.daily_checkins.bulk_write(operations, ordered=False)
+    return reported
+
+
+def _recompute_metrics(db, user_id: int, as_of_date: str, window: Optional[Dict] = None) -> Dict:
+    if window is None:
+        anchor = datetime.strptime(as_of_date, "%Y-%m-%d").date()
+        window = _window_totals(db, int(user_id), anchor, days=30)
+    count = window["days"]
+
+    avg_daily_sales = window["daily_sales"] / count if count else 0.0
+    avg_daily_expenses = window["daily_expenses"] / count if count else 0.0
+    avg_receivables = window["receivables"] / count if count else 0.0
+    avg_loan_emi = window["loan_emi"] / count if count else 0.0
+    avg_cash_balance = window["cash_balance"] / count if count else 0.0
+    window_days = int(count)
 
     monthly_sales = avg_daily_sales * 30.0
     monthly_expenses = avg_daily_expenses * 30.0
@@ -144,7 +271,7 @@ def _recompute_metrics(db, user_id: int, as_of_date: str) -> Dict:
         "window_days": window_days,
         "updated_at": updated_at,
     }
-    db.user_metrics.update_one({"user_id": int(user_id)}, {"$set": metrics_doc}, upsert=True)
+    db.user_metrics.update_one({"user_id": int(user_id)}, {"$set": metrics_doc, "$inc": {"version": 1}}, upsert=True)
 
     return {
         "user_id": int(user_id),
@@ -158,41 +285,210 @@ def _recompute_metrics(db, user_id: int, as_of_date: str) -> Dict:
     }
 
 
-def upsert_daily_checkin(payload: Dict) -> Dict:
+def _check_not_compacted(db, user_id: int, earliest_date: str) -> Optional[str]:
+    """
+    The user's last compacted month when `earliest_date` could fall into one.
+    Compaction never passes the retention cutoff, so newer dates skip the lookup.
+    """
+    if earliest_date[:7] >= retention_cutoff()[:7]:
+        return None
+    row = db.monthly_checkin_rollups.find_one(
+        {"user_id": int(user_id)}, {"_id": 0, "month": 1}, sort=[("month", DESCENDING)]
+    )
+    return row["month"] if row else None
+
+
+def _checkin_update(payload: Dict, now: str) -> Dict:
+    values = {name: float(payload[name]) for name in ["daily_sales", "daily_expenses", "receivables", "loan_emi", "cash_balance"]}
+    for name, value in values.items():
+        if value != value:
+            # Mongo would store NaN and poison the running totals; reject it
+            # like the SQLite backend does.
+            raise ValueError(f"NOT NULL constraint failed: daily_checkins.{name}")
+    return {
+        "$set": {**values, "updated_at": now},
+        "$setOnInsert": {"created_at": now},
+    }
+
+
+def check_checkin(payload: Dict) -> None:
+    """Raise the ValueError upsert_daily_checkin would raise for `payload`, without writing it."""
+    db = _get_db()
+    user_id = int(payload["user_id"])
+    checkin_date = (payload.get("checkin_date") or date.today().isoformat()).strip()
+    _checkin_update(payload, "")
+    _validate_user_exists(db, user_id)
+    compacted = _check_not_compacted(db, user_id, checkin_date)
+    if compacted and checkin_date[:7] <= compacted:
+        raise compacted_error(compacted)
+
+
+def upsert_daily_checkin(payload: Dict, with_rolling: bool = False) -> Dict:
+    """
+    Write one check-in, its running totals and the user's metrics.
+
+    One read (every check-in from 30 days back on, with running totals)
+    usually gives everything needed: the new day's totals, the rewritten
+    totals of any later days, and the 30-day window for user_metrics. A
+    running-total lookup is added for users with no recent check-ins and
+    for windows reaching back past the retention horizon. All writes to
+    daily_checkins then go out as one unordered bulk_write, whose upsert
+    result also tells whether the day already existed.
+
+    With `with_rolling`, the result also carries "rolling":
+    compute_rolling_metrics as of the check-in date. The current window is
+    the user_metrics window already in hand; the previous one costs a single
+    running-total lookup.
+    """
     db = _get_db()
     user_id = int(payload["user_id"])
     checkin_date = (payload.get("checkin_date") or date.today().isoformat()).strip()
     now = datetime.utcnow().isoformat(timespec="seconds")
+    update = _checkin_update(payload, now)
+    window_start = (datetime.strptime(checkin_date, "%Y-%m-%d").date() - timedelta(days=30)).isoformat()
 
     _validate_user_exists(db, user_id)
-    existing = db.daily_checkins.find_one({"user_id": user_id, "checkin_date": checkin_date}, {"_id": 1})
-
-    db.daily_checkins.update_one(
-        {"user_id": user_id, "checkin_date": checkin_date},
-        {
-            "$set": {
-                "daily_sales": float(payload["daily_sales"]),
-                "daily_expenses": float(payload["daily_expenses"]),
-                "receivables": float(payload["receivables"]),
-                "loan_emi": float(payload["loan_emi"]),
-                "cash_balance": float(payload["cash_balance"]),
-                "updated_at": now,
-            },
-            "$setOnInsert": {"created_at": now},
-        },
-        upsert=True,
+    compacted = _check_not_compacted(db, user_id, checkin_date)
+    if compacted and checkin_date[:7] <= compacted:
+        raise compacted_error(compacted)
+    projection = {"_id": 1, "checkin_date": 1, "cum_days": 1}
+    for cum, field in _PREFIX_FIELDS:
+        projection.update({cum: 1, field: 1})
+    rows = list(
+        db.daily_checkins.find({"user_id": user_id, "checkin_date": {"$gt": window_start}}, projection).sort(
+            "checkin_date", ASCENDING
+        )
     )
-
-    metrics = _recompute_metrics(db, user_id=user_id, as_of_date=checkin_date)
-    metrics["updated"] = bool(existing)
+    if rows and "cum_days" in rows[0]:
+        # The first document's running totals less its own values are the
+        # totals before it, which saves a lookup.
+        first = rows[0]
+        running = {"days": int(first["cum_days"]) - 1}
+        for cum, field in _PREFIX_FIELDS:
+            running[field] = float(first[cum]) - float(first[field])
+    elif rows:
+        running = _prefix_doc(db, user_id, {"$lte": window_start})
+    else:
+        running = _prefix_doc(db, user_id, {"$lt": checkin_date})
+    if window_start < retention_cutoff():
+        # A compacted month whose last check-in is after window_start counts
+        # in the window as a whole, so take the window base from the lookup.
+        window = {key: -value for key, value in _prefix_doc(db, user_id, {"$lte": window_start}).items()}
+    else:
+        window = {key: -value for key, value in running.items()}
+    later = []
+    for row in rows:
+        if row["checkin_date"] < checkin_date:
+            running["days"] += 1
+            for _, field in _PREFIX_FIELDS:
+                running[field] += float(row[field])
+        elif row["checkin_date"] > checkin_date:
+            later.append(row)
+
+    def _totals(row: Dict) -> Dict:
+        running["days"] += 1
+        values = {"cum_days": running["days"]}
+        for cum, field in _PREFIX_FIELDS:
+            running[field] += float(row[field])
+            values[cum] = running[field]
+        return values
+
+    update["$set"].update(_totals(update["$set"]))
+    window_base = window
+    window = {key: running[key] + window_base[key] for key in running}
+    operations = [UpdateOne({"user_id": user_id, "checkin_date": checkin_date}, update, upsert=True)]
+    operations.extend(UpdateOne({"_id": row["_id"]}, {"$set": _totals(row)}) for row in later)
+    result = db.daily_checkins.bulk_write(operations, ordered=False)
+
+    metrics = _recompute_metrics(db, user_id=user_id, as_of_date=checkin_date, window=window)
+    if with_rolling:
+        previous_start = (datetime.strptime(checkin_date, "%Y-%m-%d").date() - timedelta(days=60)).isoformat()
+        before = _prefix_doc(db, user_id, {"$lte": previous_start})
+        # window_base is the negated totals up to window_start.
+        metrics["rolling"] = {
+            "monthly_sales": _money(window["daily_sales"]),
+            "monthly_expenses": _money(window["daily_expenses"]),
+            "sales_3_months_ago": _money(-window_base["daily_sales"] - before["daily_sales"]),
+            "expenses_3_months_ago": _money(-window_base["daily_expenses"] - before["daily_expenses"]),
+        }
+    metrics["updated"] = 0 not in result.upserted_ids
     return metrics
 
 
-def get_user_metrics(user_id: int) -> Optional[Dict]:
+def bulk_upsert_daily_checkins(user_id: int, payloads: List[Dict]) -> Dict:
+    """
+    Upsert many check-ins for one user with one unordered bulk_write.
+
+    Same contract as the SQLite backend: per-row errors by payload index,
+    user_metrics recomputed once as of the last written row.
+    """
     db = _get_db()
-    row = db.user_metrics.find_one({"user_id": int(user_id)}, {"_id": 0})
-    if not row:
-        return None
+    user_id = int(user_id)
+    now = datetime.utcnow().isoformat(timespec="seconds")
+    errors: List[Dict] = []
+    # Later rows for the same day win, as with row-by-row upserts; collapsing
+    # them first lets the bulk write run unordered.
+    ops_by_date: Dict[str, Dict] = {}
+    last_date = None
+    for idx, payload in enumerate(payloads):
+        try:
+            checkin_date = (payload.get("checkin_date") or date.today().isoformat()).strip()
+            update = _checkin_update(payload, now)
+        except (KeyError, TypeError, ValueError) as exc:
+            errors.append({"index": idx, "error": str(exc)})
+            continue
+        entry = ops_by_date.pop(checkin_date, {"indexes": []})
+        entry["indexes"].append(idx)
+        entry["update"] = update
+        ops_by_date[checkin_date] = entry
+        last_date = checkin_date
+
+    try:
+        _validate_user_exists(db, user_id)
+    except ValueError as exc:
+        return {
+            "processed": 0,
+            "errors": [{"index": idx, "error": str(exc)} for idx in range(len(payloads))],
+            "metrics": None,
+        }
+
+    compacted = _check_not_compacted(db, user_id, min(ops_by_date)) if ops_by_date else None
+    if compacted:
+        message = str(compacted_error(compacted))
+        for checkin_date in [d for d in ops_by_date if d[:7] <= compacted]:
+            errors.extend({"index": idx, "error": message} for idx in ops_by_date.pop(checkin_date)["indexes"])
+        errors.sort(key=lambda e: e["index"])
+        last_date = max(ops_by_date, key=lambda d: ops_by_date[d]["indexes"][-1]) if ops_by_date else None
+
+    dates = list(ops_by_date)
+    processed = sum(len(entry["indexes"]) for entry in ops_by_date.values())
+    if dates:
+        operations = [
+            UpdateOne({"user_id": user_id, "checkin_date": d}, ops_by_date[d]["update"], upsert=True)
+            for d in dates
+        ]
+        try:
+            db.daily_checkins.bulk_write(operations, ordered=False)
+        except BulkWriteError as exc:
+            for write_error in exc.details.get("writeErrors", []):
+                failed = ops_by_date[dates[write_error["index"]]]["indexes"]
+                processed -= len(failed)
+                errors.extend({"index": idx, "error": str(write_error.get("errmsg"))} for idx in failed)
+            errors.sort(key=lambda e: e["index"])
+
+    metrics = None
+    if processed and last_date is not None:
+        end = _refresh_prefix_sums(db, user_id, min(dates), report_date=last_date)
+        if end is None:
+            end = _prefix_doc(db, user_id, {"$lte": last_date})
+        window_start = datetime.strptime(last_date, "%Y-%m-%d").date() - timedelta(days=30)
+        before = _prefix_doc(db, user_id, {"$lte": window_start.isoformat()})
+        window = {key: end[key] - before[key] for key in end}
+        metrics = _recompute_metrics(db, user_id=user_id, as_of_date=last_date, window=window)
+    return {"processed": processed, "errors": errors, "metrics": metrics}
+
+
+def _metrics_from_doc(row: Dict) -> Dict:
     return {
         "user_id": int(row["user_id"]),
         "last_checkin_date": row.get("last_checkin_date"),
@@ -204,17 +500,46 @@ def get_user_metrics(user_id: int) -> Optional[Dict]:
     }
 
 
+def get_user_metrics(user_id: int) -> Optional[Dict]:
+    db = _get_db()
+    row = db.user_metrics.find_one({"user_id": int(user_id)}, {"_id": 0})
+    return _metrics_from_doc(row) if row else None
+
+
+def get_checkin_version(user_id: int) -> int:
+    """Counter bumped by every check-in write for the user (0 before the first)."""
+    row = _get_db().user_metrics.find_one({"user_id": int(user_id)}, {"_id": 0, "version": 1})
+    return int(row.get("version", 0)) if row else 0
+
+
+def get_portfolio_metrics(user_ids: List[int]) -> List[Dict]:
+    db = _get_db()
+    rows = db.user_metrics.find({"user_id": {"$in": sorted({int(u) for u in user_ids})}}, {"_id": 0})
+    return sorted((_metrics_from_doc(row) for row in rows), key=lambda m: m["user_id"])
+
+
 def get_user_checkins(user_id: int, limit: int = 120) -> List[Dict]:
+    """Oldest first; compacted months come first as one per-check-in average each."""
     db = _get_db()
-    rows = (
-        db.daily_checkins.find(
+    months = list(
+        db.monthly_checkin_rollups.find(
             {"user_id": int(user_id)},
-            {"_id": 0, "checkin_date": 1, "daily_sales": 1, "daily_expenses": 1},
+            {"_id": 0, "month": 1, "checkin_days": 1, "daily_sales_sum": 1, "daily_expenses_sum": 1},
         )
-        .sort("checkin_date", ASCENDING)
+        .sort("month", ASCENDING)
         .limit(int(limit))
     )
-    return [
+    rows = []
+    if len(months) < int(limit):
+        rows = (
+            db.daily_checkins.find(
+                {"user_id": int(user_id)},
+                {"_id": 0, "checkin_date": 1, "daily_sales": 1, "daily_expenses": 1},
+            )
+            .sort("checkin_date", ASCENDING)
+            .limit(int(limit) - len(months))
+        )
+    return [month_record(row) for row in months] + [
         {
             "checkin_date": str(row["checkin_date"]),
             "daily_sales": _money(row["daily_sales"]),
@@ -224,23 +549,299 @@ def get_user_checkins(user_id: int, limit: int = 120) -> List[Dict]:
     ]
 
 
+_COMPARISONS = {"$gte": operator.ge, "$lte": operator.le, "$gt": operator.gt, "$lt": operator.lt}
+
+
+def _page_filter(start_date: Optional[str], end_date: Optional[str], after: Optional[str], descending: bool) -> Dict:
+    bounds: Dict = {}
+    if start_date:
+        bounds["$gte"] = start_date
+    if end_date:
+        bounds["$lte"] = end_date
+    if after:
+        bounds["$lt" if descending else "$gt"] = after
+    return bounds
+
+
+def get_checkin_page(
+    user_id: int,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = 500,
+    descending: bool = False,
+) -> List[Dict]:
+    """Keyset page of check-ins; same contract as the SQLite backend."""
+    db = _get_db()
+    bounds = _page_filter(start_date, end_date, after, descending)
+    direction = DESCENDING if descending else ASCENDING
+
+    def raw_rows(count: int) -> List[Dict]:
+        query = {"user_id": int(user_id), **({"checkin_date": bounds} if bounds else {})}
+        projection = {"_id": 0, "checkin_date": 1, **{metric: 1 for metric in ROLLING_WINDOW_METRICS}}
+        rows = db.daily_checkins.find(query, projection).sort("checkin_date", direction).limit(count)
+        return [
+            {
+                "checkin_date": str(row["checkin_date"]),
+                **{metric: _money(row[metric]) for metric in ROLLING_WINDOW_METRICS},
+                "period": "day",
+                "checkin_days": 1,
+            }
+            for row in rows
+        ]
+
+    def month_rows(count: int) -> List[Dict]:
+        # Few per user, so the date bounds are applied here rather than in the query.
+        rows = db.monthly_checkin_rollups.find({"user_id": int(user_id)}, {"_id": 0}).sort("month", direction)
+        page = []
+        for row in rows:
+            entry = page_row(row)
+            day = entry["checkin_date"]
+            if all(_COMPARISONS[op](day, bound) for op, bound in bounds.items()):
+                page.append(entry)
+                if len(page) >= count:
+                    break
+        return page
+
+    # Compacted months are older than every check-in document.
+    first, second = (raw_rows, month_rows) if descending else (month_rows, raw_rows)
+    page = first(int(limit))
+    if len(page) < int(limit):
+        page.extend(second(int(limit) - len(page)))
+    return page
+
+
+def get_latest_checkin(user_id: int, as_of_date: Optional[str] = None) -> Optional[Dict]:
+    db = _get_db()
+    anchor_date = (as_of_date or date.today().isoformat()).strip()
+    row = db.daily_checkins.find_one(
+        {"user_id": int(user_id), "checkin_date": {"$lte": anchor_date}},
+        {"_id": 0},
+        sort=[("checkin_date", DESCENDING)],
+    )
+    if not row:
+        # Every check-in document is newer than the compacted months, so only look there when none matched.
+        rollup = db.monthly_checkin_rollups.find_one(
+            {"user_id": int(user_id), "last_checkin_date": {"$lte": anchor_date}},
+            {"_id": 0},
+            sort=[("month", DESCENDING)],
+        )
+        return latest_row(user_id, rollup) if rollup else None
+    return {
+        "user_id": int(user_id),
+        "checkin_date": str(row["checkin_date"]),
+        "daily_sales": float(row["daily_sales"]),
+        "daily_expenses": float(row["daily_expenses"]),
+        "receivables": float(row["receivables"]),
+        "loan_emi": float(row["loan_emi"]),
+        "cash_balance": float(row["cash_balance"]),
+    }
+
+
+def get_checkin_history(user_id: int, start_date: str, end_date: str) -> List[Dict]:
+    """
+    Full check-in rows dated start_date..end_date, oldest first, preceded by
+    the latest check-in before start_date (if any) so balances carry forward.
+    A compacted month appears as one row on its last check-in date (see
+    checkin_rollups.history_row).
+    """
+    db = _get_db()
+    _validate_user_exists(db, int(user_id))
+    projection = {
+        "_id": 0,
+        "checkin_date": 1,
+        "daily_sales": 1,
+        "daily_expenses": 1,
+        "receivables": 1,
+        "loan_emi": 1,
+        "cash_balance": 1,
+    }
+    seed = db.daily_checkins.find_one(
+        {"user_id": int(user_id), "checkin_date": {"$lt": start_date}},
+        projection,
+        sort=[("checkin_date", DESCENDING)],
+    )
+    rows = db.daily_checkins.find(
+        {"user_id": int(user_id), "checkin_date": {"$gte": start_date, "$lte": end_date}},
+        projection,
+    ).sort("checkin_date", ASCENDING)
+    history = [
+        {
+            "checkin_date": str(row["checkin_date"]),
+            "daily_sales": float(row["daily_sales"]),
+            "daily_expenses": float(row["daily_expenses"]),
+            "receivables": float(row["receivables"]),
+            "loan_emi": float(row["loan_emi"]),
+            "cash_balance": float(row["cash_balance"]),
+        }
+        for row in ([seed] if seed else []) + list(rows)
+    ]
+    if seed:
+        return history
+    rollups = db.monthly_checkin_rollups.find(
+        {"user_id": int(user_id), "last_checkin_date": {"$lte": end_date}}, {"_id": 0}
+    ).sort("month", ASCENDING)
+    return merge_history(history, [history_row(row) for row in rollups], start_date)
+
+
+def save_risk_report(report: Dict) -> None:
+    db = _get_db()
+    now = datetime.utcnow().isoformat(timespec="seconds")
+    db.risk_reports.update_one(
+        {"run_id": str(report["run_id"]), "user_id": int(report["user_id"])},
+        {
+            "$set": {
+                "as_of_date": str(report["as_of_date"]),
+                "risk_score": int(report["risk_score"]),
+                "risk_level": str(report["risk_level"]),
+                "report": report,
+                "created_at": now,
+            }
+        },
+        upsert=True,
+    )
+
+
+def save_import_job(job: Dict, owner: Optional[str] = None) -> bool:
+    db = _get_db()
+    doc = {**job, "updated_at": datetime.utcnow().isoformat(timespec="seconds")}
+    if owner is None:
+        db.import_jobs.replace_one({"job_id": str(job["job_id"])}, doc, upsert=True)
+        return True
+    return db.import_jobs.replace_one({"job_id": str(job["job_id"]), "owner": owner}, doc).matched_count > 0
+
+
+def claim_import_job(job_id: str, owner: str, lease_seconds: float, statuses: List[str]) -> Optional[Dict]:
+    db = _get_db()
+    now = time.time()
+    return db.import_jobs.find_one_and_update(
+        {
+            "job_id": str(job_id),
+            "status": {"$in": list(statuses)},
+            "$or": [{"owner": None}, {"owner": owner}, {"lease_expires_at": None}, {"lease_expires_at": {"$lt": now}}],
+        },
+        {
+            "$set": {
+                "status": "running",
+                "owner": owner,
+                "lease_expires_at": now + lease_seconds,
+                "updated_at": datetime.utcnow().isoformat(timespec="seconds"),
+            }
+        },
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def get_import_job(job_id: str) -> Optional[Dict]:
+    db = _get_db()
+    return db.import_jobs.find_one({"job_id": str(job_id)}, {"_id": 0})
+
+
+def list_import_jobs(statuses: List[str]) -> List[Dict]:
+    db = _get_db()
+    return list(
+        db.import_jobs.find({"status": {"$in": list(statuses)}}, {"_id": 0}).sort("created_at", ASCENDING)
+    )
+
+
+def _window_sums(db, user_id: int, anchor, periods: List, metrics: List[str]) -> Dict:
+    """
+    Check-in count and metric sums for every (days, offset) period in one
+    $match + $group pipeline: a single index range scan over the widest span.
+    """
+    group: Dict = {"_id": None}
+    for i, (days, offset) in enumerate(periods):
+        after = (anchor - timedelta(days=offset + days)).isoformat()
+        until = (anchor - timedelta(days=offset)).isoformat()
+        inside = {"$and": [{"$gt": ["$checkin_date", after]}, {"$lte": ["$checkin_date", until]}]}
+        group[f"p{i}_days"] = {"$sum": {"$cond": [inside, 1, 0]}}
+        for j, metric in enumerate(metrics):
+            group[f"p{i}_m{j}"] = {"$sum": {"$cond": [inside, f"${metric}", 0]}}
+
+    span = max(days + offset for days, offset in periods)
+    pipeline = [
+        {
+            "$match": {
+                "user_id": int(user_id),
+                "checkin_date": {
+                    "$gt": (anchor - timedelta(days=span)).isoformat(),
+                    "$lte": anchor.isoformat(),
+                },
+            }
+        },
+        {"$group": group},
+    ]
+    rows = list(db.daily_checkins.aggregate(pipeline))
+    row = rows[0] if rows else {}
+    sums = {
+        period: (
+            int(row.get(f"p{i}_days") or 0),
+            {metric: float(row.get(f"p{i}_m{j}") or 0.0) for j, metric in enumerate(metrics)},
+        )
+        for i, period in enumerate(periods)
+    }
+    if (anchor - timedelta(days=span)).isoformat() < retention_cutoff():
+        # A compacted month counts in a period as a whole when its last check-in does.
+        rollups = db.monthly_checkin_rollups.find(
+            {
+                "user_id": int(user_id),
+                "last_checkin_date": {
+                    "$gt": (anchor - timedelta(days=span)).isoformat(),
+                    "$lte": anchor.isoformat(),
+                },
+            },
+            {"_id": 0, "last_checkin_date": 1, "checkin_days": 1, **{f"{metric}_sum": 1 for metric in metrics}},
+        )
+        for rollup in rollups:
+            for days, offset in periods:
+                after = (anchor - timedelta(days=offset + days)).isoformat()
+                until = (anchor - timedelta(days=offset)).isoformat()
+                if after < rollup["last_checkin_date"] <= until:
+                    count, totals = sums[(days, offset)]
+                    for metric in metrics:
+                        totals[metric] += float(rollup[f"{metric}_sum"])
+                    sums[(days, offset)] = (count + int(rollup["checkin_days"]), totals)
+    return sums
+
+
+def compute_window_aggregates(
+    user_id: int,
+    windows: Optional[List[int]] = None,
+    metrics: Optional[List[str]] = None,
+    as_of_date: Optional[str] = None,
+    include_previous: bool = True,
+) -> Dict:
+    """
+    Totals and per-check-in averages over several trailing windows (default
+    7/30/90/365 days) and the equally long period before each, from one
+    aggregation pipeline.
+    """
+    anchor, windows, metrics = normalize_window_request(windows, metrics, as_of_date)
+    periods = window_periods(windows, include_previous)
+    db = _get_db()
+    _validate_user_exists(db, int(user_id))
+    sums = _window_sums(db, int(user_id), anchor, periods, metrics)
+    summaries = {
+        (days, offset): period_summary(anchor, days, offset, *sums[(days, offset)])
+        for days, offset in periods
+    }
+    return window_result(user_id, anchor, windows, summaries)
+
+
 def compute_rolling_metrics(user_id: int, as_of_date: Optional[str] = None) -> Dict:
     db = _get_db()
     _validate_user_exists(db, int(user_id))
 
     anchor = datetime.strptime((as_of_date or date.today().isoformat()).strip(), "%Y-%m-%d").date()
-    cur_start = (anchor - timedelta(days=29)).isoformat()
-    cur_end = anchor.isoformat()
-    prev_start = (anchor - timedelta(days=59)).isoformat()
-    prev_end = (anchor - timedelta(days=30)).isoformat()
-
-    cur = _sum_and_avg(db, user_id=int(user_id), start_date=cur_start, end_date=cur_end)
-    prev = _sum_and_avg(db, user_id=int(user_id), start_date=prev_start, end_date=prev_end)
+    sums = _window_sums(db, int(user_id), anchor, [(30, 0), (30, 30)], ["daily_sales", "daily_expenses"])
+    _, cur = sums[(30, 0)]
+    _, prev = sums[(30, 30)]
 
-    rolling_30_day_sales = float(cur.get("sum_sales") or 0.0)
-    rolling_30_day_expenses = float(cur.get("sum_expenses") or 0.0)
-    previous_30_day_sales = float(prev.get("sum_sales") or 0.0)
-    previous_30_day_expenses = float(prev.get("sum_expenses") or 0.0)
+    rolling_30_day_sales = cur["daily_sales"]
+    rolling_30_day_expenses = cur["daily_expenses"]
+    previous_30_day_sales = prev["daily_sales"]
+    previous_30_day_expenses = prev["daily_expenses"]
 
     return {
         "monthly_sales": _money(rolling_30_day_sales),
@@ -248,3 +849,75 @@ def compute_rolling_metrics(user_id: int, as_of_date: Optional[str] = None) -> D
         "sales_3_months_ago": _money(previous_30_day_sales),
         "expenses_3_months_ago": _money(previous_30_day_expenses),
     }
+
+
+def compact_checkins(before_date: Optional[str] = None, archive=None) -> Dict:
+    """
+    Fold check-ins in months before `before_date` (never past the retention
+    horizon) into monthly_checkin_rollups and delete the raw documents.
+    Rollups are upserted before the documents are deleted, so re-running
+    finishes an interrupted compaction. When `archive` is given, the raw
+    rows are written to it as JSON lines before they are deleted.
+
+    Returns {"before": str, "users": int, "months": int, "rows": int}.
+    """
+    db = _get_db()
+    boundary = compaction_boundary(before_date)
+    now = datetime.utcnow().isoformat(timespec="seconds")
+    stats = {"before": boundary, "users": 0, "months": 0, "rows": 0}
+    for user_id in sorted(db.daily_checkins.distinct("user_id", {"checkin_date": {"$lt": boundary}})):
+        rows = [
+            row
+            for row in db.daily_checkins.find(
+                {"user_id": int(user_id), "checkin_date": {"$lt": boundary}}, {"_id": 0}
+            ).sort("checkin_date", ASCENDING)
+            if is_compactable(row["checkin_date"])
+        ]
+        if not rows:
+            continue
+        rollups = build_rollups(rows, now)
+        if archive is not None:
+            for row in rows:
+                archive.write(json.dumps(row) + "\n")
+            archive.flush()
+        db.monthly_checkin_rollups.bulk_write(
+            [
+                UpdateOne({"user_id": int(user_id), "month": rollup["month"]}, {"$set": rollup}, upsert=True)
+                for rollup in rollups
+            ],
+            ordered=False,
+        )
+        db.daily_checkins.delete_many(
+            {"user_id": int(user_id), "checkin_date": {"$in": [row["checkin_date"] for row in rows]}}
+        )
+        stats["users"] += 1
+        stats["months"] += len(rollups)
+        stats["rows"] += len(rows)
+    return stats
+
+
+def iter_table_rows(
+    table: str, since: Optional[str] = None, until: Optional[str] = None, batch_rows: int = 5000
+) -> Iterator[List[Dict]]:
+    """Export table rows in batches; same contract as the SQLite backend."""
+    db = _get_db()
+    spec = export_spec(table)
+    columns, stamp = spec["columns"], spec["timestamp"]
+    projection = {column: 1 for column in columns}
+    bounds = {"$gte": since or "", **({"$lt": until} if until else {})}
+    last = None
+    while True:
+        query = {stamp: bounds}
+        if last is not None:
+            query = {
+                stamp: bounds,
+                "$or": [{stamp: {"$gt": last[stamp]}}, {stamp: last[stamp], "_id": {"$gt": last["_id"]}}],
+            }
+        rows = list(db[table].find(query, projection).sort([(stamp, ASCENDING), ("_id", ASCENDING)]).limit(int(batch_rows)))
+        if not rows:
+            return
+        yield [{column: row.get(column) for column in columns} for row in rows]
+        if len(rows) < int(batch_rows):
+            return
+        last = rows[-1]
+
@@ -1,35 +1,346 @@
+import functools
+import json
 import os
 import sqlite3
+import threading
+import time
+import weakref
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, datetime
-from typing import Dict, Optional, List
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .checkin_rollups import (
+    build_rollups,
+    compacted_error,
+    compaction_boundary,
+    history_row,
+    latest_row,
+    merge_history,
+    month_record,
+    page_row,
+    retention_cutoff,
+)
+from .export_tables import export_spec
+from .rolling_windows import ROLLING_WINDOW_METRICS, normalize_window_request, period_summary, window_periods, window_result
 
 
 DB_PATH = os.getenv("APP_DB_PATH", "./data/app.db")
 
 
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)).strip())
+    except ValueError:
+        return default
+
+
+# Connection manager: each thread keeps one open connection per database file
+# (WAL journal, tuned pragmas, statement cache) instead of reconnecting on
+# every call. SQLITE_POOL=0 restores the old connect-per-call behaviour.
+SQLITE_POOL = os.getenv("SQLITE_POOL", "1").strip().lower() not in {"0", "false", "no"}
+SQLITE_BUSY_TIMEOUT_MS = _env_int("SQLITE_BUSY_TIMEOUT_MS", 5000)
+SQLITE_CACHE_SIZE_KB = _env_int("SQLITE_CACHE_SIZE_KB", 20000)
+SQLITE_MMAP_SIZE = _env_int("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").strip().upper()
+SQLITE_CACHED_STATEMENTS = _env_int("SQLITE_CACHED_STATEMENTS", 256)
+
+# Sharded mode (SQLITE_SHARDS > 1): each user's check-ins, metrics and risk
+# reports live in one of N files next to APP_DB_PATH, picked by a hash of
+# user_id, so writers for different users rarely share a database lock.
+# APP_DB_PATH stays the directory: the authoritative users table (ids and
+# email lookup) and import jobs. Each shard keeps a copy of its users' rows
+# for foreign keys. The directory records the shard count; init_db() moves
+# rows between files when SQLITE_SHARDS changes (see _rebalance_shards).
+SQLITE_SHARDS = max(1, _env_int("SQLITE_SHARDS", 1))
+_PORTFOLIO_BATCH = 500
+
+_local = threading.local()
+# Bumped by close_db: a thread whose pool is from an older generation drops
+# it (those connections are closed) and opens new ones.
+_pool_generation = 0
+_open_connections: "weakref.WeakSet" = weakref.WeakSet()
+_open_connections_lock = threading.Lock()
+_db_dirs_ready = set()
+_fanout_pool: Optional[ThreadPoolExecutor] = None
+_fanout_lock = threading.Lock()
+
+
+class _PooledConnection(sqlite3.Connection):
+    """close() rolls back unfinished work and keeps the connection for reuse."""
+
+    pooled = True
+
+    def close(self) -> None:
+        if self.in_transaction:
+            self.rollback()
+        if not self.pooled:
+            super().close()
+
+    def close_for_real(self) -> None:
+        super().close()
+
+
 def _money(value: float) -> float:
     return round(float(value), 2)
 
 
-def _ensure_db_dir() -> None:
-    directory = os.path.dirname(DB_PATH)
+def _ensure_db_dir(path: str) -> None:
+    if path in _db_dirs_ready:
+        return
+    directory = os.path.dirname(path)
     if directory:
         os.makedirs(directory, exist_ok=True)
+    _db_dirs_ready.add(path)
+
 
+def _open_connection(path: str, pooled: bool) -> sqlite3.Connection:
+    _ensure_db_dir(path)
+    if not pooled:
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON;")
+        return conn
 
-def _connect() -> sqlite3.Connection:
-    _ensure_db_dir()
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(
+        path,
+        timeout=SQLITE_BUSY_TIMEOUT_MS / 1000.0,
+        cached_statements=SQLITE_CACHED_STATEMENTS,
+        # Only the owning thread uses it; unchecked so close_db() can run at shutdown.
+        check_same_thread=False,
+        factory=_PooledConnection,
+    )
     conn.row_factory = sqlite3.Row
+    if path != ":memory:":
+        # WAL lets readers proceed while a writer commits; NORMAL sync is
+        # durable across application crashes and only loses the last commits
+        # on power loss.
+        conn.execute("PRAGMA journal_mode = WAL;")
+        conn.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS};")
+    conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB};")
+    conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE};")
+    conn.execute("PRAGMA temp_store = MEMORY;")
     conn.execute("PRAGMA foreign_keys = ON;")
+    with _open_connections_lock:
+        _open_connections.add(conn)
     return conn
 
 
-def init_db() -> None:
-    conn = _connect()
-    try:
-        conn.executescript(
-            """
+def _connect(path: Optional[str] = None) -> sqlite3.Connection:
+    path = path or DB_PATH
+    if not SQLITE_POOL:
+        return _open_connection(path, pooled=False)
+    connections = getattr(_local, "connections", None)
+    if connections is None or _local.generation != _pool_generation:
+        connections = _local.connections = {}
+        _local.generation = _pool_generation
+    conn = connections.get(path)
+    if conn is None:
+        conn = connections[path] = _open_connection(path, pooled=True)
+    return conn
+
+
+def _shard_index(user_id: int) -> int:
+    return zlib.crc32(str(int(user_id)).encode()) % SQLITE_SHARDS
+
+
+def _shard_file(index: int) -> str:
+    root, ext = os.path.splitext(DB_PATH)
+    return f"{root}.shard{index}{ext or '.db'}"
+
+
+def _data_paths() -> List[str]:
+    """Every file holding per-user tables."""
+    return [_shard_file(index) for index in range(SQLITE_SHARDS)] if SQLITE_SHARDS > 1 else [DB_PATH]
+
+
+def _shard_path(user_id: int) -> str:
+    if SQLITE_SHARDS <= 1:
+        return DB_PATH
+    return _shard_file(_shard_index(user_id))
+
+
+def close_db() -> None:
+    """Close every pooled connection, in every thread (shutdown, or before swapping DB files)."""
+    global _fanout_pool, _pool_generation
+    with _fanout_lock:
+        # Its threads hold pooled connections of their own.
+        if _fanout_pool is not None:
+            _fanout_pool.shutdown(wait=True)
+            _fanout_pool = None
+    with _open_connections_lock:
+        connections = list(_open_connections)
+        _open_connections.clear()
+        _pool_generation += 1
+    for conn in connections:
+        conn.close_for_real()
+
+
+# Running totals per user, ordered by checkin_date, stored on each check-in
+# row (inclusive of that row). A window sum is the difference of two prefix
+# rows found by index lookups on (user_id, checkin_date), so reads cost the
+# same whatever the window length.
+_PREFIX_COLUMNS = [
+    ("cum_sales", "daily_sales"),
+    ("cum_expenses", "daily_expenses"),
+    ("cum_receivables", "receivables"),
+    ("cum_loan_emi", "loan_emi"),
+    ("cum_cash_balance", "cash_balance"),
+]
+
+# Compacted months (monthly_checkin_rollups) carry the running totals as of
+# their last check-in, so a bound older than every raw row still resolves.
+# Such a month counts as a whole once the bound reaches its last check-in.
+# Raw rows are always newer than compacted months, so the rollup branch only
+# runs when no raw row matches. Takes (user_id, *bound params) twice.
+_PREFIX_SELECT = f"""
+    SELECT * FROM (
+        SELECT cum_days, {", ".join(cum for cum, _ in _PREFIX_COLUMNS)}
+        FROM daily_checkins
+        WHERE user_id = ? AND checkin_date {{bound}}
+        ORDER BY checkin_date DESC
+        LIMIT 1
+    )
+    UNION ALL
+    SELECT * FROM (
+        SELECT cum_days, {", ".join(cum for cum, _ in _PREFIX_COLUMNS)}
+        FROM monthly_checkin_rollups
+        WHERE user_id = ? AND last_checkin_date {{bound}}
+        ORDER BY month DESC
+        LIMIT 1
+    )
+    LIMIT 1
+"""
+_PREFIX_BEFORE_SQL = _PREFIX_SELECT.format(bound="< ?")
+
+
+def _totals_from_row(row) -> Dict:
+    totals = {"days": int(row["cum_days"]) if row else 0}
+    for cum, column in _PREFIX_COLUMNS:
+        totals[column] = float(row[cum]) if row else 0.0
+    return totals
+
+
+_CUM_COLUMN = {column: cum for cum, column in _PREFIX_COLUMNS}
+
+
+@functools.lru_cache(maxsize=None)
+def _prefix_sql(points: int, cums: Tuple[str, ...]) -> str:
+    # One index lookup per bound, in a single statement. A UNION ALL of
+    # _PREFIX_SELECT per bound gives the same rows at several times the cost.
+    bounds = ", ".join(f"({i}, date(?2, ?{i + 3}))" for i in range(points))
+    return f"""
+        WITH bounds(point, bound) AS (VALUES {bounds})
+        SELECT bound, cum_days, {", ".join(cums)}
+        FROM bounds LEFT JOIN daily_checkins
+            ON user_id = ?1 AND checkin_date = (
+                SELECT MAX(checkin_date) FROM daily_checkins WHERE user_id = ?1 AND checkin_date <= bound
+            )
+        ORDER BY point
+    """
+
+
+@functools.lru_cache(maxsize=None)
+def _prefix_rollup_sql(cums: Tuple[str, ...]) -> str:
+    return f"""
+        SELECT last_checkin_date, cum_days, {", ".join(cums)}
+        FROM monthly_checkin_rollups
+        WHERE user_id = ? AND last_checkin_date <= ?
+        ORDER BY month DESC
+    """
+
+
+def _prefix_points(
+    conn: sqlite3.Connection, user_id: int, anchor_date: str, days_back: Tuple[int, ...], cums: Tuple[str, ...]
+) -> List[tuple]:
+    """(bound, cum_days, *cums) as of each anchor_date - n days; zeros before the first check-in."""
+    offsets = [f"-{int(n)} day" for n in days_back]
+    rows = conn.execute(_prefix_sql(len(offsets), cums), (user_id, anchor_date, *offsets)).fetchall()
+    missing = [row[0] for row in rows if row[1] is None and row[0]]
+    rollups = []
+    if missing:
+        # No raw row is old enough for these bounds, so they can only fall in
+        # compacted months (newest first; see _PREFIX_SELECT).
+        rollups = conn.execute(_prefix_rollup_sql(cums), (user_id, max(missing))).fetchall()
+    empty = (0,) + (0.0,) * len(cums)
+    points = []
+    for row in rows:
+        if row[1] is None:
+            row = next((rollup for rollup in rollups if row[0] and rollup[0] <= row[0]), (row[0],) + empty)
+        points.append(row)
+    return points
+
+
+def _period_totals(
+    conn: sqlite3.Connection,
+    user_id: int,
+    anchor_date: str,
+    periods: List[Tuple[int, int]],
+    columns: Tuple[str, ...] = tuple(column for _, column in _PREFIX_COLUMNS),
+) -> List[Dict]:
+    """Totals over each (days, offset) period ending `offset` days before anchor_date, from the running totals."""
+    offsets = sorted({offset for _, offset in periods} | {days + offset for days, offset in periods})
+    cums = tuple(_CUM_COLUMN[column] for column in columns)
+    points = dict(zip(offsets, _prefix_points(conn, user_id, anchor_date, tuple(offsets), cums)))
+    keys = ("days",) + tuple(columns)
+    return [
+        {key: points[offset][i] - points[offset + days][i] for i, key in enumerate(keys, 1)}
+        for days, offset in periods
+    ]
+
+
+def _refresh_prefix_sums(conn: sqlite3.Connection, user_id: int, from_date: str) -> None:
+    """
+    Rewrite running totals for the user's rows on or after from_date.
+
+    Appending today's check-in touches one row; a backdated or overwritten
+    day rewrites the rows after it.
+    """
+    base = _totals_from_row(conn.execute(_PREFIX_BEFORE_SQL, (user_id, from_date) * 2).fetchone())
+    base_values = [base["days"]] + [base[column] for _, column in _PREFIX_COLUMNS]
+    assignments = ", ".join(f"{cum} = ? + w.{cum}" for cum in ["cum_days"] + [c for c, _ in _PREFIX_COLUMNS])
+    windowed = ", ".join(f"SUM({column}) OVER running AS {cum}" for cum, column in _PREFIX_COLUMNS)
+    conn.execute(
+        f"""
+        UPDATE daily_checkins
+        SET {assignments}
+        FROM (
+            SELECT id, COUNT(*) OVER running AS cum_days, {windowed}
+            FROM daily_checkins
+            WHERE user_id = ? AND checkin_date >= ?
+            WINDOW running AS (ORDER BY checkin_date ROWS UNBOUNDED PRECEDING)
+        ) AS w
+        WHERE daily_checkins.id = w.id
+        """,
+        (*base_values, user_id, from_date),
+    )
+
+
+def _migrate_metrics_version(conn: sqlite3.Connection) -> None:
+    if "version" not in {row["name"] for row in conn.execute("PRAGMA table_info(user_metrics)")}:
+        conn.execute("ALTER TABLE user_metrics ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+
+def _migrate_import_job_leases(conn: sqlite3.Connection) -> None:
+    existing = {row["name"] for row in conn.execute("PRAGMA table_info(import_jobs)")}
+    for column, kind in [("owner", "TEXT"), ("lease_expires_at", "REAL")]:
+        if column not in existing:
+            conn.execute(f"ALTER TABLE import_jobs ADD COLUMN {column} {kind}")
+
+
+def _migrate_prefix_sums(conn: sqlite3.Connection) -> None:
+    existing = {row["name"] for row in conn.execute("PRAGMA table_info(daily_checkins)")}
+    added = False
+    for column, kind in [("cum_days", "INTEGER")] + [(cum, "REAL") for cum, _ in _PREFIX_COLUMNS]:
+        if column not in existing:
+            conn.execute(f"ALTER TABLE daily_checkins ADD COLUMN {column} {kind}")
+            added = True
+    if added:
+        for row in conn.execute("SELECT DISTINCT user_id FROM daily_checkins").fetchall():
+            _refresh_prefix_sums(conn, int(row["user_id"]), "")
+
+
+_SCHEMA_SQL = """
             CREATE TABLE IF NOT EXISTS users (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 name TEXT NOT NULL,
@@ -48,6 +359,12 @@ def init_db() -> None:
                 cash_balance REAL NOT NULL,
                 created_at TEXT NOT NULL,
                 updated_at TEXT NOT NULL,
+                cum_days INTEGER,
+                cum_sales REAL,
+                cum_expenses REAL,
+                cum_receivables REAL,
+                cum_loan_emi REAL,
+                cum_cash_balance REAL,
                 UNIQUE(user_id, checkin_date),
                 FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
             );
@@ -62,15 +379,227 @@ def init_db() -> None:
                 monthly_cash_balance REAL,
                 window_days INTEGER NOT NULL,
                 updated_at TEXT NOT NULL,
+                version INTEGER NOT NULL DEFAULT 0,
                 FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
             );
-            """
-        )
+
+            -- One row per user and compacted month (see compact_checkins).
+            CREATE TABLE IF NOT EXISTS monthly_checkin_rollups (
+                user_id INTEGER NOT NULL,
+                month TEXT NOT NULL,
+                first_checkin_date TEXT NOT NULL,
+                last_checkin_date TEXT NOT NULL,
+                checkin_days INTEGER NOT NULL,
+                daily_sales_sum REAL NOT NULL,
+                daily_sales_min REAL NOT NULL,
+                daily_sales_max REAL NOT NULL,
+                daily_sales_last REAL NOT NULL,
+                daily_expenses_sum REAL NOT NULL,
+                daily_expenses_min REAL NOT NULL,
+                daily_expenses_max REAL NOT NULL,
+                daily_expenses_last REAL NOT NULL,
+                receivables_sum REAL NOT NULL,
+                receivables_min REAL NOT NULL,
+                receivables_max REAL NOT NULL,
+                receivables_last REAL NOT NULL,
+                loan_emi_sum REAL NOT NULL,
+                loan_emi_min REAL NOT NULL,
+                loan_emi_max REAL NOT NULL,
+                loan_emi_last REAL NOT NULL,
+                cash_balance_sum REAL NOT NULL,
+                cash_balance_min REAL NOT NULL,
+                cash_balance_max REAL NOT NULL,
+                cash_balance_last REAL NOT NULL,
+                cum_days INTEGER NOT NULL,
+                cum_sales REAL NOT NULL,
+                cum_expenses REAL NOT NULL,
+                cum_receivables REAL NOT NULL,
+                cum_loan_emi REAL NOT NULL,
+                cum_cash_balance REAL NOT NULL,
+                created_at TEXT NOT NULL,
+                PRIMARY KEY (user_id, month),
+                FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+            );
+
+            CREATE TABLE IF NOT EXISTS risk_reports (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run_id TEXT NOT NULL,
+                user_id INTEGER NOT NULL,
+                as_of_date TEXT NOT NULL,
+                risk_score INTEGER NOT NULL,
+                risk_level TEXT NOT NULL,
+                report_json TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                UNIQUE(run_id, user_id),
+                FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+            );
+
+            CREATE TABLE IF NOT EXISTS import_jobs (
+                job_id TEXT PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                filename TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                status TEXT NOT NULL,
+                total_bytes INTEGER NOT NULL,
+                bytes_processed INTEGER NOT NULL,
+                rows_consumed INTEGER NOT NULL,
+                processed_rows INTEGER NOT NULL,
+                failed_rows INTEGER NOT NULL,
+                errors_json TEXT NOT NULL,
+                error TEXT,
+                active_seconds REAL NOT NULL,
+                created_at TEXT NOT NULL,
+                started_at TEXT,
+                updated_at TEXT NOT NULL,
+                finished_at TEXT,
+                owner TEXT,
+                lease_expires_at REAL
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_import_jobs_status ON import_jobs(status);
+
+            -- Directory only: the shard count the per-user rows are laid out for.
+            CREATE TABLE IF NOT EXISTS storage_settings (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            -- Incremental exports (iter_table_rows) walk these in order.
+            CREATE INDEX IF NOT EXISTS idx_daily_checkins_updated_at ON daily_checkins(updated_at);
+            CREATE INDEX IF NOT EXISTS idx_user_metrics_updated_at ON user_metrics(updated_at);
+            CREATE INDEX IF NOT EXISTS idx_risk_reports_created_at ON risk_reports(created_at);
+"""
+
+# Per-user tables that move between the directory and the shards.
+_SHARDED_TABLES = ["daily_checkins", "monthly_checkin_rollups", "user_metrics", "risk_reports"]
+
+
+def _init_schema(path: str) -> None:
+    conn = _connect(path)
+    try:
+        conn.executescript(_SCHEMA_SQL)
+        _migrate_prefix_sums(conn)
+        _migrate_metrics_version(conn)
+        _migrate_import_job_leases(conn)
         conn.commit()
     finally:
         conn.close()
 
 
+def _recorded_shard_count(directory: sqlite3.Connection) -> int:
+    row = directory.execute("SELECT value FROM storage_settings WHERE key = 'sqlite_shards'").fetchone()
+    if row:
+        return int(row["value"])
+    # Databases from before the count was recorded: the shard files present.
+    count = 0
+    while os.path.exists(_shard_file(count)):
+        count += 1
+    return max(1, count)
+
+
+def _copy_users(directory: sqlite3.Connection, dest: sqlite3.Connection, user_ids: List[int]) -> None:
+    for uid in user_ids:
+        row = directory.execute("SELECT * FROM users WHERE id = ?", (uid,)).fetchone()
+        dest.execute(
+            "INSERT OR REPLACE INTO users (id, name, email, created_at) VALUES (?, ?, ?, ?)",
+            (row["id"], row["name"], row["email"], row["created_at"]),
+        )
+
+
+def _move_misplaced_rows(directory: sqlite3.Connection, source_path: str) -> None:
+    """Move the per-user rows in `source_path` that belong in another file under the current shard count."""
+    source = directory if source_path == DB_PATH else _connect(source_path)
+    try:
+        by_target: Dict[str, List[int]] = {}
+        for row in source.execute(" UNION ".join(f"SELECT user_id FROM {table}" for table in _SHARDED_TABLES)):
+            target = _shard_path(int(row[0]))
+            if target != source_path:
+                by_target.setdefault(target, []).append(int(row[0]))
+        for target, user_ids in by_target.items():
+            dest = directory if target == DB_PATH else _connect(target)
+            try:
+                dest.execute("BEGIN")
+                if dest is not directory:
+                    _copy_users(directory, dest, user_ids)
+                for table in _SHARDED_TABLES:
+                    columns = [r["name"] for r in source.execute(f"PRAGMA table_info({table})") if r["name"] != "id"]
+                    column_list = ", ".join(columns)
+                    placeholders = ", ".join("?" for _ in columns)
+                    for uid in user_ids:
+                        rows = source.execute(f"SELECT {column_list} FROM {table} WHERE user_id = ?", (uid,)).fetchall()
+                        dest.executemany(
+                            f"INSERT OR REPLACE INTO {table} ({column_list}) VALUES ({placeholders})",
+                            [tuple(r) for r in rows],
+                        )
+                dest.commit()
+            finally:
+                if dest is not directory:
+                    dest.close()
+            # Only after the target has committed, so a crash in between leaves the rows in both places.
+            for table in _SHARDED_TABLES:
+                source.executemany(f"DELETE FROM {table} WHERE user_id = ?", [(uid,) for uid in user_ids])
+            if source is not directory:
+                source.executemany("DELETE FROM users WHERE id = ?", [(uid,) for uid in user_ids])
+            source.commit()
+    finally:
+        if source is not directory:
+            source.close()
+
+
+def _rebalance_shards(previous: int) -> None:
+    """
+    Put every user's rows in the file SQLITE_SHARDS assigns them to: out of
+    the directory on the first sharded start, and between files whenever the
+    shard count differs from the one recorded in the directory (more shards,
+    fewer, or back to one file). `previous` is the count the rows were
+    written under. Each shard also gets a copy of its users.
+    """
+    directory = _connect()
+    try:
+        sources = [DB_PATH]
+        if previous != SQLITE_SHARDS and previous > 1:
+            sources += [_shard_file(index) for index in range(previous) if os.path.exists(_shard_file(index))]
+        for path in sources[1:]:
+            _init_schema(path)
+        for path in sources:
+            _move_misplaced_rows(directory, path)
+        if SQLITE_SHARDS > 1:
+            by_shard: Dict[str, List[int]] = {}
+            for row in directory.execute("SELECT id FROM users"):
+                by_shard.setdefault(_shard_path(row["id"]), []).append(int(row["id"]))
+            for path, user_ids in by_shard.items():
+                shard = _connect(path)
+                try:
+                    known = {int(row["id"]) for row in shard.execute("SELECT id FROM users")}
+                    missing = [uid for uid in user_ids if uid not in known]
+                    if missing:
+                        shard.execute("BEGIN")
+                        _copy_users(directory, shard, missing)
+                        shard.commit()
+                finally:
+                    shard.close()
+        # Recorded last: an interrupted move is finished on the next start.
+        directory.execute(
+            "INSERT OR REPLACE INTO storage_settings (key, value) VALUES ('sqlite_shards', ?)", (str(SQLITE_SHARDS),)
+        )
+        directory.commit()
+    finally:
+        directory.close()
+
+
+def init_db() -> None:
+    _init_schema(DB_PATH)
+    directory = _connect()
+    try:
+        # Before any new shard file exists, which would count as one.
+        previous = _recorded_shard_count(directory)
+    finally:
+        directory.close()
+    if SQLITE_SHARDS > 1:
+        for index in range(SQLITE_SHARDS):
+            _init_schema(_shard_file(index))
+    _rebalance_shards(previous)
+
+
 def create_user(name: str, email: str) -> Dict:
     now = datetime.utcnow().isoformat(timespec="seconds")
     email_value = email.strip()
@@ -84,8 +613,20 @@ def create_user(name: str, email: str) -> Dict:
             "INSERT INTO users (name, email, created_at) VALUES (?, ?, ?)",
             (name.strip(), email_value, now),
         )
+        user_id = int(cursor.lastrowid)
+        if SQLITE_SHARDS > 1:
+            # The directory insert commits only once the shard has its copy.
+            shard = _connect(_shard_path(user_id))
+            try:
+                shard.execute(
+                    "INSERT OR REPLACE INTO users (id, name, email, created_at) VALUES (?, ?, ?, ?)",
+                    (user_id, name.strip(), email_value, now),
+                )
+                shard.commit()
+            finally:
+                shard.close()
         conn.commit()
-        return {"user_id": int(cursor.lastrowid), "name": name.strip(), "email": email_value}
+        return {"user_id": user_id, "name": name.strip(), "email": email_value}
     finally:
         conn.close()
 
@@ -104,35 +645,56 @@ def get_user_by_email(email: str) -> Optional[Dict]:
         conn.close()
 
 
+def user_exists(user_id: int) -> bool:
+    conn = _connect()
+    try:
+        return conn.execute("SELECT 1 FROM users WHERE id = ?", (int(user_id),)).fetchone() is not None
+    finally:
+        conn.close()
+
+
 def _validate_user_exists(conn: sqlite3.Connection, user_id: int) -> None:
     row = conn.execute("SELECT id FROM users WHERE id = ?", (user_id,)).fetchone()
     if not row:
         raise ValueError(f"User {user_id} not found")
 
 
-def _recompute_metrics(conn: sqlite3.Connection, user_id: int, as_of_date: str) -> Dict:
-    agg = conn.execute(
-        """
-        SELECT
-            AVG(daily_sales) AS avg_daily_sales,
-            AVG(daily_expenses) AS avg_daily_expenses,
-            AVG(receivables) AS avg_receivables,
-            AVG(loan_emi) AS avg_loan_emi,
-            AVG(cash_balance) AS avg_cash_balance,
-            COUNT(*) AS cnt
-        FROM daily_checkins
-        WHERE user_id = ?
-          AND checkin_date BETWEEN date(?, '-29 day') AND date(?)
-        """,
-        (user_id, as_of_date, as_of_date),
+def _compacted_month(conn: sqlite3.Connection, user_id: int) -> Optional[str]:
+    row = conn.execute(
+        "SELECT month FROM monthly_checkin_rollups WHERE user_id = ? ORDER BY month DESC LIMIT 1", (user_id,)
     ).fetchone()
+    return row["month"] if row else None
+
+
+def check_checkin(payload: Dict) -> None:
+    """Raise the ValueError upsert_daily_checkin would raise for `payload`, without writing it."""
+    user_id = int(payload["user_id"])
+    checkin_date = (payload.get("checkin_date") or date.today().isoformat()).strip()
+    for name in ROLLING_WINDOW_METRICS:
+        if float(payload[name]) != float(payload[name]):
+            raise ValueError(f"NOT NULL constraint failed: daily_checkins.{name}")
+    conn = _connect(_shard_path(user_id))
+    try:
+        _validate_user_exists(conn, user_id)
+        # Compaction never passes the retention cutoff, so newer dates skip the lookup.
+        if checkin_date[:7] < retention_cutoff()[:7]:
+            compacted = _compacted_month(conn, user_id)
+            if compacted and checkin_date[:7] <= compacted:
+                raise compacted_error(compacted)
+    finally:
+        conn.close()
 
-    avg_daily_sales = float(agg["avg_daily_sales"] or 0.0)
-    avg_daily_expenses = float(agg["avg_daily_expenses"] or 0.0)
-    avg_receivables = float(agg["avg_receivables"] or 0.0)
-    avg_loan_emi = float(agg["avg_loan_emi"] or 0.0)
-    avg_cash_balance = float(agg["avg_cash_balance"] or 0.0)
-    window_days = int(agg["cnt"] or 0)
+
+def _recompute_metrics(conn: sqlite3.Connection, user_id: int, as_of_date: str) -> Dict:
+    window = _period_totals(conn, user_id, as_of_date, [(30, 0)])[0]
+    count = window["days"]
+
+    avg_daily_sales = window["daily_sales"] / count if count else 0.0
+    avg_daily_expenses = window["daily_expenses"] / count if count else 0.0
+    avg_receivables = window["receivables"] / count if count else 0.0
+    avg_loan_emi = window["loan_emi"] / count if count else 0.0
+    avg_cash_balance = window["cash_balance"] / count if count else 0.0
+    window_days = int(count)
     updated_at = datetime.utcnow().isoformat(timespec="seconds")
 
     monthly_sales = avg_daily_sales * 30.0
@@ -146,9 +708,9 @@ def _recompute_metrics(conn: sqlite3.Connection, user_id: int, as_of_date: str)
         INSERT INTO user_metrics (
             user_id, last_checkin_date, monthly_sales, monthly_expenses,
             monthly_receivables, monthly_loan_emi, monthly_cash_balance,
-            window_days, updated_at
+            window_days, updated_at, version
         )
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1)
         ON CONFLICT(user_id) DO UPDATE SET
             last_checkin_date = excluded.last_checkin_date,
             monthly_sales = excluded.monthly_sales,
@@ -157,7 +719,8 @@ def _recompute_metrics(conn: sqlite3.Connection, user_id: int, as_of_date: str)
             monthly_loan_emi = excluded.monthly_loan_emi,
             monthly_cash_balance = excluded.monthly_cash_balance,
             window_days = excluded.window_days,
-            updated_at = excluded.updated_at
+            updated_at = excluded.updated_at,
+            version = user_metrics.version + 1
         """,
         (
             user_id,
@@ -184,49 +747,64 @@ def _recompute_metrics(conn: sqlite3.Connection, user_id: int, as_of_date: str)
     }
 
 
-def upsert_daily_checkin(payload: Dict) -> Dict:
+_UPSERT_CHECKIN_SQL = """
+    INSERT INTO daily_checkins (
+        user_id, checkin_date, daily_sales, daily_expenses,
+        receivables, loan_emi, cash_balance, created_at, updated_at
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(user_id, checkin_date) DO UPDATE SET
+        daily_sales = excluded.daily_sales,
+        daily_expenses = excluded.daily_expenses,
+        receivables = excluded.receivables,
+        loan_emi = excluded.loan_emi,
+        cash_balance = excluded.cash_balance,
+        updated_at = excluded.updated_at
+"""
+
+
+def _checkin_params(user_id: int, checkin_date: str, payload: Dict, now: str) -> tuple:
+    return (
+        user_id,
+        checkin_date,
+        float(payload["daily_sales"]),
+        float(payload["daily_expenses"]),
+        float(payload["receivables"]),
+        float(payload["loan_emi"]),
+        float(payload["cash_balance"]),
+        now,
+        now,
+    )
+
+
+def upsert_daily_checkin(payload: Dict, with_rolling: bool = False) -> Dict:
+    """
+    Write one check-in, its running totals and the user's metrics. With
+    `with_rolling`, the result also carries "rolling": compute_rolling_metrics
+    as of the check-in date, read in the same transaction.
+    """
     user_id = int(payload["user_id"])
     checkin_date = (payload.get("checkin_date") or date.today().isoformat()).strip()
     now = datetime.utcnow().isoformat(timespec="seconds")
 
-    conn = _connect()
+    conn = _connect(_shard_path(user_id))
     try:
         _validate_user_exists(conn, user_id)
+        compacted = _compacted_month(conn, user_id)
+        if compacted and checkin_date[:7] <= compacted:
+            raise compacted_error(compacted)
 
         existing = conn.execute(
             "SELECT id FROM daily_checkins WHERE user_id = ? AND checkin_date = ?",
             (user_id, checkin_date),
         ).fetchone()
 
-        conn.execute(
-            """
-            INSERT INTO daily_checkins (
-                user_id, checkin_date, daily_sales, daily_expenses,
-                receivables, loan_emi, cash_balance, created_at, updated_at
-            )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(user_id, checkin_date) DO UPDATE SET
-                daily_sales = excluded.daily_sales,
-                daily_expenses = excluded.daily_expenses,
-                receivables = excluded.receivables,
-                loan_emi = excluded.loan_emi,
-                cash_balance = excluded.cash_balance,
-                updated_at = excluded.updated_at
-            """,
-            (
-                user_id,
-                checkin_date,
-                float(payload["daily_sales"]),
-                float(payload["daily_expenses"]),
-                float(payload["receivables"]),
-                float(payload["loan_emi"]),
-                float(payload["cash_balance"]),
-                now,
-                now,
-            ),
-        )
+        conn.execute(_UPSERT_CHECKIN_SQL, _checkin_params(user_id, checkin_date, payload, now))
+        _refresh_prefix_sums(conn, user_id, checkin_date)
 
         metrics = _recompute_metrics(conn, user_id=user_id, as_of_date=checkin_date)
+        if with_rolling:
+            metrics["rolling"] = _rolling_metrics(conn, user_id, checkin_date)
         conn.commit()
         metrics["updated"] = bool(existing)
         return metrics
@@ -234,62 +812,523 @@ def upsert_daily_checkin(payload: Dict) -> Dict:
         conn.close()
 
 
+def bulk_upsert_daily_checkins(user_id: int, payloads: List[Dict]) -> Dict:
+    """
+    Upsert many check-ins for one user in a single transaction.
+
+    Rows that cannot be written are reported by their index in `payloads`
+    with the same messages upsert_daily_checkin would raise. user_metrics is
+    recomputed once, as of the last written row (what a row-by-row import
+    ends with).
+
+    Returns {"processed": int, "errors": [{"index", "error"}], "metrics": dict|None}.
+    """
+    user_id = int(user_id)
+    now = datetime.utcnow().isoformat(timespec="seconds")
+    errors: List[Dict] = []
+    params = []
+    last_date = None
+    for idx, payload in enumerate(payloads):
+        try:
+            checkin_date = (payload.get("checkin_date") or date.today().isoformat()).strip()
+            params.append((idx, _checkin_params(user_id, checkin_date, payload, now)))
+            last_date = checkin_date
+        except (KeyError, TypeError, ValueError) as exc:
+            errors.append({"index": idx, "error": str(exc)})
+
+    conn = _connect(_shard_path(user_id))
+    try:
+        try:
+            _validate_user_exists(conn, user_id)
+        except ValueError as exc:
+            return {
+                "processed": 0,
+                "errors": [{"index": idx, "error": str(exc)} for idx in range(len(payloads))],
+                "metrics": None,
+            }
+        compacted = _compacted_month(conn, user_id)
+        if compacted:
+            kept = []
+            for idx, row_params in params:
+                if row_params[1][:7] <= compacted:
+                    errors.append({"index": idx, "error": str(compacted_error(compacted))})
+                else:
+                    kept.append((idx, row_params))
+            if len(kept) < len(params):
+                params = kept
+                last_date = params[-1][1][1] if params else None
+                errors.sort(key=lambda e: e["index"])
+
+        metrics = None
+        processed = len(params)
+        if params:
+            # Explicit BEGIN so releasing the savepoint does not commit early.
+            conn.execute("BEGIN")
+            conn.execute("SAVEPOINT bulk_checkins")
+            try:
+                conn.executemany(_UPSERT_CHECKIN_SQL, [p for _, p in params])
+                conn.execute("RELEASE bulk_checkins")
+            except sqlite3.Error:
+                # Some row violates a constraint (e.g. NaN stored as NULL):
+                # replay row by row so only the offending rows are reported.
+                conn.execute("ROLLBACK TO bulk_checkins")
+                conn.execute("RELEASE bulk_checkins")
+                processed = 0
+                for idx, row_params in params:
+                    try:
+                        conn.execute(_UPSERT_CHECKIN_SQL, row_params)
+                        processed += 1
+                        last_date = row_params[1]
+                    except sqlite3.Error as exc:
+                        errors.append({"index": idx, "error": str(exc)})
+                errors.sort(key=lambda e: e["index"])
+            if processed:
+                _refresh_prefix_sums(conn, user_id, min(p[1] for _, p in params))
+                metrics = _recompute_metrics(conn, user_id=user_id, as_of_date=last_date)
+            conn.commit()
+        return {"processed": processed, "errors": errors, "metrics": metrics}
+    finally:
+        conn.close()
+
+
+_METRICS_SELECT = """
+    SELECT
+        user_id, last_checkin_date, monthly_sales, monthly_expenses,
+        monthly_receivables, monthly_loan_emi, monthly_cash_balance
+    FROM user_metrics
+"""
+
+
+def _metrics_from_row(row) -> Dict:
+    return {
+        "user_id": int(row["user_id"]),
+        "last_checkin_date": row["last_checkin_date"],
+        "monthly_sales": _money(row["monthly_sales"]) if row["monthly_sales"] is not None else None,
+        "monthly_expenses": _money(row["monthly_expenses"]) if row["monthly_expenses"] is not None else None,
+        "monthly_receivables": _money(row["monthly_receivables"]) if row["monthly_receivables"] is not None else None,
+        "monthly_loan_emi": _money(row["monthly_loan_emi"]) if row["monthly_loan_emi"] is not None else None,
+        "monthly_cash_balance": _money(row["monthly_cash_balance"]) if row["monthly_cash_balance"] is not None else None,
+    }
+
+
 def get_user_metrics(user_id: int) -> Optional[Dict]:
-    conn = _connect()
+    conn = _connect(_shard_path(user_id))
     try:
-        row = conn.execute(
+        row = conn.execute(_METRICS_SELECT + "WHERE user_id = ?", (int(user_id),)).fetchone()
+        return _metrics_from_row(row) if row else None
+    finally:
+        conn.close()
+
+
+def _read_portfolio_metrics(path: str, user_ids: List[int]) -> List[Dict]:
+    conn = _connect(path)
+    try:
+        found = []
+        for offset in range(0, len(user_ids), _PORTFOLIO_BATCH):
+            chunk = user_ids[offset : offset + _PORTFOLIO_BATCH]
+            placeholders = ", ".join("?" for _ in chunk)
+            rows = conn.execute(_METRICS_SELECT + f"WHERE user_id IN ({placeholders})", chunk).fetchall()
+            found.extend(_metrics_from_row(row) for row in rows)
+        return found
+    finally:
+        conn.close()
+
+
+def _fanout_executor() -> ThreadPoolExecutor:
+    global _fanout_pool
+    with _fanout_lock:
+        if _fanout_pool is None:
+            _fanout_pool = ThreadPoolExecutor(max_workers=SQLITE_SHARDS, thread_name_prefix="sqlite-shard-read")
+        return _fanout_pool
+
+
+def get_checkin_version(user_id: int) -> int:
+    """Counter bumped by every committed check-in write for the user (0 before the first)."""
+    conn = _connect(_shard_path(int(user_id)))
+    try:
+        row = conn.execute("SELECT version FROM user_metrics WHERE user_id = ?", (int(user_id),)).fetchone()
+        return int(row["version"]) if row else 0
+    finally:
+        conn.close()
+
+
+def get_portfolio_metrics(user_ids: List[int]) -> List[Dict]:
+    """
+    user_metrics for many users, ordered by user_id; users without any
+    check-in are left out. In sharded mode each shard is read in parallel.
+    """
+    by_path: Dict[str, List[int]] = {}
+    for user_id in sorted({int(u) for u in user_ids}):
+        by_path.setdefault(_shard_path(user_id), []).append(user_id)
+    if len(by_path) > 1:
+        parts = list(_fanout_executor().map(lambda item: _read_portfolio_metrics(*item), by_path.items()))
+    else:
+        parts = [_read_portfolio_metrics(path, ids) for path, ids in by_path.items()]
+    return sorted((metrics for part in parts for metrics in part), key=lambda m: m["user_id"])
+
+
+def get_user_checkins(user_id: int, limit: int = 120) -> List[Dict]:
+    """Oldest first; compacted months come first as one per-check-in average each."""
+    conn = _connect(_shard_path(user_id))
+    try:
+        months = conn.execute(
+            """
+            SELECT month, checkin_days, daily_sales_sum, daily_expenses_sum
+            FROM monthly_checkin_rollups
+            WHERE user_id = ?
+            ORDER BY month ASC
+            LIMIT ?
+            """,
+            (int(user_id), int(limit)),
+        ).fetchall()
+        rows = conn.execute(
             """
-            SELECT
-                user_id, last_checkin_date, monthly_sales, monthly_expenses,
-                monthly_receivables, monthly_loan_emi, monthly_cash_balance
-            FROM user_metrics
+            SELECT checkin_date, daily_sales, daily_expenses
+            FROM daily_checkins
             WHERE user_id = ?
+            ORDER BY checkin_date ASC
+            LIMIT ?
+            """,
+            (int(user_id), int(limit) - len(months)),
+        ).fetchall()
+        return [month_record(row) for row in months] + [
+            {
+                "checkin_date": str(row["checkin_date"]),
+                "daily_sales": _money(row["daily_sales"]),
+                "daily_expenses": _money(row["daily_expenses"]),
+            }
+            for row in rows
+        ]
+    finally:
+        conn.close()
+
+
+def _page_bounds(column: str, start_date: Optional[str], end_date: Optional[str], after: Optional[str], descending: bool):
+    clauses, params = [], []
+    if start_date:
+        clauses.append(f"{column} >= ?")
+        params.append(start_date)
+    if end_date:
+        clauses.append(f"{column} <= ?")
+        params.append(end_date)
+    if after:
+        clauses.append(f"{column} {'<' if descending else '>'} ?")
+        params.append(after)
+    return "".join(f" AND {clause}" for clause in clauses), params
+
+
+def get_checkin_page(
+    user_id: int,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: int = 500,
+    descending: bool = False,
+) -> List[Dict]:
+    """
+    Up to `limit` check-ins dated start_date..end_date (inclusive, either
+    open) that come after the `after` date in the requested order: keyset
+    pagination on (user_id, checkin_date). Compacted months appear as one
+    row dated on the 1st with per-check-in averages (period "month").
+    """
+    order = "DESC" if descending else "ASC"
+    conn = _connect(_shard_path(user_id))
+    try:
+        raw_sql, raw_params = _page_bounds("checkin_date", start_date, end_date, after, descending)
+        month_sql, month_params = _page_bounds("(month || '-01')", start_date, end_date, after, descending)
+
+        def raw_rows(count: int) -> List[Dict]:
+            rows = conn.execute(
+                f"""
+                SELECT checkin_date, daily_sales, daily_expenses, receivables, loan_emi, cash_balance
+                FROM daily_checkins
+                WHERE user_id = ?{raw_sql}
+                ORDER BY checkin_date {order}
+                LIMIT ?
+                """,
+                (int(user_id), *raw_params, count),
+            ).fetchall()
+            return [
+                {
+                    "checkin_date": str(row["checkin_date"]),
+                    **{metric: _money(row[metric]) for metric in ROLLING_WINDOW_METRICS},
+                    "period": "day",
+                    "checkin_days": 1,
+                }
+                for row in rows
+            ]
+
+        def month_rows(count: int) -> List[Dict]:
+            rows = conn.execute(
+                f"""
+                SELECT * FROM monthly_checkin_rollups
+                WHERE user_id = ?{month_sql}
+                ORDER BY month {order}
+                LIMIT ?
+                """,
+                (int(user_id), *month_params, count),
+            ).fetchall()
+            return [page_row(row) for row in rows]
+
+        # Compacted months are older than every raw row.
+        first, second = (raw_rows, month_rows) if descending else (month_rows, raw_rows)
+        page = first(int(limit))
+        if len(page) < int(limit):
+            page.extend(second(int(limit) - len(page)))
+        return page
+    finally:
+        conn.close()
+
+
+def get_latest_checkin(user_id: int, as_of_date: Optional[str] = None) -> Optional[Dict]:
+    anchor_date = (as_of_date or date.today().isoformat()).strip()
+    conn = _connect(_shard_path(user_id))
+    try:
+        row = conn.execute(
+            """
+            SELECT checkin_date, daily_sales, daily_expenses, receivables, loan_emi, cash_balance
+            FROM daily_checkins
+            WHERE user_id = ? AND checkin_date <= ?
+            ORDER BY checkin_date DESC
+            LIMIT 1
             """,
-            (int(user_id),),
+            (int(user_id), anchor_date),
         ).fetchone()
         if not row:
-            return None
+            # Every raw row is newer than the compacted months, so only look there when none matched.
+            rollup = conn.execute(
+                """
+                SELECT * FROM monthly_checkin_rollups
+                WHERE user_id = ? AND last_checkin_date <= ?
+                ORDER BY month DESC
+                LIMIT 1
+                """,
+                (int(user_id), anchor_date),
+            ).fetchone()
+            return latest_row(user_id, rollup) if rollup else None
         return {
-            "user_id": int(row["user_id"]),
-            "last_checkin_date": row["last_checkin_date"],
-            "monthly_sales": _money(row["monthly_sales"]) if row["monthly_sales"] is not None else None,
-            "monthly_expenses": _money(row["monthly_expenses"]) if row["monthly_expenses"] is not None else None,
-            "monthly_receivables": _money(row["monthly_receivables"]) if row["monthly_receivables"] is not None else None,
-            "monthly_loan_emi": _money(row["monthly_loan_emi"]) if row["monthly_loan_emi"] is not None else None,
-            "monthly_cash_balance": _money(row["monthly_cash_balance"]) if row["monthly_cash_balance"] is not None else None,
+            "user_id": int(user_id),
+            "checkin_date": str(row["checkin_date"]),
+            "daily_sales": float(row["daily_sales"]),
+            "daily_expenses": float(row["daily_expenses"]),
+            "receivables": float(row["receivables"]),
+            "loan_emi": float(row["loan_emi"]),
+            "cash_balance": float(row["cash_balance"]),
         }
     finally:
         conn.close()
 
 
-def get_user_checkins(user_id: int, limit: int = 120) -> List[Dict]:
-    conn = _connect()
+def get_checkin_history(user_id: int, start_date: str, end_date: str) -> List[Dict]:
+    """
+    Full check-in rows dated start_date..end_date, oldest first, preceded by
+    the latest check-in before start_date (if any) so balances carry forward.
+    A compacted month appears as one row on its last check-in date (see
+    checkin_rollups.history_row).
+    """
+    conn = _connect(_shard_path(user_id))
     try:
+        _validate_user_exists(conn, int(user_id))
         rows = conn.execute(
             """
-            SELECT checkin_date, daily_sales, daily_expenses
+            SELECT checkin_date, daily_sales, daily_expenses, receivables, loan_emi, cash_balance
             FROM daily_checkins
             WHERE user_id = ?
+              AND checkin_date <= ?
+              AND checkin_date >= COALESCE(
+                  (SELECT MAX(checkin_date) FROM daily_checkins WHERE user_id = ? AND checkin_date < ?),
+                  ?
+              )
             ORDER BY checkin_date ASC
-            LIMIT ?
             """,
-            (int(user_id), int(limit)),
+            (int(user_id), end_date, int(user_id), start_date, start_date),
         ).fetchall()
-        return [
+        history = [
             {
                 "checkin_date": str(row["checkin_date"]),
-                "daily_sales": _money(row["daily_sales"]),
-                "daily_expenses": _money(row["daily_expenses"]),
+                "daily_sales": float(row["daily_sales"]),
+                "daily_expenses": float(row["daily_expenses"]),
+                "receivables": float(row["receivables"]),
+                "loan_emi": float(row["loan_emi"]),
+                "cash_balance": float(row["cash_balance"]),
             }
             for row in rows
         ]
+        if history and history[0]["checkin_date"] < start_date:
+            return history
+        rollups = conn.execute(
+            """
+            SELECT * FROM monthly_checkin_rollups
+            WHERE user_id = ?
+              AND last_checkin_date <= ?
+              AND last_checkin_date >= COALESCE(
+                  (SELECT MAX(last_checkin_date) FROM monthly_checkin_rollups WHERE user_id = ? AND last_checkin_date < ?),
+                  ?
+              )
+            ORDER BY month ASC
+            """,
+            (int(user_id), end_date, int(user_id), start_date, start_date),
+        ).fetchall()
+        return merge_history(history, [history_row(row) for row in rollups], start_date)
+    finally:
+        conn.close()
+
+
+def save_risk_report(report: Dict) -> None:
+    now = datetime.utcnow().isoformat(timespec="seconds")
+    conn = _connect(_shard_path(report["user_id"]))
+    try:
+        conn.execute(
+            """
+            INSERT INTO risk_reports (
+                run_id, user_id, as_of_date, risk_score, risk_level, report_json, created_at
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(run_id, user_id) DO UPDATE SET
+                as_of_date = excluded.as_of_date,
+                risk_score = excluded.risk_score,
+                risk_level = excluded.risk_level,
+                report_json = excluded.report_json,
+                created_at = excluded.created_at
+            """,
+            (
+                str(report["run_id"]),
+                int(report["user_id"]),
+                str(report["as_of_date"]),
+                int(report["risk_score"]),
+                str(report["risk_level"]),
+                json.dumps(report),
+                now,
+            ),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+_IMPORT_JOB_COLUMNS = [
+    "job_id",
+    "user_id",
+    "filename",
+    "file_path",
+    "status",
+    "total_bytes",
+    "bytes_processed",
+    "rows_consumed",
+    "processed_rows",
+    "failed_rows",
+    "errors_json",
+    "error",
+    "active_seconds",
+    "created_at",
+    "started_at",
+    "updated_at",
+    "finished_at",
+    "owner",
+    "lease_expires_at",
+]
+
+
+def _import_job_from_row(row) -> Dict:
+    job = {col: row[col] for col in _IMPORT_JOB_COLUMNS if col != "errors_json"}
+    job["errors"] = json.loads(row["errors_json"] or "[]")
+    return job
+
+
+def save_import_job(job: Dict, owner: Optional[str] = None) -> bool:
+    """
+    Insert or replace the job. With `owner`, only update a job that owner
+    still holds; False when another worker has claimed it since.
+    """
+    values = {**job, "errors_json": json.dumps(job.get("errors") or [])}
+    values["updated_at"] = datetime.utcnow().isoformat(timespec="seconds")
+    conn = _connect()
+    try:
+        if owner is None:
+            placeholders = ", ".join("?" for _ in _IMPORT_JOB_COLUMNS)
+            updates = ", ".join(f"{col} = excluded.{col}" for col in _IMPORT_JOB_COLUMNS if col != "job_id")
+            cursor = conn.execute(
+                f"""
+                INSERT INTO import_jobs ({", ".join(_IMPORT_JOB_COLUMNS)})
+                VALUES ({placeholders})
+                ON CONFLICT(job_id) DO UPDATE SET {updates}
+                """,
+                tuple(values.get(col) for col in _IMPORT_JOB_COLUMNS),
+            )
+        else:
+            columns = [col for col in _IMPORT_JOB_COLUMNS if col != "job_id"]
+            cursor = conn.execute(
+                f"UPDATE import_jobs SET {', '.join(f'{col} = ?' for col in columns)} WHERE job_id = ? AND owner = ?",
+                (*(values.get(col) for col in columns), str(job["job_id"]), owner),
+            )
+        conn.commit()
+        return cursor.rowcount > 0
+    finally:
+        conn.close()
+
+
+def claim_import_job(job_id: str, owner: str, lease_seconds: float, statuses: List[str]) -> Optional[Dict]:
+    """
+    Take the job for `owner` if its status is in `statuses` and nobody else
+    holds an unexpired lease on it: set it running with a lease of
+    `lease_seconds` and return it. None when it is finished or taken.
+    """
+    now = time.time()
+    placeholders = ", ".join("?" for _ in statuses)
+    conn = _connect()
+    try:
+        cursor = conn.execute(
+            f"""
+            UPDATE import_jobs
+            SET status = 'running', owner = ?, lease_expires_at = ?, updated_at = ?
+            WHERE job_id = ? AND status IN ({placeholders})
+              AND (owner IS NULL OR owner = ? OR lease_expires_at IS NULL OR lease_expires_at < ?)
+            """,
+            (
+                owner,
+                now + lease_seconds,
+                datetime.utcnow().isoformat(timespec="seconds"),
+                str(job_id),
+                *statuses,
+                owner,
+                now,
+            ),
+        )
+        conn.commit()
+        if cursor.rowcount == 0:
+            return None
+        row = conn.execute("SELECT * FROM import_jobs WHERE job_id = ?", (str(job_id),)).fetchone()
+        return _import_job_from_row(row)
+    finally:
+        conn.close()
+
+
+def get_import_job(job_id: str) -> Optional[Dict]:
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT * FROM import_jobs WHERE job_id = ?", (str(job_id),)).fetchone()
+        return _import_job_from_row(row) if row else None
+    finally:
+        conn.close()
+
+
+def list_import_jobs(statuses: List[str]) -> List[Dict]:
+    conn = _connect()
+    try:
+        placeholders = ", ".join("?" for _ in statuses)
+        rows = conn.execute(
+            f"SELECT * FROM import_jobs WHERE status IN ({placeholders}) ORDER BY created_at ASC",
+            tuple(statuses),
+        ).fetchall()
+        return [_import_job_from_row(row) for row in rows]
     finally:
         conn.close()
 
 
 def compute_rolling_metrics(user_id: int, as_of_date: Optional[str] = None) -> Dict:
     """
-    Compute rolling and previous 30-day aggregates from daily_checkins.
+    Compute rolling and previous 30-day aggregates (three running-total
+    lookups on daily_checkins).
 
     Returns:
       {
@@ -300,44 +1339,154 @@ def compute_rolling_metrics(user_id: int, as_of_date: Optional[str] = None) -> D
       }
     """
     anchor_date = (as_of_date or date.today().isoformat()).strip()
-    conn = _connect()
+    conn = _connect(_shard_path(user_id))
     try:
         _validate_user_exists(conn, int(user_id))
+        return _rolling_metrics(conn, int(user_id), anchor_date)
+    finally:
+        conn.close()
 
-        current = conn.execute(
-            """
-            SELECT
-              SUM(daily_sales) AS rolling_sales,
-              SUM(daily_expenses) AS rolling_expenses
-            FROM daily_checkins
-            WHERE user_id = ?
-              AND checkin_date BETWEEN date(?, '-29 day') AND date(?)
-            """,
-            (int(user_id), anchor_date, anchor_date),
-        ).fetchone()
 
-        previous = conn.execute(
-            """
-            SELECT
-              SUM(daily_sales) AS prev_sales,
-              SUM(daily_expenses) AS prev_expenses
-            FROM daily_checkins
-            WHERE user_id = ?
-              AND checkin_date BETWEEN date(?, '-59 day') AND date(?, '-30 day')
-            """,
-            (int(user_id), anchor_date, anchor_date),
-        ).fetchone()
+def _rolling_metrics(conn: sqlite3.Connection, user_id: int, anchor_date: str) -> Dict:
+    # (bound, days, sales, expenses) now, 30 and 60 days back.
+    now, month_ago, two_months_ago = _prefix_points(
+        conn, user_id, anchor_date, (0, 30, 60), ("cum_sales", "cum_expenses")
+    )
 
-        rolling_30_day_sales = float(current["rolling_sales"] or 0.0)
-        rolling_30_day_expenses = float(current["rolling_expenses"] or 0.0)
-        previous_30_day_sales = float(previous["prev_sales"] or 0.0)
-        previous_30_day_expenses = float(previous["prev_expenses"] or 0.0)
+    return {
+        "monthly_sales": _money(now[2] - month_ago[2]),
+        "monthly_expenses": _money(now[3] - month_ago[3]),
+        "sales_3_months_ago": _money(month_ago[2] - two_months_ago[2]),
+        "expenses_3_months_ago": _money(month_ago[3] - two_months_ago[3]),
+    }
 
-        return {
-            "monthly_sales": _money(rolling_30_day_sales),
-            "monthly_expenses": _money(rolling_30_day_expenses),
-            "sales_3_months_ago": _money(previous_30_day_sales),
-            "expenses_3_months_ago": _money(previous_30_day_expenses),
-        }
+
+def compute_window_aggregates(
+    user_id: int,
+    windows: Optional[List[int]] = None,
+    metrics: Optional[List[str]] = None,
+    as_of_date: Optional[str] = None,
+    include_previous: bool = True,
+) -> Dict:
+    """
+    Totals and per-check-in averages over several trailing windows (default
+    7/30/90/365 days) and the equally long period before each.
+
+    All periods come from one statement, a running-total lookup per window
+    boundary, so the cost does not grow with window length.
+    """
+    anchor, windows, metrics = normalize_window_request(windows, metrics, as_of_date)
+    periods = window_periods(windows, include_previous)
+    conn = _connect(_shard_path(user_id))
+    try:
+        _validate_user_exists(conn, int(user_id))
+        totals = _period_totals(conn, int(user_id), anchor.isoformat(), periods, tuple(metrics))
     finally:
         conn.close()
+
+    summaries = {}
+    for (days, offset), period in zip(periods, totals):
+        summaries[(days, offset)] = period_summary(anchor, days, offset, period["days"], {m: period[m] for m in metrics})
+    return window_result(user_id, anchor, windows, summaries)
+
+
+_ROLLUP_COLUMNS = (
+    ["user_id", "month", "first_checkin_date", "last_checkin_date", "checkin_days"]
+    + [f"{metric}_{stat}" for metric in ROLLING_WINDOW_METRICS for stat in ("sum", "min", "max", "last")]
+    + ["cum_days"] + [cum for cum, _ in _PREFIX_COLUMNS]
+    + ["created_at"]
+)
+_ISO_DATE_GLOB = "[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]"
+
+
+def compact_checkins(before_date: Optional[str] = None, archive=None) -> Dict:
+    """
+    Fold check-ins in months before `before_date` (never past the retention
+    horizon) into monthly_checkin_rollups and delete the raw rows. Each user
+    is compacted in its own transaction. When `archive` is given, the raw
+    rows are written to it as JSON lines before they are deleted.
+
+    Returns {"before": str, "users": int, "months": int, "rows": int}.
+    """
+    boundary = compaction_boundary(before_date)
+    now = datetime.utcnow().isoformat(timespec="seconds")
+    stats = {"before": boundary, "users": 0, "months": 0, "rows": 0}
+    insert_sql = (
+        f"INSERT INTO monthly_checkin_rollups ({', '.join(_ROLLUP_COLUMNS)}) "
+        f"VALUES ({', '.join('?' for _ in _ROLLUP_COLUMNS)})"
+    )
+    for path in _data_paths():
+        conn = _connect(path)
+        try:
+            user_ids = [
+                int(row["user_id"])
+                for row in conn.execute(
+                    "SELECT DISTINCT user_id FROM daily_checkins WHERE checkin_date < ? AND checkin_date GLOB ?",
+                    (boundary, _ISO_DATE_GLOB),
+                )
+            ]
+            for user_id in user_ids:
+                rows = [
+                    dict(row)
+                    for row in conn.execute(
+                        """
+                        SELECT * FROM daily_checkins
+                        WHERE user_id = ? AND checkin_date < ? AND checkin_date GLOB ?
+                        ORDER BY checkin_date ASC
+                        """,
+                        (user_id, boundary, _ISO_DATE_GLOB),
+                    )
+                ]
+                rollups = build_rollups(rows, now)
+                if archive is not None:
+                    for row in rows:
+                        archive.write(json.dumps(row) + "\n")
+                    archive.flush()
+                conn.execute("BEGIN")
+                conn.executemany(insert_sql, [(user_id,) + tuple(r[c] for c in _ROLLUP_COLUMNS[1:]) for r in rollups])
+                conn.execute(
+                    "DELETE FROM daily_checkins WHERE user_id = ? AND checkin_date < ? AND checkin_date GLOB ?",
+                    (user_id, boundary, _ISO_DATE_GLOB),
+                )
+                conn.commit()
+                stats["users"] += 1
+                stats["months"] += len(rollups)
+                stats["rows"] += len(rows)
+        finally:
+            conn.close()
+    return stats
+
+
+def iter_table_rows(
+    table: str, since: Optional[str] = None, until: Optional[str] = None, batch_rows: int = 5000
+) -> Iterator[List[Dict]]:
+    """
+    Rows of an export table (db/export_tables.py) whose timestamp is in
+    [since, until), in batches of up to `batch_rows`, shard by shard. Each
+    batch is one keyset step along the timestamp index, so memory stays
+    flat however large the table is.
+    """
+    spec = export_spec(table)
+    columns, stamp = spec["columns"], spec["timestamp"]
+    sql = f"""
+        SELECT rowid AS _rowid, {", ".join(columns)}
+        FROM {table}
+        WHERE ({stamp}, rowid) > (?, ?) AND {stamp} < ?
+        ORDER BY {stamp}, rowid
+        LIMIT ?
+    """
+    for path in _data_paths():
+        position = (since or "", 0)
+        while True:
+            conn = _connect(path)
+            try:
+                rows = conn.execute(sql, (*position, until or "\uffff", int(batch_rows))).fetchall()
+            finally:
+                conn.close()
+            if not rows:
+                break
+            yield [{column: row[column] for column in columns} for row in rows]
+            if len(rows) < int(batch_rows):
+                break
+            position = (rows[-1][stamp], rows[-1]["_rowid"])
+
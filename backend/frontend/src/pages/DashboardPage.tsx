@@ -9,6 +9,7 @@ import { useLanguage } from "@/lib/i18n";
 
 const API_BASE = import.meta.env.VITE_API_BASE_URL || "http://127.0.0.1:8000";
 const REQUEST_TIMEOUT_MS = 60000;
+const HISTORY_DAYS = 365;
 const TOUR_STORAGE_KEY = "finpilot_dashboard_tour_done_v1";
 const formatINR = (value: number) => `₹${Number(value || 0).toLocaleString()}`;
 const metricsCacheKey = (userId: number) => `finpilot_metrics_user_${userId}`;
@@ -117,7 +118,7 @@ const DashboardPage = () => {
 
         const [metricsResp, historyResp] = await Promise.all([
           withTimeout(`${API_BASE}/users/${userId}/metrics`),
-          withTimeout(`${API_BASE}/users/${userId}/checkins`),
+          withTimeout(`${API_BASE}/users/${userId}/checkins?order=desc&limit=${HISTORY_DAYS}`),
         ]);
         if (metricsResp.ok) {
           const data = await metricsResp.json();
@@ -127,7 +128,8 @@ const DashboardPage = () => {
         }
         if (historyResp.ok) {
           const rows = await historyResp.json();
-          const safeRows = Array.isArray(rows) ? rows : [];
+          // Newest first from the API; charts want oldest first.
+          const safeRows = Array.isArray(rows) ? rows.reverse() : [];
           setHistory(safeRows);
           localStorage.setItem(historyCacheKey(userId), JSON.stringify(safeRows));
         }
@@ -272,7 +274,7 @@ const DashboardPage = () => {
   const refreshDashboardData = async (userId: number) => {
     const [metricsResp, historyResp] = await Promise.all([
       withTimeout(`${API_BASE}/users/${userId}/metrics`),
-      withTimeout(`${API_BASE}/users/${userId}/checkins`),
+      withTimeout(`${API_BASE}/users/${userId}/checkins?order=desc&limit=${HISTORY_DAYS}`),
     ]);
     if (metricsResp.ok) {
       const data = await metricsResp.json();
@@ -282,7 +284,7 @@ const DashboardPage = () => {
     }
     if (historyResp.ok) {
       const rows = await historyResp.json();
-      const safeRows = Array.isArray(rows) ? rows : [];
+      const safeRows = Array.isArray(rows) ? rows.reverse() : [];
       setHistory(safeRows);
       localStorage.setItem(historyCacheKey(userId), JSON.stringify(safeRows));
     }
@@ -144,8 +144,22 @@ const FinancialInputPage = () => {
       userId = null;
     }
 
-    const checkinResponse = userId
-      ? await fetch(`${API_BASE}/checkins/daily`, {
+    // Signed-in users check in and get scored in one round trip (score=true);
+    // otherwise the monthly figures go straight to /predict.
+    const readError = async (resp: Response, path: string) => {
+      let detail = "";
+      try {
+        const err = await resp.json();
+        detail = err?.detail ? String(err.detail) : "";
+      } catch {
+        detail = "";
+      }
+      return { __error: detail || `HTTP ${resp.status} from ${API_BASE}${path}` };
+    };
+
+    let checkinResponse: Record<string, unknown> | null = null;
+    const predictPromise = userId
+      ? fetch(`${API_BASE}/checkins/daily?score=true`, {
           method: "POST",
           headers: { "Content-Type": "application/json" },
           body: JSON.stringify({
@@ -158,50 +172,28 @@ const FinancialInputPage = () => {
           }),
         })
           .then(async (resp) => {
-            if (!resp.ok) return null;
+            if (!resp.ok) return await readError(resp, "/checkins/daily");
+            const { prediction, ...checkin } = await resp.json();
+            checkinResponse = checkin;
+            return prediction;
+          })
+          .catch(() => ({ __error: `Network error while calling ${API_BASE}/checkins/daily` }))
+      : fetch(`${API_BASE}/predict`, {
+          method: "POST",
+          headers: { "Content-Type": "application/json" },
+          body: JSON.stringify({
+            monthly_sales: monthlySales,
+            monthly_expenses: monthlyExpenses,
+            receivables,
+            loan_emi: emi,
+            cash_balance: cash,
+          }),
+        })
+          .then(async (resp) => {
+            if (!resp.ok) return await readError(resp, "/predict");
             return await resp.json();
           })
-          .catch(() => null)
-      : null;
-
-    const predictPayload = userId
-      ? {
-          user_id: userId,
-          use_daily_mode: true,
-          receivables,
-          loan_emi: emi,
-          cash_balance: cash,
-        }
-      : {
-          // Fallback to manual mode only if session user is unavailable.
-          monthly_sales: monthlySales,
-          monthly_expenses: monthlyExpenses,
-          receivables,
-          loan_emi: emi,
-          cash_balance: cash,
-        };
-
-    const predictPromise = fetch(`${API_BASE}/predict`, {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify(predictPayload),
-    })
-      .then(async (resp) => {
-        if (!resp.ok) {
-          let detail = "";
-          try {
-            const err = await resp.json();
-            detail = err?.detail ? String(err.detail) : "";
-          } catch {
-            detail = "";
-          }
-          return {
-            __error: detail || `HTTP ${resp.status} from ${API_BASE}/predict`,
-          };
-        }
-        return await resp.json();
-      })
-      .catch(() => ({ __error: `Network error while calling ${API_BASE}/predict` }));
+          .catch(() => ({ __error: `Network error while calling ${API_BASE}/predict` }));
 
     const minLoadingPromise = new Promise((resolve) => window.setTimeout(resolve, 1600));
     const [predictResponse] = await Promise.all([predictPromise, minLoadingPromise]);
@@ -1,11 +1,19 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import HTTPException, UploadFile, File
-from typing import List
-import json
-import csv
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi import HTTPException, UploadFile, File, Header, Query, Response
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
+import codecs
 import io
-from datetime import datetime
+import shutil
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
 
 from schemas.request_response import (
     InputData,
@@ -18,22 +26,90 @@ from schemas.request_response import (
     DailyCheckinResponse,
     UserMetricsResponse,
     DailyCheckinRecord,
+    ImportJobResponse,
+    WindowAggregatesResponse,
+    RiskHistoryResponse,
 )
 
 from rules.rule_engine import evaluate_rules
-from utils.feature_engineering import compute_features
-from ml.predictor import predict_risk
-from xai.explain import generate_llm_explanation
+from services.scoring import (
+    apply_rolling_metrics,
+    apply_rolling_metrics_async,
+    build_llm_explanation_ui,
+    build_llm_prompt,
+    compute_survival_metrics,
+    inject_rolling_metrics,
+    llm_timeout_seconds,
+    risk_level_for,
+    score_input,
+)
+from utils.risk_history import history_dates, history_start, score_history
+from utils.checkin_buffer import (
+    enqueue_checkin,
+    flush_user,
+    start_checkin_flusher,
+    stop_checkin_flusher,
+    write_behind_enabled,
+)
+from utils.checkin_pages import (
+    DEFAULT_FIELDS,
+    MAX_PAGE_ROWS,
+    PERIOD_FIELDS,
+    decode_cursor,
+    default_fields,
+    iter_ndjson,
+    next_cursor,
+    parse_date,
+    parse_fields,
+    project,
+    to_columns,
+)
+from utils.columnar_export import EXPORT_FORMATS, iter_arrow_stream, write_export_file
+from utils.csv_import import iter_checkin_chunks, open_checkin_csv
+from utils.profiling import (
+    PROFILE_FORMATS,
+    ProfilingMiddleware,
+    get_request_profile,
+    is_admin,
+    memory_diff,
+    profile_worker,
+    profiling_enabled,
+    stop_memory_tracing,
+    validate_profile_request,
+)
+from utils.latency import CONTENT_TYPE as METRICS_CONTENT_TYPE, LatencyMiddleware, render_metrics, span
+from utils.import_jobs import (
+    import_file_path,
+    import_job_status,
+    merge_errors,
+    start_import_workers,
+    stop_import_workers,
+    submit_import_job,
+    upsert_checkin_chunk,
+)
+from xai.explain import (
+    close_async_client as close_llm_client,
+    generate_llm_explanation_admitted,
+    generate_llm_explanation_admitted_async,
+    get_llm_admission_stats,
+)
 import os
 from db.storage import (
     init_db,
+    close_db,
     create_user,
     get_user_by_email,
-    upsert_daily_checkin,
-    get_user_metrics,
-    get_user_checkins,
-    compute_rolling_metrics,
+    get_import_job,
+    get_portfolio_metrics,
+    get_checkin_page,
+    compute_window_aggregates,
+    get_checkin_history,
+    get_read_cache_stats,
+    get_hot_series_stats,
 )
+from db import storage_async
+from db.read_cache import content_etag
+from db.rolling_windows import normalize_window_request
 
 
 app = FastAPI(
@@ -42,217 +118,17 @@ app = FastAPI(
 )
 
 
-def _llm_timeout_seconds() -> float:
-    raw = os.getenv("LLM_TIMEOUT_SECONDS", "20").strip()
-    try:
-        value = float(raw)
-    except ValueError:
-        return 20.0
-    return max(1.0, value)
-
-
-def _build_llm_prompt(risk_score, risk_level, features, reasons, actions):
-    return (
-        "You are a helpful financial guide for small business owners with no finance background.\n"
-        "Return ONLY valid JSON (no markdown) using this schema:\n"
-        "{\"summary\": string, \"key_drivers\": string[], \"immediate_actions\": string[]}\n"
-        "Rules:\n"
-        "- Use simple everyday language (grade 6-8).\n"
-        "- Avoid jargon. If needed, explain in plain words.\n"
-        "- Speak directly to the user as 'your business'.\n"
-        "- summary: max 2 short sentences.\n"
-        "- key_drivers: 2-4 short bullet points.\n"
-        "- immediate_actions: 2-4 concrete next steps for this week.\n\n"
-        "Grounding requirements (strict):\n"
-        "- Use the provided reasons/actions as the primary source of truth.\n"
-        "- Mention at least 2 concrete risk drivers from reasons.\n"
-        "- Mention at least 2 concrete actions from actions.\n"
-        "- Include at least 1 numeric fact from risk score or engineered features.\n"
-        "- Do not invent new drivers that are not implied by reasons/features.\n\n"
-        f"risk_score: {risk_score}\n"
-        f"risk_level: {risk_level}\n"
-        "engineered_features:\n"
-        f"- profit_margin: {features.get('profit_margin', 0.0):.4f}\n"
-        f"- receivables_ratio: {features.get('receivables_ratio', 0.0):.4f}\n"
-        f"- emi_ratio: {features.get('emi_ratio', 0.0):.4f}\n"
-        f"- cash_buffer: {features.get('cash_buffer_months', 0.0):.4f}\n"
-        f"- sales_growth_rate: {features.get('sales_growth_rate', 0.0):.4f}\n"
-        f"- expense_growth_rate: {features.get('expense_growth_rate', 0.0):.4f}\n"
-        f"reasons: {reasons}\n"
-        f"actions: {actions}\n"
-    )
-
-
-def _extract_json_object(text: str):
-    text = (text or "").strip()
-    if not text:
-        return None
-
-    try:
-        obj = json.loads(text)
-        if isinstance(obj, dict):
-            return obj
-    except Exception:
-        pass
-
-    start = text.find("{")
-    end = text.rfind("}")
-    if start == -1 or end == -1 or end <= start:
-        return None
-    try:
-        obj = json.loads(text[start : end + 1])
-        if isinstance(obj, dict):
-            return obj
-    except Exception:
-        return None
-    return None
-
-
-def _to_string_list(value):
-    if not isinstance(value, list):
-        return []
-    return [str(v).strip() for v in value if str(v).strip()]
-
-
-def _simplify_phrase(text: str) -> str:
-    simple = str(text or "").strip()
-    replacements = {
-        "receivables": "pending customer payments",
-        "EMI": "loan payment",
-        "liquidity": "available cash",
-        "cash flow": "money coming in and going out",
-        "operational costs": "running costs",
-        "debt service": "loan repayment",
-        "refinance": "rework your loan terms",
-        "discretionary expenses": "non-essential expenses",
-    }
-    for src, tgt in replacements.items():
-        simple = simple.replace(src, tgt)
-    return simple
-
-
-def _is_vague_text(text: str) -> bool:
-    content = str(text or "").strip().lower()
-    if not content:
-        return True
-    vague_phrases = [
-        "high risk due to",
-        "improve financial situation",
-        "key issues below",
-        "face pressure soon",
-        "take immediate action",
-        "monitor closely",
-    ]
-    # Treat as vague when it only contains generic phrases and no numbers.
-    has_number = any(ch.isdigit() for ch in content)
-    if has_number:
-        return False
-    return any(phrase in content for phrase in vague_phrases)
-
-
-def _merge_distinct(primary, fallback, limit=4):
-    merged = []
-    for item in list(primary or []) + list(fallback or []):
-        val = _simplify_phrase(str(item or "").strip())
-        if not val:
-            continue
-        key = val.lower()
-        if any(existing.lower() == key for existing in merged):
-            continue
-        merged.append(val)
-        if len(merged) >= limit:
-            break
-    return merged
-
-
-def _build_llm_explanation_ui(llm_explanation, risk_score, risk_level, reasons, actions):
-    parsed = _extract_json_object(llm_explanation or "")
-    if parsed:
-        summary = _simplify_phrase(str(parsed.get("summary") or "").strip())
-        if not summary or _is_vague_text(summary):
-            summary = _simplify_phrase(
-                f"Risk is {risk_level} ({risk_score}/100). Main issues: "
-                + "; ".join([str(i) for i in reasons[:2]])
-                + ". Start with: "
-                + "; ".join([str(i) for i in actions[:2]])
-                + "."
-            )
-
-        key_drivers = _merge_distinct(_to_string_list(parsed.get("key_drivers")), reasons, limit=4)
-        immediate_actions = _merge_distinct(_to_string_list(parsed.get("immediate_actions")), actions, limit=4)
-
-        if summary and key_drivers and immediate_actions:
-            return {
-                "summary": summary,
-                "key_drivers": key_drivers,
-                "immediate_actions": immediate_actions,
-            }
-
-    fallback_summary = (
-        f"Risk is {risk_level} ({risk_score}/100). "
-        "Your business may face pressure soon, so focus on the key issues below first."
-    )
-    return {
-        "summary": _simplify_phrase(fallback_summary),
-        "key_drivers": [_simplify_phrase(i) for i in reasons[:4]],
-        "immediate_actions": [_simplify_phrase(i) for i in actions[:4]],
-    }
-
-
-def _to_float(value, default: float = 0.0) -> float:
-    try:
-        return float(value) if value is not None else float(default)
-    except (TypeError, ValueError):
-        return float(default)
-
-
-def _round2(value: float) -> float:
-    return round(float(value), 2)
+_CSV_READ_BLOCK_BYTES = 1024 * 1024
+_PORTFOLIO_MAX_USERS = 5000
+# Smaller responses are not worth the CPU; long check-in histories shrink ~5x.
+_GZIP_MINIMUM_BYTES = 1024
 
 
-def _pick_csv_value(row: dict, keys: List[str]):
-    for key in keys:
-        if key in row and str(row.get(key) or "").strip() != "":
-            return row.get(key)
-    return None
-
-
-def _parse_csv_float(value, default: float = 0.0) -> float:
-    if value is None:
-        return float(default)
-    text = str(value).strip()
-    if not text:
-        return float(default)
-    cleaned = (
-        text.replace(",", "")
-        .replace("₹", "")
-        .replace("$", "")
-        .replace("rs", "")
-        .replace("RS", "")
-        .strip()
-    )
-    try:
-        return float(cleaned)
-    except ValueError:
-        raise ValueError(f"Invalid numeric value: '{text}'")
-
-
-def _normalize_csv_date(value: str) -> str:
-    text = str(value or "").strip()
-    if not text:
-        raise ValueError("Missing date/checkin_date value")
-    # Accept YYYY-MM-DD directly.
+def _csv_chunk_rows() -> int:
     try:
-        return datetime.strptime(text, "%Y-%m-%d").date().isoformat()
+        return max(1, int(os.getenv("CSV_IMPORT_CHUNK_ROWS", "5000").strip()))
     except ValueError:
-        pass
-    # Accept DD/MM/YYYY and MM/DD/YYYY style.
-    for fmt in ("%d/%m/%Y", "%m/%d/%Y", "%d-%m-%Y", "%m-%d-%Y"):
-        try:
-            return datetime.strptime(text, fmt).date().isoformat()
-        except ValueError:
-            continue
-    raise ValueError(f"Unsupported date format: '{text}'")
+        return 5000
 
 
 def _is_daily_mode(input_dict: dict) -> bool:
@@ -263,67 +139,103 @@ def _is_daily_mode(input_dict: dict) -> bool:
     return input_dict.get("user_id") is not None
 
 
-def compute_survival_metrics(input_dict):
-    monthly_sales = _to_float(input_dict.get("monthly_sales"))
-    monthly_expenses = _to_float(input_dict.get("monthly_expenses"))
-    receivables = _to_float(input_dict.get("receivables"))
-    cash_balance = _to_float(input_dict.get("cash_balance"))
+# Speculative explanation pre-generation (opt-in via LLM_SPECULATIVE_PREGEN=1).
+# After a daily check-in we already know everything /predict will compute, so
+# score it in the background and warm the explanation cache. A newer check-in
+# for the same user supersedes (cancels or skips) the older job.
+_speculative_lock = threading.Lock()
+_speculative_executor = None
+_speculative_jobs = {}
+_speculative_stats = {"scheduled": 0, "cancelled": 0, "stale": 0, "warmed": 0, "failed": 0}
+
 
-    monthly_loss_raw = monthly_expenses - monthly_sales
-    monthly_loss = monthly_loss_raw if monthly_loss_raw > 0 else 0.0
+def _speculative_enabled() -> bool:
+    return os.getenv("LLM_SPECULATIVE_PREGEN", "0").strip().lower() in {"1", "true", "yes"}
 
-    if monthly_loss > 0:
-        cash_runway_months = cash_balance / monthly_loss if monthly_loss != 0 else 12.0
-    else:
-        cash_runway_months = 12.0
 
-    estimated_days_left = cash_runway_months * 30.0
-    break_even_sales_required = monthly_expenses
+def _speculative_workers() -> int:
+    try:
+        return max(1, int(os.getenv("LLM_SPECULATIVE_WORKERS", "2").strip()))
+    except ValueError:
+        return 2
 
-    recommended_collection_target = 0.0
-    if monthly_sales > 0 and receivables > 0.2 * monthly_sales:
-        recommended_collection_target = 0.25 * receivables
 
-    recommended_expense_reduction = monthly_loss if monthly_loss > 0 else 0.0
-    recommended_sales_increase = monthly_loss if monthly_loss > 0 else 0.0
+def _is_current_speculative(user_id: int, token: int) -> bool:
+    with _speculative_lock:
+        entry = _speculative_jobs.get(user_id)
+        return entry is not None and entry[0] == token
 
-    if recommended_collection_target > 0:
-        top_fix = "Collect pending customer payments faster"
-        target_amount = recommended_collection_target
-        expected_impact = (
-            "Recovering this amount can immediately improve cash availability and extend runway."
-        )
-    elif recommended_expense_reduction > 0:
-        top_fix = "Reduce monthly expenses"
-        target_amount = recommended_expense_reduction
-        expected_impact = (
-            "Reducing this monthly amount can move your business closer to break-even."
-        )
-    elif recommended_sales_increase > 0:
-        top_fix = "Increase monthly sales"
-        target_amount = recommended_sales_increase
-        expected_impact = (
-            "Increasing sales by this amount can offset losses and improve stability."
+
+def _run_speculative_explanation(user_id: int, token: int, input_dict: dict) -> None:
+    try:
+        if not _is_current_speculative(user_id, token):
+            with _speculative_lock:
+                _speculative_stats["stale"] += 1
+            return
+        apply_rolling_metrics(input_dict)
+        scored = score_input(input_dict)
+        llm_prompt = build_llm_prompt(
+            scored["risk_score"], scored["risk_level"], scored["features"], scored["reasons"], scored["actions"]
         )
-    else:
-        top_fix = "Maintain current discipline"
-        target_amount = 0.0
-        expected_impact = "Your business is not currently in monthly loss."
+        # Last chance to drop the job before paying for the LLM call.
+        if not _is_current_speculative(user_id, token):
+            with _speculative_lock:
+                _speculative_stats["stale"] += 1
+            return
+        # Goes through admission, single-flight and the cache, so a /predict
+        # arriving mid-generation joins this call instead of starting another.
+        text = generate_llm_explanation_admitted(llm_prompt, timeout_seconds=llm_timeout_seconds())
+        with _speculative_lock:
+            _speculative_stats["warmed" if text else "failed"] += 1
+    except Exception:
+        with _speculative_lock:
+            _speculative_stats["failed"] += 1
+    finally:
+        with _speculative_lock:
+            entry = _speculative_jobs.get(user_id)
+            if entry is not None and entry[0] == token:
+                del _speculative_jobs[user_id]
+
 
+def _daily_predict_input(payload: dict, checkin_date: str) -> dict:
+    # Mirror the daily-mode /predict payload the frontend sends after a check-in.
     return {
-        "survival_analysis": {
-            "cash_runway_months": _round2(cash_runway_months),
-            "estimated_days_left": _round2(estimated_days_left),
-            "monthly_loss": _round2(monthly_loss),
-            "break_even_sales_required": _round2(break_even_sales_required),
-        },
-        "priority_action": {
-            "top_fix": top_fix,
-            "target_amount": _round2(target_amount),
-            "expected_impact": expected_impact,
-        },
+        "user_id": int(payload["user_id"]),
+        "use_daily_mode": True,
+        "as_of_date": checkin_date,
+        "receivables": payload.get("receivables"),
+        "loan_emi": payload.get("loan_emi"),
+        "cash_balance": payload.get("cash_balance"),
     }
 
+
+def _schedule_speculative_explanation(payload: dict, checkin_date: str) -> None:
+    global _speculative_executor
+    user_id = int(payload["user_id"])
+    input_dict = _daily_predict_input(payload, checkin_date)
+    with _speculative_lock:
+        if _speculative_executor is None:
+            _speculative_executor = ThreadPoolExecutor(
+                max_workers=_speculative_workers(),
+                thread_name_prefix="speculative-llm",
+            )
+        previous = _speculative_jobs.get(user_id)
+        token = previous[0] + 1 if previous else 1
+        if previous and previous[1].cancel():
+            _speculative_stats["cancelled"] += 1
+        # Register before submitting so the job sees itself as current.
+        _speculative_jobs[user_id] = (token, None)
+        future = _speculative_executor.submit(_run_speculative_explanation, user_id, token, input_dict)
+        if _speculative_jobs.get(user_id, (None,))[0] == token:
+            _speculative_jobs[user_id] = (token, future)
+        _speculative_stats["scheduled"] += 1
+
+
+def get_speculative_stats() -> dict:
+    with _speculative_lock:
+        return {**_speculative_stats, "pending": len(_speculative_jobs), "enabled": _speculative_enabled()}
+
+
 # Allow Expo (mobile + web) to access backend
 app.add_middleware(
     CORSMiddleware,
@@ -331,12 +243,33 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Server-Timing", "X-Profile-Id"],
 )
+app.add_middleware(GZipMiddleware, minimum_size=_GZIP_MINIMUM_BYTES)
+# X-Profile: 1 requests from an admin are sampled (see utils/profiling.py).
+app.add_middleware(ProfilingMiddleware)
+# Outermost, so request timings include compression (see utils/latency.py).
+app.add_middleware(LatencyMiddleware)
 
 
 @app.on_event("startup")
 def startup_event():
     init_db()
+    start_checkin_flusher()
+    start_import_workers()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # In order: stop everything that writes, then the storage threads (they
+    # hold pooled connections), and only then close the connections.
+    stop_import_workers()
+    stop_checkin_flusher()
+    if _speculative_executor is not None:
+        _speculative_executor.shutdown(wait=False, cancel_futures=True)
+    storage_async.shutdown()
+    await close_llm_client()
+    close_db()
 
 
 @app.post("/check-input", response_model=CheckInputResponse)
@@ -384,69 +317,126 @@ def login_user(data: UserLoginRequest):
     return user
 
 
-@app.post("/checkins/daily", response_model=DailyCheckinResponse)
-def create_daily_checkin(data: DailyCheckinRequest):
+def _checkin_rejected(exc: ValueError) -> HTTPException:
+    # Unknown users are 404; a check-in storage refuses (compacted month, NaN values) is 422.
+    message = str(exc)
+    if message.startswith("User ") and message.endswith(" not found"):
+        return HTTPException(status_code=404, detail=message)
+    return HTTPException(status_code=422, detail=message)
+
+
+@app.post("/checkins/daily", response_model=DailyCheckinResponse, response_model_exclude_unset=True)
+async def create_daily_checkin(data: DailyCheckinRequest, score: bool = False):
+    """
+    Record a check-in. With score=true the response also carries the
+    daily-mode prediction as of the check-in date (what /predict would
+    return next), computed from the rolling windows read in the same
+    transaction as the write; such check-ins skip the write-behind log.
+    """
+    payload = data.dict()
+    if score:
+        if write_behind_enabled():
+            # Earlier queued check-ins land first, as they would have.
+            user_id = int(payload["user_id"])
+            await storage_async.run_user_write(user_id, flush_user, user_id, raise_errors=True)
+        try:
+            result = await storage_async.upsert_daily_checkin(payload, with_rolling=True)
+        except ValueError as exc:
+            raise _checkin_rejected(exc) from exc
+        input_dict = inject_rolling_metrics(_daily_predict_input(payload, result["checkin_date"]), result.pop("rolling"))
+        result["prediction"] = await _predict_from_input(input_dict)
+        return result
+    if write_behind_enabled():
+        # Acknowledge once the check-in is checked and in the local log; metrics follow on the next flush.
+        try:
+            queued = await storage_async.run(enqueue_checkin, payload)
+        except ValueError as exc:
+            raise _checkin_rejected(exc) from exc
+        if _speculative_enabled():
+            _schedule_speculative_explanation(payload, queued["checkin_date"])
+        return JSONResponse(status_code=202, content=queued)
     try:
-        return upsert_daily_checkin(data.dict())
+        result = await storage_async.upsert_daily_checkin(payload)
     except ValueError as exc:
-        raise HTTPException(status_code=404, detail=str(exc)) from exc
+        raise _checkin_rejected(exc) from exc
+    if _speculative_enabled():
+        _schedule_speculative_explanation(payload, result["checkin_date"])
+    return result
 
 
-@app.post("/checkins/upload-csv")
-async def upload_checkins_csv(user_id: int, file: UploadFile = File(...)):
-    filename = (file.filename or "").strip()
-    if not filename.lower().endswith(".csv"):
-        raise HTTPException(status_code=400, detail="Please upload a .csv file")
-
-    raw = await file.read()
-    if not raw:
-        raise HTTPException(status_code=400, detail="Uploaded CSV file is empty")
-
+def _validate_csv(raw, sink=None) -> int:
+    """Check the upload is UTF-8 in bounded blocks (optionally copying it to `sink`); returns its size."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    size = 0
     try:
-        text = raw.decode("utf-8-sig")
+        while True:
+            block = raw.read(_CSV_READ_BLOCK_BYTES)
+            if not block:
+                break
+            size += len(block)
+            decoder.decode(block)
+            if sink is not None:
+                sink.write(block)
+        decoder.decode(b"", final=True)
     except UnicodeDecodeError:
         raise HTTPException(status_code=400, detail="CSV must be UTF-8 encoded")
+    if size == 0:
+        raise HTTPException(status_code=400, detail="Uploaded CSV file is empty")
+    return size
 
-    reader = csv.DictReader(io.StringIO(text))
-    if not reader.fieldnames:
-        raise HTTPException(status_code=400, detail="CSV header row is missing")
 
-    total_rows = 0
-    processed = 0
-    errors = []
+@app.post("/checkins/upload-csv")
+async def upload_checkins_csv(user_id: int, file: UploadFile = File(...), background: bool = False):
+    filename = (file.filename or "").strip()
+    if not filename.lower().endswith(".csv"):
+        raise HTTPException(status_code=400, detail="Please upload a .csv file")
 
-    for idx, row in enumerate(reader, start=2):
-        total_rows += 1
+    if background:
+        job_id = uuid.uuid4().hex
+        path = import_file_path(job_id)
         try:
-            date_raw = _pick_csv_value(row, ["checkin_date", "date", "day"])
-            sales_raw = _pick_csv_value(
-                row,
-                ["daily_sales", "sales", "sales_daily", "sales_per_day", "day_sales"],
-            )
-            expenses_raw = _pick_csv_value(
-                row,
-                ["daily_expenses", "expenses", "expenses_daily", "expenses_per_day", "day_expenses"],
+            with open(path, "wb") as sink:
+                await run_in_threadpool(_validate_csv, file.file, sink)
+        except HTTPException:
+            os.remove(path)
+            raise
+        job = submit_import_job(job_id, int(user_id), filename, path)
+        return JSONResponse(status_code=202, content=import_job_status(job))
+
+    # Validate encoding in bounded blocks so the upload is never held in memory.
+    # Reading and parsing block, so they run on the threadpool, one chunk at a
+    # time, and the event loop keeps serving other requests meanwhile.
+    await run_in_threadpool(_validate_csv, file.file)
+    file.file.seek(0)
+
+    stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    try:
+        try:
+            reader, columns = await run_in_threadpool(open_checkin_csv, stream)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+
+        total_rows = 0
+        processed = 0
+        failed = 0
+        errors = []
+        chunks = iter_checkin_chunks(reader, columns, int(user_id), chunk_rows=_csv_chunk_rows())
+        while True:
+            try:
+                chunk = await run_in_threadpool(next, chunks, None)
+            except ValueError as exc:
+                raise HTTPException(status_code=400, detail=str(exc))
+            if chunk is None:
+                break
+            payloads, payload_lines, chunk_errors, row_count = chunk
+            total_rows += row_count
+            processed += await storage_async.run_user_write(
+                user_id, upsert_checkin_chunk, int(user_id), payloads, payload_lines, chunk_errors
             )
-            receivables_raw = _pick_csv_value(row, ["receivables", "pending_payments"])
-            emi_raw = _pick_csv_value(row, ["loan_emi", "emi", "daily_loan_emi"])
-            cash_raw = _pick_csv_value(row, ["cash_balance", "cash", "daily_cash_balance"])
-
-            if sales_raw is None or expenses_raw is None:
-                raise ValueError("Missing required columns: daily_sales and/or daily_expenses")
-
-            payload = {
-                "user_id": int(user_id),
-                "checkin_date": _normalize_csv_date(date_raw),
-                "daily_sales": _parse_csv_float(sales_raw),
-                "daily_expenses": _parse_csv_float(expenses_raw),
-                "receivables": _parse_csv_float(receivables_raw, default=0.0),
-                "loan_emi": _parse_csv_float(emi_raw, default=0.0),
-                "cash_balance": _parse_csv_float(cash_raw, default=0.0),
-            }
-            upsert_daily_checkin(payload)
-            processed += 1
-        except Exception as exc:
-            errors.append({"line": idx, "error": str(exc)})
+            failed += len(chunk_errors)
+            merge_errors(errors, chunk_errors)
+    finally:
+        stream.detach()
 
     if processed == 0:
         raise HTTPException(
@@ -458,20 +448,54 @@ async def upload_checkins_csv(user_id: int, file: UploadFile = File(...)):
             },
         )
 
-    latest_metrics = get_user_metrics(int(user_id))
+    latest_metrics = await storage_async.get_user_metrics(int(user_id))
     return {
         "user_id": int(user_id),
         "total_rows": total_rows,
         "processed_rows": processed,
-        "failed_rows": total_rows - processed,
+        "failed_rows": failed,
         "errors": errors[:20],
         "latest_metrics": latest_metrics,
     }
 
 
+@app.get("/imports/{job_id}", response_model=ImportJobResponse)
+def fetch_import_job(job_id: str):
+    job = get_import_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return import_job_status(job)
+
+
+def _not_modified(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
+
+def _cache_headers(etag: str) -> dict:
+    # no-cache: browsers keep the body but revalidate it on every load.
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+
+def _conditional(response: Response, if_none_match: Optional[str], etag: str) -> Optional[Response]:
+    """A bodyless 304 when the client already has this version, otherwise None after tagging `response`."""
+    headers = _cache_headers(etag)
+    if _not_modified(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
 @app.get("/users/{user_id}/metrics", response_model=UserMetricsResponse)
-def fetch_user_metrics(user_id: int):
-    metrics = get_user_metrics(user_id)
+async def fetch_user_metrics(user_id: int, response: Response, if_none_match: Optional[str] = Header(None)):
+    if write_behind_enabled():
+        await storage_async.run_user_write(user_id, flush_user, user_id)
+    metrics, etag = await storage_async.get_user_metrics.with_etag(user_id)
+    not_modified = _conditional(response, if_none_match, etag)
+    if not_modified is not None:
+        return not_modified
     if not metrics:
         return {
             "user_id": int(user_id),
@@ -485,13 +509,289 @@ def fetch_user_metrics(user_id: int):
     return metrics
 
 
-@app.get("/users/{user_id}/checkins", response_model=List[DailyCheckinRecord])
-def fetch_user_checkins(user_id: int):
-    return get_user_checkins(user_id=user_id)
+@app.get("/portfolio/metrics", response_model=List[UserMetricsResponse])
+def fetch_portfolio_metrics(user_ids: str):
+    """Stored metrics for many users at once (comma-separated ids); users without check-ins are left out."""
+    try:
+        ids = [int(part) for part in user_ids.split(",") if part.strip()]
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail="user_ids must be comma-separated integers") from exc
+    if not ids or len(ids) > _PORTFOLIO_MAX_USERS:
+        raise HTTPException(status_code=400, detail=f"Pass between 1 and {_PORTFOLIO_MAX_USERS} user ids")
+    return get_portfolio_metrics(ids)
+
+
+@app.get("/users/{user_id}/checkins", response_model=List[DailyCheckinRecord], response_model_exclude_unset=True)
+def fetch_user_checkins(
+    user_id: int,
+    response: Response,
+    limit: int = 120,
+    cursor: Optional[str] = None,
+    from_date: Optional[str] = Query(None, alias="from"),
+    to_date: Optional[str] = Query(None, alias="to"),
+    fields: Optional[str] = None,
+    order: str = "asc",
+    output_format: str = Query("json", alias="format"),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Check-ins oldest first (order=desc for newest first), `limit` per page.
+    When a page is full, X-Next-Cursor holds the cursor for the next one.
+    format=columns returns the page as parallel arrays with next_cursor in
+    the body; format=ndjson streams every row from the cursor on, one JSON
+    object per line, and ignores `limit`. Without ?fields=, period and
+    checkin_days are only included when the page is paged (a cursor in or
+    out) or holds a compacted month.
+    """
+    try:
+        start = parse_date(from_date, "from")
+        end = parse_date(to_date, "to")
+        selected = parse_fields(fields)
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    if order not in {"asc", "desc"}:
+        raise HTTPException(status_code=400, detail="order must be 'asc' or 'desc'")
+    if output_format not in {"json", "columns", "ndjson"}:
+        raise HTTPException(status_code=400, detail="format must be 'json', 'columns' or 'ndjson'")
+    if not 1 <= limit <= MAX_PAGE_ROWS:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_PAGE_ROWS}")
+
+    flush_user(user_id)
+
+    def fetch_page(page_after: Optional[str], page_limit: int) -> List[dict]:
+        return get_checkin_page(
+            int(user_id), start_date=start, end_date=end, after=page_after, limit=page_limit, descending=order == "desc"
+        )
+
+    if output_format == "ndjson":
+        # A stream is read page by page, so every line carries period and checkin_days.
+        streamed = selected or DEFAULT_FIELDS + PERIOD_FIELDS
+        return StreamingResponse(iter_ndjson(fetch_page, streamed, after), media_type="application/x-ndjson")
+    rows, page_etag = get_checkin_page.with_etag(
+        int(user_id), start_date=start, end_date=end, after=after, limit=limit, descending=order == "desc"
+    )
+    cursor_out = next_cursor(rows, limit)
+    if selected is None:
+        selected = default_fields(rows, paged=after is not None or cursor_out is not None)
+    # The body also depends on the projection and format, not only on the rows.
+    etag = content_etag([page_etag, output_format, selected])
+    not_modified = _conditional(response, if_none_match, etag)
+    if not_modified is not None:
+        return not_modified
+    if output_format == "columns":
+        return JSONResponse(
+            content={"fields": selected, "rows": len(rows), "columns": to_columns(rows, selected), "next_cursor": cursor_out},
+            headers=_cache_headers(etag),
+        )
+    if cursor_out:
+        response.headers["X-Next-Cursor"] = cursor_out
+    return project(rows, selected)
+
+
+@app.get("/users/{user_id}/rolling-metrics", response_model=WindowAggregatesResponse)
+def fetch_rolling_metrics(
+    user_id: int,
+    windows: str = "7,30,90,365",
+    metrics: Optional[str] = None,
+    as_of_date: Optional[str] = None,
+    include_previous: bool = True,
+):
+    try:
+        window_days = [int(part) for part in windows.split(",") if part.strip()]
+        metric_names = [part.strip() for part in (metrics or "").split(",") if part.strip()] or None
+        normalize_window_request(window_days, metric_names, as_of_date)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    flush_user(user_id)
+    try:
+        return compute_window_aggregates(
+            int(user_id),
+            windows=window_days,
+            metrics=metric_names,
+            as_of_date=as_of_date,
+            include_previous=include_previous,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+
+
+@app.get("/users/{user_id}/risk-history", response_model=RiskHistoryResponse)
+def fetch_risk_history(
+    user_id: int,
+    from_date: Optional[str] = Query(None, alias="from"),
+    to_date: Optional[str] = Query(None, alias="to"),
+    step: int = 1,
+):
+    """Daily-mode risk score for every `step` days between from and to (default: the past year)."""
+    try:
+        end = datetime.strptime(to_date.strip(), "%Y-%m-%d").date() if to_date else date.today()
+        start = datetime.strptime(from_date.strip(), "%Y-%m-%d").date() if from_date else end - timedelta(days=364)
+        dates = history_dates(start, end, int(step))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    flush_user(user_id)
+    try:
+        checkins = get_checkin_history(int(user_id), history_start(dates).isoformat(), end.isoformat())
+    except ValueError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+
+    points = score_history(checkins, dates)
+    for point in points:
+        point["risk_level"] = risk_level_for(point["risk_score"])
+    return {
+        "user_id": int(user_id),
+        "from_date": start.isoformat(),
+        "to_date": end.isoformat(),
+        "step_days": int(step),
+        "points": points,
+    }
+
+
+def _exports_enabled() -> bool:
+    return os.getenv("EXPORTS_ENABLED", "0").strip().lower() in {"1", "true", "yes"}
+
+
+def _remove_export_dir(path: str) -> None:
+    shutil.rmtree(path, ignore_errors=True)
+
+
+@app.get("/exports/{table}")
+def export_table_endpoint(
+    table: str,
+    output_format: str = Query("arrow", alias="format"),
+    since: Optional[str] = None,
+    x_admin_token: Optional[str] = Header(None),
+):
+    """
+    A whole table (daily_checkins, user_metrics or risk_reports), or the rows
+    written since `since`, for analysts. format=arrow streams an Arrow IPC
+    stream batch by batch; format=parquet returns one Parquet file. Off
+    unless EXPORTS_ENABLED=1; admin only (X-Admin-Token must match
+    PROFILING_TOKEN).
+    """
+    if not _exports_enabled():
+        raise HTTPException(status_code=403, detail="Exports are disabled (set EXPORTS_ENABLED=1)")
+    if not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid X-Admin-Token")
+    if output_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    try:
+        if output_format == "arrow":
+            return StreamingResponse(
+                iter_arrow_stream(table, since=since),
+                media_type="application/vnd.apache.arrow.stream",
+                headers={"Content-Disposition": f'attachment; filename="{table}.arrows"'},
+            )
+        out_dir = tempfile.mkdtemp(prefix="export-")
+        path = os.path.join(out_dir, f"{table}.parquet")
+        try:
+            write_export_file(path, table, "parquet", since=since)
+        except BaseException:
+            _remove_export_dir(out_dir)
+            raise
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except RuntimeError as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+    return FileResponse(
+        path,
+        media_type="application/vnd.apache.parquet",
+        filename=f"{table}.parquet",
+        background=BackgroundTask(_remove_export_dir, out_dir),
+    )
+
+
+@app.get("/storage/cache-stats")
+def fetch_storage_cache_stats():
+    return {"read_cache": get_read_cache_stats(), "hot_series": get_hot_series_stats()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def fetch_metrics():
+    # Prometheus scrape target: request and per-stage latency histograms.
+    return PlainTextResponse(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+
+def _require_admin(token: Optional[str]) -> None:
+    if not profiling_enabled():
+        raise HTTPException(status_code=403, detail="Profiling is disabled (set PROFILING_TOKEN)")
+    if not is_admin(token):
+        raise HTTPException(status_code=403, detail="Invalid X-Admin-Token")
+
+
+def _profile_response(profile, output_format: str, name: str) -> Response:
+    if output_format == "speedscope":
+        return JSONResponse(profile, headers={"Content-Disposition": f'attachment; filename="{name}.speedscope.json"'})
+    return PlainTextResponse(profile, headers={"Content-Disposition": f'attachment; filename="{name}.collapsed.txt"'})
+
+
+@app.post("/admin/profile")
+async def profile_worker_endpoint(
+    seconds: float = 10.0,
+    output_format: str = Query("collapsed", alias="format"),
+    interval_ms: float = 5.0,
+    include_idle: bool = False,
+    x_admin_token: Optional[str] = Header(None),
+):
+    """
+    Sample every thread of this worker for `seconds` and return the stacks
+    as collapsed text or a speedscope file. Requests keep being served
+    while it runs. Admin only (X-Admin-Token must match PROFILING_TOKEN).
+    """
+    _require_admin(x_admin_token)
+    try:
+        validate_profile_request(output_format, interval_ms)
+        sampler = await run_in_threadpool(profile_worker, seconds, interval_ms, include_idle)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    name = f"worker-{os.getpid()}"
+    return _profile_response(sampler.render(output_format, name), output_format, name)
+
+
+@app.get("/admin/profile/{profile_id}")
+def fetch_request_profile(
+    profile_id: str,
+    output_format: str = Query("collapsed", alias="format"),
+    x_admin_token: Optional[str] = Header(None),
+):
+    """The profile of a request sent with X-Profile: 1 (its X-Profile-Id response header)."""
+    _require_admin(x_admin_token)
+    if output_format not in PROFILE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(PROFILE_FORMATS)}")
+    profile = get_request_profile(profile_id, output_format)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return _profile_response(profile, output_format, f"request-{profile_id}")
+
+
+@app.post("/admin/memory/diff")
+def memory_diff_endpoint(limit: int = Query(25, ge=1, le=500), group_by: str = "lineno", x_admin_token: Optional[str] = Header(None)):
+    """
+    tracemalloc growth since the previous call, largest first. The first
+    call starts tracing and only records the baseline.
+    """
+    _require_admin(x_admin_token)
+    try:
+        return memory_diff(limit=limit, group_by=group_by)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+@app.post("/admin/memory/stop")
+def stop_memory_tracing_endpoint(x_admin_token: Optional[str] = Header(None)):
+    _require_admin(x_admin_token)
+    return stop_memory_tracing()
+
+
+@app.get("/llm/stats")
+def fetch_llm_stats():
+    return {**get_llm_admission_stats(), "speculative": get_speculative_stats()}
 
 
 @app.post("/predict", response_model=PredictResponse)
-def predict(data: InputData):
+async def predict(data: InputData):
     input_dict = data.dict()
 
     # Daily mode: compute standardized monthly windows from SQLite check-ins.
@@ -515,15 +815,7 @@ def predict(data: InputData):
             }
 
         try:
-            rolling = compute_rolling_metrics(
-                user_id=int(user_id),
-                as_of_date=input_dict.get("as_of_date"),
-            )
-            # Inject computed standardized fields expected by ML/rules.
-            input_dict["monthly_sales"] = rolling["monthly_sales"]
-            input_dict["monthly_expenses"] = rolling["monthly_expenses"]
-            input_dict["sales_3_months_ago"] = rolling["sales_3_months_ago"]
-            input_dict["expenses_3_months_ago"] = rolling["expenses_3_months_ago"]
+            await apply_rolling_metrics_async(input_dict)
         except ValueError as exc:
             survival = compute_survival_metrics(input_dict)
             return {
@@ -541,6 +833,11 @@ def predict(data: InputData):
                 "priority_action": survival["priority_action"],
             }
 
+    return await _predict_from_input(input_dict)
+
+
+async def _predict_from_input(input_dict: dict) -> dict:
+    """Features, model, rules, LLM explanation and survival analysis for a filled-in input."""
     # Enforce complete input for prediction; return clean response if anything is missing.
     required_fields = [
         "monthly_sales",
@@ -569,40 +866,31 @@ def predict(data: InputData):
             "priority_action": survival["priority_action"],
         }
 
-    # Feature engineering is defensive against None/zero divisions.
-    features = compute_features(input_dict)
-
-    probability = predict_risk(features)
-    risk_score = int(probability * 100)
-
-    if risk_score < 35:
-        risk_level = "LOW"
-    elif risk_score < 65:
-        risk_level = "MEDIUM"
-    else:
-        risk_level = "HIGH"
-
-    # Use raw inputs + engineered features for explainability.
-    # This allows momentum rules to run when past values are provided.
-    rule_input = {**input_dict, **features}
-    warnings, suggestions = evaluate_rules(rule_input)
-    reasons = [str(w) for w in warnings]
-    actions = [str(s) for s in suggestions]
+    # Scoring is about a millisecond of CPU and holds the GIL either way, so it
+    # runs inline; a threadpool hop only added queueing. The LLM call awaits a
+    # slot and the response on the loop (generate_llm_explanation_admitted_async).
+    scored = score_input(input_dict)
+    features = scored["features"]
+    risk_score = scored["risk_score"]
+    risk_level = scored["risk_level"]
+    reasons = scored["reasons"]
+    actions = scored["actions"]
+    top_features = scored["top_features"]
 
     llm_explanation = None
     try:
-        llm_prompt = _build_llm_prompt(risk_score, risk_level, features, reasons, actions)
-        llm_explanation = generate_llm_explanation(
-            llm_prompt,
-            timeout_seconds=_llm_timeout_seconds(),
-        )
+        llm_prompt = build_llm_prompt(risk_score, risk_level, features, reasons, actions)
+        with span("llm"):
+            llm_explanation = await generate_llm_explanation_admitted_async(
+                llm_prompt, timeout_seconds=llm_timeout_seconds()
+            )
     except TimeoutError:
         llm_explanation = None
     except Exception:
         llm_explanation = None
 
-    llm_explanation_ui = _build_llm_explanation_ui(
-        llm_explanation, risk_score, risk_level, reasons, actions
+    llm_explanation_ui = build_llm_explanation_ui(
+        llm_explanation, risk_score, risk_level, reasons, actions, top_features
     )
     survival = compute_survival_metrics(input_dict)
 
@@ -615,4 +903,5 @@ def predict(data: InputData):
         "llm_explanation_ui": llm_explanation_ui,
         "survival_analysis": survival["survival_analysis"],
         "priority_action": survival["priority_action"],
+        "top_features": top_features,
     }
@@ -1,5 +1,6 @@
 import os
 import pickle
+import numpy as np
 import pandas as pd
 
 # Load model once at import time and fail loudly on invalid model artifact.
@@ -20,29 +21,33 @@ with open(MODEL_PATH, "rb") as f:
 if not hasattr(model, "predict_proba"):
     raise TypeError("Loaded model does not implement predict_proba")
 
+FEATURE_COLUMNS = [
+    "profit_margin",
+    "receivables_ratio",
+    "emi_ratio",
+    "cash_buffer_months",
+    "sales_growth_rate",
+    "expense_growth_rate",
+]
+
 
 def predict_risk(features: dict) -> float:
     """
     Predict probability of financial distress.
     Returns value between 0 and 1.
     """
-    feature_vector = [
-        features["profit_margin"],
-        features["receivables_ratio"],
-        features["emi_ratio"],
-        features["cash_buffer_months"],
-        features["sales_growth_rate"],
-        features["expense_growth_rate"],
-    ]
-
-    feature_columns = [
-        "profit_margin",
-        "receivables_ratio",
-        "emi_ratio",
-        "cash_buffer_months",
-        "sales_growth_rate",
-        "expense_growth_rate",
-    ]
-    feature_frame = pd.DataFrame([feature_vector], columns=feature_columns)
+    feature_vector = [features[name] for name in FEATURE_COLUMNS]
+    feature_frame = pd.DataFrame([feature_vector], columns=FEATURE_COLUMNS)
     probability = model.predict_proba(feature_frame)[0][1]
     return float(probability)
+
+
+def predict_risk_batch(features: dict) -> np.ndarray:
+    """
+    Distress probabilities for many rows in one model call.
+    `features` maps each FEATURE_COLUMNS name to an array of values.
+    """
+    feature_frame = pd.DataFrame({name: np.asarray(features[name], dtype=float) for name in FEATURE_COLUMNS})
+    if feature_frame.empty:
+        return np.zeros(0)
+    return np.asarray(model.predict_proba(feature_frame)[:, 1], dtype=float)
@@ -31,9 +31,25 @@ def best_f1_threshold(y_true, probabilities):
     return best_threshold, best_f1
 
 
-# Load synthetic dataset
-DATA_PATH = os.path.join(os.path.dirname(__file__), "../data/synthetic_msme.csv")
-df = pd.read_csv(DATA_PATH)
+def load_training_data(path):
+    """
+    A CSV file, or a Parquet / Arrow IPC export file or directory read with
+    utils.columnar_export.load_export (latest copy of each row). Exports hold
+    raw tables, so the feature columns and the distress label must have been
+    added to the dataset before training on it.
+    """
+    if path.endswith(".csv"):
+        return pd.read_csv(path)
+    # Needs the backend packages on the path: python -m ml.train_model from backend/.
+    from utils.columnar_export import load_export
+
+    return load_export(path)
+
+
+# Load synthetic dataset (TRAIN_DATA_PATH for another CSV, Parquet or Arrow dataset
+# with the feature columns and a distress label)
+DATA_PATH = os.getenv("TRAIN_DATA_PATH", os.path.join(os.path.dirname(__file__), "../data/synthetic_msme.csv"))
+df = load_training_data(DATA_PATH)
 
 # Features and label
 feature_cols = [
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 
 class InputData(BaseModel):
@@ -39,6 +39,14 @@ class PriorityAction(BaseModel):
     expected_impact: str
 
 
+class FeatureContribution(BaseModel):
+    feature: str
+    label: str
+    value: float
+    contribution: float
+    direction: str
+
+
 class PredictResponse(BaseModel):
     risk_score: int
     risk_level: str
@@ -48,6 +56,7 @@ class PredictResponse(BaseModel):
     llm_explanation_ui: LLMExplanationUI
     survival_analysis: Optional[SurvivalAnalysis] = None
     priority_action: Optional[PriorityAction] = None
+    top_features: List[FeatureContribution] = []
 
 
 class UserRegisterRequest(BaseModel):
@@ -85,6 +94,8 @@ class DailyCheckinResponse(BaseModel):
     monthly_cash_balance: float
     window_days: int
     updated: bool
+    # Only with /checkins/daily?score=true.
+    prediction: Optional[PredictResponse] = None
 
 
 class UserMetricsResponse(BaseModel):
@@ -98,6 +109,78 @@ class UserMetricsResponse(BaseModel):
 
 
 class DailyCheckinRecord(BaseModel):
+    # Only the fields asked for (?fields=) are returned.
     checkin_date: str
-    daily_sales: float
-    daily_expenses: float
+    daily_sales: Optional[float] = None
+    daily_expenses: Optional[float] = None
+    receivables: Optional[float] = None
+    loan_emi: Optional[float] = None
+    cash_balance: Optional[float] = None
+    # "month" for a compacted month: first day of the month and per-check-in averages.
+    # Only returned when asked for, or when the response is paged or holds a month.
+    period: str = "day"
+    checkin_days: int = 1
+
+
+class ImportRowError(BaseModel):
+    line: int
+    error: str
+
+
+class ImportJobResponse(BaseModel):
+    job_id: str
+    user_id: int
+    filename: str
+    status: str  # queued | running | completed | failed
+    total_bytes: int
+    bytes_processed: int
+    percent_complete: float
+    total_rows: int
+    processed_rows: int
+    failed_rows: int
+    errors: List[ImportRowError] = []
+    error: Optional[str] = None
+    rows_per_second: float
+    eta_seconds: Optional[float] = None
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+
+
+class WindowPeriod(BaseModel):
+    start_date: str
+    end_date: str
+    checkin_days: int
+    totals: Dict[str, float]
+    averages: Dict[str, float]
+
+
+class RollingWindow(BaseModel):
+    window_days: int
+    current: WindowPeriod
+    previous: Optional[WindowPeriod] = None
+
+
+class WindowAggregatesResponse(BaseModel):
+    user_id: int
+    as_of_date: str
+    windows: List[RollingWindow]
+
+
+class RiskHistoryPoint(BaseModel):
+    as_of_date: str
+    risk_score: int
+    risk_level: str
+    probability: float
+    monthly_sales: float
+    monthly_expenses: float
+    sales_3_months_ago: float
+    expenses_3_months_ago: float
+
+
+class RiskHistoryResponse(BaseModel):
+    user_id: int
+    from_date: str
+    to_date: str
+    step_days: int
+    points: List[RiskHistoryPoint]
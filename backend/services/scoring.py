@@ -0,0 +1,324 @@
+"""
+Scoring and explanation helpers shared by the API (main.py) and the offline
+batch job (xai/batch_reports.py): rolling-window inputs, model + rules
+scoring, the LLM prompt, the explanation UI fallback and survival metrics.
+"""
+import json
+import os
+
+from db import storage_async
+from db.storage import compute_rolling_metrics
+from ml.predictor import predict_risk
+from rules.rule_engine import evaluate_rules
+from utils.checkin_buffer import flush_user, write_behind_enabled
+from utils.feature_engineering import compute_features
+from utils.latency import span, timed
+from xai.explain import explain_risk
+
+
+def llm_timeout_seconds() -> float:
+    raw = os.getenv("LLM_TIMEOUT_SECONDS", "20").strip()
+    try:
+        value = float(raw)
+    except ValueError:
+        return 20.0
+    return max(1.0, value)
+
+
+@timed("build_llm_prompt")
+def build_llm_prompt(risk_score, risk_level, features, reasons, actions):
+    return (
+        "You are a helpful financial guide for small business owners with no finance background.\n"
+        "Return ONLY valid JSON (no markdown) using this schema:\n"
+        "{\"summary\": string, \"key_drivers\": string[], \"immediate_actions\": string[]}\n"
+        "Rules:\n"
+        "- Use simple everyday language (grade 6-8).\n"
+        "- Avoid jargon. If needed, explain in plain words.\n"
+        "- Speak directly to the user as 'your business'.\n"
+        "- summary: max 2 short sentences.\n"
+        "- key_drivers: 2-4 short bullet points.\n"
+        "- immediate_actions: 2-4 concrete next steps for this week.\n\n"
+        "Grounding requirements (strict):\n"
+        "- Use the provided reasons/actions as the primary source of truth.\n"
+        "- Mention at least 2 concrete risk drivers from reasons.\n"
+        "- Mention at least 2 concrete actions from actions.\n"
+        "- Include at least 1 numeric fact from risk score or engineered features.\n"
+        "- Do not invent new drivers that are not implied by reasons/features.\n\n"
+        f"risk_score: {risk_score}\n"
+        f"risk_level: {risk_level}\n"
+        "engineered_features:\n"
+        f"- profit_margin: {features.get('profit_margin', 0.0):.4f}\n"
+        f"- receivables_ratio: {features.get('receivables_ratio', 0.0):.4f}\n"
+        f"- emi_ratio: {features.get('emi_ratio', 0.0):.4f}\n"
+        f"- cash_buffer: {features.get('cash_buffer_months', 0.0):.4f}\n"
+        f"- sales_growth_rate: {features.get('sales_growth_rate', 0.0):.4f}\n"
+        f"- expense_growth_rate: {features.get('expense_growth_rate', 0.0):.4f}\n"
+        f"reasons: {reasons}\n"
+        f"actions: {actions}\n"
+    )
+
+
+def _extract_json_object(text: str):
+    text = (text or "").strip()
+    if not text:
+        return None
+
+    try:
+        obj = json.loads(text)
+        if isinstance(obj, dict):
+            return obj
+    except Exception:
+        pass
+
+    start = text.find("{")
+    end = text.rfind("}")
+    if start == -1 or end == -1 or end <= start:
+        return None
+    try:
+        obj = json.loads(text[start : end + 1])
+        if isinstance(obj, dict):
+            return obj
+    except Exception:
+        return None
+    return None
+
+
+def _to_string_list(value):
+    if not isinstance(value, list):
+        return []
+    return [str(v).strip() for v in value if str(v).strip()]
+
+
+def _simplify_phrase(text: str) -> str:
+    simple = str(text or "").strip()
+    replacements = {
+        "receivables": "pending customer payments",
+        "EMI": "loan payment",
+        "liquidity": "available cash",
+        "cash flow": "money coming in and going out",
+        "operational costs": "running costs",
+        "debt service": "loan repayment",
+        "refinance": "rework your loan terms",
+        "discretionary expenses": "non-essential expenses",
+    }
+    for src, tgt in replacements.items():
+        simple = simple.replace(src, tgt)
+    return simple
+
+
+def _is_vague_text(text: str) -> bool:
+    content = str(text or "").strip().lower()
+    if not content:
+        return True
+    vague_phrases = [
+        "high risk due to",
+        "improve financial situation",
+        "key issues below",
+        "face pressure soon",
+        "take immediate action",
+        "monitor closely",
+    ]
+    # Treat as vague when it only contains generic phrases and no numbers.
+    has_number = any(ch.isdigit() for ch in content)
+    if has_number:
+        return False
+    return any(phrase in content for phrase in vague_phrases)
+
+
+def _merge_distinct(primary, fallback, limit=4):
+    merged = []
+    for item in list(primary or []) + list(fallback or []):
+        val = _simplify_phrase(str(item or "").strip())
+        if not val:
+            continue
+        key = val.lower()
+        if any(existing.lower() == key for existing in merged):
+            continue
+        merged.append(val)
+        if len(merged) >= limit:
+            break
+    return merged
+
+
+def _feature_driver_phrase(item: dict) -> str:
+    trend = "is pushing your risk up" if item.get("direction") == "increases_risk" else "is keeping your risk down"
+    return f"{item.get('label') or item.get('feature')} ({item.get('value')}) {trend}"
+
+
+@timed("build_llm_explanation_ui")
+def build_llm_explanation_ui(llm_explanation, risk_score, risk_level, reasons, actions, top_features=None):
+    parsed = _extract_json_object(llm_explanation or "")
+    if parsed:
+        summary = _simplify_phrase(str(parsed.get("summary") or "").strip())
+        if not summary or _is_vague_text(summary):
+            summary = _simplify_phrase(
+                f"Risk is {risk_level} ({risk_score}/100). Main issues: "
+                + "; ".join([str(i) for i in reasons[:2]])
+                + ". Start with: "
+                + "; ".join([str(i) for i in actions[:2]])
+                + "."
+            )
+
+        key_drivers = _merge_distinct(_to_string_list(parsed.get("key_drivers")), reasons, limit=4)
+        immediate_actions = _merge_distinct(_to_string_list(parsed.get("immediate_actions")), actions, limit=4)
+
+        if summary and key_drivers and immediate_actions:
+            return {
+                "summary": summary,
+                "key_drivers": key_drivers,
+                "immediate_actions": immediate_actions,
+            }
+
+    fallback_summary = (
+        f"Risk is {risk_level} ({risk_score}/100). "
+        "Your business may face pressure soon, so focus on the key issues below first."
+    )
+    # With few rule hits, fill drivers from the model attribution so the UI
+    # still has something concrete when the LLM is skipped.
+    key_drivers = [_simplify_phrase(i) for i in reasons[:4]]
+    if len(key_drivers) < 2:
+        risk_up = [i for i in (top_features or []) if i.get("direction") == "increases_risk"]
+        key_drivers = _merge_distinct(key_drivers, [_feature_driver_phrase(i) for i in risk_up], limit=4)
+    return {
+        "summary": _simplify_phrase(fallback_summary),
+        "key_drivers": key_drivers,
+        "immediate_actions": [_simplify_phrase(i) for i in actions[:4]],
+    }
+
+
+def _to_float(value, default: float = 0.0) -> float:
+    try:
+        return float(value) if value is not None else float(default)
+    except (TypeError, ValueError):
+        return float(default)
+
+
+def _round2(value: float) -> float:
+    return round(float(value), 2)
+
+
+@timed("compute_survival_metrics")
+def compute_survival_metrics(input_dict):
+    monthly_sales = _to_float(input_dict.get("monthly_sales"))
+    monthly_expenses = _to_float(input_dict.get("monthly_expenses"))
+    receivables = _to_float(input_dict.get("receivables"))
+    cash_balance = _to_float(input_dict.get("cash_balance"))
+
+    monthly_loss_raw = monthly_expenses - monthly_sales
+    monthly_loss = monthly_loss_raw if monthly_loss_raw > 0 else 0.0
+
+    if monthly_loss > 0:
+        cash_runway_months = cash_balance / monthly_loss if monthly_loss != 0 else 12.0
+    else:
+        cash_runway_months = 12.0
+
+    estimated_days_left = cash_runway_months * 30.0
+    break_even_sales_required = monthly_expenses
+
+    recommended_collection_target = 0.0
+    if monthly_sales > 0 and receivables > 0.2 * monthly_sales:
+        recommended_collection_target = 0.25 * receivables
+
+    recommended_expense_reduction = monthly_loss if monthly_loss > 0 else 0.0
+    recommended_sales_increase = monthly_loss if monthly_loss > 0 else 0.0
+
+    if recommended_collection_target > 0:
+        top_fix = "Collect pending customer payments faster"
+        target_amount = recommended_collection_target
+        expected_impact = (
+            "Recovering this amount can immediately improve cash availability and extend runway."
+        )
+    elif recommended_expense_reduction > 0:
+        top_fix = "Reduce monthly expenses"
+        target_amount = recommended_expense_reduction
+        expected_impact = (
+            "Reducing this monthly amount can move your business closer to break-even."
+        )
+    elif recommended_sales_increase > 0:
+        top_fix = "Increase monthly sales"
+        target_amount = recommended_sales_increase
+        expected_impact = (
+            "Increasing sales by this amount can offset losses and improve stability."
+        )
+    else:
+        top_fix = "Maintain current discipline"
+        target_amount = 0.0
+        expected_impact = "Your business is not currently in monthly loss."
+
+    return {
+        "survival_analysis": {
+            "cash_runway_months": _round2(cash_runway_months),
+            "estimated_days_left": _round2(estimated_days_left),
+            "monthly_loss": _round2(monthly_loss),
+            "break_even_sales_required": _round2(break_even_sales_required),
+        },
+        "priority_action": {
+            "top_fix": top_fix,
+            "target_amount": _round2(target_amount),
+            "expected_impact": expected_impact,
+        },
+    }
+
+
+def risk_level_for(risk_score: int) -> str:
+    if risk_score < 35:
+        return "LOW"
+    if risk_score < 65:
+        return "MEDIUM"
+    return "HIGH"
+
+
+def apply_rolling_metrics(input_dict: dict) -> dict:
+    flush_user(int(input_dict["user_id"]))
+    rolling = compute_rolling_metrics(
+        user_id=int(input_dict["user_id"]),
+        as_of_date=input_dict.get("as_of_date"),
+    )
+    return inject_rolling_metrics(input_dict, rolling)
+
+
+async def apply_rolling_metrics_async(input_dict: dict) -> dict:
+    user_id = int(input_dict["user_id"])
+    if write_behind_enabled():
+        await storage_async.run_user_write(user_id, flush_user, user_id)
+    rolling = await storage_async.compute_rolling_metrics(user_id=user_id, as_of_date=input_dict.get("as_of_date"))
+    return inject_rolling_metrics(input_dict, rolling)
+
+
+def inject_rolling_metrics(input_dict: dict, rolling: dict) -> dict:
+    # Inject computed standardized fields expected by ML/rules.
+    input_dict["monthly_sales"] = rolling["monthly_sales"]
+    input_dict["monthly_expenses"] = rolling["monthly_expenses"]
+    input_dict["sales_3_months_ago"] = rolling["sales_3_months_ago"]
+    input_dict["expenses_3_months_ago"] = rolling["expenses_3_months_ago"]
+    return input_dict
+
+
+def score_input(input_dict: dict) -> dict:
+    # Feature engineering is defensive against None/zero divisions.
+    with span("compute_features"):
+        features = compute_features(input_dict)
+
+    with span("predict_risk"):
+        probability = predict_risk(features)
+    risk_score = int(probability * 100)
+    risk_level = risk_level_for(risk_score)
+
+    # Use raw inputs + engineered features for explainability.
+    # This allows momentum rules to run when past values are provided.
+    rule_input = {**input_dict, **features}
+    with span("evaluate_rules"):
+        warnings, suggestions = evaluate_rules(rule_input)
+    reasons = [str(w) for w in warnings]
+    actions = [str(s) for s in suggestions]
+
+    scored = {
+        "features": features,
+        "risk_score": risk_score,
+        "risk_level": risk_level,
+        "reasons": reasons,
+        "actions": actions,
+    }
+    with span("explain_risk"):
+        scored["top_features"] = explain_risk(features, reasons)
+    return scored
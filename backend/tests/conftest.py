@@ -0,0 +1,84 @@
+"""
+Shared fixtures for the storage tests.
+
+The backends are imported directly (db.storage picks one from the
+environment at import). SQLite gets a fresh database file per test; Mongo
+runs against mongomock (tests/storage_helpers.py, also used by the
+benchmarks) and is skipped when mongomock is not installed.
+
+Run from backend/:
+    python -m pytest -q
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BACKENDS = ["memory", "sqlite", "mongo"]
+
+
+@pytest.fixture(scope="session")
+def _mongo_backend():
+    try:
+        from db import storage_mongo
+        from tests.storage_helpers import RoundTrips, mongomock_client
+
+        # Patches mongomock's Collection once for the whole session.
+        client = mongomock_client(RoundTrips())
+    except ImportError:
+        yield None
+        return
+    storage_mongo._client = client
+    yield storage_mongo
+    storage_mongo._client = None
+
+
+@pytest.fixture
+def fresh_backend(tmp_path, _mongo_backend):
+    """fresh_backend(name) -> that storage module, emptied and initialised."""
+    used = []
+
+    def make(name: str):
+        if name == "memory":
+            from db import storage_memory as module
+
+            module.reset_db()
+        elif name == "sqlite":
+            from db import storage_sqlite as module
+
+            module.close_db()
+            module.DB_PATH = str(tmp_path / f"app-{len(used)}.db")
+        elif name == "mongo":
+            module = _mongo_backend
+            if module is None:
+                pytest.skip("mongo backend tests need mongomock")
+            database = module._get_db()
+            for collection in database.list_collection_names():
+                database[collection].delete_many({})
+            # close_db also drops the id block and user cache; keep the client.
+            client, module._client = module._client, None
+            module.close_db()
+            module._client = client
+        else:
+            raise ValueError(name)
+        module.init_db()
+        used.append(module)
+        return module
+
+    yield make
+    from db import storage_sqlite
+
+    storage_sqlite.close_db()
+
+
+@pytest.fixture(params=BACKENDS)
+def storage(request, fresh_backend):
+    return fresh_backend(request.param)
+
+
+@pytest.fixture(params=["sqlite", "mongo"])
+def compacting_storage(request, fresh_backend):
+    """The backends that persist data, and so compact it."""
+    return fresh_backend(request.param)
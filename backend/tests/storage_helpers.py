@@ -0,0 +1,211 @@
+"""
+Storage test helpers shared with the benchmarks in bench/: the mongomock
+stand-in for a Mongo server (with round-trip counting) and the seeded
+conformance workload every backend must answer like the memory backend.
+
+Import as tests.storage_helpers, from backend/.
+"""
+import random
+import threading
+import time
+import types
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Tuple
+
+from db.rolling_windows import ROLLING_WINDOW_METRICS
+
+
+_COUNTED = ["find", "find_one", "insert_one", "update_one", "replace_one", "find_one_and_update", "bulk_write", "aggregate"]
+
+
+class RoundTrips:
+    """Counts Mongo round trips (one per outermost collection call)."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def add(self) -> None:
+        with self._lock:
+            self.count += 1
+
+
+def mongomock_client(counter: RoundTrips):
+    """A mongomock client counting into `counter`. Patches mongomock's Collection class: call once per process."""
+    import mongomock
+    from pymongo import UpdateOne
+
+    collection_cls = mongomock.collection.Collection
+
+    def _counted(name):
+        original = getattr(collection_cls, name)
+
+        def wrapper(self, *args, **kwargs):
+            # mongomock calls its own public methods internally; count the outermost call only.
+            depth = getattr(counter._local, "depth", 0)
+            if depth == 0:
+                counter.add()
+            counter._local.depth = depth + 1
+            try:
+                return original(self, *args, **kwargs)
+            finally:
+                counter._local.depth = depth
+
+        return wrapper
+
+    def _bulk_write(self, operations, ordered=True):
+        # mongomock's bulk builder lags behind newer pymongo operation objects.
+        upserted = {}
+        for idx, op in enumerate(operations):
+            if not isinstance(op, UpdateOne):
+                raise NotImplementedError(type(op).__name__)
+            result = self.update_one(op._filter, op._doc, upsert=op._upsert)
+            if result.upserted_id is not None:
+                upserted[idx] = result.upserted_id
+        return types.SimpleNamespace(upserted_ids=upserted)
+
+    collection_cls.bulk_write = _bulk_write
+    for name in _COUNTED:
+        setattr(collection_cls, name, _counted(name))
+    return mongomock.MongoClient()
+
+
+# Wall-clock fields that legitimately differ between runs and backends.
+_VOLATILE = {"updated_at", "created_at", "lease_expires_at"}
+_TOLERANCE = 0.011
+
+
+def conformance_workload(args) -> List[Tuple[str, tuple]]:
+    """(operation, arguments) in execution order; user ids assume a fresh store."""
+    rng = random.Random(args.seed)
+    start = date(2023, 1, 1)
+    ops: List[Tuple[str, tuple]] = []
+    for i in range(args.users):
+        ops.append(("create_user", (f"User {i}", f"user{i}@example.com")))
+    ops.append(("create_user", ("Dup", "user0@example.com")))
+    ops.append(("create_user", ("Late", "late@example.com")))
+    user_ids = list(range(1, args.users + 2))
+
+    def payload(user_id: int, day: int) -> Dict:
+        row = {"user_id": user_id, "checkin_date": (start + timedelta(days=day)).isoformat()}
+        for name in ROLLING_WINDOW_METRICS:
+            row[name] = round(rng.uniform(0, 5000), 2)
+        return row
+
+    for _ in range(args.ops):
+        user_id = rng.choice(user_ids)
+        day = rng.randrange(args.days)
+        anchor = (start + timedelta(days=rng.randrange(args.days + 60))).isoformat()
+        roll = rng.random()
+        if roll < 0.35:
+            ops.append(("upsert_daily_checkin", (payload(user_id, day),)))
+        elif roll < 0.40:
+            rows = [payload(user_id, rng.randrange(args.days)) for _ in range(rng.randint(1, 40))]
+            if rng.random() < 0.3:
+                del rows[0]["daily_sales"]
+            if rng.random() < 0.2:
+                rows[-1]["cash_balance"] = float("nan")
+            ops.append(("bulk_upsert_daily_checkins", (user_id, rows)))
+        elif roll < 0.50:
+            ops.append(("compute_rolling_metrics", (user_id, anchor)))
+        elif roll < 0.60:
+            windows = rng.sample([1, 7, 14, 30, 90, 365], rng.randint(1, 3))
+            ops.append(("compute_window_aggregates", (user_id, windows, None, anchor, rng.random() < 0.5)))
+        elif roll < 0.70:
+            ops.append(("get_latest_checkin", (user_id, anchor)))
+        elif roll < 0.78:
+            end = start + timedelta(days=rng.randrange(args.days))
+            ops.append(("get_checkin_history", (user_id, (end - timedelta(days=60)).isoformat(), end.isoformat())))
+        elif roll < 0.86:
+            ops.append(("get_user_metrics", (user_id,)))
+        elif roll < 0.89:
+            ops.append(("get_user_checkins", (user_id, rng.choice([10, 120]))))
+        elif roll < 0.92:
+            after = (start + timedelta(days=rng.randrange(args.days))).isoformat() if rng.random() < 0.5 else None
+            since = (start + timedelta(days=rng.randrange(args.days))).isoformat() if rng.random() < 0.3 else None
+            ops.append(("get_checkin_page", (user_id, since, None, after, rng.choice([5, 50]), rng.random() < 0.5)))
+        else:
+            ops.append(("get_user_by_email", (f"user{rng.randrange(args.users + 1)}@example.com",)))
+
+    # Unknown users, an unparseable anchor and import-job bookkeeping.
+    missing = args.users + 100
+    ops.append(("upsert_daily_checkin", (payload(missing, 0),)))
+    ops.append(("bulk_upsert_daily_checkins", (missing, [payload(missing, 0), payload(missing, 1)])))
+    ops.append(("compute_rolling_metrics", (missing, "2023-02-01")))
+    ops.append(("compute_window_aggregates", (1, [0], None, "2023-02-01", True)))
+    ops.append(("compute_window_aggregates", (1, None, ["profit"], "2023-02-01", True)))
+    ops.append(("get_portfolio_metrics", (user_ids + [missing],)))
+    for i, status in enumerate(["queued", "running", "completed"]):
+        job = {
+            "job_id": f"job-{i}",
+            "user_id": 1,
+            "filename": f"import-{i}.csv",
+            "file_path": f"/tmp/import-{i}.csv",
+            "status": status,
+            "total_bytes": 1000,
+            "bytes_processed": 500 * i,
+            "rows_consumed": 10 * i,
+            "processed_rows": 9 * i,
+            "failed_rows": i,
+            "errors": [{"line": 2, "error": "bad row"}] * i,
+            "error": None,
+            "active_seconds": 1.5 * i,
+            "created_at": f"2023-01-0{i + 1}T00:00:00",
+            "started_at": None,
+            "finished_at": None,
+            "owner": None,
+            "lease_expires_at": None,
+        }
+        ops.append(("save_import_job", (job,)))
+    ops.append(("get_import_job", ("job-1",)))
+    ops.append(("get_import_job", ("missing",)))
+    ops.append(("list_import_jobs", (["queued", "running"],)))
+    # Claims: a held lease turns other owners away, finished jobs are never claimed.
+    active = ["queued", "running"]
+    ops.append(("claim_import_job", ("job-0", "worker-a", 60, active)))
+    ops.append(("claim_import_job", ("job-0", "worker-b", 60, active)))
+    ops.append(("claim_import_job", ("job-0", "worker-a", 60, active)))
+    ops.append(("claim_import_job", ("job-2", "worker-a", 60, active)))
+    ops.append(("claim_import_job", ("missing", "worker-a", 60, active)))
+    ops.append(("save_import_job", ({**job, "job_id": "job-0", "owner": "worker-b"}, "worker-b")))
+    ops.append(("get_import_job", ("job-0",)))
+    return ops
+
+
+def run_workload(storage, ops: List[Tuple[str, tuple]]) -> Tuple[List, Dict[str, List[float]]]:
+    results = []
+    timings: Dict[str, List[float]] = {}
+    for name, op_args in ops:
+        call: Callable = getattr(storage, name)
+        began = time.perf_counter()
+        try:
+            outcome = ("ok", call(*op_args))
+        except (KeyError, ValueError) as exc:
+            outcome = ("error", str(exc))
+        timings.setdefault(name, []).append(time.perf_counter() - began)
+        results.append(outcome)
+    return results, timings
+
+
+def diff_results(expected, actual, path: str = "") -> List[str]:
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        keys = (set(expected) | set(actual)) - _VOLATILE
+        problems = []
+        for key in sorted(keys, key=str):
+            if key not in expected or key not in actual:
+                problems.append(f"{path}.{key}: only in {'actual' if key in actual else 'expected'}")
+            else:
+                problems.extend(diff_results(expected[key], actual[key], f"{path}.{key}"))
+        return problems
+    if isinstance(expected, (list, tuple)) and isinstance(actual, (list, tuple)):
+        if len(expected) != len(actual):
+            return [f"{path}: length {len(expected)} != {len(actual)}"]
+        problems = []
+        for idx, (a, b) in enumerate(zip(expected, actual)):
+            problems.extend(diff_results(a, b, f"{path}[{idx}]"))
+        return problems
+    numbers = (int, float)
+    if isinstance(expected, numbers) and isinstance(actual, numbers) and not isinstance(expected, bool):
+        return [] if abs(expected - actual) <= _TOLERANCE else [f"{path}: {expected!r} != {actual!r}"]
+    return [] if expected == actual else [f"{path}: {expected!r} != {actual!r}"]
@@ -0,0 +1,76 @@
+"""[user-029] Batch reports: the job's own concurrency cap, and fallbacks stay retryable."""
+import asyncio
+
+import pytest
+
+from xai import batch_reports, explain
+
+
+@pytest.fixture
+def batch(monkeypatch, tmp_path):
+    # The API gate allows a single call; the batch must not be held to it.
+    monkeypatch.setenv("LLM_MAX_CONCURRENCY", "1")
+    monkeypatch.setenv("LLM_MAX_QUEUE", "0")
+    monkeypatch.setenv("LLM_CACHE_SIZE", "0")
+    saved = []
+    monkeypatch.setattr(
+        batch_reports,
+        "_prepare_report",
+        lambda user_id, as_of_date: {"prompt": f"prompt for {user_id}"},
+    )
+    monkeypatch.setattr(
+        batch_reports,
+        "_build_report",
+        lambda run_id, user_id, as_of_date, scored, text, source: {"user_id": user_id, "source": source},
+    )
+    monkeypatch.setattr(batch_reports, "save_risk_report", saved.append)
+    return saved, str(tmp_path / "run.checkpoint")
+
+
+def test_concurrency_is_the_batch_limit_not_the_api_gate(monkeypatch, batch):
+    _, checkpoint = batch
+    peak = {"now": 0, "max": 0}
+
+    async def generate(prompt, timeout_seconds=6.0):
+        peak["now"] += 1
+        peak["max"] = max(peak["max"], peak["now"])
+        await asyncio.sleep(0.05)
+        peak["now"] -= 1
+        return "text"
+
+    monkeypatch.setattr(explain, "generate_llm_explanation_async", generate)
+    stats = asyncio.run(
+        batch_reports.run_batch(
+            list(range(1, 17)), "run", "2024-06-30", concurrency=8, rate_per_minute=0, checkpoint_path=checkpoint
+        )
+    )
+    assert peak["max"] == 8
+    assert stats["llm"] == 16
+    assert stats["fallback"] == 0
+
+
+def test_fallbacks_are_retried_on_the_next_run(monkeypatch, batch):
+    saved, checkpoint = batch
+    answers = {1: "text", 2: None, 3: None}
+
+    async def generate(prompt, timeout_seconds=6.0):
+        return answers[int(prompt.rsplit(" ", 1)[1])]
+
+    monkeypatch.setattr(explain, "generate_llm_explanation_async", generate)
+
+    def run():
+        return asyncio.run(
+            batch_reports.run_batch([1, 2, 3], "run", "2024-06-30", rate_per_minute=0, checkpoint_path=checkpoint)
+        )
+
+    first = run()
+    assert (first["llm"], first["fallback"]) == (1, 2)
+    assert batch_reports._load_checkpoint(checkpoint) == {1}
+
+    answers[2] = "text"
+    saved.clear()
+    second = run()
+    assert second["skipped_from_checkpoint"] == 1
+    assert sorted(report["user_id"] for report in saved) == [2, 3]
+    assert (second["llm"], second["fallback"]) == (1, 1)
+    assert batch_reports._load_checkpoint(checkpoint) == {1, 2}
@@ -0,0 +1,131 @@
+"""[user-032] bulk_upsert_daily_checkins: per-row errors by payload index, and the same end state as row-by-row upserts."""
+import pytest
+
+
+def _row(user_id, checkin_date, **overrides):
+    row = {
+        "user_id": user_id,
+        "checkin_date": checkin_date,
+        "daily_sales": 100.0,
+        "daily_expenses": 40.0,
+        "receivables": 5.0,
+        "loan_emi": 2.0,
+        "cash_balance": 900.0,
+    }
+    row.update(overrides)
+    return row
+
+
+def _mixed_payloads(user_id):
+    missing_sales = _row(user_id, "2024-01-02")
+    del missing_sales["daily_sales"]
+    return [
+        _row(user_id, "2024-01-01"),
+        missing_sales,
+        _row(user_id, "2024-01-03", cash_balance=float("nan")),
+        _row(user_id, "2024-01-04", daily_sales="12.5"),
+        _row(user_id, "2024-01-05", daily_expenses="lots"),
+        # Same day again: the later row wins, like a second upsert.
+        _row(user_id, "2024-01-01", daily_sales=7.0),
+    ]
+
+
+def _single_upsert_error(storage, payload):
+    try:
+        storage.upsert_daily_checkin(payload)
+    except Exception as exc:  # KeyError, ValueError or the backend's integrity error
+        return str(exc)
+    return None
+
+
+def test_errors_are_reported_by_payload_index(storage):
+    user_id = storage.create_user("Bulk", "bulk@example.com")["user_id"]
+    result = storage.bulk_upsert_daily_checkins(user_id, _mixed_payloads(user_id))
+
+    assert [error["index"] for error in result["errors"]] == [1, 2, 4]
+    assert result["processed"] == 3
+    history = storage.get_checkin_history(user_id, "2024-01-01", "2024-01-31")
+    assert [(row["checkin_date"], row["daily_sales"]) for row in history] == [("2024-01-01", 7.0), ("2024-01-04", 12.5)]
+
+
+def test_error_messages_match_single_upserts(storage):
+    user_id = storage.create_user("Bulk", "bulk@example.com")["user_id"]
+    payloads = _mixed_payloads(user_id)
+    result = storage.bulk_upsert_daily_checkins(user_id, payloads)
+
+    other_id = storage.create_user("Single", "single@example.com")["user_id"]
+    for error in result["errors"]:
+        payload = {**payloads[error["index"]], "user_id": other_id}
+        assert error["error"] == _single_upsert_error(storage, payload)
+
+
+def test_metrics_match_row_by_row_upserts(storage):
+    bulk_id = storage.create_user("Bulk", "bulk@example.com")["user_id"]
+    single_id = storage.create_user("Single", "single@example.com")["user_id"]
+    payloads = _mixed_payloads(bulk_id) + [_row(bulk_id, f"2024-02-{day:02d}", daily_sales=day) for day in range(1, 20)]
+
+    result = storage.bulk_upsert_daily_checkins(bulk_id, payloads)
+    for payload in payloads:
+        _single_upsert_error(storage, {**payload, "user_id": single_id})
+
+    bulk_metrics = storage.get_user_metrics(bulk_id)
+    single_metrics = storage.get_user_metrics(single_id)
+    assert result["metrics"]["user_id"] == bulk_id
+    assert {k: v for k, v in bulk_metrics.items() if k != "user_id"} == {
+        k: v for k, v in single_metrics.items() if k != "user_id"
+    }
+    assert storage.compute_rolling_metrics(bulk_id, "2024-02-19") == storage.compute_rolling_metrics(single_id, "2024-02-19")
+
+
+def test_unknown_user_fails_every_row(storage):
+    payloads = [_row(404, "2024-01-01"), _row(404, "2024-01-02")]
+    result = storage.bulk_upsert_daily_checkins(404, payloads)
+    assert result == {
+        "processed": 0,
+        "errors": [{"index": 0, "error": "User 404 not found"}, {"index": 1, "error": "User 404 not found"}],
+        "metrics": None,
+    }
+
+
+def test_all_rows_rejected_leaves_metrics_alone(storage):
+    user_id = storage.create_user("Bulk", "bulk@example.com")["user_id"]
+    storage.upsert_daily_checkin(_row(user_id, "2024-01-01"))
+    before = storage.get_user_metrics(user_id)
+
+    result = storage.bulk_upsert_daily_checkins(user_id, [_row(user_id, "2024-01-02", daily_sales="x")])
+    assert result["processed"] == 0
+    assert result["metrics"] is None
+    assert storage.get_user_metrics(user_id) == before
+
+
+def test_sqlite_replays_rows_after_a_constraint_failure(fresh_backend):
+    # NaN passes float() but is stored as NULL, so executemany fails on the
+    # NOT NULL column and the batch is replayed row by row in the same
+    # transaction.
+    sqlite = fresh_backend("sqlite")
+    memory = fresh_backend("memory")
+    results = {}
+    for name, storage in (("sqlite", sqlite), ("memory", memory)):
+        user_id = storage.create_user("Replay", "replay@example.com")["user_id"]
+        payloads = [_row(user_id, f"2024-03-{day:02d}", daily_sales=10.0 * day) for day in range(1, 11)]
+        payloads[4]["cash_balance"] = float("nan")
+        payloads[7]["loan_emi"] = float("nan")
+        results[name] = (
+            storage.bulk_upsert_daily_checkins(user_id, payloads),
+            storage.get_checkin_history(user_id, "2024-03-01", "2024-03-31"),
+            storage.compute_rolling_metrics(user_id, "2024-03-10"),
+            storage.compute_window_aggregates(user_id, [7, 30], None, "2024-03-10", True),
+        )
+
+    result, history, rolling, windows = results["sqlite"]
+    assert result["processed"] == 8
+    assert result["errors"] == [
+        {"index": 4, "error": "NOT NULL constraint failed: daily_checkins.cash_balance"},
+        {"index": 7, "error": "NOT NULL constraint failed: daily_checkins.loan_emi"},
+    ]
+    assert [row["checkin_date"] for row in history] == [
+        f"2024-03-{day:02d}" for day in range(1, 11) if day not in (5, 8)
+    ]
+    # The rows written during the replay carry correct running totals.
+    assert (result, history, rolling, windows) == results["memory"]
+    assert rolling["monthly_sales"] == pytest.approx(10.0 * (sum(range(1, 11)) - 5 - 8))
@@ -0,0 +1,190 @@
+"""[user-042] compact_checkins and the reads that merge monthly rollups with the raw check-ins after them."""
+from datetime import date, timedelta
+
+import pytest
+
+from db.checkin_rollups import compacted_error
+
+
+START = date(2024, 1, 1)
+DAYS = 121  # 2024-01-01 .. 2024-04-30
+
+
+def _row(user_id, day: date):
+    n = (day - START).days
+    return {
+        "user_id": user_id,
+        "checkin_date": day.isoformat(),
+        "daily_sales": 100.0 + n,
+        "daily_expenses": 50.0 + n % 7,
+        "receivables": 10.0 + n % 3,
+        "loan_emi": 5.0,
+        "cash_balance": 1000.0 + 2 * n,
+    }
+
+
+def _days(first: date, last: date):
+    return [first + timedelta(days=n) for n in range((last - first).days + 1)]
+
+
+@pytest.fixture
+def seeded(compacting_storage):
+    storage = compacting_storage
+    user_id = storage.create_user("Compact", "compact@example.com")["user_id"]
+    rows = [_row(user_id, day) for day in _days(START, START + timedelta(days=DAYS - 1))]
+    # Skip a few days so months have different check-in counts.
+    rows = [row for row in rows if row["checkin_date"] not in {"2024-01-10", "2024-02-14", "2024-02-15"}]
+    assert storage.bulk_upsert_daily_checkins(user_id, rows)["processed"] == len(rows)
+    return storage, user_id, {row["checkin_date"]: row for row in rows}
+
+
+def _sum(rows, metric, first, last):
+    return sum(row[metric] for day, row in rows.items() if first <= day <= last)
+
+
+def test_compaction_folds_whole_months(seeded):
+    storage, user_id, rows = seeded
+    stats = storage.compact_checkins("2024-03-15")
+    assert stats == {"before": "2024-03-01", "users": 1, "months": 2, "rows": 30 + 27}
+    # Nothing left to fold for the same boundary.
+    assert storage.compact_checkins("2024-03-15")["rows"] == 0
+
+
+def test_pages_merge_months_then_days(seeded):
+    storage, user_id, rows = seeded
+    before = storage.get_checkin_page(user_id, limit=1000)
+    storage.compact_checkins("2024-03-01")
+    page = storage.get_checkin_page(user_id, limit=1000)
+
+    assert [row["checkin_date"] for row in page[:3]] == ["2024-01-01", "2024-02-01", "2024-03-01"]
+    january, february = page[0], page[1]
+    assert (january["period"], january["checkin_days"]) == ("month", 30)
+    assert (february["period"], february["checkin_days"]) == ("month", 27)
+    assert january["daily_sales"] == pytest.approx(_sum(rows, "daily_sales", "2024-01-01", "2024-01-31") / 30, abs=0.01)
+    assert page[2:] == [row for row in before if row["checkin_date"] >= "2024-03-01"]
+
+    descending = storage.get_checkin_page(user_id, limit=1000, descending=True)
+    assert descending == page[::-1]
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_keyset_pages_cross_the_compaction_boundary(seeded, descending):
+    storage, user_id, _ = seeded
+    storage.compact_checkins("2024-03-01")
+    everything = storage.get_checkin_page(user_id, limit=1000, descending=descending)
+
+    walked, after = [], None
+    while True:
+        page = storage.get_checkin_page(user_id, after=after, limit=7, descending=descending)
+        walked.extend(page)
+        if len(page) < 7:
+            break
+        after = page[-1]["checkin_date"]
+    assert walked == everything
+
+    # A month row is dated the 1st and filtered on that date.
+    ranged = storage.get_checkin_page(user_id, start_date="2024-02-01", end_date="2024-03-05", limit=1000)
+    assert [row["checkin_date"] for row in ranged] == ["2024-02-01"] + [f"2024-03-0{d}" for d in range(1, 6)]
+    ranged = storage.get_checkin_page(user_id, start_date="2024-02-10", end_date="2024-03-05", limit=1000)
+    assert [row["checkin_date"] for row in ranged] == [f"2024-03-0{d}" for d in range(1, 6)]
+
+
+def test_user_checkins_and_history_merge_rollups(seeded):
+    storage, user_id, rows = seeded
+    storage.compact_checkins("2024-03-01")
+
+    listed = storage.get_user_checkins(user_id, 5)
+    # Day rows leave period to the response model's default.
+    assert [(row["checkin_date"], row.get("period", "day")) for row in listed] == [
+        ("2024-01-01", "month"),
+        ("2024-02-01", "month"),
+        ("2024-03-01", "day"),
+        ("2024-03-02", "day"),
+        ("2024-03-03", "day"),
+    ]
+
+    history = storage.get_checkin_history(user_id, "2024-02-01", "2024-03-02")
+    # January's rollup carries balances forward into the range; a month is
+    # dated at its last check-in, with its totals and closing balances.
+    assert [row["checkin_date"] for row in history] == ["2024-01-31", "2024-02-29", "2024-03-01", "2024-03-02"]
+    assert history[0]["cash_balance"] == rows["2024-01-31"]["cash_balance"]
+    assert history[1] == {
+        "checkin_date": "2024-02-29",
+        "daily_sales": pytest.approx(_sum(rows, "daily_sales", "2024-02-01", "2024-02-29")),
+        "daily_expenses": pytest.approx(_sum(rows, "daily_expenses", "2024-02-01", "2024-02-29")),
+        "receivables": rows["2024-02-29"]["receivables"],
+        "loan_emi": rows["2024-02-29"]["loan_emi"],
+        "cash_balance": rows["2024-02-29"]["cash_balance"],
+    }
+    assert history[2:] == [{k: v for k, v in rows[day].items() if k != "user_id"} for day in ("2024-03-01", "2024-03-02")]
+
+
+def test_windows_inside_the_horizon_are_unchanged(seeded):
+    storage, user_id, _ = seeded
+    rolling = storage.compute_rolling_metrics(user_id, "2024-04-30")
+    windows = storage.compute_window_aggregates(user_id, [7, 30], None, "2024-04-30", True)
+    storage.compact_checkins("2024-03-01")
+    assert storage.compute_rolling_metrics(user_id, "2024-04-30") == rolling
+    assert storage.compute_window_aggregates(user_id, [7, 30], None, "2024-04-30", True) == windows
+
+
+@pytest.mark.parametrize("window", [60, 100])
+def test_windows_reaching_into_rollups_count_whole_months(seeded, window):
+    # Short windows are range scans and long ones running totals (SQLite);
+    # both must take a month in when its last check-in is inside the window.
+    storage, user_id, rows = seeded
+    storage.compact_checkins("2024-03-01")
+    anchor = date(2024, 4, 10)
+    first = anchor - timedelta(days=window - 1)
+    month_start = first.replace(day=1)
+    counted_from = month_start.isoformat() if first.day > 1 else first.isoformat()
+
+    result = storage.compute_window_aggregates(user_id, [window], ["daily_sales"], anchor.isoformat(), False)
+    current = result["windows"][0]["current"]
+    assert current["totals"]["daily_sales"] == pytest.approx(
+        _sum(rows, "daily_sales", counted_from, anchor.isoformat()), abs=0.01
+    )
+    assert current["checkin_days"] == sum(1 for day in rows if counted_from <= day <= anchor.isoformat())
+
+
+def test_rolling_metrics_read_rollups(seeded):
+    storage, user_id, rows = seeded
+    storage.compact_checkins("2024-04-01")
+    # (Mar 1 .. Mar 31] holds March's last check-in, so all of March counts;
+    # the 30 days before hold February's.
+    metrics = storage.compute_rolling_metrics(user_id, "2024-03-31")
+    assert metrics["monthly_sales"] == pytest.approx(_sum(rows, "daily_sales", "2024-03-01", "2024-03-31"), abs=0.01)
+    assert metrics["sales_3_months_ago"] == pytest.approx(_sum(rows, "daily_sales", "2024-02-01", "2024-02-29"), abs=0.01)
+    # A day earlier March's last check-in is outside the window, so none of it counts.
+    assert storage.compute_rolling_metrics(user_id, "2024-03-30")["monthly_sales"] == 0.0
+
+
+def test_writes_into_compacted_months_are_rejected(seeded):
+    storage, user_id, rows = seeded
+    storage.compact_checkins("2024-03-01")
+    with pytest.raises(ValueError, match="compacted"):
+        storage.upsert_daily_checkin(_row(user_id, date(2024, 2, 14)))
+
+    result = storage.bulk_upsert_daily_checkins(
+        user_id, [_row(user_id, date(2024, 5, 1)), _row(user_id, date(2024, 1, 10)), _row(user_id, date(2024, 5, 2))]
+    )
+    assert result["processed"] == 2
+    assert result["errors"] == [{"index": 1, "error": str(compacted_error("2024-02"))}]
+    assert storage.get_latest_checkin(user_id)["checkin_date"] == "2024-05-02"
+
+
+def test_second_compaction_adds_to_existing_rollups(seeded):
+    storage, user_id, rows = seeded
+    storage.compact_checkins("2024-02-01")
+    storage.compact_checkins("2024-04-01")
+    page = storage.get_checkin_page(user_id, limit=1000)
+    assert [(row["checkin_date"], row["checkin_days"]) for row in page[:4]] == [
+        ("2024-01-01", 30),
+        ("2024-02-01", 27),
+        ("2024-03-01", 31),
+        ("2024-04-01", 1),
+    ]
+    result = storage.compute_window_aggregates(user_id, [365], ["daily_sales"], "2024-04-30", False)
+    assert result["windows"][0]["current"]["totals"]["daily_sales"] == pytest.approx(
+        _sum(rows, "daily_sales", "2024-01-01", "2024-04-30"), abs=0.01
+    )
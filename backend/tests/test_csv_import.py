@@ -0,0 +1,13 @@
+"""[user-033] CSV date detection keeps the row-level parser's DD/MM-first precedence."""
+import pandas as pd
+
+from utils.csv_import import detect_date_format
+
+
+def test_days_up_to_twelve_read_as_dd_mm():
+    assert detect_date_format(pd.Series(["01/02/2024", "05/03/2024", "12/11/2024"])) == "%d/%m/%Y"
+
+
+def test_a_day_over_twelve_settles_the_format():
+    assert detect_date_format(pd.Series(["01/02/2024", "02/13/2024"])) == "%m/%d/%Y"
+    assert detect_date_format(pd.Series(["2024-02-01", ""])) == "%Y-%m-%d"
@@ -0,0 +1,122 @@
+"""[user-026] LLM admission: threads and event-loop callers share one slot budget and one queue."""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from xai import explain
+
+
+@pytest.fixture(autouse=True)
+def limits(monkeypatch):
+    monkeypatch.setenv("LLM_MAX_CONCURRENCY", "2")
+    monkeypatch.setenv("LLM_MAX_QUEUE", "3")
+    monkeypatch.setenv("LLM_QUEUE_WAIT_SECONDS", "1.0")
+    yield
+    assert explain._llm_admission["in_flight"] == 0
+    assert not explain._llm_waiters
+
+
+def _stats():
+    return explain.get_llm_admission_stats()
+
+
+def test_threads_and_coroutines_share_the_slots():
+    assert explain._acquire_llm_slot()
+    assert explain._acquire_llm_slot()
+
+    async def main():
+        # Both slots are held by threads, so the coroutine has to queue.
+        waiting = asyncio.ensure_future(explain._acquire_llm_slot_async())
+        await asyncio.sleep(0.05)
+        assert not waiting.done()
+        assert _stats()["queue_depth"] == 1
+        threading.Thread(target=explain._release_llm_slot).start()
+        assert await asyncio.wait_for(waiting, 1.0)
+        assert _stats()["in_flight"] == 2
+
+    asyncio.run(main())
+    explain._release_llm_slot()
+    explain._release_llm_slot()
+
+
+def test_in_flight_never_exceeds_the_limit_across_both_paths():
+    peak = {"now": 0, "max": 0}
+    lock = threading.Lock()
+
+    def hold(seconds):
+        with lock:
+            peak["now"] += 1
+            peak["max"] = max(peak["max"], peak["now"])
+        time.sleep(seconds)
+        with lock:
+            peak["now"] -= 1
+
+    def thread_caller():
+        if explain._acquire_llm_slot():
+            try:
+                hold(0.05)
+            finally:
+                explain._release_llm_slot()
+
+    async def async_caller():
+        if await explain._acquire_llm_slot_async():
+            try:
+                await asyncio.to_thread(hold, 0.05)
+            finally:
+                explain._release_llm_slot()
+
+    async def main():
+        threads = [threading.Thread(target=thread_caller) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        await asyncio.gather(*(async_caller() for _ in range(3)))
+        for thread in threads:
+            thread.join()
+
+    asyncio.run(main())
+    assert peak["max"] <= 2
+
+
+def test_queue_limit_counts_both_kinds_of_waiter():
+    before = _stats()["rejected_queue_full"]
+    assert explain._acquire_llm_slot()
+    assert explain._acquire_llm_slot()
+
+    async def main():
+        queued = [asyncio.ensure_future(explain._acquire_llm_slot_async()) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        thread_result = {}
+        waiter = threading.Thread(target=lambda: thread_result.setdefault("ok", explain._acquire_llm_slot()))
+        waiter.start()
+        await asyncio.sleep(0.05)
+        assert _stats()["queue_depth"] == 3
+        # A fourth waiter of either kind is turned away.
+        assert not await explain._acquire_llm_slot_async()
+        assert not explain._acquire_llm_slot()
+        # Slots go to the waiters in arrival order: both coroutines, then the thread.
+        explain._release_llm_slot()
+        explain._release_llm_slot()
+        assert await asyncio.gather(*queued) == [True, True]
+        explain._release_llm_slot()
+        await asyncio.to_thread(waiter.join)
+        assert thread_result["ok"]
+        for _ in range(2):
+            explain._release_llm_slot()
+
+    asyncio.run(main())
+    assert _stats()["rejected_queue_full"] == before + 2
+
+
+def test_waiters_time_out_and_leave_the_queue(monkeypatch):
+    monkeypatch.setenv("LLM_QUEUE_WAIT_SECONDS", "0.05")
+    before = _stats()["rejected_wait_timeout"]
+    assert explain._acquire_llm_slot()
+    assert explain._acquire_llm_slot()
+    assert not explain._acquire_llm_slot()
+    assert not asyncio.run(explain._acquire_llm_slot_async())
+    assert _stats()["rejected_wait_timeout"] == before + 2
+    assert _stats()["queue_depth"] == 0
+    explain._release_llm_slot()
+    explain._release_llm_slot()
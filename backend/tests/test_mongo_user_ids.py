@@ -0,0 +1,62 @@
+"""[user-038] hi/lo user ids in the Mongo backend: blocks reserved from the counter, rejected registrations handing their id back."""
+import pytest
+
+
+@pytest.fixture
+def mongo(fresh_backend, monkeypatch):
+    module = fresh_backend("mongo")
+    monkeypatch.setattr(module, "USER_ID_BLOCK_SIZE", 3)
+    return module
+
+
+def _counter(mongo):
+    return mongo._get_db().counters.find_one({"_id": "user_id"})["seq"]
+
+
+def _register(mongo, *emails):
+    return [mongo.create_user(email.split("@")[0], email)["user_id"] for email in emails]
+
+
+def test_ids_are_handed_out_from_reserved_blocks(mongo):
+    assert _register(mongo, "a@x.com", "b@x.com") == [1, 2]
+    assert _counter(mongo) == 3
+    assert _register(mongo, "c@x.com", "d@x.com") == [3, 4]
+    assert _counter(mongo) == 6
+
+
+def test_duplicate_email_hands_its_id_back(mongo):
+    _register(mongo, "a@x.com")
+    with pytest.raises(ValueError, match="Email already exists"):
+        mongo.create_user("Again", "a@x.com")
+    assert _register(mongo, "b@x.com") == [2]
+
+
+def test_released_id_at_a_block_boundary_is_reused(mongo):
+    _register(mongo, "a@x.com", "b@x.com", "c@x.com")
+    # The failed registration reserves the next block, then gives back its first id.
+    with pytest.raises(ValueError):
+        mongo.create_user("Again", "c@x.com")
+    assert _counter(mongo) == 6
+    assert _register(mongo, "d@x.com", "e@x.com", "f@x.com") == [4, 5, 6]
+    assert _counter(mongo) == 6
+
+
+def test_release_after_a_later_id_does_not_reuse(mongo):
+    database = mongo._get_db()
+    first = mongo._next_user_id(database)
+    second = mongo._next_user_id(database)
+    mongo._release_user_id(first)
+    assert mongo._next_user_id(database) == second + 1
+
+    mongo._release_user_id(second + 1)
+    assert mongo._next_user_id(database) == second + 1
+
+
+def test_processes_never_share_ids(mongo):
+    ids = _register(mongo, "a@x.com")
+    # Another process starts with no block of its own.
+    mongo._id_block.update({"next": 0, "last": -1})
+    ids += _register(mongo, "b@x.com", "c@x.com", "d@x.com")
+    assert ids == [1, 4, 5, 6]
+    assert len(set(ids)) == len(ids)
+    assert all(mongo.user_exists(user_id) for user_id in ids)
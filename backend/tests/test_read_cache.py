@@ -0,0 +1,40 @@
+"""[user-045] The read cache notices check-ins written by other worker processes."""
+import pytest
+
+from db import read_cache
+
+
+def _checkin(user_id, day, sales):
+    return {
+        "user_id": user_id,
+        "checkin_date": day,
+        "daily_sales": sales,
+        "daily_expenses": 100.0,
+        "receivables": 0.0,
+        "loan_emi": 0.0,
+        "cash_balance": 1000.0,
+    }
+
+
+@pytest.mark.parametrize("backend", ["sqlite", "mongo"])
+def test_cached_reads_follow_the_checkin_version(fresh_backend, monkeypatch, backend):
+    monkeypatch.setenv("READ_CACHE_TTL_SECONDS", "3600")
+    read_cache.invalidate_all()
+    storage = fresh_backend(backend)
+    user_id = storage.create_user("a", f"a-{backend}@cache.local")["user_id"]
+    storage.upsert_daily_checkin(_checkin(user_id, "2024-06-01", 500.0))
+
+    metrics = read_cache.cached(
+        "test_metrics", storage.get_user_metrics, lambda uid: uid, version_of=storage.get_checkin_version
+    )
+    checkins = read_cache.cached(
+        "test_checkins", storage.get_user_checkins, lambda uid: uid, version_of=storage.get_checkin_version
+    )
+    first_metrics, first_checkins = metrics(user_id), checkins(user_id)
+    assert metrics(user_id) is first_metrics
+
+    # Another worker writes: this process's cache is never told.
+    storage.upsert_daily_checkin(_checkin(user_id, "2024-06-02", 700.0))
+
+    assert metrics(user_id) != first_metrics
+    assert len(checkins(user_id)) == len(first_checkins) + 1
@@ -0,0 +1,18 @@
+"""[user-031] close_db closes the pooled connections of every thread, and those threads reconnect."""
+from concurrent.futures import ThreadPoolExecutor
+
+
+def test_other_threads_reconnect_after_close_db(fresh_backend):
+    storage = fresh_backend("sqlite")
+    user_id = storage.create_user("a", "a@pool.local")["user_id"]
+    worker = ThreadPoolExecutor(1)
+    try:
+        before = worker.submit(storage._connect).result()
+        storage.close_db()
+        after = worker.submit(storage._connect).result()
+        assert after is not before
+        # The worker thread's old handle is closed, not left open on the file.
+        assert before not in storage._open_connections
+        assert worker.submit(storage.user_exists, user_id).result()
+    finally:
+        worker.shutdown()
@@ -0,0 +1,82 @@
+"""[user-041] SQLite shards: rows follow their users when SQLITE_SHARDS changes."""
+import pytest
+
+
+def _checkin(user_id, day):
+    return {
+        "user_id": user_id,
+        "checkin_date": f"2024-05-{day:02d}",
+        "daily_sales": 100.0 * user_id + day,
+        "daily_expenses": 40.0,
+        "receivables": 5.0,
+        "loan_emi": 2.0,
+        "cash_balance": 900.0,
+    }
+
+
+@pytest.fixture
+def sqlite(fresh_backend, monkeypatch):
+    module = fresh_backend("sqlite")
+    monkeypatch.setattr(module, "SQLITE_SHARDS", module.SQLITE_SHARDS)
+    return module
+
+
+def _reshard(sqlite, shards):
+    sqlite.close_db()
+    sqlite.SQLITE_SHARDS = shards
+    sqlite.init_db()
+
+
+def _snapshot(sqlite, user_ids):
+    return {
+        uid: (
+            sqlite.get_user_metrics(uid),
+            sqlite.get_checkin_history(uid, "2024-05-01", "2024-05-31"),
+            sqlite.compute_rolling_metrics(uid, "2024-05-31"),
+        )
+        for uid in user_ids
+    }
+
+
+@pytest.mark.parametrize("counts", [(1, 2, 4), (4, 2), (3, 1), (2, 5, 3)])
+def test_changing_the_shard_count_keeps_every_user(sqlite, counts):
+    _reshard(sqlite, counts[0])
+    user_ids = [sqlite.create_user(f"U{i}", f"u{i}@example.com")["user_id"] for i in range(12)]
+    for uid in user_ids:
+        sqlite.bulk_upsert_daily_checkins(uid, [_checkin(uid, day) for day in range(1, 8)])
+    expected = _snapshot(sqlite, user_ids)
+
+    for shards in counts[1:]:
+        _reshard(sqlite, shards)
+        assert _snapshot(sqlite, user_ids) == expected
+        # Every per-user row sits in exactly the file the user maps to now.
+        for path in {sqlite._shard_path(uid) for uid in user_ids}:
+            conn = sqlite._connect(path)
+            try:
+                owners = {row[0] for row in conn.execute("SELECT DISTINCT user_id FROM daily_checkins")}
+            finally:
+                conn.close()
+            assert owners == {uid for uid in user_ids if sqlite._shard_path(uid) == path}
+
+    # Writes after the move land where reads look.
+    uid = user_ids[-1]
+    sqlite.upsert_daily_checkin(_checkin(uid, 20))
+    assert sqlite.get_latest_checkin(uid)["checkin_date"] == "2024-05-20"
+
+
+def test_unrecorded_layout_is_taken_from_the_shard_files(sqlite):
+    _reshard(sqlite, 2)
+    user_ids = [sqlite.create_user(f"U{i}", f"u{i}@example.com")["user_id"] for i in range(8)]
+    for uid in user_ids:
+        sqlite.upsert_daily_checkin(_checkin(uid, 1))
+    expected = _snapshot(sqlite, user_ids)
+    # As written before the directory recorded its shard count.
+    conn = sqlite._connect()
+    try:
+        conn.execute("DELETE FROM storage_settings")
+        conn.commit()
+    finally:
+        conn.close()
+
+    _reshard(sqlite, 4)
+    assert _snapshot(sqlite, user_ids) == expected
@@ -0,0 +1,50 @@
+"""[user-047] Async SQLite writes: one writer thread per database file."""
+import asyncio
+import threading
+
+import pytest
+
+from db import storage_async, storage_sqlite
+
+
+@pytest.fixture
+def four_shards(monkeypatch):
+    storage_async.shutdown()
+    monkeypatch.setattr(storage_sqlite, "SQLITE_SHARDS", 4)
+    monkeypatch.setattr(storage_async.storage, "USE_MONGODB", False)
+    monkeypatch.setattr(storage_async.storage, "STORAGE_BACKEND", "sqlite")
+    yield
+    storage_async.shutdown()
+
+
+def _thread_name(*args):
+    return threading.current_thread().name
+
+
+def test_each_shard_has_its_own_writer(four_shards):
+    async def main():
+        users = list(range(1, 41))
+        names = await asyncio.gather(*[storage_async.run_user_write(uid, _thread_name) for uid in users])
+        main_writer = await storage_async.run_write(_thread_name)
+        return dict(zip(users, names)), main_writer
+
+    by_user, main_writer = asyncio.run(main())
+    assert len(storage_async._writers) == 5
+    for uid, name in by_user.items():
+        assert name.startswith(f"storage-write-{1 + storage_sqlite._shard_index(uid)}_")
+    assert len(set(by_user.values())) == 4
+    assert main_writer.startswith("storage-write-0_")
+
+
+def test_writes_to_different_shards_overlap(four_shards):
+    first, second = [next(uid for uid in range(1, 100) if storage_sqlite._shard_index(uid) == i) for i in (0, 1)]
+    both = threading.Barrier(2, timeout=2.0)
+
+    async def main():
+        # Each write waits for the other: only passes if they run at once.
+        await asyncio.gather(
+            storage_async.run_user_write(first, both.wait),
+            storage_async.run_user_write(second, both.wait),
+        )
+
+    asyncio.run(main())
@@ -0,0 +1,30 @@
+"""[user-039] The seeded conformance workload (tests/storage_helpers.py): SQLite and Mongo must answer like the memory backend."""
+import argparse
+
+import pytest
+
+from tests.storage_helpers import conformance_workload, diff_results, run_workload
+
+
+WORKLOAD = argparse.Namespace(users=8, ops=400, days=400, seed=11)
+
+
+@pytest.mark.parametrize("name", ["sqlite", "mongo"])
+def test_backend_answers_like_memory(fresh_backend, name):
+    ops = conformance_workload(WORKLOAD)
+    expected, _ = run_workload(fresh_backend("memory"), ops)
+    actual, _ = run_workload(fresh_backend(name), ops)
+
+    mismatches = []
+    for idx, (want, got) in enumerate(zip(expected, actual)):
+        mismatches.extend(f"#{idx} {ops[idx][0]}{problem}" for problem in diff_results(want, got))
+    assert mismatches == []
+
+
+def test_workload_covers_errors(fresh_backend):
+    results, _ = run_workload(fresh_backend("memory"), conformance_workload(WORKLOAD))
+    assert any(outcome == "error" for outcome, _ in results)
+    assert any(
+        outcome == "ok" and isinstance(value, dict) and value.get("errors")
+        for outcome, value in results
+    ), "no bulk upsert reported per-row errors"
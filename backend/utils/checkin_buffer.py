@@ -0,0 +1,329 @@
+"""
+Write-behind mode for daily check-ins (CHECKIN_WRITE_BEHIND=1).
+
+/checkins/daily checks the check-in the way upsert_daily_checkin would
+(user, values, compacted months; see check_checkin), appends it to a local
+append-only log and answers 202 straight away. A flusher thread applies the
+log every CHECKIN_FLUSH_INTERVAL_MS (sooner once CHECKIN_FLUSH_MAX_ROWS are
+waiting) with one bulk_upsert_daily_checkins per user, so each user's
+metrics are recomputed once per flush rather than once per check-in. A row
+the database still rejects at flush time is logged and appended to
+CHECKIN_REJECTS_PATH.
+
+Every worker process keeps its own log (CHECKIN_LOG_PATH with the pid
+added), so workers never apply or remove each other's rows. Reads for a
+user with unapplied check-ins in this process flush first (flush_user), so
+users see their own writes; check-ins queued on another worker are visible
+after that worker's next flush. On startup a worker replays the logs of
+processes that are no longer running; check-in upserts are idempotent, so
+rows that were already applied are simply written again.
+"""
+import glob
+import json
+import logging
+import os
+import re
+import threading
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+from db.storage import bulk_upsert_daily_checkins, check_checkin
+
+
+logger = logging.getLogger(__name__)
+
+CHECKIN_LOG_PATH = os.getenv(
+    "CHECKIN_LOG_PATH", os.path.join(os.path.dirname(__file__), "../data/checkin_log.jsonl")
+)
+CHECKIN_REJECTS_PATH = os.getenv(
+    "CHECKIN_REJECTS_PATH", os.path.join(os.path.dirname(__file__), "../data/checkin_rejects.jsonl")
+)
+
+_lock = threading.Lock()  # _pending, _pending_users and the log file
+_flush_lock = threading.Lock()  # one flush at a time
+_pending: List[Dict] = []
+_pending_users: Dict[int, int] = defaultdict(int)  # queued or in-flight rows per user
+_inflight: Optional[List[Dict]] = None
+_log = None
+_wake = threading.Event()
+_stopping = threading.Event()
+_flusher: Optional[threading.Thread] = None
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(1, int(os.getenv(name, str(default)).strip()))
+    except ValueError:
+        return default
+
+
+def write_behind_enabled() -> bool:
+    return os.getenv("CHECKIN_WRITE_BEHIND", "0").strip().lower() in {"1", "true", "yes"}
+
+
+def _fsync_enabled() -> bool:
+    # Off by default: flushing to the OS survives an application crash, the
+    # same guarantee SQLite gives with synchronous=NORMAL.
+    return os.getenv("CHECKIN_LOG_FSYNC", "0").strip().lower() in {"1", "true", "yes"}
+
+
+def _process_log_path(pid: int) -> str:
+    root, ext = os.path.splitext(CHECKIN_LOG_PATH)
+    return f"{root}.{pid}{ext}"
+
+
+def _log_path() -> str:
+    # Looked up per call: a worker forked after import has its own pid.
+    return _process_log_path(os.getpid())
+
+
+def _applying_path() -> str:
+    # The log being applied by the current flush; removed once it is in the database.
+    return _log_path() + ".applying"
+
+
+def _open_log():
+    global _log
+    if _log is None:
+        directory = os.path.dirname(CHECKIN_LOG_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        _log = open(_log_path(), "a", encoding="utf-8")
+    return _log
+
+
+def _close_log() -> None:
+    global _log
+    if _log is not None:
+        _log.close()
+        _log = None
+
+
+def _read_log(path: str) -> List[Dict]:
+    rows = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rows.append(json.loads(line))
+                except ValueError:
+                    # Torn final line from a crash mid-append; it was never acknowledged.
+                    continue
+    except FileNotFoundError:
+        pass
+    return rows
+
+
+def enqueue_checkin(payload: Dict) -> Dict:
+    """Log one check-in for the flusher; raises the ValueError upsert_daily_checkin would for a bad one."""
+    user_id = int(payload["user_id"])
+    # Resolve the default date now, not when the row is applied.
+    row = {**payload, "user_id": user_id, "checkin_date": (payload.get("checkin_date") or date.today().isoformat()).strip()}
+    check_checkin(row)
+    line = json.dumps(row) + "\n"
+    with _lock:
+        log = _open_log()
+        log.write(line)
+        log.flush()
+        if _fsync_enabled():
+            os.fsync(log.fileno())
+        _pending.append(row)
+        _pending_users[user_id] += 1
+        queued = len(_pending)
+    if queued >= _env_int("CHECKIN_FLUSH_MAX_ROWS", 5000):
+        _wake.set()
+    return {"user_id": user_id, "checkin_date": row["checkin_date"], "status": "queued", "pending": queued}
+
+
+def _apply(rows: List[Dict]) -> None:
+    by_user: Dict[int, List[Dict]] = defaultdict(list)
+    for row in rows:
+        by_user[int(row["user_id"])].append(row)
+    for user_id, user_rows in by_user.items():
+        # Log order is preserved, so the last check-in for a date wins and
+        # metrics end as of the last submitted row, as with one-by-one upserts.
+        result = bulk_upsert_daily_checkins(user_id, user_rows)
+        for error in result["errors"]:
+            _record_rejection(user_rows[error["index"]], error["error"])
+
+
+def _record_rejection(row: Dict, error: str) -> None:
+    """An acknowledged check-in the database refused after all: log it and keep it in the rejects file."""
+    logger.error("write-behind check-in %s/%s rejected at flush: %s", row.get("user_id"), row.get("checkin_date"), error)
+    entry = {"rejected_at": datetime.utcnow().isoformat(timespec="seconds"), "error": error, "checkin": row}
+    try:
+        directory = os.path.dirname(CHECKIN_REJECTS_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(CHECKIN_REJECTS_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+    except OSError:
+        logger.exception("could not append to %s", CHECKIN_REJECTS_PATH)
+
+
+def flush_once() -> int:
+    """Apply everything logged so far; returns the number of rows applied. Raises if the database write fails."""
+    global _inflight
+    with _flush_lock:
+        if _inflight is None:
+            with _lock:
+                if not _pending:
+                    return 0
+                _inflight = list(_pending)
+                _pending.clear()
+                _close_log()
+                os.replace(_log_path(), _applying_path())
+        # On failure _inflight and its file stay put and the next flush retries them first.
+        _apply(_inflight)
+        applied = _inflight
+        try:
+            os.remove(_applying_path())
+        except FileNotFoundError:
+            pass
+        with _lock:
+            for row in applied:
+                user_id = int(row["user_id"])
+                _pending_users[user_id] -= 1
+                if _pending_users[user_id] <= 0:
+                    del _pending_users[user_id]
+        _inflight = None
+        return len(applied)
+
+
+def _has_pending(user_id: int) -> bool:
+    with _lock:
+        return bool(_pending_users.get(user_id))
+
+
+def flush_user(user_id: int, raise_errors: bool = False) -> bool:
+    """
+    Read-your-writes: apply any check-ins this user is still waiting on in
+    this process. Returns False when the database write failed; the rows
+    stay queued for the flusher. Reads go on with what is stored, writes
+    that must land after the queued rows pass raise_errors=True.
+    """
+    user_id = int(user_id)
+    # A flush applies everything queued when it starts, unless it first has
+    # to retry a failed batch, so two rounds cover rows queued before this call.
+    for _ in range(2):
+        if not _has_pending(user_id):
+            return True
+        try:
+            flush_once()
+        except Exception:
+            if raise_errors:
+                raise
+            logger.exception("write-behind flush for user %s failed; serving stored data", user_id)
+            return False
+    return not _has_pending(user_id)
+
+
+def _run_flusher() -> None:
+    interval = _env_int("CHECKIN_FLUSH_INTERVAL_MS", 200) / 1000.0
+    while not _stopping.is_set():
+        _wake.wait(interval)
+        _wake.clear()
+        try:
+            flush_once()
+        except Exception:
+            logger.exception("write-behind flush failed, will retry")
+
+
+def _process_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return False  # a previous process that had our pid; we have not logged anything yet
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # exists, owned by someone else
+    return True
+
+
+def _claim_orphaned_logs() -> List[Dict]:
+    """
+    Rows from the logs of processes that are gone, oldest log first, moved
+    into this process's .applying file. A log is claimed by renaming it with
+    a .claimed-<pid> suffix, so two workers starting together never both
+    replay it, and a claim left by a worker that died is claimed again.
+    """
+    root, ext = os.path.splitext(CHECKIN_LOG_PATH)
+    pattern = re.compile(
+        re.escape(os.path.basename(root)) + r"(?:\.(\d+))?" + re.escape(ext) + r"(\.applying)?(?:\.claimed-(\d+))?$"
+    )
+    candidates = []
+    for path in glob.glob(glob.escape(root) + "*"):
+        name = os.path.basename(path)
+        match = pattern.match(name)
+        if match is None:
+            continue
+        owner, applying, claimer = match.groups()
+        holder = claimer or owner  # the unsuffixed log predates per-process logs and has no owner
+        if holder is not None and _process_alive(int(holder)):
+            continue
+        # A process's .applying rows were logged before the rest of its log.
+        base = os.path.join(os.path.dirname(path), name[: match.start(3) - len(".claimed-")]) if claimer else path
+        candidates.append((int(owner or -1), applying is None, path, base))
+
+    rows, claimed = [], []
+    for _, _, path, base in sorted(candidates):
+        target = f"{base}.claimed-{os.getpid()}"
+        if path != target:
+            try:
+                os.rename(path, target)
+            except FileNotFoundError:
+                continue  # another worker claimed it first
+        claimed.append(target)
+        rows.extend(_read_log(target))
+    if rows:
+        tmp_path = _applying_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, _applying_path())
+    for path in claimed:
+        os.remove(path)
+    return rows
+
+
+def start_checkin_flusher() -> None:
+    """Replay logs left by stopped processes, then start the flusher when write-behind is enabled."""
+    global _flusher, _inflight
+    with _flush_lock, _lock:
+        if _inflight is None and not _pending:
+            leftover = _claim_orphaned_logs()
+            if leftover:
+                _inflight = leftover
+            for row in _inflight or []:
+                _pending_users[int(row["user_id"])] += 1
+    if not write_behind_enabled():
+        # Switched off since the last run: apply what is left and stay synchronous.
+        while _inflight is not None or _pending:
+            flush_once()
+        return
+    _stopping.clear()
+    if _flusher is None or not _flusher.is_alive():
+        _flusher = threading.Thread(target=_run_flusher, name="checkin-flusher", daemon=True)
+        _flusher.start()
+
+
+def stop_checkin_flusher(timeout: float = 5.0) -> None:
+    """Stop the flusher and apply what is pending; anything left stays in the log for the next start."""
+    global _flusher
+    _stopping.set()
+    _wake.set()
+    if _flusher is not None:
+        _flusher.join(timeout)
+        _flusher = None
+    try:
+        while _inflight is not None or _pending:
+            flush_once()
+    except Exception:
+        logger.exception("final write-behind flush failed; the log is replayed on the next start")
+    with _lock:
+        _close_log()
+
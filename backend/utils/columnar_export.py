@@ -0,0 +1,256 @@
+"""
+Columnar exports of check-ins, user metrics and risk reports for analysts
+and model retraining.
+
+Rows are read from the configured storage backend in batches
+(iter_table_rows) and written as Parquet or Arrow IPC row groups, one file
+per month partition:
+
+    <out>/<table>/month=YYYY-MM/part-<run>.parquet
+
+Hive-style, so pyarrow, pandas, DuckDB or Spark read the directory as one
+dataset. Each run records a watermark per table in <out>/_watermarks.json;
+with --incremental the next run exports only rows written since then, as
+new part files. A row changed between runs is in both; load_export keeps
+the latest copy.
+
+pyarrow is only needed for exports and is imported on first use.
+
+Usage (from backend/):
+    python -m utils.columnar_export --out data/exports
+    python -m utils.columnar_export --out data/exports --incremental --tables daily_checkins --format arrow
+"""
+import argparse
+import json
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+from db.export_tables import EXPORT_TABLES, export_spec
+from db.storage import iter_table_rows
+
+
+EXPORT_FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+EXPORT_BATCH_ROWS = 50000
+# Rows stamped this close to the start of a run may still be committing;
+# they are left for the next run rather than risked being skipped.
+_WATERMARK_LAG_SECONDS = 5
+_INT_COLUMNS = {"user_id", "window_days", "risk_score"}
+# Dates and timestamps stay ISO strings: they sort correctly and a stray
+# malformed date cannot fail a whole export.
+_STRING_COLUMNS = {
+    "run_id",
+    "risk_level",
+    "checkin_date",
+    "last_checkin_date",
+    "as_of_date",
+    "updated_at",
+    "created_at",
+}
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError as exc:
+        raise RuntimeError("Columnar exports need pyarrow (pip install pyarrow)") from exc
+    return pyarrow
+
+
+def _schema(table: str):
+    pa = _pyarrow()
+    fields = []
+    for column in export_spec(table)["columns"]:
+        if column in _INT_COLUMNS:
+            fields.append(pa.field(column, pa.int64()))
+        elif column in _STRING_COLUMNS:
+            fields.append(pa.field(column, pa.string()))
+        else:
+            fields.append(pa.field(column, pa.float64()))
+    return pa.schema(fields)
+
+
+def _to_table(rows: List[Dict], schema):
+    pa = _pyarrow()
+    return pa.table({field.name: pa.array([row[field.name] for row in rows], type=field.type) for field in schema}, schema=schema)
+
+
+def _month(value) -> str:
+    return str(value)[:7] if value else "unknown"
+
+
+def _open_writer(path: str, schema, fmt: str):
+    pa = _pyarrow()
+    if fmt == "parquet":
+        return pa.parquet.ParquetWriter(path, schema, compression="zstd")
+    return pa.ipc.new_file(path, schema)
+
+
+def _read_watermarks(out_dir: str) -> Dict[str, str]:
+    try:
+        with open(os.path.join(out_dir, "_watermarks.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _write_watermarks(out_dir: str, watermarks: Dict[str, str]) -> None:
+    path = os.path.join(out_dir, "_watermarks.json")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(watermarks, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def export_table(
+    out_dir: str,
+    table: str,
+    fmt: str = "parquet",
+    since: Optional[str] = None,
+    incremental: bool = False,
+    batch_rows: int = EXPORT_BATCH_ROWS,
+) -> Dict:
+    """
+    Export one table into month partitions under out_dir/table. With
+    `incremental`, start from the table's last watermark (unless `since` is
+    given). Every storage batch becomes one row group per month it touches.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    spec = export_spec(table)
+    schema = _schema(table)
+    watermarks = _read_watermarks(out_dir)
+    if since is None and incremental:
+        since = watermarks.get(table)
+    until = (datetime.utcnow() - timedelta(seconds=_WATERMARK_LAG_SECONDS)).isoformat(timespec="seconds")
+    run = until.replace("-", "").replace(":", "")
+    writers: Dict[str, tuple] = {}
+    rows_written = 0
+    try:
+        for batch in iter_table_rows(table, since=since, until=until, batch_rows=batch_rows):
+            by_month: Dict[str, List[Dict]] = defaultdict(list)
+            for row in batch:
+                by_month[_month(row[spec["partition"]])].append(row)
+            for month, rows in by_month.items():
+                if month not in writers:
+                    directory = os.path.join(out_dir, table, f"month={month}")
+                    os.makedirs(directory, exist_ok=True)
+                    final = os.path.join(directory, f"part-{run}{EXPORT_FORMATS[fmt]}")
+                    # Readers never see a partly written file: it is renamed once closed.
+                    writers[month] = (_open_writer(final + ".tmp", schema, fmt), final)
+                writers[month][0].write_table(_to_table(rows, schema))
+                rows_written += len(rows)
+    except BaseException:
+        for writer, final in writers.values():
+            writer.close()
+            os.remove(final + ".tmp")
+        raise
+    for writer, final in writers.values():
+        writer.close()
+        os.replace(final + ".tmp", final)
+    watermarks[table] = until
+    _write_watermarks(out_dir, watermarks)
+    return {"table": table, "rows": rows_written, "files": len(writers), "since": since, "until": until}
+
+
+def write_export_file(
+    path: str, table: str, fmt: str = "parquet", since: Optional[str] = None, batch_rows: int = EXPORT_BATCH_ROWS
+) -> int:
+    """One table, or the rows written since `since`, as a single file with a row group per storage batch."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    schema = _schema(table)
+    rows_written = 0
+    writer = _open_writer(path, schema, fmt)
+    try:
+        for batch in iter_table_rows(table, since=since, batch_rows=batch_rows):
+            writer.write_table(_to_table(batch, schema))
+            rows_written += len(batch)
+    finally:
+        writer.close()
+    return rows_written
+
+
+def iter_arrow_stream(table: str, since: Optional[str] = None, batch_rows: int = EXPORT_BATCH_ROWS) -> Iterator[bytes]:
+    """
+    One table as an Arrow IPC stream, one record batch per storage batch, for
+    streaming responses. An unknown table or missing pyarrow raises here,
+    before anything is sent.
+    """
+    return _arrow_stream(_schema(table), table, since, batch_rows)
+
+
+def _arrow_stream(schema, table: str, since: Optional[str], batch_rows: int) -> Iterator[bytes]:
+    pa = _pyarrow()
+    chunks: List[bytes] = []
+
+    class _Sink:
+        closed = False
+
+        def write(self, data) -> int:
+            chunks.append(bytes(data))
+            return len(data)
+
+        def flush(self) -> None:
+            pass
+
+    writer = pa.ipc.new_stream(pa.PythonFile(_Sink(), mode="w"), schema)
+    for batch in iter_table_rows(table, since=since, batch_rows=batch_rows):
+        writer.write_table(_to_table(batch, schema))
+        yield b"".join(chunks)
+        chunks.clear()
+    writer.close()
+    yield b"".join(chunks)
+
+
+def load_export(path: str, table: Optional[str] = None):
+    """
+    An export file or directory as a pandas DataFrame. For an export table
+    directory the latest copy of each row is kept.
+    """
+    _pyarrow()
+    import pyarrow.dataset as ds
+
+    fmt = "parquet"
+    if path.endswith(".arrow") or (
+        os.path.isdir(path) and any(name.endswith(".arrow") for _, _, names in os.walk(path) for name in names)
+    ):
+        fmt = "ipc"
+    frame = ds.dataset(path, format=fmt, partitioning="hive").to_table().to_pandas()
+    table = table or os.path.basename(os.path.normpath(path))
+    spec = EXPORT_TABLES.get(table)
+    if spec is not None and not frame.empty:
+        frame = (
+            frame.sort_values(spec["timestamp"], kind="stable")
+            .drop_duplicates(subset=spec["key"], keep="last")
+            .sort_values(spec["key"])
+            .reset_index(drop=True)
+        )
+    return frame
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export storage tables to Parquet or Arrow files.")
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(__file__), "../data/exports"))
+    parser.add_argument("--tables", default=",".join(EXPORT_TABLES), help="Comma-separated tables")
+    parser.add_argument("--format", default="parquet", choices=sorted(EXPORT_FORMATS))
+    parser.add_argument("--since", default=None, help="Only rows written at or after this ISO timestamp")
+    parser.add_argument("--incremental", action="store_true", help="Continue from the last run's watermark")
+    parser.add_argument("--batch-rows", type=int, default=EXPORT_BATCH_ROWS)
+    args = parser.parse_args()
+
+    from db.storage import close_db, init_db
+
+    init_db()
+    try:
+        for table in [t.strip() for t in args.tables.split(",") if t.strip()]:
+            stats = export_table(args.out, table, args.format, args.since, args.incremental, args.batch_rows)
+            print(json.dumps(stats))
+    finally:
+        close_db()
+
+
+if __name__ == "__main__":
+    main()
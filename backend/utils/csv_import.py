@@ -0,0 +1,225 @@
+"""
+Streaming, vectorized parser for check-in CSV uploads.
+
+Column aliases are resolved once from the header and the date format is
+detected once from a sample, then each chunk of rows is parsed column-wise
+with pandas. Only one chunk is held in memory at a time. Rows the fast path
+cannot parse go through the row-level parsers, so results and error messages
+match the original per-row import.
+"""
+import csv
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# Canonical field -> accepted header names, in priority order.
+CSV_COLUMN_ALIASES = {
+    "checkin_date": ["checkin_date", "date", "day"],
+    "daily_sales": ["daily_sales", "sales", "sales_daily", "sales_per_day", "day_sales"],
+    "daily_expenses": ["daily_expenses", "expenses", "expenses_daily", "expenses_per_day", "day_expenses"],
+    "receivables": ["receivables", "pending_payments"],
+    "loan_emi": ["loan_emi", "emi", "daily_loan_emi"],
+    "cash_balance": ["cash_balance", "cash", "daily_cash_balance"],
+}
+
+# Same order the row-level parser tries them in.
+DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y", "%m/%d/%Y", "%d-%m-%Y", "%m-%d-%Y"]
+
+_CURRENCY_TOKENS = [",", "₹", "$", "rs", "RS"]
+_DATE_SAMPLE_SIZE = 200
+
+
+def parse_csv_float(value, default: float = 0.0) -> float:
+    if value is None:
+        return float(default)
+    text = str(value).strip()
+    if not text:
+        return float(default)
+    cleaned = text
+    for token in _CURRENCY_TOKENS:
+        cleaned = cleaned.replace(token, "")
+    cleaned = cleaned.strip()
+    try:
+        return float(cleaned)
+    except ValueError:
+        raise ValueError(f"Invalid numeric value: '{text}'")
+
+
+def normalize_csv_date(value: str) -> str:
+    text = str(value or "").strip()
+    if not text:
+        raise ValueError("Missing date/checkin_date value")
+    # Accept YYYY-MM-DD first, then DD/MM/YYYY and MM/DD/YYYY style.
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date().isoformat()
+        except ValueError:
+            continue
+    raise ValueError(f"Unsupported date format: '{text}'")
+
+
+def resolve_columns(fieldnames: List[str]) -> Dict[str, List[int]]:
+    """Header -> column indexes per canonical field (later duplicates win, like DictReader)."""
+    positions = {name: idx for idx, name in enumerate(fieldnames)}
+    return {
+        field: [positions[alias] for alias in aliases if alias in positions]
+        for field, aliases in CSV_COLUMN_ALIASES.items()
+    }
+
+
+def detect_date_format(values: pd.Series) -> Optional[str]:
+    """
+    The format the first _DATE_SAMPLE_SIZE dates are written in, used for the
+    whole file. A sample that fits several formats (every day is 12 or less)
+    takes the first in DATE_FORMATS, DD/MM before MM/DD, as the row-level
+    parser does.
+    """
+    sample = values[values != ""].head(_DATE_SAMPLE_SIZE)
+    if sample.empty:
+        return None
+    best_fmt, best_hits = None, 0
+    for fmt in DATE_FORMATS:
+        hits = int(pd.to_datetime(sample, format=fmt, errors="coerce").notna().sum())
+        if hits == len(sample):
+            return fmt
+        if hits > best_hits:
+            best_fmt, best_hits = fmt, hits
+    return best_fmt
+
+
+def _column(rows: List[List[str]], indexes: List[int]) -> pd.Series:
+    """First non-blank value across the alias columns, stripped ('' if none)."""
+    result = pd.Series([""] * len(rows), dtype=object)
+    for idx in reversed(indexes):
+        values = pd.Series([row[idx] if idx < len(row) else "" for row in rows], dtype=object).str.strip()
+        result = values.where(values != "", result)
+    return result
+
+
+def _parse_numeric(text: pd.Series, default: float) -> Tuple[np.ndarray, pd.Series]:
+    cleaned = text
+    for token in _CURRENCY_TOKENS:
+        cleaned = cleaned.str.replace(token, "", regex=False)
+    cleaned = cleaned.str.strip()
+    values = pd.to_numeric(cleaned, errors="coerce").to_numpy(dtype=float, copy=True)
+    empty = (text == "").to_numpy()
+    values[empty] = default
+    errors = pd.Series([None] * len(text), dtype=object)
+    # float() accepts a few spellings to_numeric does not (e.g. 'inf', '1_000').
+    for idx in np.flatnonzero(np.isnan(values) & ~empty):
+        try:
+            values[idx] = parse_csv_float(text.iat[idx], default=default)
+        except ValueError as exc:
+            errors.iat[idx] = str(exc)
+    return values, errors
+
+
+def _parse_dates(text: pd.Series, fmt: Optional[str]) -> Tuple[pd.Series, pd.Series]:
+    parsed = pd.Series([None] * len(text), dtype=object)
+    if fmt is not None:
+        converted = pd.to_datetime(text, format=fmt, errors="coerce")
+        ok = converted.notna()
+        parsed[ok] = converted[ok].dt.strftime("%Y-%m-%d")
+    errors = pd.Series([None] * len(text), dtype=object)
+    for idx in np.flatnonzero(parsed.isna().to_numpy()):
+        try:
+            parsed.iat[idx] = normalize_csv_date(text.iat[idx])
+        except ValueError as exc:
+            errors.iat[idx] = str(exc)
+    return parsed, errors
+
+
+def open_checkin_csv(stream) -> Tuple[Iterator[List[str]], Dict[str, List[int]]]:
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if not header:
+        raise ValueError("CSV header row is missing")
+    return reader, resolve_columns(header)
+
+
+def iter_checkin_chunks(
+    reader,
+    columns: Dict[str, List[int]],
+    user_id: int,
+    chunk_rows: int = 5000,
+    skip_rows: int = 0,
+):
+    """
+    Yield (payloads, payload_lines, errors, row_count) per chunk of CSV rows.
+
+    Line numbers follow the original importer: data rows start at 2 and blank
+    lines are skipped without being counted. `skip_rows` data rows are read
+    past without parsing (resuming an interrupted import).
+    """
+    date_format = None
+    format_detected = False
+    line = 2
+    skipped = 0
+    while skipped < skip_rows:
+        row = next(reader, None)
+        if row is None:
+            return
+        if row:
+            skipped += 1
+            line += 1
+    while True:
+        rows = []
+        for row in reader:
+            if row:
+                rows.append(row)
+                if len(rows) >= chunk_rows:
+                    break
+        if not rows:
+            return
+
+        lines = np.arange(line, line + len(rows))
+        line += len(rows)
+
+        date_text = _column(rows, columns["checkin_date"])
+        if not format_detected:
+            date_format = detect_date_format(date_text)
+            format_detected = True
+
+        sales_text = _column(rows, columns["daily_sales"])
+        expenses_text = _column(rows, columns["daily_expenses"])
+        dates, date_errors = _parse_dates(date_text, date_format)
+        sales, sales_errors = _parse_numeric(sales_text, 0.0)
+        expenses, expenses_errors = _parse_numeric(expenses_text, 0.0)
+        receivables, receivables_errors = _parse_numeric(_column(rows, columns["receivables"]), 0.0)
+        loan_emi, emi_errors = _parse_numeric(_column(rows, columns["loan_emi"]), 0.0)
+        cash, cash_errors = _parse_numeric(_column(rows, columns["cash_balance"]), 0.0)
+
+        # First failing check wins, in the order the per-row importer ran them.
+        error = cash_errors
+        for later_first in (emi_errors, receivables_errors, expenses_errors, sales_errors, date_errors):
+            error = later_first.where(later_first.notna(), error)
+        missing_required = (sales_text == "") | (expenses_text == "")
+        error = error.where(
+            ~missing_required, "Missing required columns: daily_sales and/or daily_expenses"
+        )
+
+        payloads = []
+        payload_lines = []
+        errors = []
+        error_values = error.to_numpy()
+        date_values = dates.to_numpy()
+        for i in range(len(rows)):
+            if isinstance(error_values[i], str):
+                errors.append({"line": int(lines[i]), "error": str(error_values[i])})
+                continue
+            payloads.append(
+                {
+                    "user_id": int(user_id),
+                    "checkin_date": date_values[i],
+                    "daily_sales": float(sales[i]),
+                    "daily_expenses": float(expenses[i]),
+                    "receivables": float(receivables[i]),
+                    "loan_emi": float(loan_emi[i]),
+                    "cash_balance": float(cash[i]),
+                }
+            )
+            payload_lines.append(int(lines[i]))
+        yield payloads, payload_lines, errors, len(rows)
@@ -1,3 +1,6 @@
+import numpy as np
+
+
 def _to_float(value, default=0.0):
     """Convert nullable numeric input to float safely."""
     try:
@@ -31,3 +34,29 @@ def compute_features(data):
         "sales_growth_rate": _safe_div(monthly_sales - sales_3_months_ago, sales_3_months_ago),
         "expense_growth_rate": _safe_div(monthly_expenses - expenses_3_months_ago, expenses_3_months_ago),
     }
+
+
+def _safe_div_array(numerator, denominator, default=0.0):
+    """Elementwise _safe_div over NumPy arrays."""
+    numerator = np.asarray(numerator, dtype=float)
+    denominator = np.asarray(denominator, dtype=float)
+    out = np.full(np.broadcast(numerator, denominator).shape, float(default))
+    np.divide(numerator, denominator, out=out, where=denominator != 0)
+    return out
+
+
+def compute_features_batch(data):
+    """compute_features for many rows at once: `data` maps input names to equal-length arrays."""
+    monthly_sales = np.asarray(data["monthly_sales"], dtype=float)
+    monthly_expenses = np.asarray(data["monthly_expenses"], dtype=float)
+    sales_3_months_ago = np.asarray(data["sales_3_months_ago"], dtype=float)
+    expenses_3_months_ago = np.asarray(data["expenses_3_months_ago"], dtype=float)
+
+    return {
+        "profit_margin": _safe_div_array(monthly_sales - monthly_expenses, monthly_sales),
+        "receivables_ratio": _safe_div_array(data["receivables"], monthly_sales),
+        "emi_ratio": _safe_div_array(data["loan_emi"], monthly_sales),
+        "cash_buffer_months": _safe_div_array(data["cash_balance"], monthly_expenses),
+        "sales_growth_rate": _safe_div_array(monthly_sales - sales_3_months_ago, sales_3_months_ago),
+        "expense_growth_rate": _safe_div_array(monthly_expenses - expenses_3_months_ago, expenses_3_months_ago),
+    }
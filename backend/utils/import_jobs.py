@@ -0,0 +1,279 @@
+"""
+Background CSV check-in imports.
+
+Uploads are spooled to IMPORT_JOBS_DIR and parsed by a small pool of worker
+threads. Progress is saved after every batch so GET /imports/{job_id} can
+report throughput and an ETA, and a job interrupted by a restart resumes
+after the last saved row (check-in upserts are idempotent, so a batch that
+was written but not yet recorded is simply written again).
+
+Several workers, in one process or many, may be handed the same job id. A
+worker first claims the job (claim_import_job), which sets it running under
+that worker's name with a lease of IMPORT_JOB_LEASE_SECONDS (default 60).
+Each saved batch renews the lease, and saves only land while the worker
+still holds the job. A job whose worker died is claimed again once its lease
+runs out; idle workers look for such jobs every lease period.
+"""
+import io
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from db.storage import bulk_upsert_daily_checkins, claim_import_job, list_import_jobs, save_import_job
+from utils.checkin_buffer import flush_user
+from utils.csv_import import iter_checkin_chunks, open_checkin_csv
+
+
+IMPORT_JOBS_DIR = os.getenv(
+    "IMPORT_JOBS_DIR", os.path.join(os.path.dirname(__file__), "../data/imports")
+)
+ACTIVE_STATUSES = ["queued", "running"]
+MAX_REPORTED_ERRORS = 20
+
+logger = logging.getLogger(__name__)
+
+_queue: "queue.Queue[Optional[str]]" = queue.Queue()
+_workers: List[threading.Thread] = []
+_workers_lock = threading.Lock()
+_stopping = threading.Event()
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(1, int(os.getenv(name, str(default)).strip()))
+    except ValueError:
+        return default
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat(timespec="seconds")
+
+
+def _lease_seconds() -> int:
+    return _env_int("IMPORT_JOB_LEASE_SECONDS", 60)
+
+
+def upsert_checkin_chunk(user_id: int, payloads: List[Dict], payload_lines: List[int], errors: List[Dict]) -> int:
+    """Write one parsed chunk; storage errors are appended to `errors` by CSV line."""
+    if not payloads:
+        return 0
+    # Buffered check-ins were submitted earlier and must not overwrite these rows later.
+    flush_user(user_id, raise_errors=True)
+    # One transaction and one user_metrics recompute per chunk.
+    result = bulk_upsert_daily_checkins(int(user_id), payloads)
+    errors.extend({"line": payload_lines[e["index"]], "error": e["error"]} for e in result["errors"])
+    return int(result["processed"])
+
+
+def merge_errors(reported: List[Dict], chunk_errors: List[Dict]) -> None:
+    if len(reported) < MAX_REPORTED_ERRORS:
+        reported.extend(sorted(chunk_errors, key=lambda e: e["line"])[: MAX_REPORTED_ERRORS - len(reported)])
+
+
+def import_file_path(job_id: str) -> str:
+    os.makedirs(IMPORT_JOBS_DIR, exist_ok=True)
+    return os.path.join(IMPORT_JOBS_DIR, f"{job_id}.csv")
+
+
+def submit_import_job(job_id: str, user_id: int, filename: str, file_path: str) -> Dict:
+    job = {
+        "job_id": job_id,
+        "user_id": int(user_id),
+        "filename": filename,
+        "file_path": file_path,
+        "status": "queued",
+        "total_bytes": os.path.getsize(file_path),
+        "bytes_processed": 0,
+        "rows_consumed": 0,
+        "processed_rows": 0,
+        "failed_rows": 0,
+        "errors": [],
+        "error": None,
+        "active_seconds": 0.0,
+        "created_at": _now(),
+        "started_at": None,
+        "updated_at": _now(),
+        "finished_at": None,
+        "owner": None,
+        "lease_expires_at": None,
+    }
+    save_import_job(job)
+    start_import_workers(resume=False)
+    _queue.put(job_id)
+    return job
+
+
+def _renew(job: Dict, owner: str) -> bool:
+    """Save progress and extend the lease; False once another worker has taken the job."""
+    job["lease_expires_at"] = time.time() + _lease_seconds()
+    return save_import_job(job, owner=owner)
+
+
+def _release(job: Dict, owner: str) -> None:
+    """Give the job up, still running, so the next worker can claim it without waiting for the lease."""
+    job["owner"] = None
+    job["lease_expires_at"] = None
+    save_import_job(job, owner=owner)
+
+
+def _finish(job: Dict, owner: str, status: str, error: Optional[str] = None) -> None:
+    job["status"] = status
+    job["error"] = error
+    job["finished_at"] = _now()
+    job["lease_expires_at"] = None
+    if status == "completed":
+        job["bytes_processed"] = job["total_bytes"]
+    if not save_import_job(job, owner=owner):
+        logger.warning("Import job %s was taken over by another worker before it finished", job["job_id"])
+        return
+    try:
+        os.remove(job["file_path"])
+    except OSError:
+        pass
+
+
+def _process_job(job: Dict, owner: str) -> None:
+    job["started_at"] = job.get("started_at") or _now()
+    if not _renew(job, owner):
+        return
+
+    try:
+        raw = open(job["file_path"], "rb")
+    except OSError:
+        _finish(job, owner, "failed", "Uploaded file is no longer available")
+        return
+
+    batch_rows = _env_int("IMPORT_JOB_BATCH_ROWS", 2000)
+    active_before = float(job.get("active_seconds") or 0.0)
+    started = time.monotonic()
+    stream = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+    failure = None
+    try:
+        reader, columns = open_checkin_csv(stream)
+        for payloads, payload_lines, chunk_errors, row_count in iter_checkin_chunks(
+            reader, columns, job["user_id"], chunk_rows=batch_rows, skip_rows=int(job["rows_consumed"])
+        ):
+            if _stopping.is_set():
+                # Left as "running"; picked up again by the next start_import_workers().
+                _release(job, owner)
+                return
+            job["processed_rows"] += upsert_checkin_chunk(job["user_id"], payloads, payload_lines, chunk_errors)
+            job["rows_consumed"] += row_count
+            job["failed_rows"] += len(chunk_errors)
+            merge_errors(job["errors"], chunk_errors)
+            job["bytes_processed"] = min(raw.tell(), job["total_bytes"])
+            job["active_seconds"] = active_before + (time.monotonic() - started)
+            if not _renew(job, owner):
+                logger.warning("Import job %s was taken over by another worker; stopping here", job["job_id"])
+                return
+    except Exception as exc:
+        failure = str(exc)
+    finally:
+        stream.close()
+
+    job["active_seconds"] = active_before + (time.monotonic() - started)
+    if failure is None and job["processed_rows"] == 0:
+        failure = "No rows were imported from CSV"
+    if failure is not None:
+        _finish(job, owner, "failed", failure)
+    else:
+        _finish(job, owner, "completed")
+
+
+def _queue_unclaimed_jobs() -> None:
+    """Queue active jobs nobody holds a live lease on (new, released, or left by a dead worker)."""
+    now = time.time()
+    for job in list_import_jobs(ACTIVE_STATUSES):
+        if not job.get("owner") or (job.get("lease_expires_at") or 0) < now:
+            _queue.put(job["job_id"])
+
+
+def _worker() -> None:
+    owner = f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+    while True:
+        try:
+            job_id = _queue.get(timeout=_lease_seconds())
+        except queue.Empty:
+            if _stopping.is_set():
+                return
+            try:
+                _queue_unclaimed_jobs()
+            except Exception:
+                logger.exception("Could not look for unclaimed import jobs")
+            continue
+        if job_id is None or _stopping.is_set():
+            return
+        try:
+            # None when the job is finished or another worker holds it.
+            job = claim_import_job(job_id, owner, _lease_seconds(), ACTIVE_STATUSES)
+            if job is not None:
+                _process_job(job, owner)
+        except Exception:
+            logger.exception("Import job %s crashed", job_id)
+
+
+def start_import_workers(resume: bool = True) -> None:
+    """Start the worker pool (idempotent); with `resume`, re-queue jobs a restart interrupted."""
+    with _workers_lock:
+        _stopping.clear()
+        alive = [t for t in _workers if t.is_alive()]
+        for _ in range(_env_int("IMPORT_WORKERS", 1) - len(alive)):
+            thread = threading.Thread(target=_worker, name="csv-import-worker", daemon=True)
+            thread.start()
+            alive.append(thread)
+        _workers[:] = alive
+    if resume:
+        _queue_unclaimed_jobs()
+
+
+def stop_import_workers(timeout: float = 5.0) -> None:
+    """Stop after the current batch; unfinished jobs stay resumable."""
+    with _workers_lock:
+        _stopping.set()
+        for _ in _workers:
+            _queue.put(None)
+        for thread in _workers:
+            thread.join(timeout)
+        _workers.clear()
+    while not _queue.empty():
+        try:
+            _queue.get_nowait()
+        except queue.Empty:
+            break
+
+
+def import_job_status(job: Dict) -> Dict:
+    active = float(job.get("active_seconds") or 0.0)
+    total_bytes = int(job.get("total_bytes") or 0)
+    done_bytes = int(job.get("bytes_processed") or 0)
+    rows_per_second = job["rows_consumed"] / active if active > 0 else 0.0
+    eta_seconds = None
+    if job["status"] in ("completed", "failed"):
+        eta_seconds = 0.0
+    elif active > 0 and done_bytes > 0:
+        # Row count of the file is unknown up front, so extrapolate from bytes.
+        eta_seconds = round((total_bytes - done_bytes) / (done_bytes / active), 1)
+    return {
+        "job_id": job["job_id"],
+        "user_id": int(job["user_id"]),
+        "filename": job["filename"],
+        "status": job["status"],
+        "total_bytes": total_bytes,
+        "bytes_processed": done_bytes,
+        "percent_complete": round(100.0 * done_bytes / total_bytes, 1) if total_bytes else 0.0,
+        "total_rows": int(job["rows_consumed"]),
+        "processed_rows": int(job["processed_rows"]),
+        "failed_rows": int(job["failed_rows"]),
+        "errors": job.get("errors") or [],
+        "error": job.get("error"),
+        "rows_per_second": round(rows_per_second, 1),
+        "eta_seconds": eta_seconds,
+        "created_at": job["created_at"],
+        "started_at": job.get("started_at"),
+        "finished_at": job.get("finished_at"),
+    }
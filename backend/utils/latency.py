@@ -0,0 +1,218 @@
+"""
+Per-stage latency spans, exported as Prometheus histograms and as a
+Server-Timing header.
+
+`with span("compute_features"):` (or `@timed("...")` on a function) times
+a stage and adds it to the finpilot_stage_duration_seconds histogram for
+that stage name. db/storage.py wraps every storage function as
+"storage.<name>", so reads served from the caches show up alongside the
+ones that reached the database.
+
+LatencyMiddleware times each request into
+finpilot_request_duration_seconds (by method, route template and status)
+and collects the spans it ran, including those on storage and threadpool
+threads, which inherit the request's context, into a Server-Timing header
+with one summed entry per stage. GET /metrics serves render_metrics().
+
+A span costs two perf_counter() calls, a bisect and an uncontended lock,
+one to two microseconds. LATENCY_METRICS=0 turns recording off; unlike most
+settings it is read once at import (checking the environment would cost as
+much as the span itself).
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+# Upper bounds in seconds: storage hits are tens of microseconds, an LLM call several seconds.
+BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_STAGE_METRIC = "finpilot_stage_duration_seconds"
+_REQUEST_METRIC = "finpilot_request_duration_seconds"
+
+_lock = threading.Lock()
+# (metric, labels) -> [bucket counts (last is +Inf), sum, count]
+_histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], List] = {}
+# Stage name -> its entry in _histograms, so a span skips building the key.
+_stages: Dict[str, List] = {}
+# Spans finished while serving the current request, for Server-Timing.
+_request_spans: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_spans", default=None)
+
+
+_enabled = os.getenv("LATENCY_METRICS", "1").strip().lower() not in {"0", "false", "no"}
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def set_enabled(flag: bool) -> None:
+    global _enabled
+    _enabled = bool(flag)
+
+
+def _histogram(metric: str, labels: Tuple[Tuple[str, str], ...]) -> List:
+    key = (metric, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+        return histogram
+
+
+def _add(histogram: List, seconds: float) -> None:
+    idx = bisect_left(BUCKETS, seconds)
+    with _lock:
+        histogram[0][idx] += 1
+        histogram[1] += seconds
+        histogram[2] += 1
+
+
+def record(name: str, seconds: float) -> None:
+    """Add one finished stage of `seconds` to its histogram and the current request's spans."""
+    histogram = _stages.get(name)
+    if histogram is None:
+        histogram = _stages[name] = _histogram(_STAGE_METRIC, (("stage", name),))
+    _add(histogram, seconds)
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.append((name, seconds))
+
+
+class span:
+    """Context manager timing the enclosed block as stage `name`."""
+
+    __slots__ = ("name", "began")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.began = None
+
+    def __enter__(self):
+        if _enabled:
+            self.began = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.began is not None:
+            record(self.name, time.perf_counter() - self.began)
+        return False
+
+
+def timed(name: str) -> Callable:
+    """Decorator timing every call of a plain function as stage `name`."""
+
+    def decorate(fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            began = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - began)
+
+        return wrapper
+
+    return decorate
+
+
+def server_timing(spans: List[Tuple[str, float]], total: Optional[float] = None) -> str:
+    """Server-Timing header value: one entry per stage name, durations summed, in milliseconds."""
+    totals: Dict[str, float] = {}
+    for name, seconds in spans:
+        totals[name] = totals.get(name, 0.0) + seconds
+    if total is not None:
+        totals["total"] = total
+    return ", ".join(f"{name};dur={seconds * 1000:.3f}" for name, seconds in totals.items())
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels) -> str:
+    return ",".join(f'{key}="{_escape(value)}"' for key, value in labels)
+
+
+def render_metrics() -> str:
+    """All histograms in the Prometheus text exposition format."""
+    with _lock:
+        snapshot = {key: (list(h[0]), h[1], h[2]) for key, h in _histograms.items()}
+    helps = {
+        _STAGE_METRIC: "Time spent in one named stage of request handling.",
+        _REQUEST_METRIC: "Time from receiving a request to sending its response headers.",
+    }
+    bounds = [f"{bound:g}" for bound in BUCKETS] + ["+Inf"]
+    lines = []
+    for metric, help_text in helps.items():
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} histogram")
+        for (name, labels), (counts, total, count) in sorted(snapshot.items()):
+            if name != metric:
+                continue
+            label_text = _format_labels(labels)
+            cumulative = 0
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                lines.append(f'{metric}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f"{metric}_sum{{{label_text}}} {total!r}")
+            lines.append(f"{metric}_count{{{label_text}}} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def reset() -> None:
+    with _lock:
+        for histogram in _histograms.values():
+            histogram[0] = [0] * (len(BUCKETS) + 1)
+            histogram[1] = 0.0
+            histogram[2] = 0
+
+
+class LatencyMiddleware:
+    """ASGI middleware: request histogram plus a Server-Timing header of the request's spans."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _enabled:
+            await self.app(scope, receive, send)
+            return
+
+        began = time.perf_counter()
+        spans: List[Tuple[str, float]] = []
+        token = _request_spans.set(spans)
+        started = False
+
+        def observe(status: int, elapsed: float) -> None:
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            labels = (("method", scope["method"]), ("route", route), ("status", str(status)))
+            _add(_histogram(_REQUEST_METRIC, labels), elapsed)
+
+        async def send_with_timing(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+                elapsed = time.perf_counter() - began
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing(spans, elapsed).encode("latin-1")))
+                message = {**message, "headers": headers}
+                observe(message["status"], elapsed)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_spans.reset(token)
+            if not started:
+                observe(500, time.perf_counter() - began)
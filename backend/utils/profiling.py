@@ -0,0 +1,302 @@
+"""
+On-demand profiling of a live worker, for the admin endpoints in main.py.
+
+Everything is off unless PROFILING_TOKEN is set, and each call must send it
+back as X-Admin-Token.
+
+- profile_worker(seconds): a sampling profiler. A background thread reads
+  every thread's Python stack (sys._current_frames) every interval_ms and
+  counts identical stacks. The workload is not instrumented, so the cost is
+  the sampler thread's share of the GIL, a few percent at the default 5 ms.
+  Threads parked in a wait (idle executor workers, the event loop's
+  select) are left out unless include_idle is set.
+- ProfilingMiddleware: a request sent with `X-Profile: 1` (and the token)
+  is sampled from arrival until its response is sent. The response carries
+  X-Profile-Id, and the profile stays available from get_request_profile
+  for the last PROFILE_KEEP (default 20) requests. Storage and threadpool
+  threads are sampled too, so other requests in flight show up as well.
+  Every stack starts with its thread's name, which tells them apart.
+  A busy interpreter hands the sampler the GIL only every switch interval
+  (5 ms by default), so this suits slow requests; profile the worker under
+  load for fast ones.
+- memory_diff(): tracemalloc snapshots. The first call starts tracing (at
+  PROFILING_TRACEMALLOC_FRAMES frames, default 1). Each later call reports
+  the allocation sites that grew most since the previous call, by line or
+  by file. stop_memory_tracing() stops tracing and drops the overhead.
+
+Profiles come out as collapsed stacks (flamegraph.pl / speedscope import:
+one "thread;outer;...;inner count" line per stack) or as a speedscope
+JSON file with one sampled profile per thread.
+"""
+import hmac
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+
+PROFILE_FORMATS = ("collapsed", "speedscope")
+MEMORY_GROUPINGS = ("lineno", "filename")
+
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Innermost Python frames of a thread blocked waiting for work.
+_IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("_base.py", "result"),
+}
+
+_profiles_lock = threading.Lock()
+_request_profiles: "OrderedDict[str, Dict]" = OrderedDict()
+_memory_lock = threading.Lock()
+_memory_baseline: Optional[tracemalloc.Snapshot] = None
+
+
+def _env_int(name: str, default: int, minimum: int = 0) -> int:
+    try:
+        return max(minimum, int(os.getenv(name, str(default)).strip()))
+    except ValueError:
+        return default
+
+
+def profiling_enabled() -> bool:
+    return bool(os.getenv("PROFILING_TOKEN", "").strip())
+
+
+def is_admin(token: Optional[str]) -> bool:
+    expected = os.getenv("PROFILING_TOKEN", "").strip()
+    return bool(expected) and token is not None and hmac.compare_digest(token.encode(), expected.encode())
+
+
+def max_profile_seconds() -> int:
+    return _env_int("PROFILING_MAX_SECONDS", 60, minimum=1)
+
+
+def _short_path(path: str) -> str:
+    if path.startswith(_BACKEND_DIR + os.sep):
+        return os.path.relpath(path, _BACKEND_DIR)
+    marker = path.rfind("site-packages" + os.sep)
+    if marker >= 0:
+        return path[marker + len("site-packages") + 1 :]
+    return os.path.basename(path)
+
+
+class Sampler:
+    """Counts the Python stacks of every other thread, sampled every `interval` seconds."""
+
+    def __init__(self, interval: float, include_idle: bool = False, exclude=()):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.exclude = set(exclude)
+        self.samples: Counter = Counter()
+        self.started = 0.0
+        self.duration = 0.0
+        self.ticks = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+
+    def start(self) -> "Sampler":
+        self.started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def stop(self) -> "Sampler":
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started
+        return self
+
+    def _run(self) -> None:
+        self.exclude.add(threading.get_ident())
+        while not self._stop.wait(self.interval):
+            self.ticks += 1
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident in self.exclude:
+                    continue
+                code = frame.f_code
+                if not self.include_idle and (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_name, _short_path(code.co_filename), code.co_firstlineno))
+                    frame = frame.f_back
+                stack.reverse()
+                self.samples[(names.get(ident, f"thread-{ident}"), tuple(stack))] += 1
+
+    def collapsed(self) -> str:
+        lines = []
+        for (thread_name, stack), count in self.samples.most_common():
+            names = [thread_name] + [f"{name} ({path}:{line})" for name, path, line in stack]
+            lines.append(";".join(part.replace(";", ":") for part in names) + f" {count}")
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def speedscope(self, name: str) -> Dict:
+        frame_index: Dict[Tuple[str, str, int], int] = {}
+        frames: List[Dict] = []
+        by_thread: Dict[str, Dict] = {}
+        # Sampling itself stretches the interval; weight ticks by the time they really took.
+        tick = self.duration / self.ticks if self.ticks and self.duration else self.interval
+        for (thread_name, stack), count in self.samples.items():
+            indices = []
+            for key in stack:
+                if key not in frame_index:
+                    frame_index[key] = len(frames)
+                    frames.append({"name": key[0], "file": key[1], "line": key[2]})
+                indices.append(frame_index[key])
+            profile = by_thread.setdefault(thread_name, {"samples": [], "weights": []})
+            profile["samples"].append(indices)
+            profile["weights"].append(round(count * tick, 6))
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "finpilot",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": thread_name,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": round(sum(profile["weights"]), 6),
+                    "samples": profile["samples"],
+                    "weights": profile["weights"],
+                }
+                for thread_name, profile in sorted(by_thread.items())
+            ],
+        }
+
+    def render(self, output_format: str, name: str):
+        """Collapsed stacks as text, or the speedscope document as a dict."""
+        if output_format == "speedscope":
+            return self.speedscope(name)
+        return self.collapsed()
+
+
+def validate_profile_request(output_format: str, interval_ms: float) -> None:
+    if output_format not in PROFILE_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(PROFILE_FORMATS)}")
+    if not 1 <= interval_ms <= 1000:
+        raise ValueError("interval_ms must be between 1 and 1000")
+
+
+def profile_worker(seconds: float, interval_ms: float = 5.0, include_idle: bool = False) -> Sampler:
+    """Sample this process for `seconds` (blocks the calling thread, not the others)."""
+    if not 0 < seconds <= max_profile_seconds():
+        raise ValueError(f"seconds must be between 0 and {max_profile_seconds()}")
+    sampler = Sampler(interval_ms / 1000.0, include_idle=include_idle, exclude=[threading.get_ident()]).start()
+    try:
+        time.sleep(seconds)
+    finally:
+        sampler.stop()
+    return sampler
+
+
+def _keep_request_profile(profile_id: str, sampler: Sampler, method: str, path: str) -> None:
+    with _profiles_lock:
+        _request_profiles[profile_id] = {"sampler": sampler, "name": f"{method} {path}"}
+        while len(_request_profiles) > _env_int("PROFILE_KEEP", 20, minimum=1):
+            _request_profiles.popitem(last=False)
+
+
+def get_request_profile(profile_id: str, output_format: str = "collapsed"):
+    """A kept request profile rendered as `output_format`, or None once it has been dropped."""
+    with _profiles_lock:
+        entry = _request_profiles.get(profile_id)
+    if entry is None:
+        return None
+    return entry["sampler"].render(output_format, entry["name"])
+
+
+class ProfilingMiddleware:
+    """ASGI middleware sampling requests sent with `X-Profile: 1` and a valid X-Admin-Token."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profiling_enabled():
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or [])
+        token = headers.get(b"x-admin-token")
+        if headers.get(b"x-profile", b"").strip() not in {b"1", b"true"} or not is_admin(
+            token.decode("latin-1") if token is not None else None
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex
+        interval_ms = _env_int("PROFILING_REQUEST_INTERVAL_MS", 1, minimum=1)
+        sampler = Sampler(interval_ms / 1000.0).start()
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            sampler.stop()
+            _keep_request_profile(profile_id, sampler, scope["method"], scope["path"])
+
+
+def memory_diff(limit: int = 25, group_by: str = "lineno") -> Dict:
+    """Allocation growth since the previous call; the first call starts tracing and sets the baseline."""
+    global _memory_baseline
+    if group_by not in MEMORY_GROUPINGS:
+        raise ValueError(f"group_by must be one of {', '.join(MEMORY_GROUPINGS)}")
+    with _memory_lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(_env_int("PROFILING_TRACEMALLOC_FRAMES", 1, minimum=1))
+            _memory_baseline = None
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+                tracemalloc.Filter(False, "<unknown>"),
+            )
+        )
+        previous, _memory_baseline = _memory_baseline, snapshot
+    current, peak = tracemalloc.get_traced_memory()
+    result = {
+        "tracing": True,
+        "traced_bytes": current,
+        "peak_traced_bytes": peak,
+        "baseline": previous is None,
+        "top": [],
+    }
+    if previous is None:
+        return result
+    for stat in snapshot.compare_to(previous, group_by)[:limit]:
+        frame = stat.traceback[0]
+        result["top"].append(
+            {
+                "location": f"{_short_path(frame.filename)}:{frame.lineno}" if group_by == "lineno" else _short_path(frame.filename),
+                "size_diff_bytes": stat.size_diff,
+                "size_bytes": stat.size,
+                "count_diff": stat.count_diff,
+                "count": stat.count,
+            }
+        )
+    return result
+
+
+def stop_memory_tracing() -> Dict:
+    global _memory_baseline
+    with _memory_lock:
+        was_tracing = tracemalloc.is_tracing()
+        tracemalloc.stop()
+        _memory_baseline = None
+    return {"tracing": False, "was_tracing": was_tracing}
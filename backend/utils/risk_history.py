@@ -0,0 +1,103 @@
+"""
+Daily-mode risk scores for many as_of dates from one load of a user's
+check-ins.
+
+For each date this reproduces what /predict computes in daily mode: the
+30-day and previous 30-day sales/expense sums (rounded like
+compute_rolling_metrics) and the latest receivables / EMI / cash balance on
+or before the date. Window sums come from one cumulative sum over a dense
+day grid, and every date is scored in a single model call.
+"""
+from datetime import date, timedelta
+from typing import Dict, List
+
+import numpy as np
+
+from ml.predictor import predict_risk_batch
+from utils.feature_engineering import compute_features_batch
+
+
+WINDOW_DAYS = 30
+MAX_POINTS = 3660
+
+
+def history_dates(start: date, end: date, step_days: int) -> List[date]:
+    if end < start:
+        raise ValueError("'from' must be on or before 'to'")
+    if step_days < 1:
+        raise ValueError("'step' must be at least 1 day")
+    count = (end - start).days // step_days + 1
+    if count > MAX_POINTS:
+        raise ValueError(f"Too many points ({count}); use a larger step or a shorter range (max {MAX_POINTS})")
+    return [start + timedelta(days=i * step_days) for i in range(count)]
+
+
+def history_start(dates: List[date]) -> date:
+    """Oldest check-in date any of the windows can include."""
+    return dates[0] - timedelta(days=2 * WINDOW_DAYS - 1)
+
+
+def _column(checkins: List[Dict], name: str) -> np.ndarray:
+    return np.fromiter((row[name] for row in checkins), dtype=float, count=len(checkins))
+
+
+def score_history(checkins: List[Dict], dates: List[date]) -> List[Dict]:
+    """
+    `checkins`: rows from get_checkin_history, oldest first. Dates before the
+    user's first check-in have no balances to score and are left out.
+    """
+    rows = []
+    ordinals = []
+    for row in checkins:
+        try:
+            ordinals.append(date.fromisoformat(row["checkin_date"]).toordinal())
+        except ValueError:
+            continue
+        rows.append(row)
+    if not rows or not dates:
+        return []
+
+    ordinals = np.asarray(ordinals)
+    targets = np.fromiter((d.toordinal() for d in dates), dtype=np.int64, count=len(dates))
+
+    # Dense per-day totals from the oldest window start to the last date.
+    first = int(targets[0]) - 2 * WINDOW_DAYS + 1
+    span = int(targets[-1]) - first + 1
+    in_grid = (ordinals >= first) & (ordinals <= targets[-1])
+    offsets = ordinals[in_grid] - first
+    end = targets - first + 1
+    sums = {}
+    for name in ("daily_sales", "daily_expenses"):
+        per_day = np.bincount(offsets, weights=_column(rows, name)[in_grid], minlength=span)
+        cumulative = np.concatenate(([0.0], np.cumsum(per_day)))
+        current = cumulative[end] - cumulative[end - WINDOW_DAYS]
+        previous = cumulative[end - WINDOW_DAYS] - cumulative[end - 2 * WINDOW_DAYS]
+        sums[name] = (np.round(current, 2), np.round(previous, 2))
+
+    latest = np.searchsorted(ordinals, targets, side="right") - 1
+    scored = latest >= 0
+    latest = latest[scored]
+    inputs = {
+        "monthly_sales": sums["daily_sales"][0][scored],
+        "monthly_expenses": sums["daily_expenses"][0][scored],
+        "sales_3_months_ago": sums["daily_sales"][1][scored],
+        "expenses_3_months_ago": sums["daily_expenses"][1][scored],
+        "receivables": _column(rows, "receivables")[latest],
+        "loan_emi": _column(rows, "loan_emi")[latest],
+        "cash_balance": _column(rows, "cash_balance")[latest],
+    }
+    probabilities = predict_risk_batch(compute_features_batch(inputs))
+
+    scored_dates = [d for d, ok in zip(dates, scored) if ok]
+    return [
+        {
+            "as_of_date": scored_dates[i].isoformat(),
+            "risk_score": int(probabilities[i] * 100),
+            "probability": round(float(probabilities[i]), 4),
+            "monthly_sales": float(inputs["monthly_sales"][i]),
+            "monthly_expenses": float(inputs["monthly_expenses"][i]),
+            "sales_3_months_ago": float(inputs["sales_3_months_ago"][i]),
+            "expenses_3_months_ago": float(inputs["expenses_3_months_ago"][i]),
+        }
+        for i in range(len(scored_dates))
+    ]
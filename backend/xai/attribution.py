@@ -0,0 +1,271 @@
+"""
+Local feature attribution for the risk model.
+
+- Tree ensembles (gradient boosting, random forest): exact path-dependent
+  TreeSHAP. Every leaf is a small product game over the distinct features on
+  its path, so its Shapley values only depend on which of those features the
+  row satisfies. Those values are precomputed per leaf for every pattern, and
+  scoring a row is one vectorized comparison pass plus a table gather.
+- Logistic regression: coefficient x (value - training mean).
+
+Contributions are in the model's raw output space (log-odds for gradient
+boosting and logistic regression, probability for random forest) and sum
+with the expected value to the model output.
+"""
+import os
+from itertools import combinations
+from math import factorial
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from ml.predictor import FEATURE_COLUMNS, model
+
+
+TRAINING_DATA_PATH = os.path.join(os.path.dirname(__file__), "../data/synthetic_msme.csv")
+
+# Precomputed tables above this many floats are skipped in favour of
+# evaluating the leaf games on the fly (deep random forests).
+_TABLE_BUDGET = 4_000_000
+
+FEATURE_LABELS = {
+    "profit_margin": "Profit margin",
+    "receivables_ratio": "Pending customer payments vs sales",
+    "emi_ratio": "Loan payments vs sales",
+    "cash_buffer_months": "Cash buffer (months of expenses)",
+    "sales_growth_rate": "Sales growth",
+    "expense_growth_rate": "Expense growth",
+}
+
+
+def _leaf_shapley(c, s, r):
+    """
+    Shapley values of v(S) = c * prod_{j in S} s_j * prod_{j not in S} r_j.
+
+    c: (..., L), s and r: (..., L, d) broadcastable. Returns (..., L, d).
+    """
+    d = r.shape[-1]
+    phi = np.zeros(np.broadcast_shapes(s.shape, r.shape), dtype=float)
+    for i in range(d):
+        others = [j for j in range(d) if j != i]
+        total = 0.0
+        for size in range(len(others) + 1):
+            weight = factorial(size) * factorial(d - size - 1) / factorial(d)
+            for subset in combinations(others, size):
+                term = weight
+                for j in others:
+                    term = term * (s[..., j] if j in subset else r[..., j])
+                total = total + term
+        phi[..., i] = c * (s[..., i] - r[..., i]) * total
+    return phi
+
+
+class _TreeEnsembleExplainer:
+    def __init__(self, trees, scales, raw_output):
+        self.raw_output = raw_output
+        groups: Dict[int, Dict[str, list]] = {}
+
+        for tree, scale in zip(trees, scales):
+            t = tree.tree_
+            cover = t.weighted_n_node_samples
+            stack = [(0, [])]
+            while stack:
+                node, path = stack.pop()
+                left, right = t.children_left[node], t.children_right[node]
+                if left == -1:
+                    self._add_leaf(groups, path, scale * self._leaf_value(t, node))
+                    continue
+                feature, threshold = int(t.feature[node]), float(t.threshold[node])
+                stack.append((left, path + [(feature, threshold, True, cover[left] / cover[node])]))
+                stack.append((right, path + [(feature, threshold, False, cover[right] / cover[node])]))
+
+        self.groups = [self._build_group(d, g) for d, g in sorted(groups.items())]
+        self.expected_value = 0.0
+        reference = np.zeros((1, len(FEATURE_COLUMNS)))
+        self.expected_value = float(self._raw(reference)[0] - self.contributions(reference).sum())
+
+    @staticmethod
+    def _leaf_value(t, node):
+        value = t.value[node][0]
+        if len(value) == 1:
+            return float(value[0])
+        return float(value[1] / value.sum())
+
+    @staticmethod
+    def _add_leaf(groups, path, value):
+        slots: Dict[int, int] = {}
+        cover = []
+        nodes = []
+        for feature, threshold, go_left, fraction in path:
+            if feature not in slots:
+                slots[feature] = len(slots)
+                cover.append(1.0)
+            cover[slots[feature]] *= fraction
+            nodes.append((feature, threshold, go_left, slots[feature]))
+        g = groups.setdefault(len(slots), {"c": [], "features": [], "r": [], "nodes": []})
+        g["c"].append(value)
+        g["features"].append(list(slots))
+        g["r"].append(cover)
+        g["nodes"].append(nodes)
+
+    @staticmethod
+    def _build_group(d, g):
+        leaves = len(g["c"])
+        depth = max(1, max(len(n) for n in g["nodes"]))
+        node_feature = np.zeros((leaves, depth), dtype=np.intp)
+        # Padding nodes always pass (x <= +inf) so they never clear a bit.
+        node_threshold = np.full((leaves, depth), np.inf)
+        node_left = np.ones((leaves, depth), dtype=bool)
+        node_bit = np.zeros((leaves, depth), dtype=np.int64)
+        for l, nodes in enumerate(g["nodes"]):
+            for k, (feature, threshold, go_left, slot) in enumerate(nodes):
+                node_feature[l, k] = feature
+                node_threshold[l, k] = threshold
+                node_left[l, k] = go_left
+                node_bit[l, k] = 1 << slot
+
+        c = np.asarray(g["c"], dtype=float)
+        r = np.asarray(g["r"], dtype=float).reshape(leaves, d)
+        scatter = np.zeros((leaves * d, len(FEATURE_COLUMNS)))
+        for l, features in enumerate(g["features"]):
+            for slot, feature in enumerate(features):
+                scatter[l * d + slot, feature] = 1.0
+
+        table = None
+        if d and leaves * (1 << d) * d <= _TABLE_BUDGET:
+            patterns = ((np.arange(1 << d)[:, None] >> np.arange(d)) & 1).astype(float)
+            table = _leaf_shapley(c[:, None], patterns[None, :, :], r[:, None, :])
+
+        return {
+            "d": d,
+            "c": c,
+            "r": r,
+            "node_feature": node_feature,
+            "node_threshold": node_threshold,
+            "node_left": node_left,
+            "node_bit": node_bit,
+            "scatter": scatter,
+            "table": table,
+            "leaf_index": np.arange(leaves),
+        }
+
+    def _raw(self, X):
+        frame = pd.DataFrame(X, columns=FEATURE_COLUMNS)
+        if self.raw_output == "decision_function":
+            return np.asarray(model.decision_function(frame), dtype=float).ravel()
+        return np.asarray(model.predict_proba(frame)[:, 1], dtype=float)
+
+    def contributions(self, X, chunk_rows: int = 512):
+        # sklearn compares float32 inputs against the split thresholds.
+        X = np.asarray(X, dtype=np.float32).astype(float)
+        if X.shape[0] > chunk_rows:
+            return np.vstack(
+                [self.contributions(X[start : start + chunk_rows]) for start in range(0, X.shape[0], chunk_rows)]
+            )
+        n = X.shape[0]
+        out = np.zeros((n, len(FEATURE_COLUMNS)))
+        for g in self.groups:
+            d = g["d"]
+            if d == 0:
+                continue
+            values = X[:, g["node_feature"]]
+            passed = np.where(g["node_left"], values <= g["node_threshold"], values > g["node_threshold"])
+            failed = np.bitwise_or.reduce(np.where(passed, 0, g["node_bit"]), axis=2)
+            pattern = ((1 << d) - 1) & ~failed
+            if g["table"] is not None:
+                phi = g["table"][g["leaf_index"], pattern]
+            else:
+                s = ((pattern[..., None] >> np.arange(d)) & 1).astype(float)
+                phi = _leaf_shapley(g["c"], s, g["r"])
+            out += phi.reshape(n, -1) @ g["scatter"]
+        return out
+
+
+class _LinearExplainer:
+    def __init__(self, coef, intercept, baseline):
+        self.coef = np.asarray(coef, dtype=float).ravel()
+        self.baseline = np.asarray(baseline, dtype=float)
+        self.expected_value = float(intercept + self.coef @ self.baseline)
+
+    def contributions(self, X):
+        return (np.asarray(X, dtype=float) - self.baseline) * self.coef
+
+
+def _training_means() -> np.ndarray:
+    try:
+        df = pd.read_csv(TRAINING_DATA_PATH, usecols=FEATURE_COLUMNS)
+    except (OSError, ValueError):
+        return np.zeros(len(FEATURE_COLUMNS))
+    return df[FEATURE_COLUMNS].fillna(0.0).mean().to_numpy(dtype=float)
+
+
+def _build_explainer():
+    estimators = getattr(model, "estimators_", None)
+    if estimators is not None and hasattr(model, "learning_rate"):
+        # Binary gradient boosting: one regression tree per stage, log-odds output.
+        trees = [stage[0] for stage in np.asarray(estimators).reshape(len(estimators), -1)]
+        return _TreeEnsembleExplainer(trees, [model.learning_rate] * len(trees), "decision_function")
+    if estimators is not None and all(hasattr(t, "tree_") for t in estimators):
+        return _TreeEnsembleExplainer(estimators, [1.0 / len(estimators)] * len(estimators), "predict_proba")
+    if hasattr(model, "coef_") and hasattr(model, "intercept_"):
+        return _LinearExplainer(model.coef_[0], float(np.ravel(model.intercept_)[0]), _training_means())
+    return None
+
+
+_explainer = None
+
+
+def _get_explainer():
+    global _explainer
+    if _explainer is None:
+        _explainer = _build_explainer() or False
+    return _explainer or None
+
+
+def feature_matrix(rows: List[Dict]) -> np.ndarray:
+    return np.array(
+        [[float(row.get(name) or 0.0) for name in FEATURE_COLUMNS] for row in rows],
+        dtype=float,
+    ).reshape(len(rows), len(FEATURE_COLUMNS))
+
+
+def feature_contributions(X) -> Optional[np.ndarray]:
+    """Per-feature contributions for a (n, 6) matrix in FEATURE_COLUMNS order."""
+    explainer = _get_explainer()
+    if explainer is None:
+        return None
+    return explainer.contributions(np.atleast_2d(np.asarray(X, dtype=float)))
+
+
+def expected_value() -> Optional[float]:
+    explainer = _get_explainer()
+    return explainer.expected_value if explainer is not None else None
+
+
+def top_contributions(X, top_k: int = 3) -> List[List[Dict]]:
+    X = np.atleast_2d(np.asarray(X, dtype=float))
+    contributions = feature_contributions(X)
+    if contributions is None:
+        return [[] for _ in range(X.shape[0])]
+
+    order = np.argsort(-np.abs(contributions), axis=1)[:, :top_k]
+    results = []
+    for row, ranked in enumerate(order):
+        items = []
+        for idx in ranked:
+            value = float(contributions[row, idx])
+            if value == 0.0:
+                continue
+            name = FEATURE_COLUMNS[idx]
+            items.append(
+                {
+                    "feature": name,
+                    "label": FEATURE_LABELS.get(name, name),
+                    "value": round(float(X[row, idx]), 4),
+                    "contribution": round(value, 4),
+                    "direction": "increases_risk" if value > 0 else "reduces_risk",
+                }
+            )
+        results.append(items)
+    return results
@@ -0,0 +1,257 @@
+"""
+Offline batch explanation generation for the weekly portfolio risk reports.
+
+Scores each user in daily mode (rolling check-in windows + latest balances),
+builds the same prompt as /predict, and runs LLM generations through an
+asyncio worker pool with a concurrency cap and a requests-per-minute limit.
+Identical prompts are served from the explanation cache. Every finished user
+is appended to a checkpoint file, so a crashed run resumes where it stopped.
+LLM calls skip the API admission gate: --concurrency and --rate-per-minute are
+the job's own limits. A user whose LLM call fails gets the rule-based
+explanation, is counted under "fallback" and is checkpointed as "fallback",
+so the next run with the same run id retries them.
+
+Usage (from backend/):
+    python -m xai.batch_reports --user-ids 1,2,3 --as-of-date 2024-06-30
+    python -m xai.batch_reports --user-ids-file ids.txt --concurrency 8 --rate-per-minute 120
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import date
+from typing import Dict, List, Optional, Set
+
+from db.storage import get_latest_checkin, init_db, save_risk_report
+from services.scoring import (
+    apply_rolling_metrics,
+    build_llm_explanation_ui,
+    build_llm_prompt,
+    compute_survival_metrics,
+    llm_timeout_seconds,
+    score_input,
+)
+from xai.explain import generate_llm_explanation_shared_async, get_cached_explanation
+
+
+class _RateLimiter:
+    """Spaces LLM calls evenly so the run never exceeds `per_minute`."""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        if not self.interval:
+            return
+        async with self._lock:
+            now = asyncio.get_running_loop().time()
+            delay = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def _load_checkpoint(path: str) -> Set[int]:
+    done: Set[int] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # A crash mid-write can leave a torn last line.
+                continue
+            if entry.get("status") == "done":
+                done.add(int(entry["user_id"]))
+    return done
+
+
+def _append_checkpoint(handle, user_id: int, status: str, error: Optional[str] = None) -> None:
+    entry = {"user_id": int(user_id), "status": status}
+    if error:
+        entry["error"] = error
+    handle.write(json.dumps(entry) + "\n")
+    handle.flush()
+    os.fsync(handle.fileno())
+
+
+def _prepare_report(user_id: int, as_of_date: str) -> Dict:
+    latest = get_latest_checkin(user_id, as_of_date=as_of_date)
+    if not latest:
+        raise ValueError(f"User {user_id} has no check-ins on or before {as_of_date}")
+
+    input_dict = {
+        "user_id": int(user_id),
+        "as_of_date": as_of_date,
+        "receivables": latest["receivables"],
+        "loan_emi": latest["loan_emi"],
+        "cash_balance": latest["cash_balance"],
+    }
+    apply_rolling_metrics(input_dict)
+    scored = score_input(input_dict)
+    scored["input"] = input_dict
+    scored["prompt"] = build_llm_prompt(
+        scored["risk_score"],
+        scored["risk_level"],
+        scored["features"],
+        scored["reasons"],
+        scored["actions"],
+    )
+    return scored
+
+
+def _build_report(run_id: str, user_id: int, as_of_date: str, scored: Dict, llm_explanation, source: str) -> Dict:
+    survival = compute_survival_metrics(scored["input"])
+    return {
+        "run_id": run_id,
+        "user_id": int(user_id),
+        "as_of_date": as_of_date,
+        "risk_score": int(scored["risk_score"]),
+        "risk_level": str(scored["risk_level"]),
+        "reasons": scored["reasons"],
+        "actions": scored["actions"],
+        "top_features": scored["top_features"],
+        "llm_explanation": llm_explanation,
+        "llm_explanation_ui": build_llm_explanation_ui(
+            llm_explanation,
+            scored["risk_score"],
+            scored["risk_level"],
+            scored["reasons"],
+            scored["actions"],
+            scored["top_features"],
+        ),
+        "explanation_source": source,
+        "survival_analysis": survival["survival_analysis"],
+        "priority_action": survival["priority_action"],
+    }
+
+
+async def run_batch(
+    user_ids: List[int],
+    run_id: str,
+    as_of_date: Optional[str] = None,
+    concurrency: int = 4,
+    rate_per_minute: float = 60.0,
+    checkpoint_path: Optional[str] = None,
+    timeout_seconds: Optional[float] = None,
+) -> Dict:
+    as_of = (as_of_date or date.today().isoformat()).strip()
+    timeout = timeout_seconds if timeout_seconds is not None else llm_timeout_seconds()
+    checkpoint_path = checkpoint_path or os.path.join("data", f"batch_reports_{run_id}.checkpoint")
+    directory = os.path.dirname(checkpoint_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    done = _load_checkpoint(checkpoint_path)
+    pending = [uid for uid in dict.fromkeys(int(u) for u in user_ids) if uid not in done]
+    stats = {
+        "run_id": run_id,
+        "as_of_date": as_of,
+        "requested": len(set(int(u) for u in user_ids)),
+        "skipped_from_checkpoint": len(set(int(u) for u in user_ids) & done),
+        "completed": 0,
+        "failed": 0,
+        "llm": 0,
+        "cache": 0,
+        "fallback": 0,
+    }
+
+    queue: "asyncio.Queue[int]" = asyncio.Queue()
+    for uid in pending:
+        queue.put_nowait(uid)
+    limiter = _RateLimiter(rate_per_minute)
+    started = time.monotonic()
+
+    with open(checkpoint_path, "a", encoding="utf-8") as checkpoint:
+
+        async def _process(user_id: int) -> str:
+            scored = await asyncio.to_thread(_prepare_report, user_id, as_of)
+            llm_explanation = get_cached_explanation(scored["prompt"])
+            source = "cache"
+            if llm_explanation is None:
+                await limiter.wait()
+                try:
+                    llm_explanation = await generate_llm_explanation_shared_async(scored["prompt"], timeout)
+                except TimeoutError:
+                    llm_explanation = None
+                source = "llm" if llm_explanation else "fallback"
+            report = _build_report(run_id, user_id, as_of, scored, llm_explanation, source)
+            await asyncio.to_thread(save_risk_report, report)
+            stats[source] += 1
+            return source
+
+        async def _worker() -> None:
+            while True:
+                try:
+                    user_id = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    source = await _process(user_id)
+                    stats["completed"] += 1
+                    _append_checkpoint(checkpoint, user_id, "fallback" if source == "fallback" else "done")
+                except Exception as exc:
+                    stats["failed"] += 1
+                    _append_checkpoint(checkpoint, user_id, "failed", str(exc))
+                processed = stats["completed"] + stats["failed"]
+                if processed % 50 == 0:
+                    elapsed = time.monotonic() - started
+                    print(
+                        f"[batch_reports] {processed}/{len(pending)} "
+                        f"({stats['completed'] / elapsed * 60.0:.1f} explanations/min)"
+                    )
+
+        await asyncio.gather(*[_worker() for _ in range(max(1, int(concurrency)))])
+
+    elapsed = time.monotonic() - started
+    stats["elapsed_seconds"] = round(elapsed, 3)
+    stats["explanations_per_minute"] = round(stats["completed"] / elapsed * 60.0, 2) if elapsed > 0 else 0.0
+    stats["checkpoint_path"] = checkpoint_path
+    return stats
+
+
+def _parse_user_ids(args) -> List[int]:
+    ids: List[int] = []
+    if args.user_ids:
+        ids.extend(int(part) for part in args.user_ids.split(",") if part.strip())
+    if args.user_ids_file:
+        with open(args.user_ids_file, "r", encoding="utf-8") as f:
+            ids.extend(int(line) for line in f if line.strip())
+    return ids
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate risk report explanations for many users.")
+    parser.add_argument("--user-ids", default="", help="Comma-separated user ids")
+    parser.add_argument("--user-ids-file", default="", help="File with one user id per line")
+    parser.add_argument("--run-id", default=f"weekly-{date.today().isoformat()}")
+    parser.add_argument("--as-of-date", default=None, help="YYYY-MM-DD (default: today)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate-per-minute", type=float, default=60.0, help="0 disables the rate limit")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file (default: data/batch_reports_<run_id>.checkpoint)")
+    args = parser.parse_args()
+
+    user_ids = _parse_user_ids(args)
+    if not user_ids:
+        parser.error("Provide --user-ids or --user-ids-file")
+
+    init_db()
+    stats = asyncio.run(
+        run_batch(
+            user_ids,
+            run_id=args.run_id,
+            as_of_date=args.as_of_date,
+            concurrency=args.concurrency,
+            rate_per_minute=args.rate_per_minute,
+            checkpoint_path=args.checkpoint,
+        )
+    )
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
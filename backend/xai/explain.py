@@ -1,14 +1,31 @@
+import asyncio
 import os
 import json
+import threading
+import time
 import urllib.request
 import urllib.error
-from typing import Optional, List
+from collections import OrderedDict, deque
+from typing import Dict, Optional, List
 
+import httpx
 
-def explain_risk(features, rules_triggered):
-    explanations = []
-    # rank top 3 contributing features
-    return explanations
+from xai.attribution import feature_matrix, top_contributions
+
+
+def explain_risk(features, rules_triggered=None, top_k: int = 3) -> List[Dict]:
+    """
+    Rank the top contributing model features for one engineered feature dict.
+
+    Ranking is purely model-based (TreeSHAP / coefficient x deviation, see
+    xai.attribution); rules_triggered is accepted for backward compatibility.
+    Each item: feature, label, value, contribution, direction.
+    """
+    return top_contributions(feature_matrix([features]), top_k=top_k)[0]
+
+
+def explain_risk_batch(feature_rows: List[Dict], top_k: int = 3) -> List[List[Dict]]:
+    return top_contributions(feature_matrix(feature_rows), top_k=top_k)
 
 
 def _debug_log(message: str) -> None:
@@ -16,15 +33,313 @@ def _debug_log(message: str) -> None:
         print(f"[LLM_DEBUG] {message}")
 
 
-def _post_json(url: str, payload: dict, api_key: str, timeout_seconds: float) -> Optional[dict]:
+def _env_int(name: str, default: int, minimum: int = 0) -> int:
+    try:
+        value = int(os.getenv(name, str(default)).strip())
+    except ValueError:
+        return default
+    return max(minimum, value)
+
+
+def _env_float(name: str, default: float, minimum: float = 0.0) -> float:
+    try:
+        value = float(os.getenv(name, str(default)).strip())
+    except ValueError:
+        return default
+    return max(minimum, value)
+
+
+# Admission control for LLM calls. Each in-flight call can take up to
+# LLM_TIMEOUT_SECONDS, so cap concurrency and keep the wait queue short;
+# callers that cannot get a slot fall back to the rule-based explanation.
+# One budget and one FIFO queue serve every caller: threads (speculative
+# pre-generation) wait on an Event, request handlers on the event loop on
+# a future the releasing thread resolves through their loop, so a waiting
+# request never holds a thread. A released slot goes straight to the
+# longest waiting caller of either kind.
+_WAIT_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_llm_slots = threading.Lock()
+_llm_waiters: "deque[Dict]" = deque()
+_llm_admission = {
+    "in_flight": 0,
+    "queue_depth": 0,
+    "max_queue_depth_seen": 0,
+    "admitted": 0,
+    "rejected_queue_full": 0,
+    "rejected_wait_timeout": 0,
+    "wait_seconds_total": 0.0,
+    "wait_seconds_max": 0.0,
+    "wait_seconds_buckets": [0] * (len(_WAIT_BUCKETS) + 1),
+}
+
+
+def _record_wait(waited: float) -> None:
+    _llm_admission["wait_seconds_total"] += waited
+    _llm_admission["wait_seconds_max"] = max(_llm_admission["wait_seconds_max"], waited)
+    for idx, bound in enumerate(_WAIT_BUCKETS):
+        if waited <= bound:
+            _llm_admission["wait_seconds_buckets"][idx] += 1
+            return
+    _llm_admission["wait_seconds_buckets"][-1] += 1
+
+
+def _wake(waiter: Dict) -> bool:
+    if "event" in waiter:
+        waiter["event"].set()
+        return True
+    future = waiter["future"]
+    try:
+        future.get_loop().call_soon_threadsafe(lambda: future.done() or future.set_result(True))
+    except RuntimeError:
+        # Its event loop is closed; nobody is left to use the slot.
+        return False
+    return True
+
+
+def _grant_waiting(max_concurrency: int) -> None:
+    """Hand free slots to queued callers, oldest first (call with _llm_slots held)."""
+    while _llm_waiters and _llm_admission["in_flight"] < max_concurrency:
+        waiter = _llm_waiters.popleft()
+        waiter["granted"] = True
+        _llm_admission["in_flight"] += 1
+        if not _wake(waiter):
+            _llm_admission["in_flight"] -= 1
+    _llm_admission["queue_depth"] = len(_llm_waiters)
+
+
+def _enter_llm_queue(waiter: Dict) -> Optional[bool]:
+    """True when admitted at once, False when the queue is full, None when `waiter` was queued."""
+    max_concurrency = _env_int("LLM_MAX_CONCURRENCY", 4, minimum=1)
+    with _llm_slots:
+        if _llm_admission["in_flight"] < max_concurrency and not _llm_waiters:
+            _llm_admission["in_flight"] += 1
+            _llm_admission["admitted"] += 1
+            _record_wait(0.0)
+            return True
+        if len(_llm_waiters) >= _env_int("LLM_MAX_QUEUE", 8):
+            _llm_admission["rejected_queue_full"] += 1
+            return False
+        waiter["granted"] = False
+        _llm_waiters.append(waiter)
+        _llm_admission["max_queue_depth_seen"] = max(_llm_admission["max_queue_depth_seen"], len(_llm_waiters))
+        _grant_waiting(max_concurrency)
+        return None
+
+
+def _leave_llm_queue(waiter: Dict, started: float) -> bool:
+    """After the wait: True if the slot was granted, otherwise drop out of the queue."""
+    with _llm_slots:
+        if not waiter["granted"]:
+            _llm_waiters.remove(waiter)
+            _llm_admission["queue_depth"] = len(_llm_waiters)
+            _llm_admission["rejected_wait_timeout"] += 1
+            return False
+        _llm_admission["admitted"] += 1
+        _record_wait(time.monotonic() - started)
+        return True
+
+
+def _acquire_llm_slot() -> bool:
+    started = time.monotonic()
+    waiter = {"event": threading.Event()}
+    admitted = _enter_llm_queue(waiter)
+    if admitted is not None:
+        return admitted
+    waiter["event"].wait(_env_float("LLM_QUEUE_WAIT_SECONDS", 2.0))
+    return _leave_llm_queue(waiter, started)
+
+
+async def _acquire_llm_slot_async() -> bool:
+    started = time.monotonic()
+    waiter = {"future": asyncio.get_running_loop().create_future()}
+    admitted = _enter_llm_queue(waiter)
+    if admitted is not None:
+        return admitted
+    try:
+        await asyncio.wait_for(asyncio.shield(waiter["future"]), _env_float("LLM_QUEUE_WAIT_SECONDS", 2.0))
+    except asyncio.TimeoutError:
+        pass
+    except asyncio.CancelledError:
+        if _leave_llm_queue(waiter, started):
+            _release_llm_slot()
+        raise
+    return _leave_llm_queue(waiter, started)
+
+
+def _release_llm_slot() -> None:
+    with _llm_slots:
+        _llm_admission["in_flight"] = max(0, _llm_admission["in_flight"] - 1)
+        _grant_waiting(_env_int("LLM_MAX_CONCURRENCY", 4, minimum=1))
+
+
+# Single-flight: concurrent callers with the same prompt and model share one
+# upstream request instead of each paying the full generation cost.
+_inflight_lock = threading.Lock()
+_inflight: Dict[tuple, Dict] = {}
+_single_flight = {"leaders": 0, "coalesced": 0}
+
+
+def _llm_model_key() -> tuple:
+    use_ollama = os.getenv("LLM_USE_OLLAMA", "1").strip().lower() not in {"0", "false", "no"}
+    return (
+        use_ollama,
+        os.getenv("OLLAMA_BASE_URL", "http://127.0.0.1:11434").strip().rstrip("/") if use_ollama else "",
+        os.getenv("OLLAMA_MODEL", "llama3.1:8b").strip() if use_ollama else "",
+        os.getenv("LLM_API_BASE", "https://api.openai.com/v1").strip().rstrip("/"),
+        os.getenv("LLM_MODEL", "gpt-4o-mini").strip(),
+    )
+
+
+def _run_single_flight(key: tuple, fn):
+    with _inflight_lock:
+        flight = _inflight.get(key)
+        leader = flight is None
+        if leader:
+            flight = {"done": threading.Event(), "result": None, "error": None}
+            _inflight[key] = flight
+            _single_flight["leaders"] += 1
+        else:
+            _single_flight["coalesced"] += 1
+
+    if leader:
+        try:
+            flight["result"] = fn()
+        except Exception as exc:
+            flight["error"] = exc
+            raise
+        finally:
+            with _inflight_lock:
+                _inflight.pop(key, None)
+            flight["done"].set()
+        return flight["result"]
+
+    # The leader's own timeouts bound this wait; followers get its result or error.
+    flight["done"].wait()
+    if flight["error"] is not None:
+        raise flight["error"]
+    return flight["result"]
+
+
+async def _run_single_flight_async(key: tuple, fn):
+    """_run_single_flight for coroutines; shares flights with threaded callers."""
+    loop = asyncio.get_running_loop()
+    with _inflight_lock:
+        flight = _inflight.get(key)
+        leader = flight is None
+        if leader:
+            flight = {"done": threading.Event(), "result": None, "error": None, "future": loop.create_future()}
+            _inflight[key] = flight
+            _single_flight["leaders"] += 1
+        else:
+            _single_flight["coalesced"] += 1
+
+    if leader:
+        try:
+            flight["result"] = await fn()
+        except BaseException as exc:
+            # A cancelled leader must not hand CancelledError to its followers.
+            flight["error"] = exc if isinstance(exc, Exception) else TimeoutError("LLM request cancelled")
+            raise
+        finally:
+            with _inflight_lock:
+                _inflight.pop(key, None)
+            flight["done"].set()
+            flight["future"].set_result(None)
+        return flight["result"]
+
+    future = flight.get("future")
+    if future is not None and future.get_loop() is loop:
+        await asyncio.shield(future)
+    else:
+        # Led by a thread (e.g. speculative pre-generation): wait for it off the loop.
+        await loop.run_in_executor(None, flight["done"].wait)
+    if flight["error"] is not None:
+        raise flight["error"]
+    return flight["result"]
+
+
+# Explanation cache: prompts are fully determined by the score, features and
+# rule output, so a finished generation can be reused for identical prompts.
+_cache_lock = threading.Lock()
+_explanation_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+_cache_counters = {"hits": 0, "misses": 0, "stores": 0}
+
+
+def get_cached_explanation(prompt: str) -> Optional[str]:
+    key = (_llm_model_key(), prompt)
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _explanation_cache.get(key)
+        if entry is None or entry[1] < now:
+            if entry is not None:
+                del _explanation_cache[key]
+            _cache_counters["misses"] += 1
+            return None
+        _explanation_cache.move_to_end(key)
+        _cache_counters["hits"] += 1
+        return entry[0]
+
+
+def cache_explanation(prompt: str, text: Optional[str]) -> None:
+    max_entries = _env_int("LLM_CACHE_SIZE", 512)
+    if not text or max_entries == 0:
+        return
+    key = (_llm_model_key(), prompt)
+    expires_at = time.monotonic() + _env_float("LLM_CACHE_TTL_SECONDS", 3600.0)
+    with _cache_lock:
+        _explanation_cache[key] = (text, expires_at)
+        _explanation_cache.move_to_end(key)
+        _cache_counters["stores"] += 1
+        while len(_explanation_cache) > max_entries:
+            _explanation_cache.popitem(last=False)
+
+
+def get_llm_admission_stats() -> Dict:
+    with _llm_slots:
+        stats = dict(_llm_admission)
+        stats["wait_seconds_buckets"] = {
+            **{f"le_{bound}": count for bound, count in zip(_WAIT_BUCKETS, _llm_admission["wait_seconds_buckets"])},
+            "le_inf": _llm_admission["wait_seconds_buckets"][-1],
+        }
+    stats["wait_seconds_avg"] = stats["wait_seconds_total"] / stats["admitted"] if stats["admitted"] else 0.0
+    stats["max_concurrency"] = _env_int("LLM_MAX_CONCURRENCY", 4, minimum=1)
+    stats["max_queue"] = _env_int("LLM_MAX_QUEUE", 8)
+    stats["max_wait_seconds"] = _env_float("LLM_QUEUE_WAIT_SECONDS", 2.0)
+    with _inflight_lock:
+        stats["single_flight_leaders"] = _single_flight["leaders"]
+        stats["single_flight_coalesced"] = _single_flight["coalesced"]
+        stats["single_flight_in_progress"] = len(_inflight)
+    with _cache_lock:
+        stats["cache_entries"] = len(_explanation_cache)
+        stats["cache_hits"] = _cache_counters["hits"]
+        stats["cache_misses"] = _cache_counters["misses"]
+        stats["cache_stores"] = _cache_counters["stores"]
+    return stats
+
+
+def _json_headers(api_key: str) -> Dict[str, str]:
     headers = {"Content-Type": "application/json"}
     if api_key:
         headers["Authorization"] = f"Bearer {api_key}"
+    return headers
 
+
+def _http_error(url: str, status: int, err_body: str) -> dict:
+    _debug_log(f"HTTPError {status} at {url}: {err_body}")
+    try:
+        err_json = json.loads(err_body)
+        err_text = str(err_json.get("error") or err_body)
+    except Exception:
+        err_text = err_body
+    return {"error": err_text, "_http_status": status}
+
+
+def _post_json(url: str, payload: dict, api_key: str, timeout_seconds: float) -> Optional[dict]:
     req = urllib.request.Request(
         url=url,
         data=json.dumps(payload).encode("utf-8"),
-        headers=headers,
+        headers=_json_headers(api_key),
         method="POST",
     )
 
@@ -37,13 +352,7 @@ def _post_json(url: str, payload: dict, api_key: str, timeout_seconds: float) ->
             err_body = exc.read().decode("utf-8")
         except Exception:
             err_body = "<unreadable>"
-        _debug_log(f"HTTPError {exc.code} at {url}: {err_body}")
-        try:
-            err_json = json.loads(err_body)
-            err_text = str(err_json.get("error") or err_body)
-        except Exception:
-            err_text = err_body
-        return {"error": err_text, "_http_status": exc.code}
+        return _http_error(url, exc.code, err_body)
     except urllib.error.URLError as exc:
         _debug_log(f"URLError at {url}: {exc}")
         if isinstance(getattr(exc, "reason", None), TimeoutError):
@@ -56,38 +365,106 @@ def _post_json(url: str, payload: dict, api_key: str, timeout_seconds: float) ->
         return None
 
 
-def _generate_with_ollama(prompt: str, timeout_seconds: float) -> Optional[str]:
+# One pooled client per event loop, so async calls reuse keep-alive connections.
+_async_client = {"loop": None, "client": None}
+
+
+def _get_async_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _async_client["client"]
+    if client is None or client.is_closed or _async_client["loop"] is not loop:
+        client = httpx.AsyncClient()
+        _async_client.update(loop=loop, client=client)
+    return client
+
+
+async def close_async_client() -> None:
+    client = _async_client["client"]
+    _async_client.update(loop=None, client=None)
+    if client is not None and not client.is_closed:
+        await client.aclose()
+
+
+async def _post_json_async(url: str, payload: dict, api_key: str, timeout_seconds: float) -> Optional[dict]:
+    try:
+        resp = await _get_async_client().post(
+            url, json=payload, headers=_json_headers(api_key), timeout=timeout_seconds
+        )
+    except httpx.TimeoutException as exc:
+        raise TimeoutError("LLM request timed out") from exc
+    except Exception as exc:
+        _debug_log(f"Request error at {url}: {exc}")
+        return None
+    if resp.status_code >= 400:
+        return _http_error(url, resp.status_code, resp.text)
+    try:
+        return resp.json()
+    except Exception as exc:
+        _debug_log(f"Unreadable response from {url}: {exc}")
+        return None
+
+
+async def _get_json_async(url: str, timeout_seconds: float) -> dict:
+    resp = await _get_async_client().get(url, timeout=timeout_seconds)
+    resp.raise_for_status()
+    return resp.json()
+
+
+def _ollama_settings() -> tuple:
     ollama_base = os.getenv("OLLAMA_BASE_URL", "http://127.0.0.1:11434").strip().rstrip("/")
-    ollama_model = os.getenv("OLLAMA_MODEL", "llama3.1:8b").strip()
-    ollama_url = f"{ollama_base}/api/generate"
+    return ollama_base, os.getenv("OLLAMA_MODEL", "llama3.1:8b").strip()
 
-    def _try_generate(model_name: str) -> Optional[str]:
-        payload = {
-            "model": model_name,
-            "prompt": prompt,
-            "stream": False,
-        }
-        data = _post_json(ollama_url, payload, api_key="", timeout_seconds=timeout_seconds)
-        if not data:
-            return None
 
-        if data.get("error"):
-            _debug_log(f"Ollama error for model '{model_name}': {data.get('error')}")
-            return None
+def _ollama_payload(model_name: str, prompt: str) -> dict:
+    return {"model": model_name, "prompt": prompt, "stream": False}
+
+
+def _ollama_text(data: Optional[dict], model_name: str) -> Optional[str]:
+    if not data:
+        return None
+    if data.get("error"):
+        _debug_log(f"Ollama error for model '{model_name}': {data.get('error')}")
+        return None
+    response = data.get("response")
+    if not response:
+        return None
+    return str(response).strip()
 
-        response = data.get("response")
-        if not response:
-            return None
-        return str(response).strip()
+
+def _ollama_model_names(data: dict) -> List[str]:
+    models = data.get("models") or []
+    return [str(m.get("name")).strip() for m in models if m.get("name")]
+
+
+def _ollama_fallback_model(ollama_model: str, installed_models: List[str]) -> Optional[str]:
+    """The first installed model, when the configured one is missing and fallback is on."""
+    if not installed_models or ollama_model in installed_models:
+        return None
+    fallback_model = installed_models[0]
+    _debug_log(
+        f"Configured model '{ollama_model}' not found in local Ollama tags; retrying with '{fallback_model}'"
+    )
+    return fallback_model
+
+
+def _ollama_fallback_enabled() -> bool:
+    return os.getenv("OLLAMA_FALLBACK_TO_FIRST_TAG", "1").strip().lower() not in {"0", "false", "no"}
+
+
+def _generate_with_ollama(prompt: str, timeout_seconds: float) -> Optional[str]:
+    ollama_base, ollama_model = _ollama_settings()
+    ollama_url = f"{ollama_base}/api/generate"
+
+    def _try_generate(model_name: str) -> Optional[str]:
+        data = _post_json(ollama_url, _ollama_payload(model_name, prompt), api_key="", timeout_seconds=timeout_seconds)
+        return _ollama_text(data, model_name)
 
     def _list_models() -> List[str]:
         tags_url = f"{ollama_base}/api/tags"
         try:
             with urllib.request.urlopen(tags_url, timeout=timeout_seconds) as resp:
                 body = resp.read().decode("utf-8")
-                data = json.loads(body)
-                models = data.get("models") or []
-                return [str(m.get("name")).strip() for m in models if m.get("name")]
+                return _ollama_model_names(json.loads(body))
         except Exception as exc:
             _debug_log(f"Unable to list Ollama models from {tags_url}: {exc}")
             return []
@@ -97,21 +474,93 @@ def _generate_with_ollama(prompt: str, timeout_seconds: float) -> Optional[str]:
     if result:
         return result
 
-    fallback_enabled = os.getenv("OLLAMA_FALLBACK_TO_FIRST_TAG", "1").strip().lower() not in {"0", "false", "no"}
-    if not fallback_enabled:
+    if not _ollama_fallback_enabled():
         return None
 
-    installed_models = _list_models()
-    if not installed_models:
+    fallback_model = _ollama_fallback_model(ollama_model, _list_models())
+    if fallback_model is None:
+        return None
+    return _try_generate(fallback_model)
+
+
+async def _generate_with_ollama_async(prompt: str, timeout_seconds: float) -> Optional[str]:
+    ollama_base, ollama_model = _ollama_settings()
+    ollama_url = f"{ollama_base}/api/generate"
+
+    async def _try_generate(model_name: str) -> Optional[str]:
+        data = await _post_json_async(
+            ollama_url, _ollama_payload(model_name, prompt), api_key="", timeout_seconds=timeout_seconds
+        )
+        return _ollama_text(data, model_name)
+
+    async def _list_models() -> List[str]:
+        tags_url = f"{ollama_base}/api/tags"
+        try:
+            return _ollama_model_names(await _get_json_async(tags_url, timeout_seconds))
+        except Exception as exc:
+            _debug_log(f"Unable to list Ollama models from {tags_url}: {exc}")
+            return []
+
+    _debug_log(f"Trying Ollama at {ollama_base} with model '{ollama_model}'")
+    result = await _try_generate(ollama_model)
+    if result:
+        return result
+
+    if not _ollama_fallback_enabled():
         return None
-    if ollama_model in installed_models:
+
+    fallback_model = _ollama_fallback_model(ollama_model, await _list_models())
+    if fallback_model is None:
         return None
+    return await _try_generate(fallback_model)
 
-    fallback_model = installed_models[0]
-    _debug_log(
-        f"Configured model '{ollama_model}' not found in local Ollama tags; retrying with '{fallback_model}'"
-    )
-    return _try_generate(fallback_model)
+
+def _use_ollama() -> bool:
+    return os.getenv("LLM_USE_OLLAMA", "1").strip().lower() not in {"0", "false", "no"}
+
+
+def _openai_requests(prompt: str) -> List[tuple]:
+    """(url, payload) for the Responses API, then the Chat Completions fallback."""
+    model = os.getenv("LLM_MODEL", "gpt-4o-mini").strip()
+    api_base = os.getenv("LLM_API_BASE", "https://api.openai.com/v1").strip().rstrip("/")
+    messages = [
+        {"role": "system", "content": "You are a concise financial risk assistant."},
+        {"role": "user", "content": prompt},
+    ]
+    return [
+        # 1) Responses API (newer OpenAI-compatible path).
+        (
+            f"{api_base}/responses",
+            {"model": model, "input": messages, "temperature": 0.2, "max_output_tokens": 280},
+        ),
+        # 2) Chat Completions API.
+        (
+            f"{api_base}/chat/completions",
+            {"model": model, "messages": messages, "temperature": 0.2, "max_tokens": 280},
+        ),
+    ]
+
+
+def _responses_text(data: Optional[dict]) -> Optional[str]:
+    if not data:
+        return None
+    text = data.get("output_text")
+    if isinstance(text, str) and text.strip():
+        return text.strip()
+    return None
+
+
+def _chat_text(data: Optional[dict]) -> Optional[str]:
+    if not data:
+        return None
+    choices = data.get("choices") or []
+    if not choices:
+        return None
+    message = choices[0].get("message") or {}
+    content = message.get("content")
+    if not content:
+        return None
+    return str(content).strip()
 
 
 def generate_llm_explanation(prompt: str, timeout_seconds: float = 6.0) -> Optional[str]:
@@ -128,57 +577,110 @@ def generate_llm_explanation(prompt: str, timeout_seconds: float = 6.0) -> Optio
     - LLM_MODEL: optional (default: gpt-4o-mini)
     - LLM_API_BASE: optional (default: https://api.openai.com/v1)
     """
-    use_ollama = os.getenv("LLM_USE_OLLAMA", "1").strip().lower() not in {"0", "false", "no"}
-
-    if use_ollama:
+    if _use_ollama():
         ollama_result = _generate_with_ollama(prompt, timeout_seconds=timeout_seconds)
         if ollama_result:
             return ollama_result
 
     api_key = os.getenv("LLM_API_KEY", "").strip()
-    model = os.getenv("LLM_MODEL", "gpt-4o-mini").strip()
-    api_base = os.getenv("LLM_API_BASE", "https://api.openai.com/v1").strip().rstrip("/")
-
     if not api_key:
         return None
 
-    # 1) Try Responses API (newer OpenAI-compatible path).
-    responses_url = f"{api_base}/responses"
-    responses_payload = {
-        "model": model,
-        "input": [
-            {"role": "system", "content": "You are a concise financial risk assistant."},
-            {"role": "user", "content": prompt},
-        ],
-        "temperature": 0.2,
-        "max_output_tokens": 280,
-    }
-    responses_data = _post_json(responses_url, responses_payload, api_key, timeout_seconds)
-    if responses_data:
-        text = responses_data.get("output_text")
-        if isinstance(text, str) and text.strip():
-            return text.strip()
-
-    # 2) Fallback to Chat Completions API.
-    chat_url = f"{api_base}/chat/completions"
-    chat_payload = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": "You are a concise financial risk assistant."},
-            {"role": "user", "content": prompt},
-        ],
-        "temperature": 0.2,
-        "max_tokens": 280,
-    }
-    chat_data = _post_json(chat_url, chat_payload, api_key, timeout_seconds)
-    if not chat_data:
-        return None
-
-    choices = chat_data.get("choices") or []
-    if not choices:
-        return None
-    message = choices[0].get("message") or {}
-    content = message.get("content")
-    if not content:
+    (responses_url, responses_payload), (chat_url, chat_payload) = _openai_requests(prompt)
+    text = _responses_text(_post_json(responses_url, responses_payload, api_key, timeout_seconds))
+    if text:
+        return text
+    return _chat_text(_post_json(chat_url, chat_payload, api_key, timeout_seconds))
+
+
+async def generate_llm_explanation_async(prompt: str, timeout_seconds: float = 6.0) -> Optional[str]:
+    """generate_llm_explanation over a pooled httpx.AsyncClient; same configuration."""
+    if _use_ollama():
+        ollama_result = await _generate_with_ollama_async(prompt, timeout_seconds=timeout_seconds)
+        if ollama_result:
+            return ollama_result
+
+    api_key = os.getenv("LLM_API_KEY", "").strip()
+    if not api_key:
         return None
-    return str(content).strip()
+
+    (responses_url, responses_payload), (chat_url, chat_payload) = _openai_requests(prompt)
+    text = _responses_text(await _post_json_async(responses_url, responses_payload, api_key, timeout_seconds))
+    if text:
+        return text
+    return _chat_text(await _post_json_async(chat_url, chat_payload, api_key, timeout_seconds))
+
+
+def generate_llm_explanation_admitted(prompt: str, timeout_seconds: float = 6.0) -> Optional[str]:
+    """
+    Same as generate_llm_explanation, but only runs when an LLM slot is free.
+
+    Returns None without calling the LLM when the wait queue is full or the
+    slot wait exceeds LLM_QUEUE_WAIT_SECONDS, so callers use their fallback.
+    Identical in-flight prompts for the same model are coalesced into one
+    upstream call (and one slot); every caller receives its result or timeout.
+    Successful generations are kept in the explanation cache.
+    - LLM_MAX_CONCURRENCY: optional (default: 4)
+    - LLM_MAX_QUEUE: optional (default: 8)
+    - LLM_QUEUE_WAIT_SECONDS: optional (default: 2.0)
+    - LLM_CACHE_SIZE: optional (default: 512, 0 disables the cache)
+    - LLM_CACHE_TTL_SECONDS: optional (default: 3600)
+    """
+    cached = get_cached_explanation(prompt)
+    if cached is not None:
+        return cached
+
+    def _generate() -> Optional[str]:
+        if not _acquire_llm_slot():
+            _debug_log("LLM admission rejected; using fallback explanation")
+            return None
+        try:
+            text = generate_llm_explanation(prompt, timeout_seconds=timeout_seconds)
+        finally:
+            _release_llm_slot()
+        cache_explanation(prompt, text)
+        return text
+
+    return _run_single_flight((_llm_model_key(), prompt), _generate)
+
+
+async def generate_llm_explanation_admitted_async(prompt: str, timeout_seconds: float = 6.0) -> Optional[str]:
+    """
+    generate_llm_explanation_admitted for the event loop: waits for a slot
+    and calls the LLM without holding a thread. Shares the slots, the queue,
+    the cache and the single-flight table with the sync version.
+    """
+    cached = get_cached_explanation(prompt)
+    if cached is not None:
+        return cached
+
+    async def _generate() -> Optional[str]:
+        if not await _acquire_llm_slot_async():
+            _debug_log("LLM admission rejected; using fallback explanation")
+            return None
+        try:
+            text = await generate_llm_explanation_async(prompt, timeout_seconds=timeout_seconds)
+        finally:
+            _release_llm_slot()
+        cache_explanation(prompt, text)
+        return text
+
+    return await _run_single_flight_async((_llm_model_key(), prompt), _generate)
+
+
+async def generate_llm_explanation_shared_async(prompt: str, timeout_seconds: float = 6.0) -> Optional[str]:
+    """
+    generate_llm_explanation_async with the explanation cache and the
+    single-flight table, but without the admission gate. For callers that
+    bound their own concurrency (xai.batch_reports).
+    """
+    cached = get_cached_explanation(prompt)
+    if cached is not None:
+        return cached
+
+    async def _generate() -> Optional[str]:
+        text = await generate_llm_explanation_async(prompt, timeout_seconds=timeout_seconds)
+        cache_explanation(prompt, text)
+        return text
+
+    return await _run_single_flight_async((_llm_model_key(), prompt), _generate)